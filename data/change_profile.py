@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from disbursement.dispatcher import IssuerDispatcher
+from disbursement.models import ChangeProfileBatch
+from utilities import upstream
+
+
+CHANGE_PROFILE_LOGGER = logging.getLogger("change_fees_profile")
+
+# Change profile statuses of the msisdns which passed the validations, ex: the msisdn already has the new profile
+CHANGE_PROFILE_SUCCESS_CODES = ["200", "629", "560", "562"]
+DEFAULT_CHANGE_PROFILE_BATCH_SIZE = 1000
+DEFAULT_CHANGE_PROFILE_CONCURRENCY = 4
+
+
+def submit_change_profile_batches(doc, url, payload_without_users, msisdns, batch_size=None, concurrency=None):
+    """
+    Submit the msisdns as bulk change profile requests of CHANGE_PROFILE_BATCH_SIZE msisdns, at most
+        CHANGE_PROFILE_CONCURRENCY requests are in flight at once through the pooled upstream session.
+        The requests are asynchronous, the msisdns statuses are posted later to the change profile callback
+        so the ChangeProfileBatch of each accepted batch is saved as soon as UIG returns its batch id
+    :param doc: document of the msisdns, its owner is logged at the requests/responses logs
+    :param payload_without_users: bulk change profile payload of the super admin without the USERS
+    :return: list of (batch id, msisdns count) ordered as the passed msisdns batches
+    :raises: the error of the first failed or rejected request after all the batches are sent
+    """
+    batch_size = batch_size or getattr(settings, "CHANGE_PROFILE_BATCH_SIZE", DEFAULT_CHANGE_PROFILE_BATCH_SIZE)
+    concurrency = concurrency or getattr(settings, "CHANGE_PROFILE_CONCURRENCY", DEFAULT_CHANGE_PROFILE_CONCURRENCY)
+    batches = [msisdns[index:index + batch_size] for index in range(0, len(msisdns), batch_size)]
+    results, errors = [None] * len(batches), []
+    username = doc.owner
+
+    def send(batch_index, agent):
+        batch = batches[batch_index]
+        payload = {**payload_without_users, 'USERS': batch}
+        try:
+            CHANGE_PROFILE_LOGGER.debug(
+                    f"[request] [change fees profile] [{username}] -- batch: {batch_index}, msisdns: {len(batch)}"
+            )
+            # Not retried, a retried submit would create a second batch changing the same profiles again
+            response = upstream.post(url, "CENTRAL_UIG_CHANGE_PROFILE", json=payload, verify=False)
+            CHANGE_PROFILE_LOGGER.debug(
+                    f"[response] [change fees profile] [{username}] -- batch: {batch_index}, {str(response.text)}"
+            )
+            response.raise_for_status()
+            response_dict = response.json()
+            if response_dict.get("TXNSTATUS") != "200" or not response_dict.get("BATCH_ID"):
+                raise ValueError(response_dict.get("MESSAGE") or "change profile batch is rejected")
+            ChangeProfileBatch.objects.create(
+                    doc=doc, batch_id=response_dict["BATCH_ID"], msisdns_count=len(batch),
+                    doc_batches_count=len(batches)
+            )
+            results[batch_index] = (response_dict["BATCH_ID"], len(batch))
+        except Exception as err:
+            CHANGE_PROFILE_LOGGER.debug(
+                    f"[message] [change fees profile error] [{username}] -- batch: {batch_index}, {err.args}"
+            )
+            errors.append(err)
+
+    IssuerDispatcher("change_profile", max_in_flight=concurrency).dispatch(range(len(batches)), send)
+    if errors:
+        raise errors[0]
+
+    return results
+
+
+def record_change_profile_callback(doc_id, batch_id, transactions):
+    """
+    Save the callback transactions of one of the document's change profile batches, the document batches are locked
+        together so that only the callback completing the last batch aggregates them
+    :return: transactions of all the document batches once every batch got its callback,
+        None while some batches are still awaited or submitted, or if the callback of this batch is replayed
+    """
+    with transaction.atomic():
+        doc_batches = list(ChangeProfileBatch.objects.select_for_update().filter(doc_id=doc_id).order_by('id'))
+        batch = next((doc_batch for doc_batch in doc_batches if doc_batch.batch_id == batch_id), None)
+        if batch is None or batch.has_callback:
+            return None
+
+        batch.has_callback = True
+        batch.transactions = transactions
+        batch.save(update_fields=['has_callback', 'transactions', 'updated_at'])
+        # Batches are saved as they're accepted, a callback may complete the saved ones before the others are
+        if len(doc_batches) < batch.doc_batches_count or not all(doc_batch.has_callback for doc_batch in doc_batches):
+            return None
+
+    return [trx for doc_batch in doc_batches for trx in doc_batch.transactions]
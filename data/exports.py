@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import csv
+import gzip
+import itertools
+
+import xlsxwriter
+
+from django.conf import settings
+from django.urls import reverse
+
+from utilities.models import ExcelFile
+
+from .utils import randomword
+
+
+XLSX = 'xlsx'
+CSV = 'csv'
+CSV_GZIP = 'csv.gz'
+EXPORT_FORMATS = (XLSX, CSV, CSV_GZIP)
+# Max rows of an xlsx sheet including its header row
+XLSX_MAX_ROWS = 1048576
+DEFAULT_EXPORT_ITERATOR_CHUNK_SIZE = 2000
+EXPORTED_FILES_DIR = "documents/disbursement"
+
+
+def get_export_format(export_format=None):
+    export_format = export_format or getattr(settings, 'TRANSACTIONS_EXPORT_FORMAT', XLSX)
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format {export_format}, choose one of {', '.join(EXPORT_FORMATS)}")
+    return export_format
+
+
+def iter_export_rows(queryset, fields, converters=None, chunk_size=None):
+    """
+    Stream the passed fields values of the queryset rows through a server side cursor instead of loading model objects
+    :param converters: {field: function} mapping the raw value to the exported one, ex: choice to its verbose name
+    :return: generator of rows as lists of strings
+    """
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_ITERATOR_CHUNK_SIZE', DEFAULT_EXPORT_ITERATOR_CHUNK_SIZE)
+    converters = converters or {}
+    fields_converters = [converters.get(field) for field in fields]
+
+    for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield [
+            str(converter(value) if converter else value) for converter, value in zip(fields_converters, values)
+        ]
+
+
+def _write_xlsx(file_path, columns, rows):
+    # constant_memory flushes every row once the next one is written so memory doesn't grow with the rows count
+    workbook = xlsxwriter.Workbook(file_path, {
+        'constant_memory': True, 'strings_to_formulas': False, 'strings_to_urls': False
+    })
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, columns, workbook.add_format({'bold': True}))
+
+    for row_num, row in enumerate(rows, start=1):
+        worksheet.write_row(row_num, 0, row)
+
+    workbook.close()
+
+
+def _write_csv(file_path, columns, rows, gzipped=False):
+    opener = gzip.open if gzipped else open
+    with opener(file_path, 'wt', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def write_export(file_path_stem, columns, rows, export_format=None, max_rows=XLSX_MAX_ROWS):
+    """
+    Write the rows as they're generated to one sheet per file,
+        xlsx exports roll over to a new part file whenever the sheet of the current one is full
+    :param file_path_stem: file path without the extension, the part files after the first get _part<N> suffix
+    :return: the written files paths
+    """
+    export_format = get_export_format(export_format)
+    rows = iter(rows)
+
+    if export_format != XLSX:
+        file_path = f"{file_path_stem}.{export_format}"
+        _write_csv(file_path, columns, rows, gzipped=export_format == CSV_GZIP)
+        return [file_path]
+
+    file_paths = []
+    next_row = next(rows, None)
+    while next_row is not None or not file_paths:
+        part = len(file_paths) + 1
+        file_path = f"{file_path_stem}.{XLSX}" if part == 1 else f"{file_path_stem}_part{part}.{XLSX}"
+        part_rows = itertools.chain([next_row], rows) if next_row is not None else []
+        _write_xlsx(file_path, columns, itertools.islice(part_rows, max_rows - 1))
+        file_paths.append(file_path)
+        next_row = next(rows, None)
+
+    return file_paths
+
+
+def export_transactions_report(user, filename_prefix, columns, rows, export_format=None):
+    """
+    Write the report files to the exported transactions directory and register them for the user to download them
+    :return: download urls of the report files
+    """
+    file_path_stem = f"{settings.MEDIA_ROOT}/{EXPORTED_FILES_DIR}/{filename_prefix}_{randomword(8)}"
+    download_urls = []
+
+    for file_path in write_export(file_path_stem, columns, rows, export_format):
+        filename = file_path.rsplit('/', 1)[-1]
+        ExcelFile.objects.create(file_name=filename, owner=user)
+        download_urls.append(f"{settings.BASE_URL}{str(reverse('disbursement:download_exported'))}?filename={filename}")
+
+    return download_urls
@@ -0,0 +1,64 @@
+import random
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from data.tasks import BankWalletsAndCardsSheetProcessor, EWalletsSheetProcessor
+
+
+class Command(BaseCommand):
+    help = "Measure the uploaded sheets validation time of the e-wallets and bank wallets/cards sheet specs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--duplicates', type=float, default=0.05, help="ratio of duplicate recipients")
+
+    def make_msisdns(self, rows, duplicates):
+        msisdns = [f"010{index:08d}" for index in range(rows)]
+        for index in random.sample(range(1, rows), int(rows * duplicates)):
+            msisdns[index] = msisdns[index - 1]
+        return msisdns
+
+    def make_sheets(self, rows, duplicates):
+        msisdns = self.make_msisdns(rows, duplicates)
+        amounts = [round(random.uniform(1, 5000), 2) for _ in range(rows)]
+        return {
+            "e-wallets normal specs": pd.DataFrame({"mobile number": msisdns, "amount": amounts}),
+            "e-wallets issuers specs": pd.DataFrame({
+                "mobile number": msisdns, "amount": amounts,
+                "issuer": random.choices(["vodafone", "etisalat", "aman"], k=rows)
+            }),
+            "bank wallets": pd.DataFrame({
+                "mobile number": msisdns, "amount": amounts, "full name": ["Test Recipient"] * rows,
+                "issuer": random.choices(["orange", "bank_wallet"], k=rows)
+            }),
+            "bank cards": pd.DataFrame({
+                "account number": [f"{int(msisdn):012d}" for msisdn in msisdns], "amount": amounts,
+                "full name": ["Test Recipient"] * rows, "bank swift code": ["NBEG"] * rows,
+                "transaction type": ["SALARY"] * rows
+            }),
+        }
+
+    def validate(self, label, df):
+        """:return: errors list of the validated sheet"""
+        if label == "e-wallets normal specs":
+            return EWalletsSheetProcessor.process_and_validate_normal_specs_records(df, "mobile number", "amount")[2]
+        if label == "e-wallets issuers specs":
+            return EWalletsSheetProcessor.process_and_validate_issuers_specs_records(
+                    df, "mobile number", "amount", "issuer"
+            )[3]
+        if label == "bank wallets":
+            return BankWalletsAndCardsSheetProcessor.process_and_validate_wallets_records(df)[4]
+        return BankWalletsAndCardsSheetProcessor.process_and_validate_cards_records(df)[5]
+
+    def handle(self, *args, **options):
+        for rows in options['rows']:
+            for label, df in self.make_sheets(rows, options['duplicates']).items():
+                start = time.perf_counter()
+                errors_list = self.validate(label, df)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(self.style.SUCCESS(
+                        f"{label:<24} rows: {rows:<8} -- validated in {elapsed:.2f}s "
+                        f"({rows / elapsed:.0f} rows/s), rows with errors: {len([e for e in errors_list if e])}"
+                ))
@@ -1,13 +1,13 @@
 # -*- coding: UTF-8 -*-
 from __future__ import print_function
 
-import csv
+import itertools
 import json
 import logging
 import re
+from collections import Counter
 from decimal import Decimal
-import pandas as pd
-import requests
+import numpy as np
 import tablib
 import xlrd
 import xlwt
@@ -15,7 +15,7 @@ from celery import Task
 from dateutil.parser import parse
 
 from django.conf import settings
-from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Case, Count, F, Q, Sum, When
 from django.urls import reverse
 from django.utils.timezone import datetime, make_aware, timedelta
@@ -24,11 +24,13 @@ from django.utils.translation import gettext as _
 from django.contrib.auth.models import Permission
 
 from core.models import AbstractBaseStatus
-from core.utils.validations import phonenumber_form_validate
-from disbursement.models import BankTransaction, DisbursementData
+from disbursement.doc_counters import recompute_doc_counters, reset_doc_counters
+from disbursement.models import BankTransaction, ChangeProfileBatch, DisbursementData, TransactionsDailyRollup
+from disbursement.persistence import bulk_create_transactions
 from disbursement.resources import (DisbursementDataResourceForBankCards,
                                     DisbursementDataResourceForBankWallet,
                                     DisbursementDataResourceForEWallets)
+from disbursement.rollup import aggregate_rollup_per_admin_and_issuer, transactions_rollup
 from disbursement.utils import (DEFAULT_LIST_PER_ADMIN_FOR_TRANSACTIONS_REPORT,
                                 DEFAULT_LIST_PER_ADMIN_FOR_TRANSACTIONS_REPORT_raseedy_vf,
                                 DEFAULT_PER_ADMIN_FOR_VF_FACILITATOR_TRANSACTIONS_REPORT,
@@ -36,19 +38,24 @@ from disbursement.utils import (DEFAULT_LIST_PER_ADMIN_FOR_TRANSACTIONS_REPORT,
                                 VALID_BANK_TRANSACTION_TYPES_LIST,
                                 determine_trx_category_and_purpose)
 from instant_cashin.models import AbstractBaseIssuer, InstantTransaction
-from instant_cashin.utils import get_digits, get_from_env
+from instant_cashin.utils import get_from_env, re_non_digits
 from payouts.settings.celery import app
 from users.models import CheckerUser, Levels, UploaderUser, User, SuperAdminUser
+from utilities import upstream
 from utilities.functions import get_value_from_env
 from utilities.messages import MSG_TRY_OR_CONTACT, MSG_WRONG_FILE_FORMAT
 from utilities.models import Budget, ExcelFile
 from utilities.models.abstract_models import AbstractBaseACHTransactionStatus
 
+from .change_profile import (
+    CHANGE_PROFILE_SUCCESS_CODES, record_change_profile_callback, submit_change_profile_batches
+)
 from .decorators import respects_language
+from .exports import export_transactions_report, iter_export_rows
 from .models import Doc, FileData
-from .utils import deliver_mail, export_excel, randomword
+from .utils import (combine_sheet_errors, deliver_mail, export_excel, iter_sheet_chunks, randomword,
+                    sheet_column_as_str, sniff_csv_delimiter, validate_sheet_amounts, validate_sheet_msisdns)
 
-from django.core.paginator import Paginator
 from data.utils import upload_file_to_vodafone, ExportTransactionsBaseView
 from copy import deepcopy
 import uuid
@@ -90,27 +97,32 @@ class BankWalletsAndCardsSheetProcessor(Task):
         :param doc_obj: csv document to be processed
         :return: the delimiter used at the csv sheet or False if there is any problem
         """
-        try:
-            as_string = doc_obj.file.read().decode("utf-8")
-            dialect = csv.Sniffer().sniff(as_string)
-            doc_obj.file.seek(0)
-            return dialect.delimiter
-        except:
-            return False
+        return sniff_csv_delimiter(doc_obj.file)
 
-    def accumulate_df(self, doc_obj):
+    def iterate_sheet(self, doc_obj):
         """
         :param doc_obj: document to be processed
-        :return: data frame using pandas package
+        :return: generator of data frames of at most SHEET_INGESTION_CHUNK_SIZE rows using pandas package
         """
-        doc_type = "csv" if doc_obj.file.name.endswith(".csv") else "excel"
+        delimiter = self.determine_csv_delimiter(doc_obj) if doc_obj.file.name.endswith(".csv") else None
+        return iter_sheet_chunks(doc_obj.file, settings.SHEET_INGESTION_CHUNK_SIZE, delimiter)
 
-        if doc_type == "excel":
-            df = pd.read_excel(doc_obj.file)
-        else:
-            df = pd.read_csv(doc_obj.file, delimiter=self.determine_csv_delimiter(doc_obj))
+    def validate_records(self, doc_obj, df, seen_recipients=None):
+        """
+        :param doc_obj: document to be processed
+        :param df: data frame chunk of the sheet
+        :param seen_recipients: recipients of the previous chunks used to catch the duplicates across the chunks
+        :return: the sheet processor lists ending with the errors list and the chunk total amount
+        """
+        if doc_obj.is_bank_wallet:
+            return self.process_and_validate_wallets_records(df, seen_recipients)
+        return self.process_and_validate_cards_records(df, seen_recipients)
 
-        return df
+    def failure_sheet_rows(self, doc_obj):
+        """Validate the sheet again chunk by chunk generating the failure sheet rows"""
+        seen_recipients = set() if doc_obj.is_bank_wallet else Counter()
+        for df in self.iterate_sheet(doc_obj):
+            yield from zip(*self.validate_records(doc_obj, df, seen_recipients)[:-1])
 
     def end_with_failure(self, doc_obj, failure_message):
         """
@@ -123,27 +135,20 @@ class BankWalletsAndCardsSheetProcessor(Task):
         file_type = "wallets file" if doc_obj.is_bank_wallet else "cards file"
         UPLOAD_LOGGER.debug(f"[message] [bank {file_type} processing error] [celery_task] -- {failure_message}")
 
-    def end_with_failure_sheet_details(self,
-                                       doc_obj,
-                                       numbers_list,
-                                       amount_list,
-                                       names_list,
-                                       issuers_list=None,
-                                       codes_list=None,
-                                       purposes_list=None,
-                                       errors_list=None):
+    def end_with_failure_sheet_details(self, doc_obj, sheet_rows):
+        """
+        :param doc_obj: document to be processed
+        :param sheet_rows: iterable of the sheet rows with their errors
+        """
         if doc_obj.is_bank_wallet:
-            sheet_data = list(zip(numbers_list, amount_list, names_list, issuers_list, errors_list))
             headers = ["mobile number", "amount", "full name", "issuer", "errors"]
         else:
-            sheet_data = list(zip(numbers_list, amount_list, names_list, codes_list, purposes_list, errors_list))
             headers = ["account number / IBAN", "amount", "full name", "bank swift code", "transaction type", "errors"]
 
         filename = f"failed_validations_{randomword(8)}.xlsx"
         file_path = f"{settings.MEDIA_ROOT}/documents/disbursement/{filename}"
         error_message = _("File validation error")
-        sheet_data.insert(0, headers)
-        export_excel(file_path, sheet_data)
+        export_excel(file_path, itertools.chain([headers], sheet_rows))
         download_url = settings.BASE_URL + \
                        str(reverse('disbursement:download_validation_failed', kwargs={'doc_id': doc_obj.id})) + \
                        f"?filename={filename}"
@@ -154,157 +159,103 @@ class BankWalletsAndCardsSheetProcessor(Task):
 
         notify_maker(doc_obj, download_url)
 
-    def process_and_validate_wallets_records(self, df):
+    def process_and_validate_wallets_records(self, df, seen_msisdns=None):
         """
         :param df: data frame read from the uploaded document
+        :param seen_msisdns: set of the msisdns of the previous chunks of the document
         :return: msisdn_list, amount_list, names_list, errors_list, total_amount
         """
-        total_amount = 0
-        msisdns_list, amounts_list, names_list, issuers_list, errors_list = [], [], [], [], []
-
         try:
-            for record in df.itertuples():
-                index = record[0]
-                errors_list.append(None)
-
-                # 1. Validate msisdns
-                msisdn = str(record[1])
-                valid_msisdn = False
-                try:
-                    if msisdn.startswith("1") and len(msisdn) == 10:
-                        phonenumber_form_validate(f"+20{msisdn}")
-                        msisdn = f"0020{msisdn}"
-                        msisdns_list.append(msisdn)
-                        valid_msisdn = True
-                    elif msisdn.startswith("01") and len(msisdn) == 11:
-                        phonenumber_form_validate(f"+2{msisdn}")
-                        msisdn = f"002{msisdn}"
-                        msisdns_list.append(msisdn)
-                        valid_msisdn = True
-                    elif msisdn.startswith("2") and len(msisdn) == 12:
-                        phonenumber_form_validate(f"+{msisdn}")
-                        msisdn = f"00{msisdn}"
-                        msisdns_list.append(msisdn)
-                        valid_msisdn = True
-                    else:
-                        raise ValidationError('')
-                except ValidationError:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid mobile number"
-                    else:
-                        errors_list[index] = "\nInvalid mobile number"
-                    msisdns_list.append(msisdn)
+            # 1. Validate msisdns
+            msisdns, valid_msisdns, duplicate_msisdns = validate_sheet_msisdns(
+                    sheet_column_as_str(df.iloc[:, 0]), seen_msisdns
+            )
 
-                if valid_msisdn and len(list(filter(lambda ms: ms == msisdn, msisdns_list))) > 1:
-                    if errors_list[index]:
-                        errors_list[index] = "Duplicate mobile number"
-                    else:
-                        errors_list[index] = "\nDuplicate mobile number"
+            # 2. Validate amounts
+            amounts_list, valid_amounts, total_amount = validate_sheet_amounts(
+                    df.iloc[:, 1].tolist(), decimal_from_str=False
+            )
 
-                # 2. Validate amounts
-                if self.amount_is_valid_digit(record[2]) and float(record[2]) >= 1.0:
-                    amounts_list.append(round(Decimal(record[2]), 2))
-                    total_amount += round(Decimal(record[2]), 2)
-                else:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid amount"
-                    else:
-                        errors_list[index] = "\nInvalid amount"
-                    amounts_list.append(record[2])
-
-                # 3. Validate for empty names
-                names_list.append(record[3])
-                if not record[3]:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid name"
-                    else:
-                        errors_list[index] = "\nInvalid name"
-
-                # 4. Validate issuer
-                issuer = str(record[4])
-                issuers_list.append(issuer)
-                if not issuer or issuer.lower() not in ["orange", "bank_wallet"]:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid issuer option"
-                    else:
-                        errors_list[index] = "\nInvalid issuer option"
+            # 3. Validate for empty names
+            names = df.iloc[:, 2]
+
+            # 4. Validate issuer
+            issuers = sheet_column_as_str(df.iloc[:, 3])
+            valid_issuers = issuers.str.lower().isin(["orange", "bank_wallet"])
+
+            errors_list = combine_sheet_errors(len(df), [
+                (~valid_msisdns, "Invalid mobile number"),
+                (duplicate_msisdns, "Duplicate mobile number"),
+                (~valid_amounts, "Invalid amount"),
+                (~names.astype(bool).values, "Invalid name"),
+                (~valid_issuers, "Invalid issuer option"),
+            ])
 
         except Exception as e:
             raise Exception(e)
-        return msisdns_list, amounts_list, names_list, issuers_list, errors_list, total_amount
+        return msisdns.tolist(), amounts_list, names.tolist(), issuers.tolist(), errors_list, total_amount
 
-    def process_and_validate_cards_records(self, df):
+    def process_and_validate_cards_records(self, df, seen_accounts=None):
         """
         :param df: data frame read from the uploaded document
+        :param seen_accounts: Counter of the accounts of the previous chunks of the document
         :return: msisdn_list, amount_list, names_list, codes_list, purposes_list, errors_list, total_amount
         """
         total_amount = 0
         accounts_list, amount_list, names_list, codes_list, purposes_list, errors_list = [], [], [], [], [], []
-        iban_regex = re.compile(r'^EG\d{27}')
         try:
-            for record in df.itertuples():
-                index = record[0]
-                errors_list.append(None)
-
-                # 1.1 Validate account numbers
-                account = get_digits(str(record[1]))
-                valid_account = False
-                if account and (6 <= len(account) <= 20):
-                    accounts_list.append(account)
-                    valid_account = True
-                # check account is iban number
-                elif bool(iban_regex.match(str(record[1]))):
-                    accounts_list.append(str(record[1]))
-                    valid_account = True
-                else:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid account number / IBAN"
-                    else:
-                        errors_list[index] = "\nInvalid account number / IBAN"
-                    accounts_list.append(str(record[1]))
-
-                # 1.2 Validate for duplicate account numbers
-                if valid_account and len(list(filter(lambda acc: acc == account, accounts_list))) > 1:
-                    if errors_list[index]:
-                        errors_list[index] = "Duplicate account number / IBAN"
-                    else:
-                        errors_list[index] = "\nDuplicate account number / IBAN"
-                        accounts_list.append(record[1])
-
-                # 2. Validate amounts
-                if self.amount_is_valid_digit(record[2]) and float(record[2]) >= 1.0:
-                    amount_list.append(round(Decimal(record[2]), 2))
-                    total_amount += round(Decimal(record[2]), 2)
-                else:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid amount"
-                    else:
-                        errors_list[index] = "\nInvalid amount"
-                    amount_list.append(record[2])
-
-                # 3. Validate for empty names or have special character
-                names_list.append(record[3])
-                if not record[3] or any(e in str(record[3]) for e in '!%*+&,<=>'):
-                    if errors_list[index]:
-                        errors_list[index] = "Symbols not allowed in name"
-                    else:
-                        errors_list[index] = "\nSymbols not allowed in name"
+            # 1.1 Validate account numbers, check account is iban number if it isn't a valid account number
+            accounts = sheet_column_as_str(df.iloc[:, 0])
+            accounts_digits = accounts.str.replace(re_non_digits, "", regex=True)
+            valid_numbers = accounts_digits.str.len().between(6, 20)
+            valid_ibans = ~valid_numbers & accounts.str.match(r'^EG\d{27}')
+            accounts = accounts_digits.where(valid_numbers, accounts)
+
+            # 1.2 Validate for duplicate account numbers, IBANs are looked up by their digits as well
+            seen_accounts = Counter() if seen_accounts is None else seen_accounts
+            duplicate_accounts = valid_numbers & (
+                    accounts.duplicated(keep="first") | accounts.isin(seen_accounts.keys())
+            )
+            if valid_ibans.any():
+                accounts_positions = accounts.groupby(accounts, sort=False).indices
+                for position in np.flatnonzero(valid_ibans.values):
+                    iban_digits = accounts_digits.iat[position]
+                    earlier_matches = seen_accounts[iban_digits] + np.searchsorted(
+                            accounts_positions.get(iban_digits, []), position
+                    )
+                    duplicate_accounts.iat[position] = earlier_matches > 1
+            seen_accounts.update(accounts)
 
-                # 4. Validate banks swift codes
-                codes_list.append(record[4])
-                if not record[4] or str(record[4]).upper() not in VALID_BANK_CODES_LIST:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid bank swift code"
-                    else:
-                        errors_list[index] = "\nInvalid bank swift code"
+            # 2. Validate amounts
+            amount_list, valid_amounts, total_amount = validate_sheet_amounts(
+                    df.iloc[:, 1].tolist(), decimal_from_str=False
+            )
 
-                # 5. Validate transaction purpose
-                purposes_list.append(record[5])
-                if not record[5] or str(record[5]).upper() not in VALID_BANK_TRANSACTION_TYPES_LIST:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid transaction purpose"
-                    else:
-                        errors_list[index] = "\nInvalid transaction purpose"
+            # 3. Validate for empty names or have special character
+            names = df.iloc[:, 2]
+            invalid_names = ~names.astype(bool) | \
+                sheet_column_as_str(names).str.contains(r'[!%*+&,<=>]').astype(bool).values
+
+            # 4. Validate banks swift codes
+            codes = df.iloc[:, 3]
+            invalid_codes = ~codes.astype(bool) | \
+                ~sheet_column_as_str(codes).str.upper().isin(VALID_BANK_CODES_LIST).values
+
+            # 5. Validate transaction purpose
+            purposes = df.iloc[:, 4]
+            invalid_purposes = ~purposes.astype(bool) | \
+                ~sheet_column_as_str(purposes).str.upper().isin(VALID_BANK_TRANSACTION_TYPES_LIST).values
+
+            errors_list = combine_sheet_errors(len(df), [
+                (~(valid_numbers | valid_ibans), "Invalid account number / IBAN"),
+                (duplicate_accounts, "Duplicate account number / IBAN"),
+                (~valid_amounts, "Invalid amount"),
+                (invalid_names, "Symbols not allowed in name"),
+                (invalid_codes, "Invalid bank swift code"),
+                (invalid_purposes, "Invalid transaction purpose"),
+            ])
+            accounts_list, names_list, codes_list, purposes_list = \
+                accounts.tolist(), names.tolist(), codes.tolist(), purposes.tolist()
         except:
             pass
         finally:
@@ -324,39 +275,33 @@ class BankWalletsAndCardsSheetProcessor(Task):
 
         # 1 For bank wallets/Orange: Save the refined data as instant transactions records
         if doc_obj.is_bank_wallet:
-            processed_data = zip(amounts_list, names_list, recipients_list, issuers_list)
-            objs = []
-            for record in processed_data:
-                fees, vat = budget.calculate_fees_and_vat_for_amount(
-                    record[0], record[3].lower()
-                )
-                objs.append(InstantTransaction(
+            objs = [
+                InstantTransaction(
                     document=doc_obj,
-                    issuer_type=AbstractBaseIssuer.ORANGE if record[3].lower() == "orange"
+                    issuer_type=AbstractBaseIssuer.ORANGE if issuer.lower() == "orange"
                     else AbstractBaseIssuer.BANK_WALLET,
-                    amount=record[0],
-                    recipient_name=record[1],
-                    anon_recipient=record[2],
-                    fees=fees,
-                    vat=vat
-                ))
-
-            InstantTransaction.objects.bulk_create(objs=objs)
+                    amount=amount,
+                    recipient_name=name,
+                    anon_recipient=recipient
+                ) for amount, name, recipient, issuer in zip(amounts_list, names_list, recipients_list, issuers_list)
+            ]
+            bulk_create_transactions(
+                InstantTransaction, objs, budget=budget, fees_issuers=[issuer.lower() for issuer in issuers_list]
+            )
 
         # 2 For bank cards: Save the refined data as bank transactions records
         elif doc_obj.is_bank_card:
-            processed_data = zip(amounts_list, names_list, recipients_list, codes_list, purposes_list)
-            for record in processed_data:
-                fees, vat = budget.calculate_fees_and_vat_for_amount(
-                    record[0], "bank_card"
-                )
+            corporate_code = get_from_env("ACH_CORPORATE_CODE")
+            debtor_account = get_from_env("ACH_DEBTOR_ACCOUNT")
+            objs = []
+            for record in zip(amounts_list, names_list, recipients_list, codes_list, purposes_list):
                 category_purpose_dict = determine_trx_category_and_purpose(record[4])
-                BankTransaction.objects.create(
+                objs.append(BankTransaction(
                     currency="EGP",
                     debtor_address_1="EG",
                     creditor_address_1="EG",
-                    corporate_code=get_from_env("ACH_CORPORATE_CODE"),
-                    debtor_account=get_from_env("ACH_DEBTOR_ACCOUNT"),
+                    corporate_code=corporate_code,
+                    debtor_account=debtor_account,
                     document=doc_obj,
                     user_created=doc_obj.owner,
                     amount=record[0],
@@ -364,10 +309,9 @@ class BankWalletsAndCardsSheetProcessor(Task):
                     creditor_account_number=record[2],
                     creditor_bank=record[3],
                     category_code=category_purpose_dict.get("category_code", "CASH"),
-                    purpose=category_purpose_dict.get("purpose", "CASH"),
-                    fees=fees,
-                    vat=vat
-                )
+                    purpose=category_purpose_dict.get("purpose", "CASH")
+                ))
+            bulk_create_transactions(BankTransaction, objs, budget=budget, fees_issuers=["bank_card"] * len(objs))
 
     def run(self, doc_id, *args, **kwargs):
         """
@@ -383,8 +327,15 @@ class BankWalletsAndCardsSheetProcessor(Task):
             UPLOAD_LOGGER.debug(f"[message] [bank {file_type} doc start processing] [celery_task] -- Doc id: {doc_id}")
 
             max_amount_can_be_disbursed = self.determine_max_amount_can_be_disbursed(doc_obj)
-            df = self.accumulate_df(doc_obj)
-            rows_count = df.count()
+
+            # 1. Validate the sheet chunk by chunk, the recipients seen so far are kept to catch the duplicates
+            rows_count, total_amount, has_errors = None, 0, False
+            seen_recipients = set() if doc_obj.is_bank_wallet else Counter()
+            for df in self.iterate_sheet(doc_obj):
+                rows_count = df.count() if rows_count is None else rows_count + df.count()
+                errors_list, chunk_total_amount = self.validate_records(doc_obj, df, seen_recipients)[-2:]
+                total_amount += chunk_total_amount
+                has_errors = has_errors or any(errors_list)
 
             # 1.1 For bank wallets: Check if all records has no empty values
             if doc_obj.is_bank_wallet:
@@ -392,8 +343,6 @@ class BankWalletsAndCardsSheetProcessor(Task):
                         rows_count["full name"] == rows_count["issuer"]):
                     self.end_with_failure(doc_obj, MSG_WRONG_FILE_FORMAT)
                     return False
-                msisdn_list, amounts_list, names_list, issuers_list, errors_list, total_amount = \
-                    self.process_and_validate_wallets_records(df)
 
             # 1.2 For bank cards: Check if all records has no empty values
             elif doc_obj.is_bank_card:
@@ -407,8 +356,6 @@ class BankWalletsAndCardsSheetProcessor(Task):
                         rows_count["full name"] == rows_count["bank swift code"] == rows_count["transaction type"]):
                     self.end_with_failure(doc_obj, MSG_WRONG_FILE_FORMAT)
                     return False
-                accounts_list, amounts_list, names_list, codes_list, purposes_list, errors_list, total_amount = \
-                    self.process_and_validate_cards_records(df)
 
             doc_obj.total_amount = total_amount
             doc_obj.total_count = max(rows_count)
@@ -419,17 +366,8 @@ class BankWalletsAndCardsSheetProcessor(Task):
                 return False
 
             # 3. Check if there is any errors happened at sheet processing
-            elif len([value for value in errors_list if value]) > 0:
-                if doc_obj.is_bank_wallet:
-                    self.end_with_failure_sheet_details(
-                            doc_obj, msisdn_list, amounts_list, names_list, issuers_list=issuers_list,
-                            errors_list=errors_list
-                    )
-                elif doc_obj.is_bank_card:
-                    self.end_with_failure_sheet_details(
-                            doc_obj, accounts_list, amounts_list, names_list, codes_list=codes_list,
-                            purposes_list=purposes_list, errors_list=errors_list
-                    )
+            elif has_errors:
+                self.end_with_failure_sheet_details(doc_obj, self.failure_sheet_rows(doc_obj))
                 return False
 
             # 4. Check if the sheet's total amount doesn't exceed maximum amount that can be disbursed for this checker
@@ -442,16 +380,25 @@ class BankWalletsAndCardsSheetProcessor(Task):
                 self.end_with_failure(doc_obj, MSG_NOT_WITHIN_THRESHOLD)
                 return False
 
-            # 6.1 For bank wallets/Orange: Save the refined data as instant transactions records
-            if doc_obj.is_bank_wallet:
-                self.save_processed_records_to_db(doc_obj, amounts_list, names_list, msisdn_list, issuers_list)
+            # 6. Save the refined data chunk by chunk, all of the chunks are saved or none of them
+            with transaction.atomic():
+                for df in self.iterate_sheet(doc_obj):
+                    # 6.1 For bank wallets/Orange: Save the refined data as instant transactions records
+                    if doc_obj.is_bank_wallet:
+                        msisdn_list, amounts_list, names_list, issuers_list, errors_list, chunk_total_amount = \
+                            self.process_and_validate_wallets_records(df)
+                        self.save_processed_records_to_db(
+                                doc_obj, amounts_list, names_list, msisdn_list, issuers_list
+                        )
 
-            # 6.2 For bank cards: Save the refined data as bank transactions records
-            elif doc_obj.is_bank_card:
-                self.save_processed_records_to_db(
-                        doc_obj, amounts_list, names_list, accounts_list, codes_list=codes_list,
-                        purposes_list=purposes_list
-                )
+                    # 6.2 For bank cards: Save the refined data as bank transactions records
+                    elif doc_obj.is_bank_card:
+                        accounts_list, amounts_list, names_list, codes_list, purposes_list, errors_list, \
+                            chunk_total_amount = self.process_and_validate_cards_records(df)
+                        self.save_processed_records_to_db(
+                                doc_obj, amounts_list, names_list, accounts_list, codes_list=codes_list,
+                                purposes_list=purposes_list
+                        )
 
             # 7. Change doc status to processed successfully and notify makers that doc passed validations
             doc_obj.has_change_profile_callback = True
@@ -479,9 +426,9 @@ class EWalletsSheetProcessor(Task):
     def amount_is_valid_digit(self, amount):
         return str(amount).replace('.', '', 1).isdigit()
 
-    def return_total_amount_plus_fees_regarding_specific_issuer(self, amount_list, issuer, amount_list_length):
+    def return_total_amount_plus_fees_regarding_specific_issuer(self, total_amount, issuer, records_count):
         return Budget.objects.get(disburser=self.doc_obj.owner.root).\
-            accumulate_amount_with_fees_and_vat(sum(amount_list), issuer, amount_list_length)
+            accumulate_amount_with_fees_and_vat(total_amount, issuer, records_count)
 
     def determine_max_amount_can_be_disbursed(self):
         """:return: max_amount_can_be_disbursed"""
@@ -492,24 +439,48 @@ class EWalletsSheetProcessor(Task):
 
     def determine_csv_delimiter(self):
         """:return: the delimiter used at the csv sheet or False if there is any problem"""
-        try:
-            as_string = self.doc_obj.file.read().decode("utf-8")
-            dialect = csv.Sniffer().sniff(as_string)
-            self.doc_obj.file.seek(0)
-            return dialect.delimiter
-        except:
-            return False
+        return sniff_csv_delimiter(self.doc_obj.file)
 
-    def accumulate_df(self):
-        """:return: data frame using pandas package"""
-        doc_type = "csv" if self.doc_obj.file.name.endswith(".csv") else "excel"
+    def iterate_sheet(self):
+        """:return: generator of data frames of at most SHEET_INGESTION_CHUNK_SIZE rows using pandas package"""
+        delimiter = self.determine_csv_delimiter() if self.doc_obj.file.name.endswith(".csv") else None
+        return iter_sheet_chunks(self.doc_obj.file, settings.SHEET_INGESTION_CHUNK_SIZE, delimiter)
 
-        if doc_type == "excel":
-            df = pd.read_excel(self.doc_obj.file)
-        else:
-            df = pd.read_csv(self.doc_obj.file, delimiter=self.determine_csv_delimiter())
+    def validate_records(self, df, headers, seen_msisdns=None):
+        """
+        :param df: data frame chunk of the sheet
+        :param headers: msisdn, amount and issuer headers of the sheet
+        :param seen_msisdns: msisdns of the previous chunks used to catch the duplicates across the chunks
+        :return: msisdn_list, amount_list, issuers_list (None for normal sheet specs), errors_list,
+            total_amount, vf_msisdns_list
+        """
+        msisdn_header, amount_header, issuer_header = headers
+        if self.is_normal_sheet_specs:
+            msisdn_list, amounts_list, errors_list, total_amount, vf_msisdns_list = \
+                self.process_and_validate_normal_specs_records(df, msisdn_header, amount_header, seen_msisdns)
+            return msisdn_list, amounts_list, None, errors_list, total_amount, vf_msisdns_list
+
+        return self.process_and_validate_issuers_specs_records(
+                df, msisdn_header, amount_header, issuer_header, seen_msisdns
+        )
+
+    def failure_sheet_rows(self, headers):
+        """Validate the sheet again chunk by chunk generating the failure sheet rows"""
+        seen_msisdns = set()
+        for df in self.iterate_sheet():
+            msisdn_list, amounts_list, issuers_list, errors_list, total_amount, vf_msisdns_list = \
+                self.validate_records(df, headers, seen_msisdns)
+            if self.is_normal_sheet_specs:
+                yield from zip(msisdn_list, amounts_list, errors_list)
+            else:
+                yield from zip(msisdn_list, amounts_list, issuers_list, errors_list)
 
-        return df
+    @staticmethod
+    def accumulate_issuers_totals(issuers_totals, amounts_list, issuers_list):
+        """Add the amounts of a sheet chunk to the running (total amount, records count) of their issuers"""
+        for amount, issuer in zip(amounts_list, issuers_list):
+            total_amount, records_count = issuers_totals.get(issuer, (0, 0))
+            issuers_totals[issuer] = (total_amount + amount, records_count + 1)
 
     def determine_headers_names(self, df):
         amount_position, msisdn_position, issuer_position = self.doc_obj.file_category.fields_cols()
@@ -531,19 +502,17 @@ class EWalletsSheetProcessor(Task):
         notify_maker(self.doc_obj)
         UPLOAD_LOGGER.debug(f"[message] [ewallets file processing error] [celery_task] -- {failure_message}")
 
-    def end_with_failure_sheet_details(self, numbers_list, amount_list, issuers_list=None, errors_list=None):
+    def end_with_failure_sheet_details(self, sheet_rows):
+        """:param sheet_rows: iterable of the sheet rows with their errors"""
         if self.is_normal_sheet_specs:
-            sheet_data = list(zip(numbers_list, amount_list, errors_list))
             headers = ["mobile number", "amount", "errors"]
         else:
-            sheet_data = list(zip(numbers_list, amount_list, issuers_list, errors_list))
             headers = ["mobile number", "amount", "issuer", "errors"]
 
         filename = f"failed_validations_{randomword(8)}.xlsx"
         file_path = f"{settings.MEDIA_ROOT}/documents/disbursement/{filename}"
         error_message = _("Validation error, file with errors sent to the maker user.")
-        sheet_data.insert(0, headers)
-        export_excel(file_path, sheet_data)
+        export_excel(file_path, itertools.chain([headers], sheet_rows))
         download_url = settings.BASE_URL + \
                        str(reverse('disbursement:download_validation_failed', kwargs={'doc_id': self.doc_obj.id})) + \
                        f"?filename={filename}"
@@ -554,172 +523,110 @@ class EWalletsSheetProcessor(Task):
 
         notify_maker(self.doc_obj, download_url)
 
-    def process_and_validate_normal_specs_records(self, df, msisdn_header, amount_header):
+    @staticmethod
+    def column_values(df, header):
+        """:return: values of the passed column as they're read row by row from the data frame"""
+        return df.values[:, df.columns.get_loc(header)]
+
+    def process_and_validate_normal_specs_records(self, df, msisdn_header, amount_header, seen_msisdns=None):
         """
         :param df: data frame read from the uploaded document
+        :param seen_msisdns: set of the msisdns of the previous chunks of the document
         :return: msisdn_list, amount_list, errors_list, total_amount
         """
-        total_amount = 0
-        msisdns_list, amounts_list, errors_list = [], [], []
-
         try:
-            for index, record in df.iterrows():
-                errors_list.append(None)
-
-                # 1. Validate msisdns
-                msisdn = str(record[msisdn_header])
-                valid_msisdn = False
-                try:
-                    if msisdn.startswith("1") and len(msisdn) == 10:
-                        phonenumber_form_validate(f"+20{msisdn}")
-                        msisdn = f"0020{msisdn}"
-                        msisdns_list.append(msisdn)
-                        valid_msisdn = True
-                    elif msisdn.startswith("01") and len(msisdn) == 11:
-                        phonenumber_form_validate(f"+2{msisdn}")
-                        msisdn = f"002{msisdn}"
-                        msisdns_list.append(msisdn)
-                        valid_msisdn = True
-                    elif msisdn.startswith("2") and len(msisdn) == 12:
-                        phonenumber_form_validate(f"+{msisdn}")
-                        msisdn = f"00{msisdn}"
-                        msisdns_list.append(msisdn)
-                        valid_msisdn = True
-                    else:
-                        raise ValidationError('')
-                except ValidationError:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid mobile number"
-                    else:
-                        errors_list[index] = "\nInvalid mobile number"
-                    msisdns_list.append(msisdn)
+            # 1. Validate msisdns
+            msisdns, valid_msisdns, duplicate_msisdns = validate_sheet_msisdns(
+                    sheet_column_as_str(self.column_values(df, msisdn_header)), seen_msisdns
+            )
 
-                if valid_msisdn and len(list(filter(lambda ms: ms == msisdn, msisdns_list))) > 1:
-                    if errors_list[index]:
-                        errors_list[index] = "Duplicate mobile number"
-                    else:
-                        errors_list[index] = "\nDuplicate mobile number"
+            # 2. Validate amounts
+            amounts_list, valid_amounts, total_amount = validate_sheet_amounts(
+                    self.column_values(df, amount_header)
+            )
 
-                # 2. Validate amounts
-                if self.amount_is_valid_digit(str(record[amount_header])) and float(str(record[amount_header])) >= 1.0:
-                    amounts_list.append(round(Decimal(str(record[amount_header])), 2))
-                    total_amount += round(Decimal(str(record[amount_header])), 2)
-                else:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid amount"
-                    else:
-                        errors_list[index] = "\nInvalid amount"
-                    amounts_list.append(record[amount_header])
+            errors_list = combine_sheet_errors(len(df), [
+                (~valid_msisdns, "Invalid mobile number"),
+                (duplicate_msisdns, "Duplicate mobile number"),
+                (~valid_amounts, "Invalid amount"),
+            ])
+            msisdns_list = msisdns.tolist()
 
         except Exception as e:
             raise Exception(e)
         return msisdns_list, amounts_list, errors_list, total_amount, msisdns_list
 
-    def process_and_validate_issuers_specs_records(self, df, msisdn_header, amount_header, issuer_header):
+    def process_and_validate_issuers_specs_records(self,
+                                                   df,
+                                                   msisdn_header,
+                                                   amount_header,
+                                                   issuer_header,
+                                                   seen_msisdns=None):
         """
         :param df: data frame read from the uploaded document
+        :param seen_msisdns: set of the msisdns of the previous chunks of the document
         :return: msisdn_list, amount_list, issuers_list, errors_list, total_amount
         """
-        total_amount = 0
         valid_issuers_list = ['vodafone', 'etisalat', 'aman']
-        msisdns_list, amounts_list, issuers_list, errors_list, vf_msisdns_list = [], [], [], [], []
 
         try:
-            for index, record in df.iterrows():
-                errors_list.append(None)
-
-                # 1. Validate msisdns
-                msisdn = str(record[msisdn_header]).strip("\u200e")
-                valid_msisdn = False
-                try:
-                    if msisdn.startswith("1") and len(msisdn) == 10:
-                        phonenumber_form_validate(f"+20{msisdn}")
-                        msisdn = f"0020{msisdn}"
-                        msisdns_list.append(msisdn)
-                        valid_msisdn = True
-                    elif msisdn.startswith("01") and len(msisdn) == 11:
-                        phonenumber_form_validate(f"+2{msisdn}")
-                        msisdn = f"002{msisdn}"
-                        msisdns_list.append(msisdn)
-                        valid_msisdn = True
-                    elif msisdn.startswith("2") and len(msisdn) == 12:
-                        phonenumber_form_validate(f"+{msisdn}")
-                        msisdn = f"00{msisdn}"
-                        msisdns_list.append(msisdn)
-                        valid_msisdn = True
-                    else:
-                        raise ValidationError('')
+            # 1. Validate msisdns
+            msisdns, valid_msisdns, duplicate_msisdns = validate_sheet_msisdns(
+                    sheet_column_as_str(self.column_values(df, msisdn_header)).str.strip("\u200e"), seen_msisdns
+            )
 
-                except ValidationError:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid mobile number"
-                    else:
-                        errors_list[index] = "\nInvalid mobile number"
-                    msisdns_list.append(msisdn)
+            # 2. Validate amounts
+            amounts_list, valid_amounts, total_amount = validate_sheet_amounts(
+                    sheet_column_as_str(self.column_values(df, amount_header)).tolist()
+            )
 
-                if valid_msisdn and len(list(filter(lambda ms: ms == msisdn, msisdns_list))) > 1:
-                    if errors_list[index]:
-                        errors_list[index] = "Duplicate mobile number"
-                    else:
-                        errors_list[index] = "\nDuplicate mobile number"
+            # 3. Validate issuer
+            issuers = sheet_column_as_str(self.column_values(df, issuer_header)).str.lower().str.strip()
 
-                # 2. Validate amounts
-                if self.amount_is_valid_digit(str(record[amount_header])) and float(str(record[amount_header])) >= 1.0:
-                    amounts_list.append(round(Decimal(str(record[amount_header])), 2))
-                    total_amount += round(Decimal(str(record[amount_header])), 2)
-                else:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid amount"
-                    else:
-                        errors_list[index] = "\nInvalid amount"
-                    amounts_list.append(str(record[amount_header]))
-
-                # 3. Validate issuer
-                issuer = str(record[issuer_header]).lower().strip()
-                issuers_list.append(issuer)
-                if issuer not in valid_issuers_list:
-                    if errors_list[index]:
-                        errors_list[index] = "Invalid issuer option"
-                    else:
-                        errors_list[index] = "\nInvalid issuer option"
+            errors_list = combine_sheet_errors(len(df), [
+                (~valid_msisdns, "Invalid mobile number"),
+                (duplicate_msisdns, "Duplicate mobile number"),
+                (~valid_amounts, "Invalid amount"),
+                (~issuers.isin(valid_issuers_list), "Invalid issuer option"),
+            ])
 
-                # 4. Accumulate vodafone msisdns list
-                if issuer == "vodafone":
-                    vf_msisdns_list.append(msisdn)
+            # 4. Accumulate vodafone msisdns list
+            vf_msisdns_list = msisdns[issuers == "vodafone"].tolist()
 
         except Exception as e:
             raise Exception(e)
-        return msisdns_list, amounts_list, issuers_list, errors_list, total_amount, vf_msisdns_list
+        return msisdns.tolist(), amounts_list, issuers.tolist(), errors_list, total_amount, vf_msisdns_list
 
-    def validate_doc_total_amount_against_custom_budget(self, issuers_list, amounts_list):
-        vf_amount_list, ets_amount_list, aman_amount_list = [], [], []
+    def validate_doc_total_amount_against_custom_budget(self, issuers_totals, total_amount, total_count):
+        """
+        :param issuers_totals: {issuer: (total amount, records count)} of the sheet
+        :param total_amount: total amount of the sheet
+        :param total_count: records count of the sheet
+        """
         vf_total_amount = ets_total_amount = aman_total_amount = 0
         current_custom_budget = Budget.objects.get(disburser=self.doc_obj.owner.root).current_balance
 
         if self.doc_obj.owner.is_accept_vodafone_onboarding:
-            for issuer, amount in zip(issuers_list, amounts_list):
-                if issuer == "vodafone":
-                    vf_amount_list.append(amount)
-                elif issuer == "etisalat":
-                    ets_amount_list.append(amount)
-                elif issuer == "aman":
-                    aman_amount_list.append(amount)
+            vf_totals = issuers_totals.get("vodafone")
+            ets_totals = issuers_totals.get("etisalat")
+            aman_totals = issuers_totals.get("aman")
         else:
-            vf_amount_list = amounts_list
+            vf_totals, ets_totals, aman_totals = (total_amount, total_count) if total_count else None, None, None
 
-        if vf_amount_list:
-            vf_total_amount = self.return_total_amount_plus_fees_regarding_specific_issuer(vf_amount_list, "vodafone", len(vf_amount_list))
-        if ets_amount_list:
-            ets_total_amount = self.return_total_amount_plus_fees_regarding_specific_issuer(ets_amount_list, "etisalat", len(ets_amount_list))
-        if aman_amount_list:
-            aman_total_amount = self.return_total_amount_plus_fees_regarding_specific_issuer(aman_amount_list, "aman", len(aman_amount_list))
+        if vf_totals:
+            vf_total_amount = self.return_total_amount_plus_fees_regarding_specific_issuer(vf_totals[0], "vodafone", vf_totals[1])
+        if ets_totals:
+            ets_total_amount = self.return_total_amount_plus_fees_regarding_specific_issuer(ets_totals[0], "etisalat", ets_totals[1])
+        if aman_totals:
+            aman_total_amount = self.return_total_amount_plus_fees_regarding_specific_issuer(aman_totals[0], "aman", aman_totals[1])
 
         self.doc_obj.total_amount_with_fees_vat = sum([vf_total_amount, ets_total_amount, aman_total_amount])
         return self.doc_obj.total_amount_with_fees_vat <= current_custom_budget
 
     def change_profile_for_vodafone_recipients(self, vodafone_recipients_list):
         """
-        Change fees profile for vodafone recipients.
+        Submit the fees profile change of the vodafone recipients as batched bulk change profile requests,
+            the document is finished by the change profile callbacks of its batches.
         :return: True or False
         """
         superadmin = self.doc_obj.owner.root.client.creator
@@ -731,56 +638,23 @@ class EWalletsSheetProcessor(Task):
             fees_profile = self.doc_obj.owner.root.super_admin.wallet_fees_profile
 
         payload_without_users = superadmin.vmt.accumulate_change_profile_payload(
-            vodafone_recipients_list, fees_profile, single_user=True
+            vodafone_recipients_list, fees_profile
         )
         try:
-            msisdns, errors = [], []
-            has_error = False
-            for user_msisdn in vodafone_recipients_list:
-                payload = {**payload_without_users, 'MSISDN': user_msisdn}
-                CHANGE_PROFILE_LOGGER.debug(f"[request] [change fees profile] [{self.doc_obj.owner}] -- {payload}")
-                response = requests.post(wallets_env_url, json=payload, verify=False)
-                CHANGE_PROFILE_LOGGER.debug(
-                    f"[response] [change fees profile] [{self.doc_obj.owner}] -- {str(response.text)}"
-                )
-                if response.ok:
-                    response_dict = response.json()
-                    msisdns.append(user_msisdn)
-                    if response_dict['TXNSTATUS'] not in ["200", "629", "560", "562"]:
-                        has_error = True
-                        errors.append(response_dict['MESSAGE'])
-                    else:
-                        errors.append("Passed validations successfully")
-
-            self.doc_obj.has_change_profile_callback = True
-            if not has_error:
-                self.doc_obj.processed_successfully()
-                notify_maker(self.doc_obj)
-                return True
-
-            filename = f"failed_disbursement_validation_{randomword(8)}.xlsx"
-            file_path = f"{settings.MEDIA_ROOT}/documents/disbursement/{filename}"
-
-            data = list(zip(msisdns, errors))
-            headers = ['Mobile Number', 'Error']
-            data.insert(0, headers)
-            export_excel(file_path, data)
-            download_url = settings.BASE_URL + str(reverse(
-                'disbursement:download_validation_failed',
-                kwargs={'doc_id': self.doc_obj.id})) + f"?filename={filename}"
-
-            self.doc_obj.processing_failure("Mobile numbers validation error")
-
-            # add new file for this user in ExcelFile model
-            ExcelFile.objects.create(file_name=filename, owner=self.doc_obj.owner)
-
-            notify_maker(self.doc_obj, download_url)
-            return False
+            batches = submit_change_profile_batches(
+                    self.doc_obj, wallets_env_url, payload_without_users, vodafone_recipients_list
+            )
         except Exception as e:
             CHANGE_PROFILE_LOGGER.debug(f"[message] [change fees profile error] [{self.doc_obj.owner}] -- {e.args}")
+            self.doc_obj.disbursement_data.all().delete()
+            recompute_doc_counters(self.doc_obj)
             self.end_with_failure(_(MSG_CHANGE_PROFILE_ERROR))
             return False
 
+        self.doc_obj.txn_id = batches[0][0]
+        self.doc_obj.save(update_fields=['txn_id'])
+        return True
+
     def bulk_change_profile_for_vodafone_recipients(self, vodafone_recipients_list):
         """
         Change fees profile for vodafone recipients.
@@ -798,7 +672,7 @@ class EWalletsSheetProcessor(Task):
 
         try:
             CHANGE_PROFILE_LOGGER.debug(f"[request] [change fees profile] [{self.doc_obj.owner}] -- {payload}")
-            response = requests.post(wallets_env_url, json=payload, verify=False)
+            response = upstream.post(wallets_env_url, "CENTRAL_UIG_CHANGE_PROFILE", json=payload, verify=False)
         except Exception as e:
             CHANGE_PROFILE_LOGGER.debug(f"[message] [change fees profile error] [{self.doc_obj.owner}] -- {e.args}")
             self.end_with_failure(_(MSG_CHANGE_PROFILE_ERROR))
@@ -826,27 +700,37 @@ class EWalletsSheetProcessor(Task):
             self.is_normal_sheet_specs = self.doc_obj.owner.root.root_entity_setups.is_normal_flow
             wallets_moderator = self.doc_obj.owner.root.callwallets_moderator.first()
             max_amount_can_be_disbursed = self.determine_max_amount_can_be_disbursed()
-            df = self.accumulate_df()
-            rows_count = df.count()
-            msisdn_header, amount_header, issuer_header = self.determine_headers_names(df)
             start_row = self.determine_starting_index()
-            issuers_list = None
+
+            # 1. Validate the sheet chunk by chunk, the msisdns seen so far are kept to catch the duplicates
+            rows_count, headers, total_amount, has_errors = None, None, 0, False
+            seen_msisdns, vf_msisdns_list, issuers_totals = set(), [], {}
+            for df in self.iterate_sheet():
+                headers = headers or self.determine_headers_names(df)
+                rows_count = df.count() if rows_count is None else rows_count + df.count()
+                msisdn_list, amounts_list, issuers_list, errors_list, chunk_total_amount, chunk_vf_msisdns_list = \
+                    self.validate_records(df, headers, seen_msisdns)
+                total_amount += chunk_total_amount
+                has_errors = has_errors or any(errors_list)
+
+                # The refined records are needed only if the whole sheet passes the validations
+                if not has_errors:
+                    vf_msisdns_list.extend(chunk_vf_msisdns_list)
+                    if issuers_list:
+                        self.accumulate_issuers_totals(issuers_totals, amounts_list, issuers_list)
+            msisdn_header, amount_header, issuer_header = headers
 
             # 1.1 For normal sheet specs: Check if all records has no empty values
             if self.is_normal_sheet_specs:
                 if not (rows_count[msisdn_header] == rows_count[amount_header]):
                     self.end_with_failure(MSG_WRONG_FILE_FORMAT)
                     return False
-                msisdn_list, amounts_list, errors_list, total_amount, vf_msisdns_list = \
-                    self.process_and_validate_normal_specs_records(df, msisdn_header, amount_header)
 
             # 1.2 For issuer based sheet specs: Check if all records has no empty values
             else:
                 if not (rows_count[msisdn_header] == rows_count[amount_header] == rows_count[issuer_header]):
                     self.end_with_failure(MSG_WRONG_FILE_FORMAT)
                     return False
-                msisdn_list, amounts_list, issuers_list, errors_list, total_amount, vf_msisdns_list = \
-                    self.process_and_validate_issuers_specs_records(df, msisdn_header, amount_header, issuer_header)
 
             self.doc_obj.total_amount = total_amount
             self.doc_obj.total_count = max(rows_count)
@@ -857,13 +741,8 @@ class EWalletsSheetProcessor(Task):
                 return False
 
             # 3. Check if there is any errors happened at sheet processing
-            elif len([value for value in errors_list if value]) > 0:
-                if self.is_normal_sheet_specs:
-                    self.end_with_failure_sheet_details(msisdn_list, amounts_list, errors_list=errors_list)
-                else:
-                    self.end_with_failure_sheet_details(
-                            msisdn_list, amounts_list, issuers_list, errors_list=errors_list
-                    )
+            elif has_errors:
+                self.end_with_failure_sheet_details(self.failure_sheet_rows(headers))
                 return False
 
             # 4. Check if the sheet's total amount doesn't exceed maximum amount that can be disbursed for this checker
@@ -874,46 +753,55 @@ class EWalletsSheetProcessor(Task):
             # 5. Validate doc total amount against custom budget for paymob send model and vodafone facilitator model
             elif not self.doc_obj.owner.is_vodafone_default_onboarding\
                 and not self.doc_obj.owner.is_banks_standard_model_onboaring:
-                has_sufficient_budget = self.validate_doc_total_amount_against_custom_budget(issuers_list, amounts_list)
+                has_sufficient_budget = self.validate_doc_total_amount_against_custom_budget(
+                        issuers_totals, total_amount, self.doc_obj.total_count
+                )
                 if not has_sufficient_budget:
                     self.end_with_failure(MSG_NOT_WITHIN_THRESHOLD)
                     return False
 
-            # 6. Make change fees profile request for vodafone recipients only
-            if wallets_moderator.change_profile and vf_msisdns_list:
-                change_profile_response = self.change_profile_for_vodafone_recipients(vf_msisdns_list)
-                if not change_profile_response:
-                    return False
-            elif not wallets_moderator.change_profile or (wallets_moderator.change_profile and not vf_msisdns_list):
+            # 6. Save the refined data as disbursement data records chunk by chunk, all of the chunks are saved
+            #    with the doc or none of them
+            budget = Budget.objects.get(disburser=self.doc_obj.owner.root)
+            with transaction.atomic():
+                for df in self.iterate_sheet():
+                    msisdn_list, amounts_list, issuers_list, errors_list, chunk_total_amount, \
+                        chunk_vf_msisdns_list = self.validate_records(df, headers)
+
+                    # 6.1 For normal flow sheets
+                    if self.is_normal_sheet_specs:
+                        objs = [
+                            DisbursementData(doc=self.doc_obj, amount=float(amount), msisdn=msisdn)
+                            for amount, msisdn in zip(amounts_list, msisdn_list)
+                        ]
+                        bulk_create_transactions(DisbursementData, objs)
+
+                    # 6.2 For issuer based sheets
+                    else:
+                        objs = [
+                            DisbursementData(doc=self.doc_obj, amount=float(amount), msisdn=msisdn, issuer=issuer)
+                            for amount, msisdn, issuer in zip(amounts_list, msisdn_list, issuers_list)
+                        ]
+                        bulk_create_transactions(
+                            DisbursementData, objs, budget=budget,
+                            fees_issuers=[issuer.lower() for issuer in issuers_list], amounts=amounts_list
+                        )
+
+                self.doc_obj.save()
+
+            # 7. Documents without vodafone recipients to change their fees profiles are processed once their
+            #    records are saved
+            has_change_profile = wallets_moderator.change_profile and vf_msisdns_list
+            if not has_change_profile:
                 self.doc_obj.has_change_profile_callback = True
                 self.doc_obj.txn_id = None
                 self.doc_obj.processed_successfully()
 
-            # 7.1 For normal flow sheets: Save the refined data as disbursement data records
-            if self.is_normal_sheet_specs:
-                records = zip(amounts_list, msisdn_list)
-                objs = [
-                    DisbursementData(doc=self.doc_obj, amount=float(record[0]), msisdn=record[1]) for record in records
-                ]
-                DisbursementData.objects.bulk_create(objs=objs)
-
-            # 7.2 For issuer based sheets: Save the refined data as disbursement data records
-            else:
-                budget = Budget.objects.get(disburser=self.doc_obj.owner.root)
-                records = zip(amounts_list, msisdn_list, issuers_list)
-                objs = []
-                for record in records:
-                    fees, vat = budget.calculate_fees_and_vat_for_amount(
-                        record[0], record[2].lower()
-                    )
-                    objs.append(DisbursementData(
-                        doc=self.doc_obj, amount=float(record[0]), msisdn=record[1],
-                        issuer=record[2], fees=fees, vat=vat
-                    ))
-
-                DisbursementData.objects.bulk_create(objs=objs)
+            # 8. Make change fees profile request for vodafone recipients only, it's made after saving the records
+            #    as the change profile callbacks finish the document
+            if has_change_profile and not self.change_profile_for_vodafone_recipients(vf_msisdns_list):
+                return False
 
-            self.doc_obj.save()
             if self.is_normal_sheet_specs:
                 if not self.doc_obj.validation_process_is_running:
                     notify_maker(self.doc_obj)
@@ -1011,89 +899,39 @@ class ExportClientsTransactionsMonthlyReportTask(Task):
         return final_data
 
     def _annotate_vf_ets_aman_qs(self, qs):
-        """ Annotate qs then add admin username to qs"""
-        if self.vf_facilitator_perm:
-            qs = qs.annotate(
-                admin=F('doc__disbursed_by__root__username'),
-                vf_identifier=F('doc__disbursed_by__root__client__vodafone_facilitator_identifier')
-            ).values('admin', 'issuer', 'vf_identifier'). \
-                annotate(
-                    total=Sum('amount'), count=Count('id'),
-                    fees=Sum('fees'), vat=Sum('vat')).\
-                order_by('admin', 'issuer', 'vf_identifier')
-        else:
-            qs = qs.annotate(
-                admin=F('doc__disbursed_by__root__username')
-            ).values('admin', 'issuer'). \
-                annotate(
-                    total=Sum('amount'), count=Count('id'),
-                    fees=Sum('fees'), vat=Sum('vat')). \
-                order_by('admin', 'issuer')
+        """ Sum rollup qs per admin username and issuer"""
+        qs = aggregate_rollup_per_admin_and_issuer(qs, vf_identifier=self.vf_facilitator_perm)
         return self._customize_issuer_in_qs_values(qs)
 
     def _annotate_instant_trxs_qs(self, qs):
-        """ Annotate qs then add admin username to qs"""
-        if self.status == 'invoices':
-            qs = qs.annotate(
-                admin=Case(
-                    When(from_user__isnull=False, then=F('from_user__root__username')),
-                    default=F('document__disbursed_by__root__username')
-                )
-            ).extra(select={'issuer': 'issuer_type'}).values('admin', 'issuer'). \
-                annotate(total=Sum(Case(
-                            When(status=AbstractBaseStatus.FAILED, then=float(0)),
-                            default=F('amount')
-                        )
-                    ), count=Count(Case(
-                            When(status=AbstractBaseStatus.FAILED, then=None),
-                            default=F('uid')
-                        )
-                    ), fees=Sum('fees'), vat=Sum('vat')). \
-                order_by('admin', 'issuer')
-        else:
-            qs = qs.annotate(
-                    admin=Case(
-                            When(from_user__isnull=False, then=F('from_user__root__username')),
-                            default=F('document__disbursed_by__root__username')
-                    )
-            ).extra(select={'issuer': 'issuer_type'}).values('admin', 'issuer'). \
-                annotate(total=Sum('amount'), count=Count('uid'),
-                         fees=Sum('fees'), vat=Sum('vat')). \
-                order_by('admin', 'issuer')
+        """ Sum rollup qs per admin username and issuer"""
+        qs = aggregate_rollup_per_admin_and_issuer(qs, invoices=self.status == 'invoices')
         return self._customize_issuer_in_qs_values(qs)
 
     def aggregate_vf_ets_aman_transactions(self):
-        """Calculate vodafone, etisalat, aman transactions details from DisbursementData model"""
+        """Calculate vodafone, etisalat, aman transactions details from DisbursementData daily rollup"""
+        qs = transactions_rollup(self.superadmins, self.first_day, self.last_day).\
+            filter(source=TransactionsDailyRollup.WALLETS)
         if self.status == 'failed':
-            qs = DisbursementData.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                ~Q(reason__exact=''),
-                Q(is_disbursed=False),
-                Q(doc__disbursed_by__root__client__creator__in=self.superadmins)
-            )
+            qs = qs.filter(status=TransactionsDailyRollup.FAILED)
         elif self.status in ['success', 'invoices', 'report']:
-            qs = DisbursementData.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                Q(is_disbursed=True),
-                Q(doc__disbursed_by__root__client__creator__in=self.superadmins)
-            )
-        else:
-            qs = DisbursementData.objects.filter(
+            qs = qs.filter(status=TransactionsDailyRollup.SUCCESSFUL)
+
+        # if super admins are vodafone facilitator onboarding save distinct admin msisdn pairs
+        # for calculate distinct msisdn count as it can't be summed from the daily rollup
+        if self.vf_facilitator_perm:
+            if self.status == 'failed':
+                status_q = ~Q(reason__exact='') & Q(is_disbursed=False)
+            elif self.status in ['success', 'invoices', 'report']:
+                status_q = Q(is_disbursed=True)
+            else:
+                status_q = Q(is_disbursed=True) | (~Q(reason__exact='') & Q(is_disbursed=False))
+            self.temp_vf_ets_aman_qs = DisbursementData.objects.filter(
                 Q(disbursed_date__gte=self.first_day),
                 Q(disbursed_date__lte=self.last_day),
-                (Q(is_disbursed=True) | (~Q(reason__exact='') & Q(is_disbursed=False))),
+                status_q,
                 Q(doc__disbursed_by__root__client__creator__in=self.superadmins)
-            )
-
-        # if super admins are vodafone facilitator onboarding save qs
-        # for calculate distinct msisdn count
-        if self.vf_facilitator_perm:
-            self.temp_vf_ets_aman_qs = qs
-            self.temp_vf_ets_aman_qs = self.temp_vf_ets_aman_qs.annotate(
-                admin=F('doc__disbursed_by__root__username')
-            )
+            ).annotate(admin=F('doc__disbursed_by__root__username')).values('admin', 'msisdn').distinct().order_by()
 
         if self.status in ['success', 'failed', 'invoices', 'report']:
             qs = self._annotate_vf_ets_aman_qs(qs)
@@ -1103,11 +941,11 @@ class ExportClientsTransactionsMonthlyReportTask(Task):
 
         # handle if status is all
         # divide qs into success and failed
-        failed_qs = qs.filter(~Q(reason__exact='') & Q(is_disbursed=False))
+        failed_qs = qs.filter(status=TransactionsDailyRollup.FAILED)
         # annotate failed qs and add admin username
         failed_qs = self._annotate_vf_ets_aman_qs(failed_qs)
 
-        success_qs = qs.filter(Q(is_disbursed=True))
+        success_qs = qs.filter(status=TransactionsDailyRollup.SUCCESSFUL)
         # annotate success qs and add admin username
         success_qs = self._annotate_vf_ets_aman_qs(success_qs)
 
@@ -1119,34 +957,15 @@ class ExportClientsTransactionsMonthlyReportTask(Task):
         return [*failed_qs, *success_qs]
 
     def aggregate_bank_wallets_orange_instant_transactions(self):
-        """Calculate bank wallets, orange, instant transactions details from InstantTransaction model"""
+        """Calculate bank wallets, orange, instant transactions details from InstantTransaction daily rollup"""
+        qs = transactions_rollup(self.superadmins, self.first_day, self.last_day).\
+            filter(source=TransactionsDailyRollup.INSTANT)
         if self.status == 'failed':
-            qs = InstantTransaction.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                Q(status=AbstractBaseStatus.FAILED),
-                (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
-                Q(from_user__root__client__creator__in=self.superadmins))
-            )
+            qs = qs.filter(status=AbstractBaseStatus.FAILED)
         elif self.status == 'success':
-            qs = InstantTransaction.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                Q(status=AbstractBaseStatus.SUCCESSFUL),
-                (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
-                Q(from_user__root__client__creator__in=self.superadmins))
-            )
+            qs = qs.filter(status=AbstractBaseStatus.SUCCESSFUL)
         else:
-            qs = InstantTransaction.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                Q(status__in=[AbstractBaseStatus.SUCCESSFUL,
-                              AbstractBaseStatus.PENDING,
-                              AbstractBaseStatus.FAILED]),
-                ~Q(transaction_status_code__in=['500', '424']),
-                (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
-                Q(from_user__root__client__creator__in=self.superadmins))
-            )
+            qs = qs.filter(is_internal_error=False)
         if self.status in ['success', 'failed']:
             qs = self._annotate_instant_trxs_qs(qs)
             qs = self._calculate_and_add_fees_to_qs_values(qs, self.status == 'failed')
@@ -1154,27 +973,27 @@ class ExportClientsTransactionsMonthlyReportTask(Task):
 
         # handle if status is all
         # divide qs into success and failed and pending
-        failed_qs = qs.filter(Q(status=AbstractBaseStatus.FAILED))
+        failed_qs = qs.filter(status=AbstractBaseStatus.FAILED)
 
         # remove instant transactions with issuer vodafone, etisalat, aman
         # in case status is invoices or report
         if self.status == 'invoices' or self.status == 'report':
             failed_qs = failed_qs.filter(
-                issuer_type__in=[InstantTransaction.ORANGE, InstantTransaction.BANK_WALLET]
+                issuer__in=[InstantTransaction.ORANGE, InstantTransaction.BANK_WALLET]
             )
 
         # annotate failed qs and add admin username
         failed_qs = self._annotate_instant_trxs_qs(failed_qs)
 
-        success_qs = qs.filter(Q(status__in=[
+        success_qs = qs.filter(status__in=[
             AbstractBaseStatus.SUCCESSFUL,
             AbstractBaseStatus.PENDING
-        ]))
+        ])
 
         # remove pending transaction with issuer [vodafone, etisalat, aman]
         success_qs = success_qs.filter(
             ~Q(Q(status=AbstractBaseStatus.PENDING) &
-                Q(issuer_type__in=[
+                Q(issuer__in=[
                     InstantTransaction.VODAFONE,
                     InstantTransaction.ETISALAT,
                     InstantTransaction.AMAN
@@ -1201,8 +1020,7 @@ class ExportClientsTransactionsMonthlyReportTask(Task):
                 Q(end_to_end=""),
                 (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
                 Q(user_created__root__client__creator__in=self.superadmins))
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id").values('id')
+            ).filter(is_latest_version=True).values('id')
         elif self.status == 'success':
             qs_ids = BankTransaction.objects.filter(
                 Q(disbursed_date__gte=self.first_day),
@@ -1211,8 +1029,7 @@ class ExportClientsTransactionsMonthlyReportTask(Task):
                 Q(end_to_end=""),
                 (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
                 Q(user_created__root__client__creator__in=self.superadmins))
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id").values('id')
+            ).filter(is_latest_version=True).values('id')
         else:
             qs_ids = BankTransaction.objects.filter(
                 Q(disbursed_date__gte=self.first_day),
@@ -1222,8 +1039,7 @@ class ExportClientsTransactionsMonthlyReportTask(Task):
                               AbstractBaseACHTransactionStatus.RETURNED, AbstractBaseACHTransactionStatus.REJECTED]),
                 (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
                 Q(user_created__root__client__creator__in=self.superadmins))
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id").values('id')
+            ).filter(is_latest_version=True).values('id')
 
         if self.status == 'invoices':
             qs = BankTransaction.objects.filter(id__in=qs_ids).annotate(
@@ -1463,7 +1279,7 @@ class ExportClientsTransactionsMonthlyReportTask(Task):
         if self.vf_facilitator_perm:
             # 8. calculate distinct msisdn per admin
             distinct_msisdn = dict()
-            for el in self.temp_vf_ets_aman_qs.values():
+            for el in self.temp_vf_ets_aman_qs:
                 if el['admin'] in distinct_msisdn:
                     distinct_msisdn[el['admin']].add(el['msisdn'])
                 else:
@@ -1547,47 +1363,23 @@ class ExportClientsTransactionsMonthlyReportTask(Task):
 class ExportPortalRootOrDashboardUserTransactionsEwallets(ExportTransactionsBaseView, Task):
 
     def create_transactions_report(self):
-        filename = f"ewallets_transactions_report_from_{self.start_date}_to_{self.end_date}_{randomword(8)}.xls"
-        file_path = f"{settings.MEDIA_ROOT}/documents/disbursement/{filename}"
-        wb = xlwt.Workbook(encoding='utf-8')
-
-
-        paginator = Paginator(self.data, 65535)
-        for page_number in paginator.page_range:
-            queryset = paginator.page(page_number)
-            column_names_list = ["Transaction ID","Recipient","Amount","Fees","Vat","Issuer","Status","Updated At", "Balance before", "Balance After"]
-            ws = wb.add_sheet(f'page{page_number}', cell_overwrite_ok=True)
-
-        # 1. Write sheet header/column names - first row
-            row_num = 0
-            font_style = xlwt.XFStyle()
-            font_style.font.bold = True
-
-            for col_nums in range(len(column_names_list)):
-                ws.write(row_num, col_nums, column_names_list[col_nums], font_style)
-
-            row_num = row_num + 1
-
-            for row in queryset:
-                ws.write(row_num, 0, str(row.uid))
-                ws.write(row_num, 1, str(row.anon_recipient))
-                ws.write(row_num, 2, str(row.amount))
-                ws.write(row_num, 3, str(row.fees))
-                ws.write(row_num, 4, str(row.vat))
-                ws.write(row_num, 5, str(row.issuer_choice_verbose))
-                ws.write(row_num, 6, str(row.status_choice_verbose))
-                ws.write(row_num, 7, str(row.updated_at))
-                ws.write(row_num, 8, str(row.balance_before))
-                ws.write(row_num, 9, str(row.balance_after))
-                row_num = row_num + 1
-
-        wb.save(file_path)
-
-        # add new file for this user in ExcelFile model
-        ExcelFile.objects.create(file_name=filename, owner=self.user)
-
-        report_download_url = f"{settings.BASE_URL}{str(reverse('disbursement:download_exported'))}?filename={filename}"
-        return report_download_url
+        column_names_list = [
+            "Transaction ID", "Recipient", "Amount", "Fees", "Vat", "Issuer", "Status", "Updated At",
+            "Balance before", "Balance After"
+        ]
+        issuers = dict(AbstractBaseIssuer.ISSUER_TYPE_CHOICES)
+        statuses = dict(InstantTransaction.STATUS_CHOICES)
+        statuses[InstantTransaction.UNKNOWN] = 'Unknown'
+        rows = iter_export_rows(
+            self.data,
+            ['uid', 'anon_recipient', 'amount', 'fees', 'vat', 'issuer_type', 'status', 'updated_at',
+             'balance_before', 'balance_after'],
+            converters={'issuer_type': issuers.get, 'status': statuses.get}
+        )
+        return export_transactions_report(
+            self.user, f"ewallets_transactions_report_from_{self.start_date}_to_{self.end_date}",
+            column_names_list, rows
+        )
 
     def run(self, user_id, start_date, end_date):
         self.start_date = start_date
@@ -1598,7 +1390,7 @@ class ExportPortalRootOrDashboardUserTransactionsEwallets(ExportTransactionsBase
         self.refine_start_and_end_date_format()
 
         # 2. get data of current client within date range
-        self.data = []
+        self.data = InstantTransaction.objects.none()
         if self.user.is_root or self.user.is_instantapiviewer:
             self.data = InstantTransaction.objects.filter(
                 (Q(document__disbursed_by__root=self.user.root) |
@@ -1619,11 +1411,13 @@ class ExportPortalRootOrDashboardUserTransactionsEwallets(ExportTransactionsBase
                 Q(disbursed_date__lte=self.last_day),
             )
 
-        download_url = self.create_transactions_report()
+        download_links = ", ".join(
+            f"<a href='{url}' >Download</a>" for url in self.create_transactions_report()
+        )
         mail_content = _(
             f"Dear <strong>{self.user.get_full_name}</strong><br><br>You can download "
             f"transactions report within the period of {self.start_date} to {self.end_date} "
-            f"from here <a href='{download_url}' >Download</a>.<br><br>Best Regards,"
+            f"from here {download_links}.<br><br>Best Regards,"
         )
         mail_subject = "Ewallets Report"
         deliver_mail(self.user, _(mail_subject), mail_content)
@@ -1632,45 +1426,19 @@ class ExportPortalRootOrDashboardUserTransactionsEwallets(ExportTransactionsBase
 class ExportPortalRootOrDashboardUserTransactionsBanks(ExportTransactionsBaseView, Task):
 
     def create_transactions_report(self):
-        filename = f"banks_transactions_report_from_{self.start_date}_to_{self.end_date}_{randomword(8)}.xls"
-        file_path = f"{settings.MEDIA_ROOT}/documents/disbursement/{filename}"
-        wb = xlwt.Workbook(encoding='utf-8')
-
-        paginator = Paginator(self.data, 65535)
-        for page_number in paginator.page_range:
-            queryset = paginator.page(page_number)
-            column_names_list = ["Reference ID","Recipient","Amount","Fees","Vat","Status","Updated At", "balance_before", "balance_after"]
-            ws = wb.add_sheet(f'page{page_number}', cell_overwrite_ok=True)
-
-        # 1. Write sheet header/column names - first row
-            row_num = 0
-            font_style = xlwt.XFStyle()
-            font_style.font.bold = True
-
-            for col_nums in range(len(column_names_list)):
-                ws.write(row_num, col_nums, column_names_list[col_nums], font_style)
-
-            row_num = row_num + 1
-
-            for row in queryset:
-                ws.write(row_num, 0, str(row.parent_transaction.transaction_id))
-                ws.write(row_num, 1, str(row.creditor_account_number))
-                ws.write(row_num, 2, str(row.amount))
-                ws.write(row_num, 3, str(row.fees))
-                ws.write(row_num, 4, str(row.vat))
-                ws.write(row_num, 6, str(row.status_choice_verbose))
-                ws.write(row_num, 7, str(row.updated_at))
-                ws.write(row_num, 8, str(row.balance_before))
-                ws.write(row_num, 9, str(row.balance_after))
-                row_num = row_num + 1
-
-        wb.save(file_path)
-
-        # add new file for this user in ExcelFile model
-        ExcelFile.objects.create(file_name=filename, owner=self.user)
-
-        report_download_url = f"{settings.BASE_URL}{str(reverse('disbursement:download_exported'))}?filename={filename}"
-        return report_download_url
+        column_names_list = [
+            "Reference ID", "Recipient", "Amount", "Fees", "Vat", "Status", "Updated At", "balance_before",
+            "balance_after"
+        ]
+        rows = iter_export_rows(
+            self.data,
+            ['parent_transaction__transaction_id', 'creditor_account_number', 'amount', 'fees', 'vat', 'status',
+             'updated_at', 'balance_before', 'balance_after'],
+            converters={'status': dict(AbstractBaseACHTransactionStatus.STATUS_CHOICES).get}
+        )
+        return export_transactions_report(
+            self.user, f"banks_transactions_report_from_{self.start_date}_to_{self.end_date}", column_names_list, rows
+        )
 
     def run(self, user_id, start_date, end_date):
         self.start_date = start_date
@@ -1681,7 +1449,7 @@ class ExportPortalRootOrDashboardUserTransactionsBanks(ExportTransactionsBaseVie
         self.refine_start_and_end_date_format()
 
         # 2. get data of current client within date range
-        self.data = []
+        self.data = BankTransaction.objects.none()
         if self.user.is_root or self.user.is_instantapiviewer:
             self.data = BankTransaction.objects.filter(
                 Q(disbursed_date__gte=self.first_day),
@@ -1689,31 +1457,30 @@ class ExportPortalRootOrDashboardUserTransactionsBanks(ExportTransactionsBaseVie
                 Q(end_to_end=""),
                 (Q(document__disbursed_by__root=self.user.root) |
                  Q(user_created__root=self.user.root))
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id")
+            ).filter(is_latest_version=True).order_by("parent_transaction__transaction_id")
         elif self.user.is_maker:
             self.data = BankTransaction.objects.filter(
                 Q(disbursed_date__gte=self.first_day),
                 Q(disbursed_date__lte=self.last_day),
                 Q(end_to_end=""),
                 Q(document__owner=self.user)
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id")
+            ).filter(is_latest_version=True).order_by("parent_transaction__transaction_id")
         elif self.user.is_checker:
             self.data = BankTransaction.objects.filter(
                 Q(disbursed_date__gte=self.first_day),
                 Q(disbursed_date__lte=self.last_day),
                 Q(end_to_end=""),
                 Q(document__disbursed_by=self.user)
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id")
+            ).filter(is_latest_version=True).order_by("parent_transaction__transaction_id")
 
 
-        download_url = self.create_transactions_report()
+        download_links = ", ".join(
+            f"<a href='{url}' >Download</a>" for url in self.create_transactions_report()
+        )
         mail_content = _(
                 f"Dear <strong>{self.user.get_full_name}</strong><br><br>You can download "
                 f"transactions report within the period of {self.start_date} to {self.end_date} "
-                f"from here <a href='{download_url}' >Download</a>.<br><br>Best Regards,"
+                f"from here {download_links}.<br><br>Best Regards,"
         )
         mail_subject = "Banks Report"
         deliver_mail(self.user, _(mail_subject), mail_content)
@@ -1722,52 +1489,19 @@ class ExportPortalRootOrDashboardUserTransactionsBanks(ExportTransactionsBaseVie
 class ExportPortalRootTransactionsEwallet(ExportTransactionsBaseView, Task):
 
     def create_transactions_report(self):
-        filename = f"e_wallets_transactions_report_from_{self.start_date}_to_{self.end_date}_{randomword(8)}.xls"
-        file_path = f"{settings.MEDIA_ROOT}/documents/disbursement/{filename}"
-        wb = xlwt.Workbook(encoding='utf-8')
-
-        paginator = Paginator(self.data, 65535)
-        for page_number in paginator.page_range:
-            queryset = paginator.page(page_number)
-            column_names_list = [
-                "Transaction UID", "Document", "Recipient", "Amount", "Fees", "Vat", "Issuer",
-                "Is Disbursed", "Disbursed At", "Created At", "Reason", "Balance before", "Balance after"
-            ]
-            ws = wb.add_sheet(f'page{page_number}', cell_overwrite_ok=True)
-
-            # 1. Write sheet header/column names - first row
-            row_num = 0
-            font_style = xlwt.XFStyle()
-            font_style.font.bold = True
-
-            for col_nums in range(len(column_names_list)):
-                ws.write(row_num, col_nums, column_names_list[col_nums], font_style)
-
-            row_num = row_num + 1
-
-            for row in queryset:
-                ws.write(row_num, 0, str(row.uid))
-                ws.write(row_num, 1, str(row.doc))
-                ws.write(row_num, 2, str(row.msisdn))
-                ws.write(row_num, 3, str(row.amount))
-                ws.write(row_num, 4, str(row.fees))
-                ws.write(row_num, 5, str(row.vat))
-                ws.write(row_num, 6, str(row.issuer))
-                ws.write(row_num, 7, str(row.is_disbursed))
-                ws.write(row_num, 8, str(row.disbursed_date))
-                ws.write(row_num, 9, str(row.created_at))
-                ws.write(row_num, 10, str(row.reason))
-                ws.write(row_num, 11, str(row.balance_before))
-                ws.write(row_num, 12, str(row.balance_after))
-                row_num = row_num + 1
-
-        wb.save(file_path)
-
-        # add new file for this user in ExcelFile model
-        ExcelFile.objects.create(file_name=filename, owner=self.user)
-
-        report_download_url = f"{settings.BASE_URL}{str(reverse('disbursement:download_exported'))}?filename={filename}"
-        return report_download_url
+        column_names_list = [
+            "Transaction UID", "Document", "Recipient", "Amount", "Fees", "Vat", "Issuer",
+            "Is Disbursed", "Disbursed At", "Created At", "Reason", "Balance before", "Balance after"
+        ]
+        rows = iter_export_rows(
+            self.data,
+            ['uid', 'doc__file', 'msisdn', 'amount', 'fees', 'vat', 'issuer', 'is_disbursed', 'disbursed_date',
+             'created_at', 'reason', 'balance_before', 'balance_after']
+        )
+        return export_transactions_report(
+            self.user, f"e_wallets_transactions_report_from_{self.start_date}_to_{self.end_date}",
+            column_names_list, rows
+        )
 
     def run(self, user_id, start_date, end_date):
         self.start_date = start_date
@@ -1778,7 +1512,7 @@ class ExportPortalRootTransactionsEwallet(ExportTransactionsBaseView, Task):
         self.refine_start_and_end_date_format()
 
         # 2. get data of current client within date range
-        self.data = []
+        self.data = DisbursementData.objects.none()
         if self.user.is_root:
             self.data = DisbursementData.objects.filter(
                 Q(doc__disbursed_by__root=self.user),
@@ -1798,11 +1532,13 @@ class ExportPortalRootTransactionsEwallet(ExportTransactionsBaseView, Task):
                 Q(disbursed_date__lte=self.last_day),
             )
 
-        download_url = self.create_transactions_report()
+        download_links = ", ".join(
+            f"<a href='{url}' >Download</a>" for url in self.create_transactions_report()
+        )
         mail_content = _(
             f"Dear <strong>{self.user.get_full_name}</strong><br><br>You can download "
             f"transactions report within the period of {self.start_date} to {self.end_date} "
-            f"from here <a href='{download_url}' >Download</a>.<br><br>Best Regards,"
+            f"from here {download_links}.<br><br>Best Regards,"
         )
         mail_subject = "Ewallets Report"
         deliver_mail(self.user, _(mail_subject), mail_content)
@@ -1817,21 +1553,27 @@ ExportPortalRootTransactionsEwallet = app.register_task(ExportPortalRootTransact
 
 
 @app.task()
-def handle_change_profile_callback(doc_id, transactions):
+def handle_change_profile_callback(doc_id, transactions, batch_id=None):
     """
     Related to disbursement
     Background task for handling central callback of msisdns change profile process
     :param doc_id: Id of the doc which holds the msisdns
     :param transactions: The callback dictionary from the central
+    :param batch_id: change profile batch of the callback, the doc is handled once all of its batches are called back
     :return:
     """
+    if batch_id and ChangeProfileBatch.objects.filter(doc_id=doc_id).exists():
+        transactions = record_change_profile_callback(doc_id, batch_id, transactions)
+        if transactions is None:
+            return
+
     doc_obj = Doc.objects.get(id=doc_id)
     doc_obj.has_change_profile_callback = True
     msisdns, errors = [], []
     has_error = False
 
     for msisdn, status_code, msg_list in transactions:
-        if status_code not in ["200", "629", "560", "562"]:
+        if status_code not in CHANGE_PROFILE_SUCCESS_CODES:
             has_error = True
             errors.append('\n'.join(msg_list))
         else:
@@ -1844,6 +1586,7 @@ def handle_change_profile_callback(doc_id, transactions):
         return
 
     doc_obj.disbursement_data.all().delete()
+    recompute_doc_counters(doc_obj)
     filename = f"failed_disbursement_validation_{randomword(8)}.xlsx"
     file_path = f"{settings.MEDIA_ROOT}/documents/disbursement/{filename}"
 
@@ -2230,10 +1973,13 @@ def create_recuring_docs():
             dis_doc.has_callback = False
             dis_doc.id = None
             dis_doc.pk = None
+            # The copied counters belong to the recurring doc, the new doc counts its transactions as they're created
+            reset_doc_counters(dis_doc)
             dis_doc.save()
 
 
             if recu_doc.is_e_wallet:
+                new_objs = []
                 for obj in recu_doc.disbursement_data.all():
                     new_obj = deepcopy(obj)
                     new_obj.uid = None
@@ -2244,10 +1990,11 @@ def create_recuring_docs():
                     new_obj.reason = ''
                     new_obj.reference_id = None
                     new_obj.disbursed_date = None
-
-                    new_obj.save()
+                    new_objs.append(new_obj)
+                bulk_create_transactions(DisbursementData, new_objs)
 
             elif recu_doc.is_bank_wallet:
+                new_objs = []
                 for obj in recu_doc.bank_wallets_transactions.all():
                     new_obj = deepcopy(obj)
                     new_obj.uid = None
@@ -2255,14 +2002,17 @@ def create_recuring_docs():
                     new_obj.document = doc
                     new_obj.balance_before = Decimal(0)
                     new_obj.after = Decimal(0)
-                    new_obj.save()
+                    new_objs.append(new_obj)
+                bulk_create_transactions(InstantTransaction, new_objs)
             elif recu_doc.is_bank_card:
+                new_objs = []
                 for obj in recu_doc.bank_cards_transactions.filter(status__in=["p", "d"]):
                     new_obj = deepcopy(obj)
                     new_obj.id = None
                     new_obj.pk = None
                     new_obj.status = 'd'
                     new_obj.parent_transaction_id = None
+                    new_obj.is_latest_version = True
                     new_obj.transaction_id = uuid.uuid4()
                     new_obj.message_id = uuid.uuid4()
                     new_obj.transaction_status_code = None
@@ -2270,7 +2020,8 @@ def create_recuring_docs():
                     new_obj.document = doc
                     new_obj.balance_before = Decimal(0)
                     new_obj.after = Decimal(0)
-                    new_obj.save()
+                    new_objs.append(new_obj)
+                bulk_create_transactions(BankTransaction, new_objs)
 
         recu_doc.recuring_latest_date = today
         recu_doc.save()
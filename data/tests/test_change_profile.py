@@ -0,0 +1,107 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from data.change_profile import record_change_profile_callback, submit_change_profile_batches
+from data.models import Doc, FileCategory
+from disbursement.models import ChangeProfileBatch
+from users.models import MakerUser
+from users.tests.factories import AdminUserFactory
+
+
+class FakeResponse:
+
+    def __init__(self, response_dict):
+        self.response_dict = response_dict
+        self.text = str(response_dict)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.response_dict
+
+
+def change_profile_response(url, upstream, json=None, **kwargs):
+    return FakeResponse({"TXNSTATUS": "200", "BATCH_ID": f"batch-{json['USERS'][0]}", "MESSAGE": "Accepted"})
+
+
+class SubmitChangeProfileBatchesTests(TestCase):
+
+    def setUp(self):
+        root = AdminUserFactory(user_type=3)
+        maker = MakerUser.objects.create(username='test_maker_user', root=root, user_type=1)
+        self.doc = Doc.objects.create(owner=maker, file_category=FileCategory.objects.create(user_created=root))
+
+    @mock.patch("data.change_profile.upstream.post", side_effect=change_profile_response)
+    def test_msisdns_are_submitted_in_batches(self, mocked_post):
+        msisdns = [f"0101010101{index}" for index in range(5)]
+
+        batches = submit_change_profile_batches(
+                self.doc, "http://uig", {"TYPE": "BCHGPREQ"}, msisdns, batch_size=2, concurrency=1
+        )
+
+        self.assertEqual(batches, [("batch-01010101010", 2), ("batch-01010101012", 2), ("batch-01010101014", 1)])
+        self.assertEqual(
+                list(self.doc.change_profile_batches.values_list('batch_id', 'msisdns_count', 'doc_batches_count')),
+                [("batch-01010101010", 2, 3), ("batch-01010101012", 2, 3), ("batch-01010101014", 1, 3)]
+        )
+        # The submits aren't idempotent so they're never retried by the upstream session
+        self.assertTrue(all('idempotent' not in call.kwargs for call in mocked_post.call_args_list))
+
+    @mock.patch("data.change_profile.upstream.post", return_value=FakeResponse({"TXNSTATUS": "407", "MESSAGE": "No"}))
+    def test_rejected_batch_raises_its_error(self, mocked_post):
+        with self.assertRaises(ValueError):
+            submit_change_profile_batches(self.doc, "http://uig", {"TYPE": "BCHGPREQ"}, ["01010101010"], concurrency=1)
+        self.assertFalse(self.doc.change_profile_batches.exists())
+
+    @mock.patch("data.change_profile.upstream.post", side_effect=ConnectionError("UIG is down"))
+    def test_failed_batch_raises_its_error(self, mocked_post):
+        with self.assertRaises(ConnectionError):
+            submit_change_profile_batches(self.doc, "http://uig", {"TYPE": "BCHGPREQ"}, ["01010101010"], concurrency=1)
+
+    def test_accepted_batches_are_saved_when_a_later_batch_fails(self):
+        responses = [change_profile_response, ConnectionError("UIG is down")]
+
+        def post(url, upstream, **kwargs):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response(url, upstream, **kwargs)
+
+        with mock.patch("data.change_profile.upstream.post", side_effect=post):
+            with self.assertRaises(ConnectionError):
+                submit_change_profile_batches(
+                        self.doc, "http://uig", {"TYPE": "BCHGPREQ"}, ["01010101010", "01010101011"],
+                        batch_size=1, concurrency=1
+                )
+        self.assertEqual(
+                list(self.doc.change_profile_batches.values_list('batch_id', flat=True)), ["batch-01010101010"]
+        )
+
+
+class RecordChangeProfileCallbackTests(TestCase):
+
+    def setUp(self):
+        root = AdminUserFactory(user_type=3)
+        maker = MakerUser.objects.create(username='test_maker_user', root=root, user_type=1)
+        self.doc = Doc.objects.create(owner=maker, file_category=FileCategory.objects.create(user_created=root))
+        for batch_id in ["first", "second"]:
+            ChangeProfileBatch.objects.create(doc=self.doc, batch_id=batch_id, msisdns_count=1, doc_batches_count=3)
+
+    def test_doc_is_handled_once_all_of_its_batches_are_called_back(self):
+        first_transactions = [["01010101010", "200", ["Done"]]]
+        second_transactions = [["01010101011", "614", ["Not registered"]]]
+        third_transactions = [["01010101012", "200", ["Done"]]]
+
+        self.assertIsNone(record_change_profile_callback(self.doc.id, "first", first_transactions))
+        # The saved batches are called back before the last batch of the doc is accepted
+        self.assertIsNone(record_change_profile_callback(self.doc.id, "second", second_transactions))
+
+        ChangeProfileBatch.objects.create(doc=self.doc, batch_id="third", msisdns_count=1, doc_batches_count=3)
+        self.assertEqual(
+                record_change_profile_callback(self.doc.id, "third", third_transactions),
+                first_transactions + second_transactions + third_transactions
+        )
+        # A replayed callback doesn't handle the doc twice
+        self.assertIsNone(record_change_profile_callback(self.doc.id, "third", third_transactions))
@@ -0,0 +1,58 @@
+import csv
+import gzip
+import os
+import shutil
+import tempfile
+
+import openpyxl
+from django.test import SimpleTestCase
+
+from data.exports import CSV, CSV_GZIP, XLSX, write_export
+
+
+class WriteExportTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.stem = os.path.join(self.directory, "report")
+        self.columns = ["Transaction ID", "Amount"]
+        self.rows = [[str(index), str(index * 10)] for index in range(5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_xlsx(self, file_path):
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        self.assertEqual(len(workbook.worksheets), 1)
+        return [list(row) for row in workbook.active.iter_rows(values_only=True)]
+
+    def test_xlsx_export_rolls_over_to_part_files_when_sheet_is_full(self):
+        file_paths = write_export(self.stem, self.columns, iter(self.rows), XLSX, max_rows=3)
+
+        self.assertEqual(file_paths, [f"{self.stem}.xlsx", f"{self.stem}_part2.xlsx", f"{self.stem}_part3.xlsx"])
+        self.assertEqual(self.read_xlsx(file_paths[0]), [self.columns] + self.rows[:2])
+        self.assertEqual(self.read_xlsx(file_paths[2]), [self.columns] + self.rows[4:])
+
+    def test_empty_xlsx_export_writes_header_only(self):
+        file_paths = write_export(self.stem, self.columns, [], XLSX)
+
+        self.assertEqual(file_paths, [f"{self.stem}.xlsx"])
+        self.assertEqual(self.read_xlsx(file_paths[0]), [self.columns])
+
+    def test_xlsx_export_keeps_formulas_as_text(self):
+        file_paths = write_export(self.stem, self.columns, [["=1+1", "10"]], XLSX)
+
+        self.assertEqual(self.read_xlsx(file_paths[0])[1], ["=1+1", "10"])
+
+    def test_csv_exports(self):
+        csv_path, = write_export(self.stem, self.columns, iter(self.rows), CSV)
+        gzip_path, = write_export(self.stem, self.columns, iter(self.rows), CSV_GZIP)
+
+        with open(csv_path, newline='', encoding='utf-8') as csv_file:
+            self.assertEqual(list(csv.reader(csv_file)), [self.columns] + self.rows)
+        with gzip.open(gzip_path, 'rt', newline='', encoding='utf-8') as gzip_file:
+            self.assertEqual(list(csv.reader(gzip_file)), [self.columns] + self.rows)
+
+    def test_unsupported_export_format(self):
+        with self.assertRaises(ValueError):
+            write_export(self.stem, self.columns, self.rows, "xls")
@@ -1,10 +1,15 @@
+from decimal import Decimal
+
 from users.tests.factories import SuperAdminUserFactory, CheckerUserFactory
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from data.tests.factories import FormarFactory, FileDataFactory, DocFactory
 from data.models.category_data import Format
 from data.models.file_data import FileData
 from unittest import mock
-from data.utils import validate_file_extension, get_client_ip
+from django.core.files.base import ContentFile
+
+from data.utils import (combine_sheet_errors, get_client_ip, iter_sheet_chunks, sheet_column_as_str,
+                        sniff_csv_delimiter, validate_file_extension, validate_sheet_amounts, validate_sheet_msisdns)
 from django.test.client import RequestFactory
 
 
@@ -31,6 +36,43 @@ class TestUtils(TestCase):
         req = MockRequest()
         req.META = {"test": "test"}
         resp = get_client_ip(req)
-        
-        
-        
+
+
+class SheetValidationTests(SimpleTestCase):
+
+    def test_msisdns_are_normalized_and_duplicates_flagged(self):
+        msisdns, valid, duplicates = validate_sheet_msisdns(
+                sheet_column_as_str(["01012345678", "1012345678", "201012345679", "12345", "abc"])
+        )
+        self.assertEqual(
+                msisdns.tolist(), ["00201012345678", "00201012345678", "00201012345679", "12345", "abc"]
+        )
+        self.assertEqual(valid.tolist(), [True, True, True, False, False])
+        self.assertEqual(duplicates.tolist(), [False, True, False, False, False])
+
+    def test_amounts_are_rounded_and_totalled(self):
+        amounts_list, valid, total_amount = validate_sheet_amounts([10, "12.505", 0.5, "abc", "1.2.3"])
+        self.assertEqual(amounts_list, [Decimal("10"), Decimal("12.50"), 0.5, "abc", "1.2.3"])
+        self.assertEqual(valid.tolist(), [True, True, False, False, False])
+        self.assertEqual(total_amount, Decimal("22.50"))
+
+    def test_errors_keep_new_line_prefix_for_single_failure_only(self):
+        errors_list = combine_sheet_errors(3, [
+            ([True, False, False], "Invalid mobile number"),
+            ([True, True, False], "Invalid amount"),
+        ])
+        self.assertEqual(errors_list, ["Invalid amount", "\nInvalid amount", None])
+
+    def test_duplicates_are_caught_across_chunks(self):
+        seen_msisdns = set()
+        validate_sheet_msisdns(sheet_column_as_str(["01012345678"]), seen_msisdns)
+        msisdns, valid, duplicates = validate_sheet_msisdns(sheet_column_as_str(["1012345678"]), seen_msisdns)
+        self.assertEqual(duplicates.tolist(), [True])
+
+    def test_csv_sheet_is_read_in_chunks(self):
+        csv_file = ContentFile(b"mobile number;amount\n01012345678;10\n01012345679;20\n01012345670;30\n", name="a.csv")
+        delimiter = sniff_csv_delimiter(csv_file)
+        chunks = list(iter_sheet_chunks(csv_file, 2, delimiter))
+        self.assertEqual(delimiter, ";")
+        self.assertEqual([len(df) for df in chunks], [2, 1])
+        self.assertEqual(chunks[0].columns.tolist(), ["mobile number", "amount"])
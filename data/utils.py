@@ -1,6 +1,12 @@
+import csv
 import os
+from decimal import Decimal
 import random, string, logging
+import numpy as np
+import openpyxl
+import pandas as pd
 import xlsxwriter
+from pandas.io.parsers import TextParser
 from urllib.parse import urlencode
 
 from django.core.mail import EmailMultiAlternatives
@@ -13,6 +19,7 @@ from django.contrib.auth.base_user import BaseUserManager
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 
+from core.utils.validations import phonenumber_form_validate
 from instant_cashin.utils import get_from_env
 from data.models.filecategory import FileCategory
 from data.models.category_data import Format
@@ -172,8 +179,8 @@ def excell_position(col_index,row_index):
 
 
 def export_excel(file_path, data):
-    # Create a workbook and add a worksheet.
-    workbook = xlsxwriter.Workbook(file_path)
+    # Create a workbook and add a worksheet, rows are flushed as they're written so data can be a generator
+    workbook = xlsxwriter.Workbook(file_path, {'constant_memory': True})
     worksheet = workbook.add_worksheet()
 
     # Iterate over the data and write it out row by row.
@@ -184,6 +191,170 @@ def export_excel(file_path, data):
     workbook.close()
 
 
+def sniff_csv_delimiter(file, sample_size=64 * 1024):
+    """
+    :param file: uploaded csv file
+    :return: the delimiter used at the csv file sniffed from its first complete lines or False if there is any problem
+    """
+    try:
+        sample = file.read(sample_size).decode("utf-8", errors="ignore")
+        if len(sample) >= sample_size and "\n" in sample:
+            sample = sample[:sample.rindex("\n")]
+        return csv.Sniffer().sniff(sample).delimiter
+    except Exception:
+        return False
+    finally:
+        file.seek(0)
+
+
+def _excel_cell_value(cell):
+    """:return: the cell value converted the same way pd.read_excel converts the openpyxl cells"""
+    if cell.is_date:
+        return cell.value
+    elif cell.data_type == openpyxl.cell.cell.TYPE_ERROR:
+        return np.nan
+    elif cell.data_type == openpyxl.cell.cell.TYPE_BOOL:
+        return bool(cell.value)
+    elif cell.value is None:
+        return ""
+    elif cell.data_type == openpyxl.cell.cell.TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+def _excel_rows_chunks(file, chunk_size):
+    """Read the first worksheet of an xlsx file row by row without loading the whole workbook"""
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = workbook.worksheets[0].iter_rows()
+        headers = next(rows, None)
+        if headers is None:
+            return
+
+        headers = [_excel_cell_value(cell) for cell in headers]
+        chunk, chunks_count = [], 0
+        for row in rows:
+            chunk.append([_excel_cell_value(cell) for cell in row])
+            if len(chunk) == chunk_size:
+                chunks_count += 1
+                yield headers, chunk
+                chunk = []
+        if chunk or not chunks_count:
+            yield headers, chunk
+    finally:
+        workbook.close()
+
+
+def iter_sheet_chunks(file, chunk_size, delimiter=None):
+    """
+    Read an uploaded disbursement sheet as data frames of at most chunk_size rows instead of loading it at once,
+        xlsx rows are parsed the same way pd.read_excel parses the whole sheet
+    :param file: uploaded csv/excel file
+    :param delimiter: the csv file delimiter
+    :return: generator of data frames, at least one data frame holding the sheet headers is generated
+    """
+    file.seek(0)
+    if file.name.endswith(".csv"):
+        chunks_count = 0
+        for df in pd.read_csv(file, delimiter=delimiter, chunksize=chunk_size):
+            chunks_count += 1
+            yield df
+        if not chunks_count:
+            file.seek(0)
+            yield pd.read_csv(file, delimiter=delimiter, nrows=0)
+
+    elif file.name.endswith(".xlsx"):
+        for headers, rows in _excel_rows_chunks(file, chunk_size):
+            yield TextParser([headers] + rows, header=0).read()
+
+    # The old excel formats can't be read row by row
+    else:
+        df = pd.read_excel(file)
+        for start in range(0, max(len(df), 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+
+def sheet_column_as_str(values):
+    """:return: pandas Series of the passed sheet cells values converted to str the same way as str(cell)"""
+    return pd.Series([str(value) for value in values], dtype=object)
+
+
+def validate_sheet_msisdns(msisdns, seen_msisdns=None):
+    """
+    Validate and normalize a whole mobile numbers column of an uploaded sheet at once,
+        every distinct number is validated once no matter how many times it appears at the sheet
+    :param msisdns: pandas Series of the mobile numbers as str
+    :param seen_msisdns: set of the msisdns of the previous chunks of the sheet, updated with this chunk msisdns
+    :return: msisdns Series (00 prefixed number for valid rows, the cell value otherwise), valid mask, duplicates mask
+    """
+    lengths = msisdns.str.len()
+    e164_msisdns = ("+20" + msisdns).where(
+            msisdns.str.startswith("1") & (lengths == 10),
+            ("+2" + msisdns).where(
+                    msisdns.str.startswith("01") & (lengths == 11),
+                    ("+" + msisdns).where(msisdns.str.startswith("2") & (lengths == 12), "")
+            )
+    )
+
+    valid_e164_msisdns = set()
+    for msisdn in e164_msisdns[e164_msisdns != ""].unique():
+        try:
+            phonenumber_form_validate(msisdn)
+            valid_e164_msisdns.add(msisdn)
+        except ValidationError:
+            pass
+
+    valid = e164_msisdns.isin(valid_e164_msisdns)
+    msisdns = ("00" + e164_msisdns.str[1:]).where(valid, msisdns)
+    duplicates = msisdns.duplicated(keep="first")
+    if seen_msisdns is not None:
+        duplicates |= msisdns.isin(seen_msisdns)
+        seen_msisdns.update(msisdns)
+    return msisdns, valid, valid & duplicates
+
+
+def validate_sheet_amounts(amounts, decimal_from_str=True):
+    """
+    Validate a whole amounts column of an uploaded sheet at once, valid amounts are numbers >= 1.0
+    :param amounts: list of the amounts cells values
+    :param decimal_from_str: build the Decimal amounts from str(cell) instead of the cell value itself
+    :return: amounts list (rounded Decimal for valid rows, the cell value otherwise), valid mask, total amount
+    """
+    amounts_as_str = sheet_column_as_str(amounts)
+    valid = np.array(amounts_as_str.str.replace(".", "", n=1, regex=False).str.isdigit(), dtype=bool)
+    valid[valid] = amounts_as_str[valid].astype(float).values >= 1.0
+
+    amounts_list = list(amounts)
+    total_amount = 0
+    for position in np.flatnonzero(valid):
+        amount = amounts_as_str.iat[position] if decimal_from_str else amounts_list[position]
+        amounts_list[position] = round(Decimal(amount), 2)
+        total_amount += amounts_list[position]
+
+    return amounts_list, valid, total_amount
+
+
+def combine_sheet_errors(rows_count, checks):
+    """
+    Build the errors column of a failure sheet from the validation checks ordered as they apply to each row,
+        a row failing one check gets its message prefixed by a new line, a row failing more keeps the last message
+    :param rows_count: number of the sheet rows
+    :param checks: list of (failed rows mask, error message)
+    :return: errors list with None for the valid rows
+    """
+    errors = np.full(rows_count, None, dtype=object)
+    failures_count = np.zeros(rows_count, dtype=int)
+    for failed, message in checks:
+        failed = np.asarray(failed, dtype=bool)
+        errors[failed] = message
+        failures_count += failed
+
+    single_failure = failures_count == 1
+    errors[single_failure] = [f"\n{message}" for message in errors[single_failure]]
+    return errors.tolist()
+
+
 def randomword(length):
     letters = string.ascii_lowercase
     return ''.join(random.choice(letters) for i in range(length))
@@ -105,7 +105,8 @@ class DisbursementHomeView(UserWithDisbursementPermissionRequired, View):
             2. Documents are paginated but not used in template.
         """
         has_vmt_setup = request.user.root.has_vmt_setup
-        doc_list_disbursement = Doc.objects.filter(owner__hierarchy=request.user.hierarchy, type_of=self.doc_type)
+        doc_list_disbursement = Doc.objects.filter(owner__hierarchy=request.user.hierarchy, type_of=self.doc_type).\
+            select_related('disbursement_txn')
         paginator = Paginator(doc_list_disbursement, 7)
         page = request.GET.get('page')
         docs = paginator.get_page(page)
@@ -176,7 +177,8 @@ class BanksHomeView(UserWithAcceptVFOnboardingPermissionRequired, UserWithDisbur
             2. Documents are paginated but not used in template.
         """
         has_vmt_setup = request.user.root.has_vmt_setup
-        banks_doc_list = Doc.objects.filter(owner__hierarchy=request.user.hierarchy, type_of=self.doc_type)
+        banks_doc_list = Doc.objects.filter(owner__hierarchy=request.user.hierarchy, type_of=self.doc_type).\
+            select_related('disbursement_txn')
         paginator = Paginator(banks_doc_list, 7)
         page = request.GET.get('page')
         docs = paginator.get_page(page)
@@ -9,7 +9,10 @@ from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
 from .mixins import AdminSiteOwnerOnlyPermissionMixin, ExportCsvMixin
-from .models import Agent, BankTransaction, DisbursementData, DisbursementDocData, VMTData, RemainingAmounts
+from .models import (
+    Agent, BankTransaction, DisbursementCallback, DisbursementChunk, DisbursementData, DisbursementDocData, VMTData,
+    RemainingAmounts
+)
 from .utils import custom_titled_filter
 from utilities.date_range_filter import CustomDateRangeFilter,CustomDateTimeRangeFilter
 
@@ -26,8 +29,7 @@ class DistinctFilter(admin.SimpleListFilter):
         if not self.value():
             return queryset
         if self.value() == 'distinct':
-            # return queryset.distinct("parent_transaction__transaction_id").order_by("parent_transaction__transaction_id", "-id")
-            return queryset.filter(id__in=[trn.id for trn in queryset.distinct("parent_transaction__transaction_id").order_by("parent_transaction__transaction_id", "-id")])
+            return queryset.filter(is_latest_version=True)
 
 
 class DisbursedFilter(admin.SimpleListFilter):
@@ -250,6 +252,39 @@ class DisbursementDocDataAdmin(AdminSiteOwnerOnlyPermissionMixin, admin.ModelAdm
     )
 
 
+@admin.register(DisbursementChunk)
+class DisbursementChunkAdmin(admin.ModelAdmin):
+    """
+    Admin panel representation for the chunks of the large disbursement documents
+    """
+
+    list_display = [
+        'doc', 'index', 'first_record_id', 'last_record_id', 'records_count', 'processed_count', 'status', 'attempts',
+        'claimed_at', 'updated_at'
+    ]
+    list_filter = ['status', ('created_at', CustomDateRangeFilter)]
+    search_fields = ['doc__id']
+    readonly_fields = list_display + ['failure_reason', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
+
+@admin.register(DisbursementCallback)
+class DisbursementCallbackAdmin(admin.ModelAdmin):
+    """
+    Admin panel representation for the inbox of the bulk disbursement callbacks
+    """
+
+    list_display = ['id', 'batch_id', 'status', 'attempts', 'applied_count', 'created_at', 'updated_at']
+    list_filter = ['status', ('created_at', CustomDateRangeFilter)]
+    search_fields = ['batch_id']
+    readonly_fields = list_display + ['payload', 'failure_reason']
+
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(VMTData)
 class VMTDataAdmin(admin.ModelAdmin):
     """
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import itertools
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+AGENT_POOL_VERSION_KEY = "agent_pool_version_{}"
+ROUND_ROBIN = "round_robin"
+LEAST_RECENTLY_USED = "least_recently_used"
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class AgentPool:
+    """
+    Agents of one wallet provider loaded once into memory,
+        listing and picking the agents used at the disbursement payloads needs no database queries
+    """
+
+    def __init__(self, agents, version=None):
+        """:param agents: (msisdn, type, super) tuples of the wallet provider agents ordered by id"""
+        self.agents = list(agents)
+        self.version = version
+        self.checked_at = time.monotonic()
+        self._round_robin = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def msisdns(self, agent_types=None, is_super=None):
+        """:return: msisdns of the agents of the passed types and super flag ordered by id"""
+        return [
+            msisdn for msisdn, agent_type, super_agent in self.agents
+            if (agent_types is None or agent_type in agent_types) and (is_super is None or super_agent == is_super)
+        ]
+
+    def first_type(self, is_super=None):
+        """:return: type of the first agent with the passed super flag or None"""
+        return next((agent_type for msisdn, agent_type, super_agent in self.agents
+                     if is_super is None or super_agent == is_super), None)
+
+    def pick(self, agent_types, is_super=False, strategy=None):
+        """
+        Pick one of the agents of the passed types spreading the requests evenly across them
+        :param strategy: ROUND_ROBIN or LEAST_RECENTLY_USED, overrides AGENT_SELECTION_STRATEGY
+        :return: agent msisdn or None if there is no matching agent
+        """
+        candidates = self.msisdns(agent_types, is_super)
+        if not candidates:
+            return None
+
+        strategy = strategy or getattr(settings, "AGENT_SELECTION_STRATEGY", ROUND_ROBIN)
+        with self._lock:
+            if strategy == LEAST_RECENTLY_USED:
+                msisdn = min(candidates, key=lambda candidate: self._last_used.get(candidate, 0))
+                self._last_used[msisdn] = time.monotonic()
+                return msisdn
+
+            counter = self._round_robin.setdefault((tuple(agent_types), is_super), itertools.count())
+            return candidates[next(counter) % len(candidates)]
+
+
+def _current_version(wallet_provider_id):
+    return cache.get(AGENT_POOL_VERSION_KEY.format(wallet_provider_id))
+
+
+def get_agent_pool(wallet_provider_id):
+    """
+    Return the agents pool of the passed wallet provider from the process cache,
+        the shared cache version is checked at most once per AGENT_POOL_CACHE_CHECK_INTERVAL seconds
+        so other processes pick up the agents changes
+    """
+    from .models import Agent
+
+    check_interval = getattr(settings, "AGENT_POOL_CACHE_CHECK_INTERVAL", 5)
+    pool = _pools.get(wallet_provider_id)
+
+    if pool is not None:
+        if time.monotonic() - pool.checked_at < check_interval:
+            return pool
+        if _current_version(wallet_provider_id) == pool.version:
+            pool.checked_at = time.monotonic()
+            return pool
+
+    version = _current_version(wallet_provider_id)
+    agents = Agent.objects.filter(wallet_provider_id=wallet_provider_id).order_by("id")
+    pool = AgentPool(agents.values_list("msisdn", "type", "super"), version)
+    with _pools_lock:
+        _pools[wallet_provider_id] = pool
+    return pool
+
+
+def invalidate_agent_pool(wallet_provider_id):
+    """Drop the agents pool of the passed wallet provider at this process and at the other processes"""
+    with _pools_lock:
+        _pools.pop(wallet_provider_id, None)
+    cache.set(AGENT_POOL_VERSION_KEY.format(wallet_provider_id), uuid.uuid4().hex, None)
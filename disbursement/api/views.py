@@ -1,4 +1,3 @@
-from decimal import Decimal
 from datetime import datetime
 import json
 import logging
@@ -6,6 +5,8 @@ import logging
 from requests.exceptions import HTTPError
 import xlrd
 
+from django.db import transaction
+from django.db.models import Q
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils import translation
@@ -24,13 +25,16 @@ from data.models import Doc
 from data.tasks import handle_change_profile_callback, notify_checkers
 from users.models import CheckerUser, User, Client
 from utilities.custom_requests import CustomRequests
-from utilities.functions import custom_budget_logger, get_value_from_env
+from utilities.functions import get_value_from_env
 from utilities.messages import MSG_DISBURSEMENT_ERROR, MSG_DISBURSEMENT_IS_RUNNING, MSG_PIN_INVALID
 
-from ..models import Agent, DisbursementData, DisbursementDocData
+from ..agent_pool import get_agent_pool
+from ..callbacks import is_async_callback_mode, settle_disbursement_callback
+from ..models import Agent, DisbursementCallback, DisbursementData
+from ..persistence import apply_disbursement_callback
 from .permission_classes import BlacklistPermission
 from .serializers import DisbursementCallBackSerializer, DisbursementSerializer
-from ..tasks import BulkDisbursementThroughOneStepCashin
+from ..tasks import BulkDisbursementThroughOneStepCashin, process_disbursement_callback
 import requests
 import json
 
@@ -76,26 +80,22 @@ class DisburseAPIView(APIView):
         :return: tuple of vodafone agent, etisalat agents lists
         """
         if not (provider.is_vodafone_default_onboarding or provider.is_banks_standard_model_onboaring):
-            agents = Agent.objects.filter(wallet_provider=provider.super_admin, super=False)
+            agents, is_super = get_agent_pool(provider.super_admin.id), False
         else:
-            agents = Agent.objects.filter(wallet_provider=provider)
-            agents = agents.filter(super=True) if provider.client.agents_onboarding_choice == Client.P2M else \
-                agents.filter(super=False)
+            agents = get_agent_pool(provider.id)
+            is_super = provider.client.agents_onboarding_choice == Client.P2M
 
-        vodafone_agents = agents.filter(type=Agent.VODAFONE)
-        etisalat_agents = agents.filter(type=Agent.ETISALAT)
+        first_agent_type = agents.first_type(is_super)
+        if first_agent_type is None:
+            raise ValueError(f"{provider.username} root has no agents setup.")
 
-        if agents.first().type == Agent.P2M and not vodafone_agents:
-            vodafone_agents = agents.filter(type=Agent.P2M)
+        vodafone_agents = agents.msisdns([Agent.VODAFONE], is_super)
+        etisalat_agents = agents.msisdns([Agent.ETISALAT], is_super)
 
-        vodafone_agents = vodafone_agents.extra(select={'MSISDN': 'msisdn'}).values('MSISDN')
-        etisalat_agents = etisalat_agents.values_list('msisdn', flat=True)
+        if first_agent_type == Agent.P2M and not vodafone_agents:
+            vodafone_agents = agents.msisdns([Agent.P2M], is_super)
 
-        vodafone_agents = list(vodafone_agents)
-        for internal_dict in vodafone_agents:
-            internal_dict.update({'PIN': raw_pin})
-
-        return vodafone_agents, list(etisalat_agents)
+        return [{'MSISDN': msisdn, 'PIN': raw_pin} for msisdn in vodafone_agents], etisalat_agents
 
     def prepare_vodafone_recipients(self, doc_id):
         """
@@ -295,45 +295,27 @@ class DisburseCallBack(UpdateAPIView):
             and UPDATES the budget record of the disbursed document Owner/Admin it he/she has custom budget
         """
         DATA_LOGGER.debug(f"[response] [automatic bulk disbursement callback] [{request.user}] -- {str(request.data)}")
-        total_disbursed_amount = 0
-        last_doc_record_id = successfully_disbursed_obj = None
-        num_of_trns = 0
 
         if len(request.data['transactions']) == 0:
             return JsonResponse({'message': 'Transactions are empty'}, status=status.HTTP_404_NOT_FOUND)
 
-        for data in request.data['transactions']:
-            try:
-                last_doc_record_id = int(data['id'])
-                # for None cases and not nullable refernce_id field
-                ref_id = data.get('mpg_rrn', 'None')
-                if ref_id is None:
-                    ref_id = "None"
-                DisbursementData.objects.select_for_update().filter(id=int(data['id'])).update(
-                        is_disbursed=True if data['status'] == '0' else False,
-                        reason=data.get('description', 'No Description found'),
-                        reference_id=ref_id
-                )
-
-                # If data['status'] = 0, it means this record amount is disbursed successfully
-                if data['status'] == '0':
-                    num_of_trns = num_of_trns + 1
-                    successfully_disbursed_obj = DisbursementData.objects.get(id=int(data['id']))
-                    total_disbursed_amount += round(Decimal(successfully_disbursed_obj.amount), 2)
-            except DisbursementData.DoesNotExist:
-                return JsonResponse({}, status=status.HTTP_404_NOT_FOUND)
-
-        if successfully_disbursed_obj is not None and successfully_disbursed_obj.doc.owner.root.has_custom_budget:
-            successfully_disbursed_obj.doc.owner.root.budget.\
-                update_disbursed_amount_and_current_balance(total_disbursed_amount, "vodafone", num_of_trns)
-            custom_budget_logger(
-                    successfully_disbursed_obj.doc.owner.root.username,
-                    f"Total disbursed amount: {total_disbursed_amount} LE",
-                    request.user.username, f" -- doc id: {successfully_disbursed_obj.doc_id}"
+        # Save the callback to the inbox and acknowledge it at once, process_disbursement_callback task applies it
+        if is_async_callback_mode():
+            callback = DisbursementCallback.objects.create(
+                    batch_id=str(request.data.get('batch_id') or ''), payload=request.data
             )
+            transaction.on_commit(lambda: process_disbursement_callback.delay(callback.id))
+            return JsonResponse({}, status=status.HTTP_202_ACCEPTED)
 
-        if last_doc_record_id:
-            DisbursementDocData.objects.filter(doc__disbursement_data__id=last_doc_record_id).update(has_callback=True)
+        # The records are applied and debited at once, so a failed debit rolls them back to be applied by a replay
+        try:
+            with transaction.atomic():
+                doc_obj, total_disbursed_amount, num_of_trns = \
+                    apply_disbursement_callback(request.data['transactions'])
+                if doc_obj is not None:
+                    settle_disbursement_callback(doc_obj, total_disbursed_amount, num_of_trns, request.user.username)
+        except DisbursementData.DoesNotExist:
+            return JsonResponse({}, status=status.HTTP_404_NOT_FOUND)
 
         return JsonResponse({}, status=status.HTTP_202_ACCEPTED)
 
@@ -359,12 +341,13 @@ class ChangeProfileCallBack(UpdateAPIView):
         if len(transactions) == 0:
             return JsonResponse({'message': 'Transactions are empty'}, status=status.HTTP_404_NOT_FOUND)
 
-        doc_obj = Doc.objects.filter(txn_id=request.data['batch_id']).first()
+        batch_id = request.data['batch_id']
+        doc_obj = Doc.objects.filter(Q(txn_id=batch_id) | Q(change_profile_batches__batch_id=batch_id)).first()
 
         if not doc_obj:
             return JsonResponse({'message': 'Batch id sent is not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        handle_change_profile_callback.delay(doc_obj.id, transactions)
+        handle_change_profile_callback.delay(doc_obj.id, transactions, batch_id)
         return JsonResponse({}, status=status.HTTP_202_ACCEPTED)
 
 
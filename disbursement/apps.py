@@ -8,3 +8,6 @@ class DisbursementConfig(AppConfig):
     name = 'disbursement'
     label = 'disbursement'
     verbose_name = "Disbursement"
+
+    def ready(self):
+        import disbursement.signals  # noqa
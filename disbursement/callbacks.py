@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from users.hierarchy import resolve_hierarchy
+from utilities.functions import custom_budget_logger
+
+from .models import DisbursementCallback, DisbursementDocData
+from .persistence import apply_disbursement_callback
+
+
+DATA_LOGGER = logging.getLogger("disburse")
+
+SYNC = "sync"
+ASYNC = "async"
+
+
+def is_async_callback_mode():
+    """:return: True if the bulk disbursement callbacks are saved to the inbox and applied by a task"""
+    return getattr(settings, "DISBURSEMENT_CALLBACK_MODE", SYNC) == ASYNC
+
+
+def settle_disbursement_callback(doc_obj, total_disbursed_amount, num_of_trns, username):
+    """
+    Debit the successfully disbursed total from the document owner's custom budget at once
+        and mark the document as it has received its callback
+    """
+    root = resolve_hierarchy(doc_obj.owner).root
+    if num_of_trns > 0 and root.has_custom_budget:
+        root.budget.update_disbursed_amount_and_current_balance(total_disbursed_amount, "vodafone", num_of_trns)
+        custom_budget_logger(
+                root.username, f"Total disbursed amount: {total_disbursed_amount} LE",
+                username, f" -- doc id: {doc_obj.id}"
+        )
+
+    DisbursementDocData.objects.filter(doc=doc_obj).update(has_callback=True)
+
+
+def process_inbox_callback(callback_id):
+    """
+    Apply the transactions of one inbox callback, callbacks replayed by UIG are deduplicated by their batch id
+        and transaction ids, the callbacks without a batch id are deduplicated by their records as only the records
+        moving to disbursed are debited
+    :return: number of the applied transactions, None if the callback has been processed before
+    """
+    batch_id = DisbursementCallback.objects.values_list('batch_id', flat=True).get(id=callback_id)
+
+    with transaction.atomic():
+        # Lock all the callbacks of the batch in the same order so its replays are processed one at a time
+        callbacks = DisbursementCallback.objects.select_for_update().order_by('id')
+        callbacks = callbacks.filter(batch_id=batch_id) if batch_id else callbacks.filter(id=callback_id)
+        callbacks = list(callbacks)
+        callback = next(callback for callback in callbacks if callback.id == callback_id)
+        if callback.status == DisbursementCallback.PROCESSED:
+            return None
+
+        applied_ids = {
+            str(trx.get('id')) for other in callbacks if other.status == DisbursementCallback.PROCESSED
+            for trx in other.transactions
+        }
+        transactions = [trx for trx in callback.transactions if str(trx.get('id')) not in applied_ids]
+
+        if transactions:
+            doc_obj, total_disbursed_amount, num_of_trns = apply_disbursement_callback(transactions)
+            if doc_obj is not None:
+                settle_disbursement_callback(doc_obj, total_disbursed_amount, num_of_trns, "celery_task")
+
+        callback.mark_processed(len(transactions))
+
+    DATA_LOGGER.debug(
+            f"[message] [disbursement callback inbox] [celery_task] -- callback: {callback_id}, "
+            f"batch id: {batch_id}, applied transactions: {len(transactions)}"
+    )
+    return len(transactions)
+
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+
+DISBURSE_LOGGER = logging.getLogger("disburse")
+
+DEFAULT_ISSUER_CONCURRENCY = 4
+DEFAULT_AGENT_CONCURRENCY = 1
+
+
+class IssuerDispatcher:
+    """
+    Bounded concurrency dispatcher used by the bulk disbursement task to send the
+    per-recipient requests of one issuer in parallel.
+
+    - At most `issuer concurrency` requests of the same issuer are in flight at any time
+    - At most `agent concurrency` requests are in flight for the same agent MSISDN,
+      agents are picked round robin and a busy agent is skipped in favour of an idle one
+    - Every recipient uid is dispatched only once per run
+    - Errors raised while sending a recipient don't stop the others, they're kept to be raised after the dispatch
+    """
+
+    def __init__(self, issuer, agents=None, max_in_flight=None, max_in_flight_per_agent=None):
+        """
+        :param issuer: issuer name used to look up the concurrency limits
+        :param agents: agent MSISDNs that will send the money, None when the issuer needs no agent
+        :param max_in_flight: overrides BULK_DISBURSEMENT_CONCURRENCY[issuer]
+        :param max_in_flight_per_agent: overrides BULK_DISBURSEMENT_CONCURRENCY_PER_AGENT
+        """
+        concurrency = getattr(settings, "BULK_DISBURSEMENT_CONCURRENCY", {})
+        self.issuer = issuer
+        self.max_in_flight = max(1, max_in_flight or concurrency.get(issuer, DEFAULT_ISSUER_CONCURRENCY))
+        self.max_in_flight_per_agent = max(1, max_in_flight_per_agent or getattr(
+                settings, "BULK_DISBURSEMENT_CONCURRENCY_PER_AGENT", DEFAULT_AGENT_CONCURRENCY
+        ))
+        self.agents = list(dict.fromkeys(agents or []))
+        self._agents_locks = {
+            agent: threading.BoundedSemaphore(self.max_in_flight_per_agent) for agent in self.agents
+        }
+        self._agents_cycle = itertools.cycle(self.agents) if self.agents else None
+        self._cycle_lock = threading.Lock()
+        self._dispatched_uids = set()
+        self._uids_lock = threading.Lock()
+        self.errors = []
+
+    def _acquire_agent(self):
+        """Reserve an idle agent slot, block on the next agent at the round robin if all of them are busy"""
+        if not self.agents:
+            return None
+
+        with self._cycle_lock:
+            candidates = [next(self._agents_cycle) for _ in range(len(self.agents))]
+
+        for agent in candidates:
+            if self._agents_locks[agent].acquire(blocking=False):
+                return agent
+
+        self._agents_locks[candidates[0]].acquire()
+        return candidates[0]
+
+    def _release_agent(self, agent):
+        if agent is not None:
+            self._agents_locks[agent].release()
+
+    def _is_first_dispatch(self, uid):
+        """:return: True if the passed uid has not been dispatched before during this run"""
+        if uid is None:
+            return True
+
+        with self._uids_lock:
+            if str(uid) in self._dispatched_uids:
+                return False
+            self._dispatched_uids.add(str(uid))
+            return True
+
+    @staticmethod
+    def _recipient_uid(recipient):
+        if isinstance(recipient, dict):
+            return recipient.get("uid")
+        return getattr(recipient, "uid", None)
+
+    def _run_one(self, send, recipient):
+        agent = self._acquire_agent()
+        try:
+            return send(recipient, agent)
+        except Exception as err:
+            DISBURSE_LOGGER.debug(
+                    f"[message] [BULK DISBURSEMENT DISPATCHER ERROR] [{self.issuer}] -- "
+                    f"uid: {self._recipient_uid(recipient)}, error: {err.args}"
+            )
+            self.errors.append(err)
+        finally:
+            self._release_agent(agent)
+
+    def _worker(self, pending, send):
+        """Keep sending the pending recipients until the queue is drained"""
+        try:
+            while True:
+                try:
+                    recipient = pending.get_nowait()
+                except queue.Empty:
+                    return
+                self._run_one(send, recipient)
+        finally:
+            # Each worker thread opens its own database connections, close them before the thread exits
+            connections.close_all()
+
+    def dispatch(self, recipients, send):
+        """
+        Send the recipients concurrently within the configured limits and wait for all of them.
+        :param recipients: iterable of recipients dicts/objects, each one should have a `uid`
+        :param send: callable(recipient, agent_msisdn) doing the request and handling its callback
+        :return: number of dispatched recipients
+        """
+        recipients = [
+            recipient for recipient in recipients if self._is_first_dispatch(self._recipient_uid(recipient))
+        ]
+        if not recipients:
+            return 0
+
+        workers = min(self.max_in_flight, len(recipients))
+        if self.agents:
+            workers = min(workers, len(self.agents) * self.max_in_flight_per_agent)
+
+        # Concurrency of 1 keeps the old sequential behaviour at the caller's thread and database connection
+        if workers == 1:
+            for recipient in recipients:
+                self._run_one(send, recipient)
+            return len(recipients)
+
+        pending = queue.SimpleQueue()
+        for recipient in recipients:
+            pending.put(recipient)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"disburse-{self.issuer}") as executor:
+            wait([executor.submit(self._worker, pending, send) for _ in range(workers)])
+
+        return len(recipients)
+
+    def raise_for_errors(self):
+        """Raise the first error met while sending the dispatched recipients if any"""
+        if self.errors:
+            raise self.errors[0]
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Sum, Value, When
+
+from utilities.models.abstract_models import AbstractBaseACHTransactionStatus
+
+from .models import DisbursementData, DisbursementDocData
+
+
+PENDING = "pending"
+SUCCESSFUL = "success"
+FAILED = "failed"
+COUNTERS_BUCKETS = [PENDING, SUCCESSFUL, FAILED]
+
+# Bank cards/wallets statuses counted as failed ones, the rest of the non successful statuses are pending
+FAILED_STATUSES = [
+    AbstractBaseACHTransactionStatus.FAILED,
+    AbstractBaseACHTransactionStatus.RETURNED,
+    AbstractBaseACHTransactionStatus.REJECTED,
+]
+
+
+def e_wallet_record_bucket(is_disbursed, reason):
+    """E-wallets records without a callback reason haven't been disbursed yet"""
+    if is_disbursed:
+        return SUCCESSFUL
+    return PENDING if not reason else FAILED
+
+
+def bank_status_bucket(status):
+    if status == AbstractBaseACHTransactionStatus.SUCCESSFUL:
+        return SUCCESSFUL
+    return FAILED if status in FAILED_STATUSES else PENDING
+
+
+def transaction_bucket(trx):
+    """:return: counters bucket of a disbursement data record, an instant transaction or a bank transaction"""
+    if isinstance(trx, DisbursementData):
+        return e_wallet_record_bucket(trx.is_disbursed, trx.reason)
+    return bank_status_bucket(trx.status)
+
+
+def transaction_doc_id(trx):
+    return trx.doc_id if isinstance(trx, DisbursementData) else getattr(trx, 'document_id', None)
+
+
+def count_transitions(transitions):
+    """
+    Move the documents counters with one update query per document
+    :param transitions: iterable of (doc id, previous bucket or None for the new transactions, new bucket, amount)
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for doc_id, previous_bucket, new_bucket, amount in transitions:
+        if doc_id is None or previous_bucket == new_bucket:
+            continue
+        amount = round(Decimal(amount), 2)
+        if previous_bucket is not None:
+            deltas[doc_id][f"{previous_bucket}_count"] -= 1
+            deltas[doc_id][f"{previous_bucket}_amount"] -= amount
+        deltas[doc_id][f"{new_bucket}_count"] += 1
+        deltas[doc_id][f"{new_bucket}_amount"] += amount
+
+    for doc_id, doc_deltas in deltas.items():
+        DisbursementDocData.objects.filter(doc_id=doc_id).update(**{
+            field: F(field) + delta for field, delta in doc_deltas.items() if delta
+        })
+
+
+def count_created_transactions(objs):
+    """Count the newly created transactions of the documents at their current buckets"""
+    count_transitions((transaction_doc_id(obj), None, transaction_bucket(obj), obj.amount) for obj in objs)
+
+
+def count_status_change(trx, previous_bucket):
+    """
+    Move the counters of the transaction's document after its status is changed,
+        the outdated versions of the bank transactions chains aren't counted
+    """
+    if not getattr(trx, 'is_latest_version', True):
+        return
+    count_transitions([(transaction_doc_id(trx), previous_bucket, transaction_bucket(trx), trx.amount)])
+
+
+def doc_transactions_buckets_queryset(doc_obj):
+    """:return: queryset of the document transactions annotated with their counters buckets"""
+    if doc_obj.is_e_wallet:
+        return doc_obj.disbursement_data.annotate(bucket=Case(
+                When(is_disbursed=True, then=Value(SUCCESSFUL)),
+                When(reason='', then=Value(PENDING)),
+                default=Value(FAILED),
+                output_field=CharField()
+        ))
+
+    if doc_obj.is_bank_wallet:
+        doc_transactions = doc_obj.bank_wallets_transactions.all()
+    else:
+        doc_transactions = doc_obj.bank_cards_transactions.filter(is_latest_version=True)
+    return doc_transactions.annotate(bucket=Case(
+            When(status=AbstractBaseACHTransactionStatus.SUCCESSFUL, then=Value(SUCCESSFUL)),
+            When(status__in=FAILED_STATUSES, then=Value(FAILED)),
+            default=Value(PENDING),
+            output_field=CharField()
+    ))
+
+
+def reset_doc_counters(doc_data):
+    """Zero the counters of a document status copied from another document, its own transactions are counted later"""
+    for bucket in COUNTERS_BUCKETS:
+        setattr(doc_data, f"{bucket}_count", 0)
+        setattr(doc_data, f"{bucket}_amount", Decimal(0))
+
+
+def recompute_doc_counters(doc_obj):
+    """Recompute the counters of the document from its transactions with one grouped aggregation"""
+    if not (doc_obj.is_e_wallet or doc_obj.is_bank_wallet or doc_obj.is_bank_card):
+        return None
+
+    with transaction.atomic():
+        doc_data = DisbursementDocData.objects.select_for_update().filter(doc=doc_obj).first()
+        if doc_data is None:
+            return None
+
+        totals = {
+            row['bucket']: row for row in doc_transactions_buckets_queryset(doc_obj).
+            values('bucket').annotate(number=Count('pk'), total_amount=Sum('amount')).order_by()
+        }
+        for bucket in COUNTERS_BUCKETS:
+            row = totals.get(bucket, {})
+            setattr(doc_data, f"{bucket}_count", row.get('number', 0))
+            setattr(doc_data, f"{bucket}_amount", round(Decimal(row.get('total_amount') or 0), 2))
+        doc_data.save(update_fields=[
+            f"{bucket}_{counter}" for bucket in COUNTERS_BUCKETS for counter in ('count', 'amount')
+        ])
+
+    return doc_data
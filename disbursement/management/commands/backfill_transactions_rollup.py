@@ -0,0 +1,54 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from disbursement.models import DisbursementData
+from disbursement.rollup import REFRESH_DAYS_PER_QUERY, get_stale_rollup_days, refresh_rollup_days
+from instant_cashin.models import InstantTransaction
+
+
+class Command(BaseCommand):
+    help = "Build the transactions daily rollup used by the clients transactions reports"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=str, help="YYYY-MM-DD, defaults to the first disbursed transaction")
+        parser.add_argument('--end-date', type=str, help="YYYY-MM-DD, defaults to today")
+        parser.add_argument(
+                '--rebuild', action='store_true', help="rebuild the already built days too not just the stale ones"
+        )
+
+    @staticmethod
+    def parse_date(value):
+        try:
+            return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError(f"{value} is not a valid YYYY-MM-DD date")
+
+    @staticmethod
+    def first_disbursed_day():
+        first_dates = [
+            model.objects.aggregate(first=Min('disbursed_date'))['first']
+            for model in [DisbursementData, InstantTransaction]
+        ]
+        first_dates = [timezone.localtime(first_date).date() for first_date in first_dates if first_date]
+        return min(first_dates) if first_dates else timezone.localdate()
+
+    def handle(self, *args, **options):
+        start_date = self.parse_date(options['start_date']) if options['start_date'] else self.first_disbursed_day()
+        end_date = self.parse_date(options['end_date']) if options['end_date'] else timezone.localdate()
+
+        if options['rebuild']:
+            days = [start_date + datetime.timedelta(days=index) for index in range((end_date - start_date).days + 1)]
+        else:
+            days = get_stale_rollup_days(start_date, end_date)
+
+        self.stdout.write(self.style.SUCCESS(
+                f"building the rollup of {len(days)} days from {start_date} to {end_date}"
+        ))
+        for index in range(0, len(days), REFRESH_DAYS_PER_QUERY):
+            batch = days[index:index + REFRESH_DAYS_PER_QUERY]
+            refresh_rollup_days(batch)
+            self.stdout.write(f"    {batch[0]} to {batch[-1]} is built")
+        self.stdout.write(self.style.SUCCESS("transactions daily rollup is built"))
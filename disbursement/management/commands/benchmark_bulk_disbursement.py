@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from disbursement.dispatcher import IssuerDispatcher
+from utilities.custom_requests import CustomRequests
+
+
+class StubUIGHandler(BaseHTTPRequestHandler):
+    """Local stub of the central UIG instant disbursement endpoint, answers every request after a fixed latency"""
+
+    latency = 0.1
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+        body = json.dumps({
+            "TXNSTATUS": "200",
+            "TXNID": payload.get("EXTREFNUM", ""),
+            "MESSAGE": "Stub disbursement is done successfully"
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Measure the bulk disbursement dispatch throughput against a local stub UIG server"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=200)
+        parser.add_argument('--agents', type=int, default=5)
+        parser.add_argument('--latency', type=float, default=0.1, help="stub UIG latency in seconds")
+        parser.add_argument('--concurrency', type=int, default=8, help="in flight requests per issuer")
+        parser.add_argument('--per-agent', type=int, default=2, help="in flight requests per agent MSISDN")
+
+    def run_dispatch(self, url, recipients, agents, concurrency, per_agent):
+        callbacks = []
+
+        def send(recipient, agent):
+            payload = {
+                "MSISDN": agent, "MSISDN2": recipient["msisdn"], "AMOUNT": recipient["amount"],
+                "EXTREFNUM": str(recipient["uid"]), "TYPE": "PORCIREQ"
+            }
+            response = CustomRequests().post(url=url, payload=payload)
+            callbacks.append(response.json()["TXNSTATUS"] == "200")
+
+        dispatcher = IssuerDispatcher(
+                'vodafone', agents=agents, max_in_flight=concurrency, max_in_flight_per_agent=per_agent
+        )
+        start = time.perf_counter()
+        dispatcher.dispatch(recipients, send)
+        return time.perf_counter() - start, sum(callbacks)
+
+    def handle(self, *args, **options):
+        StubUIGHandler.latency = options['latency']
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubUIGHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/"
+
+        agents = [f"0100000{index:04d}" for index in range(options['agents'])]
+        recipients = [
+            {"msisdn": f"00201{index:09d}", "amount": 10.0, "txn_id": index, "uid": uuid.uuid4()}
+            for index in range(options['recipients'])
+        ]
+        self.stdout.write(self.style.SUCCESS(
+                f"stub UIG at {url} -- {len(recipients)} recipients, {len(agents)} agents, "
+                f"{options['latency']}s latency"
+        ))
+
+        try:
+            for label, concurrency, per_agent in [
+                ("sequential", 1, 1),
+                ("concurrent", options['concurrency'], options['per_agent']),
+            ]:
+                elapsed, succeeded = self.run_dispatch(url, recipients, agents, concurrency, per_agent)
+                self.stdout.write(self.style.SUCCESS(
+                        f"{label:<12} in flight: {concurrency:<3} per agent: {per_agent:<3} "
+                        f"-- {succeeded}/{len(recipients)} succeeded in {elapsed:.2f}s "
+                        f"({len(recipients) / elapsed:.1f} trx/s)"
+                ))
+        finally:
+            server.shutdown()
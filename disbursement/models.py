@@ -8,9 +8,11 @@ from phonenumber_field.modelfields import PhoneNumberField
 
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from rest_framework import status
@@ -111,6 +113,14 @@ class DisbursementDocData(AbstractBaseDocStatus):
         choices=AbstractBaseDocStatus.STATUS_CHOICES,
         default=AbstractBaseDocStatus.DEFAULT
     )
+    # Per status counters of the document transactions, they're moved by disbursement.doc_counters on every
+    # status transition and can be recomputed by the repair_doc_status_counters command
+    pending_count = models.IntegerField(_("Pending transactions"), default=0)
+    pending_amount = models.DecimalField(_("Pending amount"), max_digits=14, decimal_places=2, default=0)
+    success_count = models.IntegerField(_("Successful transactions"), default=0)
+    success_amount = models.DecimalField(_("Successful amount"), max_digits=14, decimal_places=2, default=0)
+    failed_count = models.IntegerField(_("Failed transactions"), default=0)
+    failed_amount = models.DecimalField(_("Failed amount"), max_digits=14, decimal_places=2, default=0)
     status = None
 
     class Meta:
@@ -121,15 +131,35 @@ class DisbursementDocData(AbstractBaseDocStatus):
         """String representation for disbursement doc data model objects"""
         return f"{self.txn_id} -- {self.doc.id}"
 
+    @property
+    def transactions_count(self):
+        return self.pending_count + self.success_count + self.failed_count
+
+    def success_ratio(self):
+        """:return: percentage of the successful transactions out of the document transactions"""
+        if self.transactions_count == 0:
+            return 0
+
+        success_percentage = (self.success_count * 100) / self.transactions_count
+        return round(success_percentage, 2) if success_percentage != 0 else 0
+
+    def transactions_totals(self):
+        """:return: {status: {number, total_amount}} of the pending, failed and successful transactions"""
+        return {
+            'P': {'number': self.pending_count, 'total_amount': self.pending_amount},
+            'F': {'number': self.failed_count, 'total_amount': self.failed_amount},
+            'S': {'number': self.success_count, 'total_amount': self.success_amount},
+        }
+
     def mark_doc_status_processed_successfully(self):
         """Mark disbursement doc status as processed successfully"""
         self.doc_status = DisbursementDocData.PROCESSED_SUCCESSFULLY
-        self.save()
+        self.save(update_fields=['doc_status', 'updated_at'])
 
     def mark_doc_status_processing_failure(self):
         """Mark disbursement doc status as processing failure"""
         self.doc_status = DisbursementDocData.PROCESSING_FAILURE
-        self.save()
+        self.save(update_fields=['doc_status', 'updated_at'])
 
     def mark_doc_status_disbursed_successfully(self, transaction_id, transaction_status):
         """
@@ -140,12 +170,12 @@ class DisbursementDocData(AbstractBaseDocStatus):
         self.txn_id = transaction_id
         self.txn_status = transaction_status
         self.doc_status = DisbursementDocData.DISBURSED_SUCCESSFULLY
-        self.save()
+        self.save(update_fields=['txn_id', 'txn_status', 'doc_status', 'updated_at'])
 
     def mark_doc_status_disbursement_failure(self):
         """Mark disbursement doc status as disbursement failure"""
         self.doc_status = DisbursementDocData.DISBURSEMENT_FAILURE
-        self.save()
+        self.save(update_fields=['doc_status', 'updated_at'])
 
 
 class DisbursementData(AbstractTimeStamp):
@@ -207,6 +237,11 @@ class DisbursementData(AbstractTimeStamp):
         unique_together = ('doc', 'msisdn')
         index_together = ['doc', 'msisdn']
         get_latest_by = ['id']
+        # The reason isn't indexed as it's a free text, the pending records are the ones without reason
+        indexes = [
+            models.Index(fields=['doc', 'is_disbursed'], name='disb_data_doc_disbursed_idx'),
+            models.Index(fields=['doc'], condition=Q(reason=''), name='disb_data_doc_pending_idx'),
+        ]
 
     def __str__(self):
         return self.msisdn
@@ -232,6 +267,172 @@ class DisbursementData(AbstractTimeStamp):
             return None
 
 
+class DisbursementChunk(AbstractTimeStamp):
+    """
+    Range of a document's disbursement data records disbursed by its own worker task
+    """
+
+    PENDING = 'P'
+    RUNNING = 'R'
+    DONE = 'D'
+    FAILED = 'F'
+    STATUS_CHOICES = [
+        (PENDING, _("Pending")),
+        (RUNNING, _("Running")),
+        (DONE, _("Done")),
+        (FAILED, _("Failed")),
+    ]
+
+    doc = models.ForeignKey(
+        'data.Doc', related_name='disbursement_chunks', on_delete=models.CASCADE)
+    index = models.PositiveIntegerField(_("Index"), default=0)
+    first_record_id = models.PositiveIntegerField(_("First Record ID"))
+    last_record_id = models.PositiveIntegerField(_("Last Record ID"))
+    records_count = models.PositiveIntegerField(_("Records Count"), default=0)
+    processed_count = models.PositiveIntegerField(_("Processed Records Count"), default=0)
+    status = models.CharField(_("status"), max_length=1, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(_("Attempts"), default=0)
+    claimed_at = models.DateTimeField(_("Claimed At"), null=True, blank=True)
+    failure_reason = models.TextField(_("Failure Reason"), blank=True, default='')
+
+    class Meta:
+        verbose_name = "Disbursement Chunk"
+        verbose_name_plural = "Disbursement Chunks"
+        ordering = ('doc', 'index')
+        constraints = [
+            models.UniqueConstraint(fields=['doc', 'index'], name='unique_doc_chunk_index'),
+        ]
+
+    def __str__(self):
+        return f"{self.doc_id} -- [{self.first_record_id}, {self.last_record_id}]"
+
+    @property
+    def id_range(self):
+        return self.first_record_id, self.last_record_id
+
+    def claim(self):
+        """
+        Move the pending chunk to running and count the current attempt using one conditional update,
+            so only one of the tasks dispatched for the same chunk disburses it
+        :return: True if the chunk is claimed by this call
+        """
+        now = timezone.now()
+        claimed = DisbursementChunk.objects.filter(id=self.id, status=self.PENDING).update(
+                status=self.RUNNING, attempts=F('attempts') + 1, claimed_at=now, updated_at=now
+        )
+        if claimed:
+            self.refresh_from_db(fields=['status', 'attempts', 'claimed_at', 'updated_at'])
+        return bool(claimed)
+
+    def mark_done(self, processed_count):
+        """Mark chunk as done with the number of records that has been processed"""
+        self.status = self.DONE
+        self.processed_count = processed_count
+        self.failure_reason = ''
+        self.save(update_fields=['status', 'processed_count', 'failure_reason', 'updated_at'])
+
+    def mark_failed(self, failure_reason):
+        """Mark chunk as failed, it'll be picked again if it has been retried"""
+        self.status = self.FAILED
+        self.failure_reason = failure_reason
+        self.save(update_fields=['status', 'failure_reason', 'updated_at'])
+
+    def reclaim(self, stale_before, claim_expired_before):
+        """
+        Move the failed chunk, the chunk left pending since before stale_before or the chunk claimed since before
+            claim_expired_before back to pending using one conditional update, so only one of the concurrent re-runs
+            dispatches it again
+        :param claim_expired_before: the chunk task time limit ago, a running chunk claimed later may still be
+            being disbursed by its worker
+        :return: True if the chunk is reclaimed by this call
+        """
+        if self.status == self.DONE or \
+                (self.status == self.PENDING and self.updated_at >= stale_before) or \
+                (self.status == self.RUNNING and (self.claimed_at or self.updated_at) >= claim_expired_before):
+            return False
+
+        now = timezone.now()
+        reclaimed = DisbursementChunk.objects.filter(
+                id=self.id, status=self.status, updated_at=self.updated_at
+        ).update(status=self.PENDING, updated_at=now)
+        if reclaimed:
+            self.status, self.updated_at = self.PENDING, now
+        return bool(reclaimed)
+
+
+
+class ChangeProfileBatch(AbstractTimeStamp):
+    """
+    One bulk change profile request of a document's vodafone msisdns, UIG answers it with a batch id
+        then posts the msisdns statuses to the change profile callback of that batch
+    """
+
+    doc = models.ForeignKey(
+        'data.Doc', related_name='change_profile_batches', on_delete=models.CASCADE)
+    batch_id = models.CharField(_("Batch ID"), max_length=16, unique=True)
+    msisdns_count = models.PositiveIntegerField(_("MSISDNs Count"), default=0)
+    doc_batches_count = models.PositiveIntegerField(_("Document Batches Count"), default=1)
+    has_callback = models.BooleanField(_("Has callback?"), default=False)
+    transactions = models.JSONField(_("Callback Transactions"), default=list)
+
+    class Meta:
+        verbose_name = "Change Profile Batch"
+        verbose_name_plural = "Change Profile Batches"
+        ordering = ('doc', 'id')
+
+    def __str__(self):
+        return f"{self.doc_id} -- {self.batch_id}"
+
+
+class DisbursementCallback(AbstractTimeStamp):
+    """
+    Inbox of the raw UIG bulk disbursement callbacks, a callback is acknowledged once it's saved
+        and its transactions are applied later by process_disbursement_callback task
+    """
+
+    PENDING = 'P'
+    PROCESSED = 'D'
+    FAILED = 'F'
+    STATUS_CHOICES = [
+        (PENDING, _("Pending")),
+        (PROCESSED, _("Processed")),
+        (FAILED, _("Failed")),
+    ]
+
+    batch_id = models.CharField(_("Batch ID"), max_length=64, blank=True, default='', db_index=True)
+    payload = models.JSONField(_("Payload"), default=dict)
+    status = models.CharField(_("status"), max_length=1, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveSmallIntegerField(_("Attempts"), default=0)
+    applied_count = models.PositiveIntegerField(_("Applied Transactions Count"), default=0)
+    failure_reason = models.TextField(_("Failure Reason"), blank=True, default='')
+
+    class Meta:
+        verbose_name = "Disbursement Callback"
+        verbose_name_plural = "Disbursement Callbacks"
+        ordering = ('id',)
+
+    def __str__(self):
+        return f"{self.batch_id} -- {self.get_status_display()}"
+
+    @property
+    def transactions(self):
+        return self.payload.get('transactions') or []
+
+    def mark_processed(self, applied_count):
+        """Mark callback as processed with the number of its transactions that haven't been applied before"""
+        self.status = self.PROCESSED
+        self.attempts += 1
+        self.applied_count = applied_count
+        self.failure_reason = ''
+        self.save(update_fields=['status', 'attempts', 'applied_count', 'failure_reason', 'updated_at'])
+
+    def mark_failed(self, failure_reason):
+        """Mark callback as failed, it'll be picked again by process_pending_disbursement_callbacks task"""
+        self.status = self.FAILED
+        self.attempts += 1
+        self.failure_reason = failure_reason
+        self.save(update_fields=['status', 'attempts', 'failure_reason', 'updated_at'])
+
 class BankTransaction(AbstractTimeStamp,
                       AbstractBaseACHTransactionStatus,
                       AbstractTransactionCategory,
@@ -411,12 +612,36 @@ class BankTransaction(AbstractTimeStamp,
         null=True,
         blank=True
     )
+    # Every status change is written as a new version of the transaction chain, only its last version is flagged
+    is_latest_version = models.BooleanField(_("Is latest version?"), default=True)
 
     class Meta:
         verbose_name = 'Bank Transaction'
         verbose_name_plural = 'Bank Transactions'
         get_latest_by = '-created_at'
         ordering = ['-created_at', '-updated_at']
+        indexes = [
+            models.Index(
+                    fields=['parent_transaction'], condition=Q(is_latest_version=True),
+                    name='bank_trx_latest_chain_idx'
+            ),
+            models.Index(
+                    fields=['document'], condition=Q(is_latest_version=True), name='bank_trx_latest_document_idx'
+            ),
+            models.Index(
+                    fields=['user_created', 'created_at'], condition=Q(is_latest_version=True),
+                    name='bank_trx_latest_user_idx'
+            ),
+            models.Index(
+                    fields=['disbursed_date'], condition=Q(is_latest_version=True),
+                    name='bank_trx_latest_disbursed_idx'
+            ),
+            models.Index(
+                    fields=['created_at', 'status'], condition=Q(is_latest_version=True),
+                    name='bank_trx_latest_created_idx'
+            ),
+            models.Index(fields=['client_transaction_reference'], name='bank_trx_client_reference_idx'),
+        ]
 
     def __str__(self):
         return str(self.transaction_id)
@@ -435,40 +660,45 @@ class BankTransaction(AbstractTimeStamp,
         self.transaction_status_code = code if code else status.HTTP_500_INTERNAL_SERVER_ERROR
         self.transaction_status_description = description if description else INTERNAL_ERROR
 
+    def save_status(self, new_status):
+        """Save the new status and move its document counters at the same database transaction"""
+        from .doc_counters import bank_status_bucket, count_status_change          # Circular import
+
+        previous_bucket = bank_status_bucket(self.status)
+        self.status = new_status
+        with transaction.atomic():
+            self.save()
+            count_status_change(self, previous_bucket)
+
     def mark_returned(self, status_code, status_description):
         """Mark transaction status as returned"""
         self.update_status_code_and_description(
             status_code, status_description)
-        self.status = self.RETURNED
-        self.save()
+        self.save_status(self.RETURNED)
 
     def mark_successful(self, status_code, status_description):
         """Mark transaction status as successful"""
         self.update_status_code_and_description(
             status_code, status_description)
-        self.status = self.SUCCESSFUL
-        self.save()
+        self.save_status(self.SUCCESSFUL)
 
     def mark_rejected(self, status_code, status_description):
         """Mark transaction status as rejected"""
         self.update_status_code_and_description(
             status_code, status_description)
-        self.status = self.REJECTED
-        self.save()
+        self.save_status(self.REJECTED)
 
     def mark_failed(self, status_code, status_description):
         """Mark transaction status as failed"""
         self.update_status_code_and_description(
             status_code, status_description)
-        self.status = self.FAILED
-        self.save()
+        self.save_status(self.FAILED)
 
     def mark_pending(self, status_code, status_description):
         """Mark transaction status as pending"""
         self.update_status_code_and_description(
             status_code, status_description)
-        self.status = self.PENDING
-        self.save()
+        self.save_status(self.PENDING)
 
 
 @receiver(post_save, sender=BankTransaction)
@@ -491,3 +721,70 @@ class RemainingAmounts(AbstractTimeStamp):
     class Meta:
         verbose_name = _("Remaining amount")
         verbose_name_plural = _("Remaining amounts")
+
+
+class TransactionsDailyRollup(models.Model):
+    """
+    Transactions aggregated per day, root admin, issuer and status for the clients transactions reports,
+        wallets rows are built from DisbursementData and instant rows from InstantTransaction
+    """
+
+    WALLETS = 'W'
+    INSTANT = 'I'
+    SOURCE_CHOICES = [
+        (WALLETS, _("Wallets bulk disbursement")),
+        (INSTANT, _("Instant disbursement")),
+    ]
+
+    SUCCESSFUL = 'S'
+    PENDING = 'P'
+    FAILED = 'F'
+
+    day = models.DateField(_("Day"))
+    root = models.ForeignKey(
+            settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions_rollups'
+    )
+    super_admin = models.ForeignKey(
+            settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, related_name='+'
+    )
+    source = models.CharField(_("Source"), max_length=1, choices=SOURCE_CHOICES)
+    issuer = models.CharField(_("Issuer"), max_length=16, blank=True, default='')
+    status = models.CharField(_("Status"), max_length=1)
+    is_internal_error = models.BooleanField(
+            _("Is internal error?"),
+            default=False,
+            help_text=_("Instant transactions ended with 500 or 424 status codes")
+    )
+    transactions_count = models.PositiveIntegerField(_("Transactions count"), default=0)
+    total_amount = models.FloatField(_("Total amount"), default=0.0)
+    total_fees = models.FloatField(_("Total fees"), default=0.0)
+    total_vat = models.FloatField(_("Total vat"), default=0.0)
+
+    class Meta:
+        verbose_name = "Transactions Daily Rollup"
+        verbose_name_plural = "Transactions Daily Rollups"
+        indexes = [
+            models.Index(fields=['super_admin', 'day']),
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} -- {self.root_id} -- {self.source} {self.issuer} {self.status}"
+
+
+class TransactionsRollupDay(models.Model):
+    """
+    Build state of the transactions daily rollup of one day, a day is rebuilt before being reported
+        if it has never been built or if it has been marked stale after its last build
+    """
+
+    day = models.DateField(_("Day"), unique=True)
+    refreshed_at = models.DateTimeField(_("Refreshed At"), null=True, blank=True)
+    marked_stale_at = models.DateTimeField(_("Marked Stale At"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Transactions Rollup Day"
+        verbose_name_plural = "Transactions Rollup Days"
+
+    def __str__(self):
+        return f"{self.day}"
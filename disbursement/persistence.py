@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .doc_counters import count_created_transactions, count_transitions, e_wallet_record_bucket
+from .models import BankTransaction, DisbursementData
+
+
+DEFAULT_BULK_CREATE_BATCH_SIZE = 1000
+
+
+def get_bulk_create_batch_size(batch_size=None):
+    return batch_size or getattr(settings, "TRANSACTIONS_BULK_CREATE_BATCH_SIZE", DEFAULT_BULK_CREATE_BATCH_SIZE)
+
+
+def link_parent_transactions(bank_transactions, batch_size=None):
+    """
+    Point the parent transaction of the passed bank transactions to themselves if it's empty,
+        does what update_parent_transaction_if_its_empty post_save handler does for the bulk created objects
+        using one update query per batch instead of one save per object
+    """
+    orphans = [trx for trx in bank_transactions if trx.parent_transaction_id is None]
+    batch_size = get_bulk_create_batch_size(batch_size)
+
+    for start in range(0, len(orphans), batch_size):
+        batch = orphans[start:start + batch_size]
+        BankTransaction.objects.filter(id__in=[trx.id for trx in batch], parent_transaction__isnull=True).\
+            update(parent_transaction_id=F("id"))
+        for trx in batch:
+            trx.parent_transaction_id = trx.id
+
+
+def create_bank_transaction_version(previous_version, **fields):
+    """
+    Write a new version of the passed bank transaction's chain and move the chain's latest version flag to it
+        at the same database transaction
+    :param previous_version: the current version of the chain, its flag is cleared in memory too
+    :param fields: fields of the new version, its parent transaction is the chain's first transaction
+    :return: the created bank transaction
+    """
+    chain_id = previous_version.parent_transaction_id or previous_version.id
+    with transaction.atomic():
+        # Lock the first transaction of the chain so its concurrent new versions are written one at a time
+        list(BankTransaction.objects.select_for_update().filter(id=chain_id).values_list('id', flat=True))
+        BankTransaction.objects.filter(parent_transaction_id=chain_id, is_latest_version=True).\
+            update(is_latest_version=False)
+        new_version = BankTransaction.objects.create(parent_transaction_id=chain_id, is_latest_version=True, **fields)
+
+    previous_version.is_latest_version = False
+    return new_version
+
+
+def bulk_create_transactions(model, objs, budget=None, fees_issuers=None, amounts=None, batch_size=None):
+    """
+    Write transactions objects with batched bulk_create instead of saving them one by one.
+    :param model: DisbursementData, InstantTransaction or BankTransaction
+    :param objs: unsaved objects of the model
+    :param budget: budget used to price the objects, fees and vat are kept as they're if it's not passed
+    :param fees_issuers: fees issuer of every object, ex: vodafone, bank_wallet, bank_card
+    :param amounts: amounts to be priced if they're more precise than the objects amounts
+    :param batch_size: overrides TRANSACTIONS_BULK_CREATE_BATCH_SIZE
+    :return: the created objects
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+
+    if budget is not None and fees_issuers is not None:
+        amounts = [obj.amount for obj in objs] if amounts is None else amounts
+        fees_list, vat_list = budget.calculate_fees_and_vat_bulk(amounts, fees_issuers)
+        for obj, fees, vat in zip(objs, fees_list, vat_list):
+            obj.fees, obj.vat = fees, vat
+
+    batch_size = get_bulk_create_batch_size(batch_size)
+    with transaction.atomic():
+        objs = model.objects.bulk_create(objs, batch_size=batch_size)
+        if model is BankTransaction:
+            link_parent_transactions(objs, batch_size)
+        count_created_transactions(objs)
+
+    return objs
+
+
+def apply_disbursement_callback(callback_transactions, batch_size=None):
+    """
+    Apply the statuses of a bulk disbursement callback to its records, the records are loaded with one query
+        and written with batched bulk updates instead of an update and a select per callback transaction,
+        the status counters of their doc are moved at the same database transaction
+    :param callback_transactions: UIG callback transactions, dicts of id, status, description and mpg_rrn
+    :param batch_size: overrides TRANSACTIONS_BULK_CREATE_BATCH_SIZE
+    :return: (doc of the records, total disbursed amount, disbursed records count), doc is None if no record is found,
+        only the records moving to disbursed by this callback are totalled so a replayed callback is never debited twice
+    :raises DisbursementData.DoesNotExist: if a successful callback transaction has no record, nothing is applied then
+    """
+    from .rollup import mark_rollup_days_stale         # Circular import
+
+    statuses = {}
+    for data in callback_transactions:
+        # for None cases and not nullable reference_id field
+        ref_id = data.get('mpg_rrn', 'None')
+        statuses[int(data['id'])] = (
+            data['status'] == '0', data.get('description', 'No Description found'), "None" if ref_id is None else ref_id
+        )
+
+    with transaction.atomic():
+        records = list(
+                DisbursementData.objects.select_for_update().
+                filter(id__in=list(statuses)).only('id', 'amount', 'doc_id', 'is_disbursed', 'reason', 'disbursed_date')
+        )
+        found_ids = {record.id for record in records}
+        missing_ids = [
+            record_id for record_id, (is_disbursed, _, _) in statuses.items()
+            if is_disbursed and record_id not in found_ids
+        ]
+        if missing_ids:
+            raise DisbursementData.DoesNotExist(f"Disbursed records {missing_ids} are not found")
+
+        total_disbursed_amount, disbursed_count, transitions = 0, 0, []
+        for record in records:
+            was_disbursed = record.is_disbursed
+            previous_bucket = e_wallet_record_bucket(record.is_disbursed, record.reason)
+            record.is_disbursed, record.reason, record.reference_id = statuses[record.id]
+            new_bucket = e_wallet_record_bucket(record.is_disbursed, record.reason)
+            transitions.append((record.doc_id, previous_bucket, new_bucket, record.amount))
+            # If the callback status is 0, it means this record amount is disbursed successfully
+            if record.is_disbursed and not was_disbursed:
+                disbursed_count += 1
+                total_disbursed_amount += round(Decimal(record.amount), 2)
+
+        DisbursementData.objects.bulk_update(
+                records, ['is_disbursed', 'reason', 'reference_id'], batch_size=get_bulk_create_batch_size(batch_size)
+        )
+        count_transitions(transitions)
+
+    # Bulk updates don't send post_save so the rollup days of the updated records are marked here
+    mark_rollup_days_stale({
+        timezone.localtime(record.disbursed_date).date() if timezone.is_aware(record.disbursed_date)
+        else record.disbursed_date.date()
+        for record in records if record.disbursed_date is not None
+    })
+
+    return (records[0].doc if records else None), total_disbursed_amount, disbursed_count
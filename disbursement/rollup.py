@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import transaction
+from django.db.models import (BooleanField, Case, CharField, Count, F, FloatField, IntegerField, Q, Sum, Value,
+                              When)
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.models import AbstractBaseStatus
+from instant_cashin.models import InstantTransaction
+
+from .models import DisbursementData, TransactionsDailyRollup, TransactionsRollupDay
+from .persistence import get_bulk_create_batch_size
+
+
+# Today and yesterday are rebuilt whenever they're reported as callbacks and inquiries still update their transactions
+OPEN_DAYS = 2
+# Max number of days aggregated by one query while refreshing the rollup
+REFRESH_DAYS_PER_QUERY = 31
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _days_runs(days, max_run_length=REFRESH_DAYS_PER_QUERY):
+    """Group the passed days into (first day, last day) runs of consecutive days"""
+    runs = []
+    for day in sorted(set(days)):
+        if runs and day - runs[-1][1] == datetime.timedelta(days=1) and (day - runs[-1][0]).days < max_run_length:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def _wallets_rollup_rows(start, end):
+    """DisbursementData disbursed within [start, end) aggregated per day, root, issuer and status"""
+    return DisbursementData.objects.filter(
+        disbursed_date__gte=start, disbursed_date__lt=end, doc__disbursed_by__isnull=False
+    ).annotate(
+        rollup_status=Case(
+            When(is_disbursed=True, then=Value(TransactionsDailyRollup.SUCCESSFUL)),
+            When(~Q(reason__exact=''), then=Value(TransactionsDailyRollup.FAILED)),
+            default=Value(''),
+            output_field=CharField()
+        )
+    ).exclude(rollup_status='').annotate(
+        rollup_day=TruncDate('disbursed_date'),
+        rollup_root=F('doc__disbursed_by__root'),
+        rollup_super_admin=F('doc__disbursed_by__root__client__creator'),
+    ).filter(rollup_root__isnull=False).values(
+        'rollup_day', 'rollup_root', 'rollup_super_admin', 'issuer', 'rollup_status'
+    ).annotate(
+        rollup_count=Count('id'), rollup_total=Sum('amount'), rollup_fees=Sum('fees'), rollup_vat=Sum('vat')
+    ).order_by()
+
+
+def _instant_rollup_rows(start, end):
+    """InstantTransaction disbursed within [start, end) aggregated per day, root, issuer and status"""
+    return InstantTransaction.objects.filter(
+        disbursed_date__gte=start, disbursed_date__lt=end,
+        status__in=[AbstractBaseStatus.SUCCESSFUL, AbstractBaseStatus.PENDING, AbstractBaseStatus.FAILED]
+    ).annotate(
+        rollup_day=TruncDate('disbursed_date'),
+        rollup_root=Case(
+            When(from_user__isnull=False, then=F('from_user__root')),
+            default=F('document__disbursed_by__root')
+        ),
+        rollup_super_admin=Case(
+            When(from_user__isnull=False, then=F('from_user__root__client__creator')),
+            default=F('document__disbursed_by__root__client__creator')
+        ),
+        rollup_internal_error=Case(
+            When(transaction_status_code__in=['500', '424'], then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField()
+        ),
+    ).filter(rollup_root__isnull=False).values(
+        'rollup_day', 'rollup_root', 'rollup_super_admin', 'issuer_type', 'status', 'rollup_internal_error'
+    ).annotate(
+        rollup_count=Count('uid'), rollup_total=Sum('amount'), rollup_fees=Sum('fees'), rollup_vat=Sum('vat')
+    ).order_by()
+
+
+def _build_rollup_objects(start, end):
+    for row in _wallets_rollup_rows(start, end):
+        yield TransactionsDailyRollup(
+            day=row['rollup_day'], root_id=row['rollup_root'], super_admin_id=row['rollup_super_admin'],
+            source=TransactionsDailyRollup.WALLETS, issuer=row['issuer'], status=row['rollup_status'],
+            transactions_count=row['rollup_count'], total_amount=row['rollup_total'] or 0,
+            total_fees=row['rollup_fees'] or 0, total_vat=row['rollup_vat'] or 0
+        )
+
+    for row in _instant_rollup_rows(start, end):
+        yield TransactionsDailyRollup(
+            day=row['rollup_day'], root_id=row['rollup_root'], super_admin_id=row['rollup_super_admin'],
+            source=TransactionsDailyRollup.INSTANT, issuer=row['issuer_type'], status=row['status'],
+            is_internal_error=row['rollup_internal_error'], transactions_count=row['rollup_count'],
+            total_amount=row['rollup_total'] or 0, total_fees=row['rollup_fees'] or 0, total_vat=row['rollup_vat'] or 0
+        )
+
+
+def refresh_rollup_days(days):
+    """
+    Rebuild the transactions daily rollup of the passed days from the transactions tables,
+        the days rows are locked while being rebuilt so the concurrent refreshes of the same days run one by one
+    :return: number of the rebuilt days
+    """
+    runs = _days_runs(days)
+
+    for first_day, last_day in runs:
+        run_days = [first_day + datetime.timedelta(days=index) for index in range((last_day - first_day).days + 1)]
+
+        with transaction.atomic():
+            TransactionsRollupDay.objects.bulk_create(
+                    [TransactionsRollupDay(day=day) for day in run_days], ignore_conflicts=True
+            )
+            list(TransactionsRollupDay.objects.select_for_update().filter(day__range=(first_day, last_day)))
+
+            refreshed_at = timezone.now()
+            objs = list(_build_rollup_objects(_day_start(first_day), _day_start(last_day + datetime.timedelta(days=1))))
+            TransactionsDailyRollup.objects.filter(day__range=(first_day, last_day)).delete()
+            TransactionsDailyRollup.objects.bulk_create(objs, batch_size=get_bulk_create_batch_size())
+            TransactionsRollupDay.objects.filter(day__range=(first_day, last_day)).update(refreshed_at=refreshed_at)
+
+    return sum((last_day - first_day).days + 1 for first_day, last_day in runs)
+
+
+def get_stale_rollup_days(first_day, last_day):
+    """
+    :return: days within the passed range which are open, never built or marked stale after their last build
+    """
+    today = timezone.localdate()
+    last_day = min(last_day, today)
+    if last_day < first_day:
+        return []
+
+    fresh_days = set(TransactionsRollupDay.objects.filter(
+        day__range=(first_day, last_day), refreshed_at__isnull=False
+    ).filter(
+        Q(marked_stale_at__isnull=True) | Q(marked_stale_at__lt=F('refreshed_at'))
+    ).values_list('day', flat=True))
+    open_from = today - datetime.timedelta(days=OPEN_DAYS - 1)
+
+    days = [first_day + datetime.timedelta(days=index) for index in range((last_day - first_day).days + 1)]
+    return [day for day in days if day >= open_from or day not in fresh_days]
+
+
+def mark_rollup_days_stale(days):
+    """
+    Mark the rollup of the passed days to be rebuilt before they're reported again,
+        the open days are always rebuilt so they're skipped to keep the transactions updates cheap
+    """
+    open_from = timezone.localdate() - datetime.timedelta(days=OPEN_DAYS - 1)
+    closed_days = {day for day in days if day is not None and day < open_from}
+    if closed_days:
+        TransactionsRollupDay.objects.filter(day__in=closed_days).update(marked_stale_at=timezone.now())
+
+
+def transactions_rollup(superadmins, first_day, last_day):
+    """
+    Rollup rows of the clients of the passed super admins within the passed aware datetimes range,
+        the stale days of the range are rebuilt first
+    """
+    first_day, last_day = timezone.localtime(first_day).date(), timezone.localtime(last_day).date()
+    refresh_rollup_days(get_stale_rollup_days(first_day, last_day))
+
+    return TransactionsDailyRollup.objects.filter(day__range=(first_day, last_day), super_admin__in=superadmins)
+
+
+def aggregate_rollup_per_admin_and_issuer(qs, vf_identifier=False, invoices=False):
+    """
+    Sum the rollup rows per root admin username and issuer as the reports aggregate the transactions
+    :param vf_identifier: group by the vodafone facilitator identifier of the admin too
+    :param invoices: failed transactions are excluded from the total and count but not from the fees and vat
+    :return: values queryset of admin, issuer, total, count, fees and vat
+    """
+    values = ['admin', 'issuer', 'vf_identifier'] if vf_identifier else ['admin', 'issuer']
+    qs = qs.annotate(admin=F('root__username'))
+    if vf_identifier:
+        qs = qs.annotate(vf_identifier=F('root__client__vodafone_facilitator_identifier'))
+
+    if invoices:
+        total = Sum(Case(
+            When(status=TransactionsDailyRollup.FAILED, then=Value(0.0)),
+            default=F('total_amount'),
+            output_field=FloatField()
+        ))
+        count = Sum(Case(
+            When(status=TransactionsDailyRollup.FAILED, then=Value(0)),
+            default=F('transactions_count'),
+            output_field=IntegerField()
+        ))
+    else:
+        total, count = Sum('total_amount'), Sum('transactions_count')
+
+    return qs.values(*values).annotate(
+        total=total, count=count, fees=Sum('total_fees'), vat=Sum('total_vat')
+    ).order_by(*values)
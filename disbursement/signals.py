@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from instant_cashin.models import InstantTransaction
+
+from .agent_pool import invalidate_agent_pool
+from .models import Agent, DisbursementData
+from .rollup import mark_rollup_days_stale
+
+
+@receiver(post_save, sender=DisbursementData)
+@receiver(post_save, sender=InstantTransaction)
+def mark_transaction_rollup_day_stale(sender, instance, **kwargs):
+    """Rebuild the daily rollup of the transaction's day if its status changed after the day has been rolled up"""
+    disbursed_date = instance.disbursed_date
+    if disbursed_date is None:
+        return
+
+    if timezone.is_aware(disbursed_date):
+        disbursed_date = timezone.localtime(disbursed_date)
+    mark_rollup_days_stale([disbursed_date.date()])
+
+
+@receiver(post_save, sender=Agent)
+@receiver(post_delete, sender=Agent)
+def invalidate_wallet_provider_agent_pool(sender, instance, **kwargs):
+    """
+    Drop the cached agents pool of the wallet provider whenever one of its agents changes, once the change is
+        committed so no process caches the agents being replaced under the new pool version
+    """
+    wallet_provider_id = instance.wallet_provider_id
+    transaction.on_commit(lambda: invalidate_agent_pool(wallet_provider_id))
@@ -1,14 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-import random
 import datetime
 import logging
 from decimal import Decimal
 
-import requests
-from celery import Task
+from celery import Task, group
 
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from rest_framework import status
@@ -16,20 +15,28 @@ from rest_framework import status
 from data.decorators import respects_language
 from data.models import Doc
 from data.tasks import handle_change_profile_callback
+from instant_cashin.async_disbursement import ACCEPTED_STATUS_CODE, PROCESSING_STATUS_CODE
 from instant_cashin.models import AmanTransaction
 from instant_cashin.models.instant_transactions import InstantTransaction
 from instant_cashin.specific_issuers_integrations import AmanChannel, BankTransactionsChannel
 from instant_cashin.utils import get_from_env
 from payouts.settings.celery import app
 from smpp.smpp_interface import send_sms
+from users.hierarchy import HierarchyResolver
 from users.models import User
+from utilities import upstream
 from utilities.functions import custom_budget_logger, get_value_from_env
 from django.conf import settings
 from utilities.models import VodafoneBalance
 import environ
 
 
-from .models import DisbursementData, DisbursementDocData, BankTransaction
+from .dispatcher import IssuerDispatcher
+from .callbacks import process_inbox_callback
+from .doc_counters import count_status_change, transaction_bucket
+from .models import DisbursementCallback, DisbursementChunk, DisbursementData, DisbursementDocData, BankTransaction
+from .persistence import apply_disbursement_callback
+from .rollup import get_stale_rollup_days, refresh_rollup_days
 
 CH_PROFILE_LOGGER = logging.getLogger("change_fees_profile")
 DISBURSE_LOGGER = logging.getLogger("disburse")
@@ -38,6 +45,12 @@ VODAFONE_UNKNWON_INQ = logging.getLogger("vodafone_inq_by_ref")
 WALLET_API_LOGGER = logging.getLogger("wallet_api")
 env = environ.Env()
 
+DEFAULT_CHUNK_STALE_AFTER = 3600
+DEFAULT_CHUNK_TIME_LIMIT = 3600
+
+# Async instant transactions keep their reserved amount until their worker settles them, they're never inquired about
+ASYNC_RESERVED_STATUS_CODES = [ACCEPTED_STATUS_CODE, PROCESSING_STATUS_CODE]
+
 
 
 
@@ -47,12 +60,16 @@ class BulkDisbursementThroughOneStepCashin(Task):
     """
 
     @staticmethod
-    def separate_recipients(doc_id):
+    def separate_recipients(doc_id, id_range=None):
         """
         :param doc_id: Id of the document being disbursed
+        :param id_range: optional (first id, last id) of the records of one chunk of the document
         :return: tuple of issuers' specific recipients
         """
-        recipients = DisbursementData.objects.filter(doc_id=doc_id)
+        # Records with disbursed date are already sent, skip them so a re-run never disburses the same uid twice
+        recipients = DisbursementData.objects.filter(doc_id=doc_id, disbursed_date__isnull=True)
+        if id_range:
+            recipients = recipients.filter(id__range=id_range)
 
         vf_recipients = recipients.filter(issuer__in=['vodafone', 'default']). \
             extra(select={'msisdn': 'msisdn', 'amount': 'amount', 'txn_id': 'id', 'uid': 'uid'}). \
@@ -66,8 +83,12 @@ class BulkDisbursementThroughOneStepCashin(Task):
 
         return vf_recipients, list(etisalat_recipients), list(aman_recipients)
 
-    def handle_disbursement_callback(self, recipient, callback, issuer):
-        """Handle disbursement callback depending on issuer based recipients"""
+    def handle_disbursement_callback(self, recipient, callback, issuer, hierarchy):
+        """
+        Handle disbursement callback depending on issuer based recipients, the disbursed state of the record is
+            committed before its budget debit so a failed debit never leaves a paid record to be sent again
+        :param hierarchy: HierarchyResolver of the current run
+        """
         try:
             trx_callback_status = status.HTTP_424_FAILED_DEPENDENCY
             reference_id = recipient["txn_id"]
@@ -92,51 +113,67 @@ class BulkDisbursementThroughOneStepCashin(Task):
                     send_sms(f"+{str(recipient['msisdn'])[2:]}", trx_callback_msg, "PayMob")
                     reference_id = callback.data["cashing_details"]["bill_reference"]
 
-            disbursement_data_record = DisbursementData.objects.get(id=recipient["txn_id"])
+            disbursement_data_record = DisbursementData.objects.select_related('doc__owner').\
+                get(id=recipient["txn_id"])
+            previous_bucket = transaction_bucket(disbursement_data_record)
             disbursement_data_record.reference_id = reference_id
-            doc_obj = disbursement_data_record.doc
+            root = hierarchy.resolve(disbursement_data_record.doc.owner).root
             balance_before = balance_after = 0
-            if doc_obj.owner.root.has_custom_budget:
-                balance_before = balance_after = doc_obj.owner.root.budget.get_current_balance()
+            if root.has_custom_budget:
+                balance_before = balance_after = root.budget.get_current_balance()
 
             if trx_callback_status == "200":
                 disbursement_data_record.is_disbursed = True
                 disbursement_data_record.reason = trx_callback_msg
-                if doc_obj.owner.root.has_custom_budget:
-                    balance_after = doc_obj.owner.root.budget.update_disbursed_amount_and_current_balance(
-                        disbursement_data_record.amount, issuer
-                    )
             else:
                 disbursement_data_record.is_disbursed = False
                 if not trx_callback_status in ["501"]:
                     disbursement_data_record.reason = trx_callback_status
             disbursement_data_record.disbursed_date=datetime.datetime.now()
+        except (DisbursementData.DoesNotExist, Exception):
+            return False
+
+        with transaction.atomic():
             disbursement_data_record.balance_before = balance_before
             disbursement_data_record.balance_after = balance_after
             disbursement_data_record.save()
-            if issuer == "aman":
-                AmanTransaction.objects.create(transaction=disbursement_data_record, bill_reference=reference_id)
-            return True
-        except (DisbursementData.DoesNotExist, Exception):
-            return False
+            count_status_change(disbursement_data_record, previous_bucket)
 
-    def handle_disbursement_callback_deposit(self, inst_obj, callback):
+        if disbursement_data_record.is_disbursed and root.has_custom_budget:
+            try:
+                disbursement_data_record.balance_after = root.budget.update_disbursed_amount_and_current_balance(
+                    disbursement_data_record.amount, issuer
+                )
+                disbursement_data_record.save(update_fields=['balance_after', 'updated_at'])
+            except Exception as err:
+                # The record is already paid, it's left disbursed and its amount is debited at the reconciliation
+                DISBURSE_LOGGER.error(
+                        f"[message] [BULK DISBURSEMENT BUDGET DEBIT ERROR - NEEDS RECONCILIATION] [{root.username}] "
+                        f"-- record: {disbursement_data_record.id}, amount: {disbursement_data_record.amount}, "
+                        f"issuer: {issuer}, error: {err.args}"
+                )
+
+        if issuer == "aman":
+            AmanTransaction.objects.create(transaction=disbursement_data_record, bill_reference=reference_id)
+        return True
+
+    def handle_disbursement_callback_deposit(self, inst_obj, callback, hierarchy):
         """Handle disbursement callback depending on issuer based recipients"""
         try:
             callback_json = callback.json()
             trx_callback_status = callback_json["TXNSTATUS"]
             reference_id = callback_json["TXNID"]
             trx_callback_msg = callback_json["MESSAGE"]
-            doc_obj = inst_obj.document
+            root = hierarchy.resolve(inst_obj.document.owner).root
             balance_before = balance_after = 0
-            if doc_obj.owner.root.has_custom_budget:
-                balance_before = balance_after = doc_obj.owner.root.budget.get_current_balance()
+            if root.has_custom_budget:
+                balance_before = balance_after = root.budget.get_current_balance()
 
             if trx_callback_status == "200":
                 inst_obj.is_disbursed = True
                 inst_obj.mark_successful("200", trx_callback_msg)
-                if doc_obj.owner.root.has_custom_budget:
-                    balance_after = doc_obj.owner.root.budget.update_disbursed_amount_and_current_balance(
+                if root.has_custom_budget:
+                    balance_after = root.budget.update_disbursed_amount_and_current_balance(
                         inst_obj.amount, inst_obj.issuer_type
                     )
             else:
@@ -151,7 +188,7 @@ class BulkDisbursementThroughOneStepCashin(Task):
             inst_obj.mark_failed(500, "External Error")
             DISBURSE_LOGGER.debug(f"[message] [HANDLE DISB CALLBACK DEPOSIT -- {err.args}")
 
-    def disburse_for_etisalat(self, checker, superadmin, ets_recipients):
+    def disburse_for_etisalat(self, checker, superadmin, ets_recipients, hierarchy):
         """Disburse for etisalat specific recipients"""
         from .api.views import DisburseAPIView          # Circular import
 
@@ -159,17 +196,20 @@ class BulkDisbursementThroughOneStepCashin(Task):
         ets_pin = get_value_from_env(f"{superadmin.username}_ETISALAT_PIN")
         _, ets_agents = DisburseAPIView.prepare_agents_list(provider=checker.root, raw_pin="000000")
 
-        for recipient in ets_recipients:
+        def send(recipient, agent):
             ets_payload, ets_log_payload = superadmin.vmt.accumulate_instant_disbursement_payload(
-                random.choice(ets_agents), recipient['msisdn'], recipient['amount'],
-                ets_pin, 'etisalat', recipient['uid']
+                agent, recipient['msisdn'], recipient['amount'], ets_pin, 'etisalat', recipient['uid']
             )
             ets_callback = DisburseAPIView.disburse_for_recipients(
                 wallets_env_url, ets_payload, checker.username, ets_log_payload
             )
-            self.handle_disbursement_callback(recipient, ets_callback, issuer='etisalat')
+            self.handle_disbursement_callback(recipient, ets_callback, 'etisalat', hierarchy)
 
-    def disburse_for_vodafone(self, checker, superadmin, vf_recipients, vf_pin, deposit=False):
+        dispatcher = IssuerDispatcher('etisalat', agents=ets_agents)
+        dispatcher.dispatch(ets_recipients, send)
+        dispatcher.raise_for_errors()
+
+    def disburse_for_vodafone(self, checker, superadmin, vf_recipients, vf_pin, hierarchy, deposit=False):
         """Disburse for vodafone specific recipients"""
         from .api.views import DisburseAPIView          # Circular import
 
@@ -179,9 +219,9 @@ class BulkDisbursementThroughOneStepCashin(Task):
         vf_agents, _ = DisburseAPIView.prepare_agents_list(provider=checker.root, raw_pin=vf_pin)
         smsc_sender_name = checker.root.client.smsc_sender_name
 
-        for recipient in vf_recipients:
+        def send(recipient, agent):
             vf_payload, vf_log_payload = superadmin.vmt.accumulate_instant_disbursement_payload(
-                random.choice(vf_agents)['MSISDN'], recipient['msisdn'], recipient['amount'],
+                agent, recipient['msisdn'], recipient['amount'],
                 vf_pin, 'vodafone', recipient['uid'], smsc_sender_name
             )
             if deposit:
@@ -190,7 +230,11 @@ class BulkDisbursementThroughOneStepCashin(Task):
             vf_callback = DisburseAPIView.disburse_for_recipients(
                 wallets_env_url, vf_payload, checker.username, vf_log_payload, txn_id=recipient["txn_id"]
             )
-            self.handle_disbursement_callback(recipient, vf_callback, issuer='vodafone')
+            self.handle_disbursement_callback(recipient, vf_callback, 'vodafone', hierarchy)
+
+        dispatcher = IssuerDispatcher('vodafone', agents=[agent['MSISDN'] for agent in vf_agents])
+        dispatcher.dispatch(vf_recipients, send)
+        dispatcher.raise_for_errors()
 
     def aman_api_authentication_params(self, aman_channel_object):
         """Handle retrieving token/merchant_id from api_authentication method of aman channel"""
@@ -203,12 +247,13 @@ class BulkDisbursementThroughOneStepCashin(Task):
 
         return api_auth_token, merchant_id
 
-    def disburse_for_aman(self, checker, aman_recipients):
+    def disburse_for_aman(self, checker, aman_recipients, hierarchy):
         """Disburse for aman specific recipients"""
         request = { "user": checker }
 
-        for recipient in aman_recipients:
+        def send(recipient, agent):
             aman_object = AmanChannel(request, amount=Decimal(str(recipient["amount"])))
+            aman_callback = None
 
             try:
                 # 1. Generate new auth token from Accept
@@ -234,11 +279,18 @@ class BulkDisbursementThroughOneStepCashin(Task):
                     if payment_key_obtained.status_code == status.HTTP_201_CREATED:
                         payment_key = payment_key_obtained.data.get("payment_token", "")
                         aman_callback = aman_object.make_pay_request(payment_key)
-                        self.handle_disbursement_callback(recipient, aman_callback, issuer="aman")
 
             except Exception as err:
                 aman_object.log_message(request, f"[general failure - aman bulk channel]", f"Exception: {err.args[0]}")
-                self.handle_disbursement_callback(recipient, False, issuer="aman")
+                aman_callback = False
+
+            # Handled outside of the channel errors so a failed budget debit never marks a paid record as failed
+            if aman_callback is not None:
+                self.handle_disbursement_callback(recipient, aman_callback, "aman", hierarchy)
+
+        dispatcher = IssuerDispatcher('aman')
+        dispatcher.dispatch(aman_recipients, send)
+        dispatcher.raise_for_errors()
 
     def create_bank_transaction_from_instant_transaction(self, checker, record):
         """Create a bank transaction out of the passed record data/instant transaction"""
@@ -261,14 +313,15 @@ class BulkDisbursementThroughOneStepCashin(Task):
         }
         return BankTransaction.objects.create(**transaction_dict)
 
-    def disburse_for_bank_docs(self, doc, checker, pin):
+    def disburse_for_bank_docs(self, doc, checker, pin, hierarchy):
         """
         :param doc: the document being disbursed
         :param checker: the checker user who have taken the disbursement action
+        :param hierarchy: HierarchyResolver of the current run
         :return
         """
         if doc.is_bank_wallet:
-            bank_wallets_transactions = doc.bank_wallets_transactions.all()
+            bank_wallets_transactions = doc.bank_wallets_transactions.filter(disbursed_date__isnull=True)
 
             if settings.BANK_WALLET_AND_ORNAGE_ISSUER == "VODAFONE":
                 from .api.views import DisburseAPIView
@@ -277,18 +330,24 @@ class BulkDisbursementThroughOneStepCashin(Task):
                 vf_pin = get_value_from_env(f"{superadmin.username}_VODAFONE_PIN")
                 vf_agents, _ = DisburseAPIView.prepare_agents_list(provider=checker.root, raw_pin=pin)
                 smsc_sender_name = checker.root.client.smsc_sender_name
-                for instant_trx_obj in bank_wallets_transactions:
+
+                def send(instant_trx_obj, agent):
                     vf_payload, vf_log_payload = superadmin.vmt.accumulate_instant_disbursement_payload(
-                        random.choice(vf_agents)['MSISDN'], instant_trx_obj.anon_recipient, instant_trx_obj.amount,
+                        agent, instant_trx_obj.anon_recipient, instant_trx_obj.amount,
                         vf_pin, 'vodafone', instant_trx_obj.uid, smsc_sender_name
                     )
                     vf_callback = DisburseAPIView.disburse_for_recipients_deposit(
                         wallets_env_url, vf_payload, checker.username, vf_log_payload, inst_obj=instant_trx_obj
                     )
-                    self.handle_disbursement_callback_deposit(callback=vf_callback, inst_obj=instant_trx_obj)
+                    self.handle_disbursement_callback_deposit(
+                            callback=vf_callback, inst_obj=instant_trx_obj, hierarchy=hierarchy
+                    )
+
+                IssuerDispatcher('vodafone', agents=[agent['MSISDN'] for agent in vf_agents]).\
+                    dispatch(bank_wallets_transactions, send)
 
             else:
-                for instant_trx_obj in bank_wallets_transactions:
+                def send(instant_trx_obj, agent):
                     try:
                         instant_trx_obj.disbursed_date = timezone.now()
                         instant_trx_obj.save()
@@ -296,10 +355,12 @@ class BulkDisbursementThroughOneStepCashin(Task):
                         BankTransactionsChannel.send_transaction(bank_trx_obj, instant_trx_obj)
                     except:
                         pass
+
+                IssuerDispatcher('bank').dispatch(bank_wallets_transactions, send)
         else:
-            bank_cards_transactions = doc.bank_cards_transactions.all()
+            bank_cards_transactions = doc.bank_cards_transactions.filter(disbursed_date__isnull=True)
 
-            for bank_trx_obj in bank_cards_transactions:
+            def send(bank_trx_obj, agent):
                 try:
                     bank_trx_obj.disbursed_date = timezone.now()
                     bank_trx_obj.save()
@@ -307,6 +368,64 @@ class BulkDisbursementThroughOneStepCashin(Task):
                 except:
                     pass
 
+            IssuerDispatcher('bank').dispatch(bank_cards_transactions, send)
+
+    def disburse_e_wallets_records(self, doc_obj, checker, superadmin, pin, hierarchy, id_range=None):
+        """
+        Disburse the e-wallets document records, vodafone records are disbursed at last
+        :param hierarchy: HierarchyResolver of the current run, the root of the checker is resolved by the run before
+            the records are dispatched so the dispatcher threads only read its memoized chain
+        :param id_range: optional (first id, last id) to disburse the records of one chunk only
+        :return: number of the records that have been sent
+        """
+        vf_recipients, ets_recipients, aman_recipients = self.separate_recipients(doc_obj.id, id_range)
+        vf_recipients = list(vf_recipients)
+
+        if ets_recipients:
+            if settings.ETISALAT_ISSUER == "VODAFONE":
+                self.disburse_for_vodafone(checker, superadmin, ets_recipients, pin, hierarchy, True)
+            else:
+                self.disburse_for_etisalat(checker, superadmin, ets_recipients, hierarchy)
+        if aman_recipients:
+            self.disburse_for_aman(checker, aman_recipients, hierarchy)
+        if vf_recipients:
+            self.disburse_for_vodafone(checker, superadmin, vf_recipients, pin, hierarchy)
+
+        return len(vf_recipients) + len(ets_recipients) + len(aman_recipients)
+
+    @staticmethod
+    def split_into_chunks(doc_obj, chunk_size):
+        """
+        Split the records of the document into chunks of consecutive ids keyed by their index at the document,
+            so a re-run of the document gets its existing chunks instead of duplicating them
+        :return: list of the chunks to be dispatched, the new ones, the failed ones, the ones left pending longer
+            than BULK_DISBURSEMENT_CHUNK_STALE_AFTER and the ones claimed longer than BULK_DISBURSEMENT_CHUNK_TIME_LIMIT
+            ago, empty list if the document fits in one chunk
+        """
+        records_ids = list(
+                DisbursementData.objects.filter(doc_id=doc_obj.id).order_by('id').values_list('id', flat=True)
+        )
+        if len(records_ids) <= chunk_size:
+            return []
+
+        now = timezone.now()
+        stale_before = now - datetime.timedelta(seconds=getattr(
+                settings, "BULK_DISBURSEMENT_CHUNK_STALE_AFTER", DEFAULT_CHUNK_STALE_AFTER
+        ))
+        claim_expired_before = now - datetime.timedelta(seconds=getattr(
+                settings, "BULK_DISBURSEMENT_CHUNK_TIME_LIMIT", DEFAULT_CHUNK_TIME_LIMIT
+        ))
+        chunks = []
+        for index, start in enumerate(range(0, len(records_ids), chunk_size)):
+            ids = records_ids[start:start + chunk_size]
+            chunk, created = DisbursementChunk.objects.get_or_create(doc=doc_obj, index=index, defaults={
+                'first_record_id': ids[0], 'last_record_id': ids[-1], 'records_count': len(ids)
+            })
+            if created or chunk.reclaim(stale_before, claim_expired_before):
+                chunks.append(chunk)
+
+        return chunks
+
     def run(self, doc_id, checker_username, pin, *args, **kwargs):
         """
         :param doc_id: id of the document being disbursed
@@ -316,31 +435,31 @@ class BulkDisbursementThroughOneStepCashin(Task):
         try:
             doc_obj = Doc.objects.get(id=doc_id)
             checker = User.objects.get(username=checker_username)
-            superadmin = checker.root.client.creator
+            # Built per run, the task instance is shared by all of its runs
+            hierarchy = HierarchyResolver()
+            superadmin = hierarchy.resolve(checker).root.client.creator
 
             # 1. Handle doc of type E-wallets
             if doc_obj.is_e_wallet:
-                vf_recipients, ets_recipients, aman_recipients = self.separate_recipients(doc_obj.id)
-                if ets_recipients:
-                    if settings.ETISALAT_ISSUER == "VODAFONE":
-                        self.disburse_for_vodafone(checker, superadmin, ets_recipients, pin, True)
-                        DisbursementDocData.objects.filter(doc=doc_obj).update(has_callback=True)
-                    else:
-                        self.disburse_for_etisalat(checker, superadmin, ets_recipients)
-                if aman_recipients:
-                    self.disburse_for_aman(checker, aman_recipients)
-
-                if vf_recipients.count() == 0 and (ets_recipients or aman_recipients):
-                    DisbursementDocData.objects.filter(doc=doc_obj).update(has_callback=True)
-
-                # handle disbursement for vodafone
-                if vf_recipients:
-                    self.disburse_for_vodafone(checker, superadmin, vf_recipients, pin)
+                # Large documents are fanned out as chunks across the workers, the last finished chunk marks the callback
+                chunks = self.split_into_chunks(doc_obj, settings.BULK_DISBURSEMENT_CHUNK_SIZE)
+                if chunks:
+                    group(
+                        BulkDisbursementChunk.s(chunk.id, checker_username, pin) for chunk in chunks
+                    ).apply_async()
+                    DISBURSE_LOGGER.debug(
+                            f"[message] [BULK DISBURSEMENT CHUNKS DISPATCHED] [{checker_username}] -- "
+                            f"doc id: {doc_id}, chunks: {len(chunks)}"
+                    )
+                elif doc_obj.disbursement_chunks.exists():
+                    # Re-run of a chunked document whose chunks are all done or still being disbursed
+                    BulkDisbursementChunk.aggregate_chunks(doc_id)
+                elif self.disburse_e_wallets_records(doc_obj, checker, superadmin, pin, hierarchy):
                     DisbursementDocData.objects.filter(doc=doc_obj).update(has_callback=True)
 
             # 2. Handle doc of type bank wallets/cards
             elif doc_obj.is_bank_wallet or doc_obj.is_bank_card:
-                self.disburse_for_bank_docs(doc=doc_obj, checker=checker, pin=pin)
+                self.disburse_for_bank_docs(doc=doc_obj, checker=checker, pin=pin, hierarchy=hierarchy)
                 DisbursementDocData.objects.filter(doc=doc_obj).update(has_callback=True)
 
         except (Doc.DoesNotExist, User.DoesNotExist, Exception) as err:
@@ -351,7 +470,77 @@ class BulkDisbursementThroughOneStepCashin(Task):
         return True
 
 
+class BulkDisbursementChunk(BulkDisbursementThroughOneStepCashin):
+    """
+    Task to disburse one chunk of a large e-wallets document, failed chunks are retried on their own
+    """
+
+    max_retries = 3
+    default_retry_delay = 60
+    # The worker is killed once the limit is exceeded so a chunk claimed before then is never still being sent
+    time_limit = getattr(settings, "BULK_DISBURSEMENT_CHUNK_TIME_LIMIT", DEFAULT_CHUNK_TIME_LIMIT)
+
+    @staticmethod
+    def aggregate_chunks(doc_id):
+        """
+        Mark the document callback once all of its chunks reached a final state
+        :return: True if the document is aggregated by this call
+        """
+        with transaction.atomic():
+            # Lock the document status row so only one of the last finishing chunks aggregates it
+            doc_data = DisbursementDocData.objects.select_for_update().filter(doc_id=doc_id).first()
+            chunks = DisbursementChunk.objects.filter(doc_id=doc_id)
+            if doc_data is None or doc_data.has_callback or \
+                    chunks.filter(status__in=[DisbursementChunk.PENDING, DisbursementChunk.RUNNING]).exists():
+                return False
+
+            doc_data.has_callback = True
+            doc_data.save(update_fields=['has_callback', 'updated_at'])
+
+        failed_chunks = chunks.filter(status=DisbursementChunk.FAILED).count()
+        DISBURSE_LOGGER.debug(
+                f"[message] [BULK DISBURSEMENT CHUNKS AGGREGATED] -- doc id: {doc_id}, "
+                f"chunks: {chunks.count()}, failed chunks: {failed_chunks}"
+        )
+        return True
+
+    def run(self, chunk_id, checker_username, pin, *args, **kwargs):
+        """
+        :param chunk_id: id of the chunk being disbursed
+        :param checker_username: username of the checker who is taking the disbursement action
+        :return
+        """
+        chunk = DisbursementChunk.objects.select_related('doc').get(id=chunk_id)
+        if not chunk.claim():
+            # The chunk is done or being disbursed by the worker of another task dispatched for it
+            return chunk.status == DisbursementChunk.DONE
+
+        try:
+            checker = User.objects.get(username=checker_username)
+            hierarchy = HierarchyResolver()
+            superadmin = hierarchy.resolve(checker).root.client.creator
+            processed_count = self.disburse_e_wallets_records(
+                    chunk.doc, checker, superadmin, pin, hierarchy, chunk.id_range
+            )
+            chunk.mark_done(processed_count)
+        except Exception as err:
+            DISBURSE_LOGGER.debug(
+                    f"[message] [BULK DISBURSEMENT CHUNK ERROR] [{checker_username}] -- "
+                    f"chunk: {chunk}, attempt: {chunk.attempts}, error: {err.args}"
+            )
+            if self.request.retries < self.max_retries:
+                chunk.status = DisbursementChunk.PENDING
+                chunk.failure_reason = str(err)
+                chunk.save(update_fields=['status', 'failure_reason', 'updated_at'])
+                raise self.retry(exc=err)
+            chunk.mark_failed(str(err))
+
+        self.aggregate_chunks(chunk.doc_id)
+        return chunk.status == DisbursementChunk.DONE
+
+
 BulkDisbursementThroughOneStepCashin = app.register_task(BulkDisbursementThroughOneStepCashin())
+BulkDisbursementChunk = app.register_task(BulkDisbursementChunk())
 
 
 @app.task()
@@ -359,19 +548,24 @@ BulkDisbursementThroughOneStepCashin = app.register_task(BulkDisbursementThrough
 def check_for_late_disbursement_callback(**kwargs):
     """Background task for asking for the late bulk disbursement callback"""
     day_ago = timezone.now() - datetime.timedelta(int(1))
-    disbursement_doc_data = DisbursementDocData.objects.\
+    disbursement_doc_data = DisbursementDocData.objects.select_related('doc__owner').\
         filter(updated_at__gte=day_ago, doc_status=DisbursementDocData.DISBURSED_SUCCESSFULLY, has_callback=False)
 
     if disbursement_doc_data.count() < 1:
         return False
 
+    hierarchy = HierarchyResolver()
     for disbursement_doc in disbursement_doc_data:
         try:
-            superadmin = disbursement_doc.doc.owner.root.super_admin
+            root = hierarchy.resolve(disbursement_doc.doc.owner).root
+            superadmin = root.super_admin
             payload = superadmin.vmt.\
                 accumulate_disbursement_or_change_profile_callback_inquiry_payload(disbursement_doc.txn_id)
             DISBURSE_LOGGER.debug(f"[request] [bulk disbursement callback inquiry] [celery_task] -- {payload}")
-            response = requests.post(get_value_from_env(superadmin.vmt.vmt_environment), json=payload, verify=False)
+            response = upstream.post(
+                    get_value_from_env(superadmin.vmt.vmt_environment), "CENTRAL_UIG_INQUIRY", idempotent=True,
+                    json=payload, verify=False
+            )
         except Exception as e:
             DISBURSE_LOGGER.debug(f"[message] [bulk disbursement callback inquiry error] [celery_task] -- {e.args}")
             continue
@@ -379,37 +573,28 @@ def check_for_late_disbursement_callback(**kwargs):
             DISBURSE_LOGGER.debug(f"[response] [bulk disbursement callback inquiry] [celery_task] -- {response.text}")
 
         doc_transactions = response.json().get("TRANSACTIONS", '')
-        total_disbursed_amount = 0
 
         if len(doc_transactions) == 0:
             continue
         else:
-            for disb_record in doc_transactions:
-                ref_id = disb_record.get('mpg_rrn', "None")
-                if ref_id is None:
-                    ref_id = "None"
-                DisbursementData.objects.select_for_update().filter(id=int(disb_record['id'])).update(
-                        is_disbursed=True if disb_record['status'] == '0' else False,
-                        reason=disb_record.get('description', 'No Description found'),
-                        reference_id=ref_id
-                )
-
-                # If disb_record['status'] = 0, it means this record amount is disbursed successfully
-                if disbursement_doc.doc.owner.root.has_custom_budget and disb_record['status'] == '0':
-                    total_disbursed_amount += round(
-                            Decimal(DisbursementData.objects.get(id=disb_record['id']).amount), 2
-                    )
-
-            if disbursement_doc.doc.owner.root.has_custom_budget and total_disbursed_amount > 0:
-                disbursement_doc.doc.owner.root.budget.\
-                    update_disbursed_amount_and_current_balance(total_disbursed_amount, "vodafone")
+            # The records are applied and debited at once, so a failed debit rolls them back for the next inquiry
+            try:
+                with transaction.atomic():
+                    _, total_disbursed_amount, _ = apply_disbursement_callback(doc_transactions)
+                    if root.has_custom_budget and total_disbursed_amount > 0:
+                        root.budget.update_disbursed_amount_and_current_balance(total_disbursed_amount, "vodafone")
+            except Exception as e:
+                DISBURSE_LOGGER.debug(f"[message] [bulk disbursement callback inquiry error] [celery_task] -- {e.args}")
+                continue
+
+            if root.has_custom_budget and total_disbursed_amount > 0:
                 custom_budget_logger(
-                        disbursement_doc.doc.owner.root, f"Total disbursed amount: {total_disbursed_amount} LE",
+                        root, f"Total disbursed amount: {total_disbursed_amount} LE",
                         "celery_task", f" -- doc id: {disbursement_doc.doc.id}"
                 )
 
             disbursement_doc.has_callback = True
-            disbursement_doc.save()
+            disbursement_doc.save(update_fields=['has_callback', 'updated_at'])
 
     return True
 
@@ -419,7 +604,7 @@ def check_for_late_disbursement_callback(**kwargs):
 def check_for_late_change_profile_callback(**kwargs):
     """Background task for asking for the late change profile callback"""
     day_ago = timezone.now() - datetime.timedelta(int(1))
-    disbursement_doc_data = DisbursementDocData.objects.filter(
+    disbursement_doc_data = DisbursementDocData.objects.select_related('doc__owner').filter(
             doc__created_at__gte=day_ago, doc__has_change_profile_callback=False,
             doc_status=DisbursementDocData.UPLOADED_SUCCESSFULLY
     ).filter(~Q(doc__txn_id=None))
@@ -427,13 +612,17 @@ def check_for_late_change_profile_callback(**kwargs):
     if disbursement_doc_data.count() < 1:
         return False
 
+    hierarchy = HierarchyResolver()
     for disbursement_doc in disbursement_doc_data:
         try:
-            superadmin = disbursement_doc.doc.owner.root.super_admin
+            superadmin = hierarchy.resolve(disbursement_doc.doc.owner).root.super_admin
             payload = superadmin.vmt.\
                 accumulate_disbursement_or_change_profile_callback_inquiry_payload(disbursement_doc.doc.txn_id)
             CH_PROFILE_LOGGER.debug(f"[request] [change profile callback inquiry] [celery_task] -- {payload}")
-            response = requests.post(get_value_from_env(superadmin.vmt.vmt_environment), json=payload, verify=False)
+            response = upstream.post(
+                    get_value_from_env(superadmin.vmt.vmt_environment), "CENTRAL_UIG_INQUIRY", idempotent=True,
+                    json=payload, verify=False
+            )
         except Exception as e:
             CH_PROFILE_LOGGER.debug(f"[message] [change profile callback inquiry error] [celery_task] -- {e.args}")
             continue
@@ -458,18 +647,19 @@ def check_for_late_change_profile_callback(**kwargs):
 @respects_language
 def check_for_etisalat_unknown_transactions(**kwargs):
     """Background task for asking for the unknown etisalat transactions"""
-    unkown_trns = InstantTransaction.objects.filter(
+    unkown_trns = InstantTransaction.objects.select_related('from_user').filter(
         status__in=["U", "P"],
         issuer_type__exact="E"
-    )
+    ).exclude(transaction_status_code__in=ASYNC_RESERVED_STATUS_CODES)
 
+    hierarchy = HierarchyResolver()
     for unkown_trn in unkown_trns:
-        super_admin = unkown_trn.from_user.root.super_admin
+        super_admin = hierarchy.resolve(unkown_trn.from_user).super_admin
         url = get_value_from_env(super_admin.vmt.vmt_environment)
         payload = super_admin.vmt.accumulate_inquiry_for_etisalat_by_ref_id(
             str(unkown_trn.uid))
         ETISALAT_UNKNWON_INQ.debug(f"[request] [ETISALAT UNKNWON TRX INQ] [celery_task] -- {payload}")
-        resp = requests.post(url, json=payload, verify=False)
+        resp = upstream.post(url, "CENTRAL_UIG_INQUIRY", idempotent=True, json=payload, verify=False)
         resp_data = resp.json()
         ETISALAT_UNKNWON_INQ.debug(f"[response] [ETISALAT UNKNWON TRX INQ] [celery_task] -- {resp_data}")
         if resp_data.get("DATA"):
@@ -486,22 +676,36 @@ def check_for_etisalat_unknown_transactions(**kwargs):
                             unkown_trn.amount, 'etisalat')
 
 
+def save_successful_transaction(trn, issuer):
+    """
+    Save the transaction found successful and debit it at the same database transaction, so a crashed run never
+        leaves it successful but not debited as the successful transactions aren't inquired about again
+    """
+    with transaction.atomic():
+        root = trn.from_user.root
+        if root.has_custom_budget:
+            trn.balance_before = root.budget.get_current_balance()
+            trn.balance_after = root.budget.update_disbursed_amount_and_current_balance(trn.amount, issuer)
+        trn.save()
+
+
 @app.task()
 @respects_language
 def check_for_etisalat_and_vodafone_unknown_transactions(**kwargs):
     """Background task for asking for the unknown etisalat and vodafone transactions"""
-    unkown_e_trns = InstantTransaction.objects.filter(
+    hierarchy = HierarchyResolver()
+    unkown_e_trns = InstantTransaction.objects.select_related('from_user').filter(
         status__in=["U", "P"],
         issuer_type__exact="E"
-    )
+    ).exclude(transaction_status_code__in=ASYNC_RESERVED_STATUS_CODES)
 
     for unkown_e_trn in unkown_e_trns:
-        super_admin = unkown_e_trn.from_user.root.super_admin
+        super_admin = hierarchy.resolve(unkown_e_trn.from_user).super_admin
         url = get_value_from_env(super_admin.vmt.vmt_environment)
         payload = super_admin.vmt.accumulate_inquiry_for_etisalat_by_ref_id(
             str(unkown_e_trn.uid))
         ETISALAT_UNKNWON_INQ.debug(f"[request] [ETISALAT UNKNWON TRX INQ] [celery_task] -- {payload}")
-        resp = requests.post(url, json=payload, verify=False)
+        resp = upstream.post(url, "CENTRAL_UIG_INQUIRY", idempotent=True, json=payload, verify=False)
         resp_data = resp.json()
         ETISALAT_UNKNWON_INQ.debug(f"[response] [ETISALAT UNKNWON TRX INQ] [celery_task] -- {resp_data}")
         if resp_data.get("DATA"):
@@ -513,21 +717,19 @@ def check_for_etisalat_and_vodafone_unknown_transactions(**kwargs):
                     unkown_e_trn.status = 'S'
                     unkown_e_trn.transaction_status_code = '200'
                     unkown_e_trn.transaction_status_description = 'تم إيداع المبلغ بنجاح'
-                    unkown_e_trn.save()
-                    unkown_e_trn.from_user.root.budget.update_disbursed_amount_and_current_balance(
-                            unkown_e_trn.amount, 'etisalat')
+                    save_successful_transaction(unkown_e_trn, 'etisalat')
 
-    unkown_v_trns = InstantTransaction.objects.filter(
+    unkown_v_trns = InstantTransaction.objects.select_related('from_user').filter(
         status__in=["U", "P"],
         issuer_type__exact="V"
-    )
+    ).exclude(transaction_status_code__in=ASYNC_RESERVED_STATUS_CODES)
     for unkown_v_trn in unkown_v_trns:
-        super_admin = unkown_v_trn.from_user.root.super_admin
+        super_admin = hierarchy.resolve(unkown_v_trn.from_user).super_admin
         url = get_value_from_env(super_admin.vmt.vmt_environment)
         payload = super_admin.vmt.accumulate_inquiry_for_vodafone_by_ref_id(
             str(unkown_v_trn.uid))
         VODAFONE_UNKNWON_INQ.debug(f"[request] [VODAFONE UNKNWON TRX INQ] [celery_task] -- {payload}")
-        resp = requests.post(url, json=payload, verify=False)
+        resp = upstream.post(url, "CENTRAL_UIG_INQUIRY", idempotent=True, json=payload, verify=False)
         resp_data = resp.json()
         VODAFONE_UNKNWON_INQ.debug(f"[response] [VODAFONE UNKNWON TRX INQ] [celery_task] -- {resp_data}")
         if resp_data.get("DATA"):
@@ -539,9 +741,7 @@ def check_for_etisalat_and_vodafone_unknown_transactions(**kwargs):
                     unkown_v_trn.status = 'S'
                     unkown_v_trn.transaction_status_code = '200'
                     unkown_v_trn.transaction_status_description = 'تم إيداع المبلغ بنجاح'
-                    unkown_v_trn.save()
-                    unkown_v_trn.from_user.root.budget.update_disbursed_amount_and_current_balance(
-                            unkown_v_trn.amount, 'vodafone')
+                    save_successful_transaction(unkown_v_trn, 'vodafone')
 
 
 @app.task()
@@ -560,7 +760,10 @@ def check_vodafone_monthly_balance(date_time=None, **kwargs):
 
         try:
             WALLET_API_LOGGER.debug(f"[request] [BALANCE INQUIRY] [MONTHLY BALANCE] -- {refined_payload}")
-            response = requests.post(env.str(superadmin.vmt.vmt_environment), json=payload, verify=False)
+            response = upstream.post(
+                    env.str(superadmin.vmt.vmt_environment), "CENTRAL_UIG_INQUIRY", idempotent=True,
+                    json=payload, verify=False
+            )
         except Exception as e:
             WALLET_API_LOGGER.debug(f"[message] [BALANCE INQUIRY ERROR] [MONTHLY BALANCE] -- Error: {e.args}")
         else:
@@ -575,4 +778,45 @@ def check_vodafone_monthly_balance(date_time=None, **kwargs):
 def end_of_month(dt):
     todays_month = dt.month
     tomorrows_month = (dt + datetime.timedelta(days=1)).month
-    return True if tomorrows_month != todays_month else False
\ No newline at end of file
+    return True if tomorrows_month != todays_month else False
+
+
+@app.task()
+@respects_language
+def refresh_transactions_rollup(days=62, **kwargs):
+    """Background task for rebuilding the stale days of the transactions daily rollup before they're reported"""
+    today = timezone.localdate()
+    stale_days = get_stale_rollup_days(today - datetime.timedelta(days=days), today)
+    refresh_rollup_days(stale_days)
+    return len(stale_days)
+
+
+@app.task()
+def process_disbursement_callback(callback_id, **kwargs):
+    """Background task for applying one bulk disbursement callback saved to the callbacks inbox"""
+    try:
+        return process_inbox_callback(callback_id)
+    except Exception as err:
+        DISBURSE_LOGGER.debug(
+                f"[message] [disbursement callback inbox error] [celery_task] -- callback: {callback_id}, "
+                f"error: {err.args}"
+        )
+        DisbursementCallback.objects.get(id=callback_id).mark_failed(str(err))
+        return False
+
+
+@app.task()
+def process_pending_disbursement_callbacks(max_attempts=3, **kwargs):
+    """
+    Background task for applying the inbox callbacks whose task has been lost
+        and retrying the failed ones till they reach the max attempts
+    """
+    minute_ago = timezone.now() - datetime.timedelta(minutes=1)
+    callbacks_ids = DisbursementCallback.objects.filter(
+            Q(status=DisbursementCallback.PENDING, created_at__lt=minute_ago) |
+            Q(status=DisbursementCallback.FAILED, attempts__lt=max_attempts)
+    ).values_list('id', flat=True)
+
+    for callback_id in callbacks_ids:
+        process_disbursement_callback(callback_id)
+    return len(callbacks_ids)
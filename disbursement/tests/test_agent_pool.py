@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.test import SimpleTestCase, TestCase
+
+from disbursement.agent_pool import LEAST_RECENTLY_USED, ROUND_ROBIN, AgentPool, get_agent_pool
+from disbursement.models import Agent
+from users.models import User
+
+
+class AgentPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pool = AgentPool([
+            ("01000000000", "V", True),
+            ("01000000001", "V", False),
+            ("01000000002", "V", False),
+            ("01100000000", "E", False),
+        ])
+
+    def test_msisdns(self):
+        self.assertEqual(self.pool.msisdns(["V"], False), ["01000000001", "01000000002"])
+        self.assertEqual(self.pool.msisdns(["V"], True), ["01000000000"])
+        self.assertEqual(self.pool.first_type(False), "V")
+        self.assertIsNone(AgentPool([]).first_type())
+
+    def test_round_robin_spreads_picks_evenly(self):
+        picks = [self.pool.pick(["V"], strategy=ROUND_ROBIN) for _ in range(4)]
+
+        self.assertEqual(picks, ["01000000001", "01000000002", "01000000001", "01000000002"])
+
+    def test_least_recently_used_picks_idle_agent_first(self):
+        first = self.pool.pick(["V"], strategy=LEAST_RECENTLY_USED)
+        second = self.pool.pick(["V"], strategy=LEAST_RECENTLY_USED)
+
+        self.assertEqual({first, second}, {"01000000001", "01000000002"})
+        self.assertEqual(self.pool.pick(["V"], strategy=LEAST_RECENTLY_USED), first)
+
+    def test_pick_without_matching_agents(self):
+        self.assertIsNone(self.pool.pick(["O"]))
+
+
+class AgentPoolInvalidationTests(TestCase):
+
+    def setUp(self):
+        self.root = User(id=1, username='test_root_user')
+        self.root.root = self.root
+        self.root.save()
+
+    def test_agents_changes_invalidate_pool(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            agent = Agent.objects.create(msisdn='01021469732', wallet_provider=self.root)
+        self.assertEqual(get_agent_pool(self.root.id).msisdns(), ['01021469732'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Agent.objects.create(msisdn='01021469733', wallet_provider=self.root)
+        self.assertEqual(get_agent_pool(self.root.id).msisdns(), ['01021469732', '01021469733'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            agent.delete()
+        self.assertEqual(get_agent_pool(self.root.id).msisdns(), ['01021469733'])
+
+    def test_pool_is_invalidated_once_the_agents_changes_are_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Agent.objects.create(msisdn='01021469732', wallet_provider=self.root)
+        pool = get_agent_pool(self.root.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Agent.objects.create(msisdn='01021469733', wallet_provider=self.root)
+            self.assertIs(get_agent_pool(self.root.id), pool)
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(get_agent_pool(self.root.id).msisdns(), ['01021469732', '01021469733'])
+
+    def test_cached_pool_needs_no_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Agent.objects.create(msisdn='01021469732', wallet_provider=self.root)
+        get_agent_pool(self.root.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_agent_pool(self.root.id).pick(["V"]), '01021469732')
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.test import TestCase
+
+from data.models import Doc, FileCategory
+from disbursement.callbacks import process_inbox_callback
+from disbursement.models import DisbursementCallback, DisbursementData
+from users.models import MakerUser
+from users.tests.factories import AdminUserFactory
+from utilities.models import Budget, FeeSetup
+
+
+class DisbursementCallbackInboxTests(TestCase):
+
+    def setUp(self):
+        self.root = AdminUserFactory(user_type=3)
+        self.root.root = self.root
+        self.root.save()
+        maker = MakerUser.objects.create(username='test_maker_user', root=self.root, user_type=1)
+        doc = Doc.objects.create(owner=maker, file_category=FileCategory.objects.create(user_created=self.root))
+        self.records = [
+            DisbursementData.objects.create(doc=doc, amount=10, msisdn=f"0101010101{index}") for index in range(3)
+        ]
+
+    def callback(self, records, batch_id="123"):
+        return DisbursementCallback.objects.create(batch_id=batch_id, payload={
+            "batch_id": batch_id,
+            "transactions": [{"id": str(record.id), "status": "0", "mpg_rrn": "1"} for record in records]
+        })
+
+    def test_replayed_transactions_are_applied_once(self):
+        first_callback = self.callback(self.records[:2])
+        replayed_callback = self.callback(self.records)
+
+        self.assertEqual(process_inbox_callback(first_callback.id), 2)
+        self.assertEqual(process_inbox_callback(replayed_callback.id), 1)
+        self.assertIsNone(process_inbox_callback(replayed_callback.id))
+
+        replayed_callback.refresh_from_db()
+        self.assertEqual(replayed_callback.status, DisbursementCallback.PROCESSED)
+        self.assertEqual(replayed_callback.applied_count, 1)
+        self.assertEqual(DisbursementData.objects.filter(is_disbursed=True).count(), 3)
+
+    def test_callbacks_of_other_batches_are_not_deduplicated(self):
+        self.assertEqual(process_inbox_callback(self.callback(self.records[:1], batch_id="1").id), 1)
+        self.assertEqual(process_inbox_callback(self.callback(self.records[:1], batch_id="2").id), 1)
+
+    def test_replayed_callback_without_batch_id_is_debited_once(self):
+        budget = Budget.objects.create(disburser=self.root, current_balance=1000)
+        FeeSetup.objects.create(budget_related=budget, issuer='vf', fee_type='f', fixed_value=1)
+
+        self.assertEqual(process_inbox_callback(self.callback(self.records, batch_id="").id), 3)
+        balance_after_first_callback = budget.get_current_balance()
+        self.assertEqual(process_inbox_callback(self.callback(self.records, batch_id="").id), 3)
+
+        self.assertLess(balance_after_first_callback, 1000)
+        self.assertEqual(budget.get_current_balance(), balance_after_first_callback)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+
+from data.models import Doc, FileCategory
+from data.tasks import create_recuring_docs
+from disbursement.doc_counters import recompute_doc_counters
+from disbursement.models import BankTransaction, DisbursementData, DisbursementDocData
+from disbursement.persistence import apply_disbursement_callback, bulk_create_transactions
+from users.models import MakerUser
+from users.tests.factories import AdminUserFactory
+
+
+class DocStatusCountersTests(TestCase):
+
+    def setUp(self):
+        root = AdminUserFactory(user_type=3)
+        self.maker = MakerUser.objects.create(username='test_maker_user', root=root, user_type=1)
+        self.file_category = FileCategory.objects.create(user_created=root)
+
+    def create_doc(self, type_of=Doc.E_WALLETS):
+        doc = Doc.objects.create(owner=self.maker, file_category=self.file_category, type_of=type_of)
+        doc.mark_uploaded_successfully()
+        return doc
+
+    def counters(self, doc):
+        doc_data = DisbursementDocData.objects.get(doc=doc)
+        return {
+            bucket: (totals['number'], totals['total_amount'])
+            for bucket, totals in doc_data.transactions_totals().items()
+        }
+
+    def test_e_wallets_records_are_counted_on_creation_and_callback(self):
+        doc = self.create_doc()
+        records = bulk_create_transactions(DisbursementData, [
+            DisbursementData(doc=doc, amount=amount, msisdn=f"0101010101{index}")
+            for index, amount in enumerate([10.5, 20.25, 30])
+        ])
+        self.assertEqual(self.counters(doc)['P'], (3, Decimal("60.75")))
+
+        apply_disbursement_callback([
+            {"id": str(records[0].id), "status": "0", "description": "Success", "mpg_rrn": "1"},
+            {"id": str(records[1].id), "status": "-1", "description": "Failed", "mpg_rrn": None},
+        ])
+
+        self.assertEqual(self.counters(doc), {
+            'P': (1, Decimal("30")), 'F': (1, Decimal("20.25")), 'S': (1, Decimal("10.50"))
+        })
+        self.assertEqual(DisbursementDocData.objects.get(doc=doc).success_ratio(), 33.33)
+
+    def test_bank_cards_status_changes_move_the_counters(self):
+        doc = self.create_doc(Doc.BANK_CARDS)
+        bank_transactions = bulk_create_transactions(
+            BankTransaction, [BankTransaction(document=doc, amount='100', user_created=self.maker) for _ in range(2)]
+        )
+
+        bank_transactions[0].mark_successful("8222", "Successful")
+        bank_transactions[1].mark_returned("8888", "Returned")
+        bank_transactions[1].mark_pending("8111", "Pending")
+
+        self.assertEqual(self.counters(doc), {
+            'P': (1, Decimal("100")), 'F': (0, Decimal("0")), 'S': (1, Decimal("100"))
+        })
+
+    def test_recomputed_counters_match_the_transactions(self):
+        doc = self.create_doc()
+        DisbursementData.objects.create(doc=doc, amount=10, msisdn="01010101010", is_disbursed=True, reason="Done")
+        DisbursementData.objects.create(doc=doc, amount=5, msisdn="01010101011", reason="Failed")
+
+        recompute_doc_counters(doc)
+
+        self.assertEqual(self.counters(doc), {
+            'P': (0, Decimal("0")), 'F': (1, Decimal("5")), 'S': (1, Decimal("10"))
+        })
+
+    def test_recurring_doc_counts_only_its_own_records(self):
+        doc = self.create_doc()
+        bulk_create_transactions(DisbursementData, [
+            DisbursementData(doc=doc, amount=10, msisdn=f"0101010101{index}") for index in range(2)
+        ])
+        Doc.objects.filter(id=doc.id).update(
+            is_recuring=True, recuring_period=1, recuring_latest_date=date.today() - timedelta(days=1)
+        )
+
+        create_recuring_docs()
+
+        self.assertEqual(self.counters(Doc.objects.exclude(id=doc.id).get())['P'], (2, Decimal("20")))
@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import datetime
+
 from django.test import TestCase
+from django.utils import timezone
 
 from disbursement.models import (Agent, DisbursementDocData, DisbursementData,
-                                 BankTransaction)
-from users.models import User
-from data.models import Doc
+                                 BankTransaction, TransactionsDailyRollup)
+from disbursement.persistence import bulk_create_transactions, create_bank_transaction_version
+from disbursement.rollup import aggregate_rollup_per_admin_and_issuer, get_stale_rollup_days, transactions_rollup
+from users.models import Client, MakerUser, User
+from data.models import Doc, FileCategory
 from instant_cashin.models import AmanTransaction
 
 
@@ -90,4 +95,80 @@ class BankTransactionModelTests(TestCase):
 
     # test  update parent transaction if its empty
     def test_update_parent_transaction_if_its_empty(self):
-        self.assertEqual(self.bank_transaction, self.bank_transaction.parent_transaction)
\ No newline at end of file
+        self.assertEqual(self.bank_transaction, self.bank_transaction.parent_transaction)
+
+    # test bulk created bank transactions are their own parents
+    def test_bulk_create_transactions_links_parent_transactions(self):
+        bank_transactions = bulk_create_transactions(
+            BankTransaction,
+            [BankTransaction(amount='100', user_created=self.user) for _ in range(3)],
+            batch_size=2
+        )
+        for bank_transaction in bank_transactions:
+            bank_transaction.refresh_from_db()
+            self.assertEqual(bank_transaction.parent_transaction_id, bank_transaction.id)
+
+    # test only the last version of the transaction chain is flagged as its latest one
+    def test_new_version_moves_the_latest_version_flag(self):
+        second_version = create_bank_transaction_version(self.bank_transaction, amount='100', user_created=self.user)
+        third_version = create_bank_transaction_version(second_version, amount='100', user_created=self.user)
+
+        self.assertEqual(third_version.parent_transaction_id, self.bank_transaction.id)
+        self.assertEqual(
+            list(BankTransaction.objects.filter(is_latest_version=True).values_list('id', flat=True)),
+            [third_version.id]
+        )
+        self.assertFalse(second_version.is_latest_version)
+
+
+class TransactionsDailyRollupTests(TestCase):
+    def setUp(self):
+        self.super_admin = User(id=2, username='test_super_admin')
+        self.super_admin.save()
+        self.root = User(id=3, username='test_root_user')
+        self.root.root = self.root
+        self.root.save()
+        Client(client=self.root, creator=self.super_admin).save()
+        maker_user = MakerUser(id=14, username='test_maker_user', email='t@mk.com', root=self.root, user_type=1)
+        maker_user.save()
+        self.doc = Doc.objects.create(
+            owner=maker_user,
+            file_category=FileCategory.objects.create(user_created=self.root),
+            disbursed_by=self.root
+        )
+        self.disbursed_date = timezone.now() - datetime.timedelta(days=10)
+        self.first_day = self.disbursed_date - datetime.timedelta(days=1)
+        self.last_day = self.disbursed_date + datetime.timedelta(days=1)
+        DisbursementData.objects.create(
+            doc=self.doc, amount=50, msisdn='01021469732', issuer='vodafone', is_disbursed=True,
+            disbursed_date=self.disbursed_date
+        )
+        self.failed_record = DisbursementData.objects.create(
+            doc=self.doc, amount=20, msisdn='01021469733', issuer='vodafone', is_disbursed=False,
+            reason='failed', disbursed_date=self.disbursed_date
+        )
+
+    def successful_wallets_rollup(self):
+        qs = transactions_rollup([self.super_admin], self.first_day, self.last_day).filter(
+            source=TransactionsDailyRollup.WALLETS, status=TransactionsDailyRollup.SUCCESSFUL
+        )
+        return list(aggregate_rollup_per_admin_and_issuer(qs))
+
+    # test the rollup sums the transactions per admin and issuer
+    def test_transactions_rollup(self):
+        self.assertEqual(
+            self.successful_wallets_rollup(),
+            [{'admin': 'test_root_user', 'issuer': 'vodafone', 'total': 50.0, 'count': 1, 'fees': 0.0, 'vat': 0.0}]
+        )
+
+    # test status transitions of a rolled up closed day rebuild it before it's reported again
+    def test_status_transition_marks_rollup_day_stale(self):
+        self.successful_wallets_rollup()
+        day = timezone.localtime(self.disbursed_date).date()
+        self.assertEqual(get_stale_rollup_days(day, day), [])
+
+        self.failed_record.is_disbursed = True
+        self.failed_record.save()
+
+        self.assertEqual(get_stale_rollup_days(day, day), [day])
+        self.assertEqual(self.successful_wallets_rollup()[0]['count'], 2)
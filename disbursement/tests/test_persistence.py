@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from data.models import Doc, FileCategory
+from disbursement.models import DisbursementData, TransactionsRollupDay
+from disbursement.persistence import apply_disbursement_callback
+from users.models import MakerUser
+from users.tests.factories import AdminUserFactory
+
+
+class ApplyDisbursementCallbackTests(TestCase):
+
+    def setUp(self):
+        root = AdminUserFactory(user_type=3)
+        maker = MakerUser.objects.create(username='test_maker_user', root=root, user_type=1)
+        self.doc = Doc.objects.create(owner=maker, file_category=FileCategory.objects.create(user_created=root))
+        self.records = [
+            DisbursementData.objects.create(doc=self.doc, amount=amount, msisdn=f"0101010101{index}")
+            for index, amount in enumerate([10.5, 20.25, 30])
+        ]
+
+    def test_callback_is_applied_with_constant_queries(self):
+        """Test the records are loaded with one query, updated with one bulk update and counted with one update"""
+        callback_transactions = [
+            {"id": str(self.records[0].id), "status": "0", "description": "Success", "mpg_rrn": "123"},
+            {"id": str(self.records[1].id), "status": "-1", "description": "Failed", "mpg_rrn": None},
+            {"id": str(self.records[2].id), "status": "0"},
+        ]
+
+        with self.assertNumQueries(6):
+            doc, total_disbursed_amount, disbursed_count = apply_disbursement_callback(callback_transactions)
+
+        self.assertEqual(doc, self.doc)
+        self.assertEqual(total_disbursed_amount, Decimal("40.50"))
+        self.assertEqual(disbursed_count, 2)
+        self.assertEqual(
+            list(DisbursementData.objects.order_by('id').values_list('is_disbursed', 'reason', 'reference_id')),
+            [(True, "Success", "123"), (False, "Failed", "None"), (True, "No Description found", "None")]
+        )
+
+    def test_missing_disbursed_record_applies_nothing(self):
+        callback_transactions = [
+            {"id": str(self.records[0].id), "status": "0"},
+            {"id": "0", "status": "0"},
+        ]
+
+        with self.assertRaises(DisbursementData.DoesNotExist):
+            apply_disbursement_callback(callback_transactions)
+
+        self.assertFalse(DisbursementData.objects.filter(is_disbursed=True).exists())
+
+    def test_rollup_days_of_the_updated_records_are_marked_stale(self):
+        day = timezone.localdate() - datetime.timedelta(days=10)
+        rollup_day = TransactionsRollupDay.objects.create(day=day, refreshed_at=timezone.now())
+        DisbursementData.objects.filter(id=self.records[0].id).update(
+                disbursed_date=timezone.make_aware(datetime.datetime.combine(day, datetime.time(12)))
+        )
+
+        apply_disbursement_callback([{"id": str(self.records[0].id), "status": "0"}])
+
+        rollup_day.refresh_from_db()
+        self.assertIsNotNone(rollup_day.marked_stale_at)
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from django.test import TestCase
+import datetime
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
 from django.contrib.auth.models import Permission
+from django.utils import timezone
 
 from users.tests.factories import (
     SuperAdminUserFactory, AdminUserFactory, VMTDataFactory
@@ -12,12 +19,14 @@ from users.models import (
     MakerUser
 )
 from data.models import Doc, DocReview, FileCategory
+from users.hierarchy import HierarchyResolver
 from utilities.models import Budget, FeeSetup, AbstractBaseDocType
 from instant_cashin.models import AbstractBaseIssuer, InstantTransaction
 
-from disbursement.models import DisbursementDocData, DisbursementData
+from disbursement.dispatcher import IssuerDispatcher
+from disbursement.models import DisbursementChunk, DisbursementDocData, DisbursementData
 from disbursement.tasks import (
-    BulkDisbursementThroughOneStepCashin, check_for_late_disbursement_callback,
+    BulkDisbursementThroughOneStepCashin, BulkDisbursementChunk, check_for_late_disbursement_callback,
     check_for_late_change_profile_callback
 )
 
@@ -168,6 +177,90 @@ class BulkDisbursementThroughOneStepCashinTests(TestCase):
             )
         )
 
+    def test_successful_record_is_debited_with_its_disbursed_state(self):
+        record = DisbursementData.objects.create(doc=self.doc, amount=50, msisdn='01021467656', issuer='vodafone')
+        callback = mock.Mock(**{'json.return_value': {"TXNSTATUS": "200", "TXNID": "1", "MESSAGE": "Done"}})
+
+        self.assertTrue(BulkDisbursementThroughOneStepCashin.handle_disbursement_callback(
+                {"txn_id": record.id, "msisdn": record.msisdn}, callback, 'vodafone', HierarchyResolver()
+        ))
+        record.refresh_from_db()
+        self.assertTrue(record.is_disbursed)
+        self.assertEqual(record.balance_before, 150)
+        self.assertEqual(record.balance_after, Budget.objects.get(id=self.budget.id).current_balance)
+
+    def test_failed_debit_keeps_record_disbursed(self):
+        record = DisbursementData.objects.create(doc=self.doc, amount=50, msisdn='01021467656', issuer='vodafone')
+        callback = mock.Mock(**{'json.return_value': {"TXNSTATUS": "200", "TXNID": "1", "MESSAGE": "Done"}})
+
+        with mock.patch.object(Budget, 'update_disbursed_amount_and_current_balance', side_effect=ValueError()):
+            self.assertTrue(BulkDisbursementThroughOneStepCashin.handle_disbursement_callback(
+                    {"txn_id": record.id, "msisdn": record.msisdn}, callback, 'vodafone', HierarchyResolver()
+            ))
+        record.refresh_from_db()
+        # The paid record is never picked again by a retry of its chunk
+        self.assertTrue(record.is_disbursed)
+        self.assertIsNotNone(record.disbursed_date)
+        self.assertEqual(record.reference_id, "1")
+        self.assertEqual(record.balance_after, 150)
+
+    def test_split_large_document_into_chunks(self):
+        DisbursementData.objects.bulk_create([
+            DisbursementData(doc=self.doc, amount=50, msisdn=f'0102146765{index}', issuer='vodafone')
+            for index in range(5)
+        ])
+        chunks = BulkDisbursementThroughOneStepCashin.split_into_chunks(self.doc, 2)
+
+        self.assertEqual([chunk.records_count for chunk in chunks], [2, 2, 1])
+        self.assertEqual(BulkDisbursementThroughOneStepCashin.split_into_chunks(self.doc, 5), [])
+
+    def test_split_again_reclaims_only_the_stale_chunks(self):
+        DisbursementData.objects.bulk_create([
+            DisbursementData(doc=self.doc, amount=50, msisdn=f'0102146765{index}', issuer='vodafone')
+            for index in range(5)
+        ])
+        first_chunk, second_chunk, third_chunk = BulkDisbursementThroughOneStepCashin.split_into_chunks(self.doc, 2)
+        self.assertTrue(first_chunk.claim())
+        self.assertTrue(second_chunk.claim())
+        self.assertTrue(third_chunk.claim())
+        # Slow running chunks whose claims haven't expired yet are never dispatched twice
+        DisbursementChunk.objects.filter(id=first_chunk.id).update(
+                updated_at=timezone.now() - datetime.timedelta(hours=2)
+        )
+        DisbursementChunk.objects.filter(id=second_chunk.id).update(
+                claimed_at=timezone.now() - datetime.timedelta(hours=2)
+        )
+
+        chunks = BulkDisbursementThroughOneStepCashin.split_into_chunks(self.doc, 2)
+
+        self.assertEqual([chunk.id for chunk in chunks], [second_chunk.id])
+        self.assertEqual(chunks[0].status, DisbursementChunk.PENDING)
+        self.assertEqual(DisbursementChunk.objects.filter(doc=self.doc).count(), 3)
+
+    def test_chunk_is_claimed_by_one_task_only(self):
+        chunk = DisbursementChunk.objects.create(doc=self.doc, index=0, first_record_id=1, last_record_id=2)
+        duplicate = DisbursementChunk.objects.get(id=chunk.id)
+
+        self.assertTrue(chunk.claim())
+        self.assertFalse(duplicate.claim())
+        self.assertEqual(DisbursementChunk.objects.get(id=chunk.id).attempts, 1)
+
+        with mock.patch.object(BulkDisbursementChunk, 'disburse_e_wallets_records') as mocked_disburse:
+            self.assertFalse(BulkDisbursementChunk.run(chunk.id, self.checker_user.username, None))
+        mocked_disburse.assert_not_called()
+
+    def test_aggregate_chunks_marks_callback_after_last_chunk(self):
+        DisbursementDocData.objects.filter(doc=self.doc).update(has_callback=False)
+        first_chunk = DisbursementChunk.objects.create(doc=self.doc, index=0, first_record_id=1, last_record_id=2)
+        DisbursementChunk.objects.create(
+            doc=self.doc, index=1, first_record_id=3, last_record_id=4, status=DisbursementChunk.DONE
+        )
+
+        self.assertFalse(BulkDisbursementChunk.aggregate_chunks(self.doc.id))
+        first_chunk.mark_done(2)
+        self.assertTrue(BulkDisbursementChunk.aggregate_chunks(self.doc.id))
+        self.assertTrue(DisbursementDocData.objects.get(doc=self.doc).has_callback)
+
 
 class LateChangeProfileCallBack(TestCase):
 
@@ -178,4 +271,45 @@ class LateChangeProfileCallBack(TestCase):
 class LateDisbursementCallBack(TestCase):
 
     def test_check_for_late_disbursement_callback(self):
-        self.assertFalse(check_for_late_disbursement_callback())
\ No newline at end of file
+        self.assertFalse(check_for_late_disbursement_callback())
+
+class IssuerDispatcherTests(SimpleTestCase):
+
+    def test_dispatch_respects_per_agent_limit_and_uid_idempotency(self):
+        uid = uuid.uuid4()
+        recipients = [{"uid": uid}, {"uid": uid}] + [{"uid": uuid.uuid4()} for _ in range(10)]
+        in_flight, max_in_flight, sent = {}, {}, []
+        lock = threading.Lock()
+
+        def send(recipient, agent):
+            with lock:
+                in_flight[agent] = in_flight.get(agent, 0) + 1
+                max_in_flight[agent] = max(max_in_flight.get(agent, 0), in_flight[agent])
+                sent.append(recipient["uid"])
+            time.sleep(0.01)
+            with lock:
+                in_flight[agent] -= 1
+
+        dispatcher = IssuerDispatcher(
+                'vodafone', agents=['01000000001', '01000000002'], max_in_flight=8, max_in_flight_per_agent=1
+        )
+
+        self.assertEqual(dispatcher.dispatch(recipients, send), 11)
+        self.assertEqual(len(sent), 11)
+        self.assertEqual(sent.count(uid), 1)
+        self.assertTrue(all(count == 1 for count in max_in_flight.values()))
+
+    def test_send_errors_are_raised_after_all_recipients_are_sent(self):
+        sent = []
+
+        def send(recipient, agent):
+            sent.append(recipient["uid"])
+            if len(sent) == 1:
+                raise ValueError("budget debit failed")
+
+        dispatcher = IssuerDispatcher('aman', max_in_flight=1)
+        dispatcher.dispatch([{"uid": uuid.uuid4()} for _ in range(3)], send)
+
+        self.assertEqual(len(sent), 3)
+        with self.assertRaises(ValueError):
+            dispatcher.raise_for_errors()
@@ -15,7 +15,7 @@ import requests
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpResponseForbidden
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils import translation
@@ -57,7 +57,8 @@ from utilities.models import Budget, ExcelFile
 from .forms import (ExistingAgentForm, AgentForm, AgentFormSet, ExistingAgentFormSet,
                     BalanceInquiryPinForm, SingleStepTransactionForm)
 from .mixins import AdminOrCheckerOrSupportRequiredMixin
-from .models import Agent, BankTransaction, DisbursementData
+from .models import Agent, BankTransaction, DisbursementData, TransactionsDailyRollup
+from .rollup import aggregate_rollup_per_admin_and_issuer, transactions_rollup
 from .utils import (VALID_BANK_CODES_LIST, VALID_BANK_TRANSACTION_TYPES_LIST,
                     DEFAULT_LIST_PER_ADMIN_FOR_TRANSACTIONS_REPORT_raseedy_vf,
                     DEFAULT_LIST_PER_ADMIN_FOR_TRANSACTIONS_REPORT,
@@ -136,57 +137,24 @@ class DisbursementDocTransactionsView(UserWithDisbursementPermissionRequired, Vi
     """
 
     @staticmethod
-    def get_document_transactions_totals(doc_obj, doc_transactions):
-        """Returns aggregated totals for specific doc"""
-
-        # Handle e-wallets docs -vodafone/etisalat/aman-
-        if doc_obj.is_e_wallet:
-            pending_transactions = doc_transactions.filter(reason='').\
-                values('is_disbursed').annotate(total_amount=Sum('amount'), number=Count('id')).order_by()
-            failed_transactions = doc_transactions.filter(~Q(reason=''), is_disbursed=False).\
-                values('is_disbursed').annotate(total_amount=Sum('amount'), number=Count('id')).order_by()
-            success_transactions = doc_transactions.filter(is_disbursed=True).\
-                values('is_disbursed').annotate(total_amount=Sum('amount'), number=Count('id')).order_by()
-            doc_transactions_totals = {
-                'P': pending_transactions[0] if pending_transactions else None,
-                'F': failed_transactions[0] if failed_transactions else None,
-                'S': success_transactions[0] if success_transactions else None
-            }
-
-        # Handle bank cards/wallets/orange docs
-        elif doc_obj.is_bank_wallet or doc_obj.is_bank_card:
-            trx_id = 'uid' if doc_obj.is_bank_wallet else 'id'
-            doc_transactions_totals = doc_transactions.values('status').\
-                annotate(total_amount=Sum('amount'), number=Count(trx_id)).order_by()
-
-            doc_transactions_totals = { agg_dict['status']: agg_dict for agg_dict in doc_transactions_totals }
-            # add default transactions to pending transactions
-            if doc_transactions_totals.get('d') and doc_transactions_totals.get('P'):
-                doc_transactions_totals['P']['total_amount'] += doc_transactions_totals.get('d').get('total_amount')
-                doc_transactions_totals['P']['number'] += doc_transactions_totals.get('d').get('number')
-            elif doc_transactions_totals.get('d'):
-                doc_transactions_totals['P'] = doc_transactions_totals.get('d')
-
-            # put failed transaction equal to 0 if not exist
-            if doc_transactions_totals.get('F') == None:
-                doc_transactions_totals['F'] = {'status': 'F', 'total_amount': Decimal('0'), 'number': 0}
-
-            # add returned transaction to failed transactions if exist
-            if doc_transactions_totals.get('R') != None:
-                doc_transactions_totals['F']['total_amount'] += doc_transactions_totals.get('R').get('total_amount')
-                doc_transactions_totals['F']['number'] += doc_transactions_totals.get('R').get('number')
-
-            # add rejected transaction to failed transactions if exist
-            if doc_transactions_totals.get('J') != None:
-                doc_transactions_totals['F']['total_amount'] += doc_transactions_totals.get('J').get('total_amount')
-                doc_transactions_totals['F']['number'] += doc_transactions_totals.get('J').get('number')
-
+    def get_document_transactions_totals(doc_obj):
+        """Returns aggregated totals for specific doc read from its status counters"""
+        doc_transactions_totals = doc_obj.disbursement_txn.transactions_totals()
         doc_transactions_totals['all'] = {
             'total_amount' : doc_obj.total_amount,
             'number' : doc_obj.total_count
         }
         return doc_transactions_totals
 
+    @staticmethod
+    def get_document_transactions_flags(doc_obj):
+        """Returns has_failed/has_success flags of specific doc, e-wallets records without callback count as failed"""
+        doc_data = doc_obj.disbursement_txn
+        failed_count = doc_data.failed_count
+        if doc_obj.is_e_wallet:
+            failed_count += doc_data.pending_count
+        return {'has_failed': failed_count != 0, 'has_success': doc_data.success_count != 0}
+
     def get(self, request, *args, **kwargs):
         """"""
         doc_id = self.kwargs.get("doc_id")
@@ -230,8 +198,6 @@ class DisbursementDocTransactionsView(UserWithDisbursementPermissionRequired, Vi
                     )
                 context = {
                     'doc_transactions': doc_transactions,
-                    'has_failed': doc_obj.disbursement_data.filter(is_disbursed=False).count() != 0,
-                    'has_success': doc_obj.disbursement_data.filter(is_disbursed=True).count() != 0,
                     'is_normal_flow': request.user.root.root_entity_setups.is_normal_flow,
                 }
             elif doc_obj.is_bank_wallet:
@@ -247,20 +213,11 @@ class DisbursementDocTransactionsView(UserWithDisbursementPermissionRequired, Vi
 
                 context = {
                     'doc_transactions': doc_transactions,
-                    'has_failed': doc_obj.bank_wallets_transactions.filter(
-                            status=AbstractBaseStatus.FAILED
-                    ).count() != 0,
-                    'has_success': doc_obj.bank_wallets_transactions.filter(
-                            status=AbstractBaseStatus.SUCCESSFUL
-                    ).count() != 0,
                 }
             elif doc_obj.is_bank_card:
                 template_name = "disbursement/bank_transactions_list.html"
-                bank_trx_ids = BankTransaction.objects.filter(document=doc_obj).\
-                    order_by("parent_transaction__transaction_id", "-id").\
-                    distinct("parent_transaction__transaction_id").\
-                    values_list("id", flat=True)
-                doc_transactions = BankTransaction.objects.filter(id__in=bank_trx_ids).order_by("-created_at")
+                doc_transactions = BankTransaction.objects.filter(document=doc_obj, is_latest_version=True).\
+                    order_by("-created_at")
                 if self.request.GET.get('search'):
                     search_keys = self.request.GET.get('search')
                     search_filter = (
@@ -270,12 +227,6 @@ class DisbursementDocTransactionsView(UserWithDisbursementPermissionRequired, Vi
                     )
                 context = {
                     'doc_transactions': doc_transactions,
-                    'has_failed': doc_obj.bank_cards_transactions.filter(
-                            status=AbstractBaseStatus.FAILED
-                    ).count() != 0,
-                    'has_success': doc_obj.bank_cards_transactions.filter(
-                            status=AbstractBaseStatus.SUCCESSFUL
-                    ).count() != 0,
                 }
             if search_filter:
                 context['doc_transactions'] = context['doc_transactions'].filter(search_filter)
@@ -286,7 +237,8 @@ class DisbursementDocTransactionsView(UserWithDisbursementPermissionRequired, Vi
 
             context.update({
                 'doc_obj': doc_obj,
-                'doc_transactions_totals': self.__class__.get_document_transactions_totals(doc_obj, doc_transactions),
+                'doc_transactions_totals': self.__class__.get_document_transactions_totals(doc_obj),
+                **self.__class__.get_document_transactions_flags(doc_obj),
             })
             return render(request, template_name=template_name, context=context)
 
@@ -379,16 +331,12 @@ def download_exported_transactions(request):
         raise Http404
 
     if os.path.exists(file_path):
-        with open(file_path, 'rb') as fh:
-            response = HttpResponse(
-                fh.read(),
-                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-            response['Content-Disposition'] = 'attachment; filename=%s' % filename
-            FAILED_DISBURSEMENT_DOWNLOAD.debug(
-                f"[message] [DOWNLOAD EXPORTED TRANSACTIONS] [{request.user}] -- file name: {filename}"
-            )
-            return response
+        # Exports may be too large to be read in memory, they're streamed with a content type matching their format
+        response = FileResponse(open(file_path, 'rb'), as_attachment=True, filename=filename)
+        FAILED_DISBURSEMENT_DOWNLOAD.debug(
+            f"[message] [DOWNLOAD EXPORTED TRANSACTIONS] [{request.user}] -- file name: {filename}"
+        )
+        return response
     else:
         raise Http404
 
@@ -858,9 +806,9 @@ class HomeView(RootUserORDashboardUserOrMakerORCheckerRequiredMixin, View):
                 ~Q(disbursed_date=None),
                 Q(end_to_end=""),
                 (Q(document__disbursed_by__root=request.user.root) |
-                 Q(user_created__root=request.user.root))
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id").values('id').count()
+                 Q(user_created__root=request.user.root)),
+                is_latest_version=True
+            ).count()
 
         vodafone_transactions = 0
         etisalat_transactions = 0
@@ -942,13 +890,9 @@ class SingleStepTransactionsView(AdminOrCheckerOrSupportRequiredMixin, View):
             trxs = InstantTransaction.objects.filter(
                 from_user__hierarchy=user_hierarchy, is_single_step=True).order_by("-created_at")
         else:
-            bank_trx_ids = BankTransaction.objects.\
-                filter(user_created__hierarchy=user_hierarchy, is_single_step=True).\
-                order_by("parent_transaction__transaction_id", "-id").\
-                distinct("parent_transaction__transaction_id").\
-                values_list("id", flat=True)
-
-            trxs = BankTransaction.objects.filter(id__in=bank_trx_ids).order_by("-created_at")
+            trxs = BankTransaction.objects.filter(
+                user_created__hierarchy=user_hierarchy, is_single_step=True, is_latest_version=True
+            ).order_by("-created_at")
 
         return trxs
 
@@ -1220,63 +1164,39 @@ class ExportClientsTransactionsMonthlyReport:
         return final_data
 
     def _annotate_vf_ets_aman_qs(self, qs):
-        """ Annotate qs then add admin username to qs"""
-        if self.vf_facilitator_perm:
-            qs = qs.annotate(
-                admin=F('doc__disbursed_by__root__username'),
-                vf_identifier=F('doc__disbursed_by__root__client__vodafone_facilitator_identifier')
-            ).values('admin', 'issuer', 'vf_identifier'). \
-                annotate(total=Sum('amount'), count=Count('id'))
-        else:
-            qs = qs.annotate(
-                admin=F('doc__disbursed_by__root__username')
-            ).values('admin', 'issuer'). \
-                annotate(total=Sum('amount'), count=Count('id'))
+        """ Sum rollup qs per admin username and issuer"""
+        qs = aggregate_rollup_per_admin_and_issuer(qs, vf_identifier=self.vf_facilitator_perm)
         return self._customize_issuer_in_qs_values(qs)
 
     def _annotate_instant_trxs_qs(self, qs):
-        """ Annotate qs then add admin username to qs"""
-        qs = qs.annotate(
-            admin=Case(
-                When(from_user__isnull=False, then=F('from_user__root__username')),
-                default=F('document__disbursed_by__root__username')
-            )
-        ).extra(select={'issuer': 'issuer_type'}).values('admin', 'issuer'). \
-            annotate(total=Sum('amount'), count=Count('uid'))
+        """ Sum rollup qs per admin username and issuer"""
+        qs = aggregate_rollup_per_admin_and_issuer(qs)
         return self._customize_issuer_in_qs_values(qs)
 
     def aggregate_vf_ets_aman_transactions(self):
-        """Calculate vodafone, etisalat, aman transactions details from DisbursementData model"""
+        """Calculate vodafone, etisalat, aman transactions details from DisbursementData daily rollup"""
+        qs = transactions_rollup(self.superadmins, self.first_day, self.last_day).\
+            filter(source=TransactionsDailyRollup.WALLETS)
         if self.status == 'failed':
-            qs = DisbursementData.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                ~Q(reason__exact=''),
-                Q(is_disbursed=False),
-                Q(doc__disbursed_by__root__client__creator__in=self.superadmins)
-            )
+            qs = qs.filter(status=TransactionsDailyRollup.FAILED)
         elif self.status == 'success':
-            qs = DisbursementData.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                Q(is_disbursed=True),
-                Q(doc__disbursed_by__root__client__creator__in=self.superadmins)
-            )
-        else:
-            qs = DisbursementData.objects.filter(
+            qs = qs.filter(status=TransactionsDailyRollup.SUCCESSFUL)
+
+        # if super admins are vodafone facilitator onboarding save distinct admin msisdn pairs
+        # for calculate distinct msisdn count as it can't be summed from the daily rollup
+        if self.vf_facilitator_perm:
+            if self.status == 'failed':
+                status_q = ~Q(reason__exact='') & Q(is_disbursed=False)
+            elif self.status == 'success':
+                status_q = Q(is_disbursed=True)
+            else:
+                status_q = Q(is_disbursed=True) | (~Q(reason__exact='') & Q(is_disbursed=False))
+            self.temp_vf_ets_aman_qs = DisbursementData.objects.filter(
                 Q(disbursed_date__gte=self.first_day),
                 Q(disbursed_date__lte=self.last_day),
-                (Q(is_disbursed=True) | (~Q(reason__exact='') & Q(is_disbursed=False))),
+                status_q,
                 Q(doc__disbursed_by__root__client__creator__in=self.superadmins)
-            )
-
-        # if super admins are vodafone facilitator onboarding save qs
-        # for calculate distinct msisdn count
-        if self.vf_facilitator_perm:
-            self.temp_vf_ets_aman_qs = qs
-            self.temp_vf_ets_aman_qs = self.temp_vf_ets_aman_qs.annotate(
-                admin=F('doc__disbursed_by__root__username')
-            )
+            ).annotate(admin=F('doc__disbursed_by__root__username')).values('admin', 'msisdn').distinct().order_by()
 
         if self.status in ['success', 'failed']:
             qs = self._annotate_vf_ets_aman_qs(qs)
@@ -1286,11 +1206,11 @@ class ExportClientsTransactionsMonthlyReport:
 
         # handle if status is all
         # divide qs into success and failed
-        failed_qs = qs.filter(~Q(reason__exact='') & Q(is_disbursed=False))
+        failed_qs = qs.filter(status=TransactionsDailyRollup.FAILED)
         # annotate failed qs and add admin username
         failed_qs = self._annotate_vf_ets_aman_qs(failed_qs)
 
-        success_qs = qs.filter(Q(is_disbursed=True))
+        success_qs = qs.filter(status=TransactionsDailyRollup.SUCCESSFUL)
         # annotate success qs and add admin username
         success_qs = self._annotate_vf_ets_aman_qs(success_qs)
 
@@ -1302,34 +1222,15 @@ class ExportClientsTransactionsMonthlyReport:
         return [*failed_qs, *success_qs]
 
     def aggregate_bank_wallets_orange_instant_transactions(self):
-        """Calculate bank wallets, orange, instant transactions details from InstantTransaction model"""
+        """Calculate bank wallets, orange, instant transactions details from InstantTransaction daily rollup"""
+        qs = transactions_rollup(self.superadmins, self.first_day, self.last_day).\
+            filter(source=TransactionsDailyRollup.INSTANT)
         if self.status == 'failed':
-            qs = InstantTransaction.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                Q(status=AbstractBaseStatus.FAILED),
-                (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
-                Q(from_user__root__client__creator__in=self.superadmins))
-            )
+            qs = qs.filter(status=AbstractBaseStatus.FAILED)
         elif self.status == 'success':
-            qs = InstantTransaction.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                Q(status=AbstractBaseStatus.SUCCESSFUL),
-                (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
-                Q(from_user__root__client__creator__in=self.superadmins))
-            )
+            qs = qs.filter(status=AbstractBaseStatus.SUCCESSFUL)
         else:
-            qs = InstantTransaction.objects.filter(
-                Q(disbursed_date__gte=self.first_day),
-                Q(disbursed_date__lte=self.last_day),
-                Q(status__in=[AbstractBaseStatus.SUCCESSFUL,
-                              AbstractBaseStatus.PENDING,
-                              AbstractBaseStatus.FAILED]),
-                ~Q(transaction_status_code__in=['500', '424']),
-                (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
-                Q(from_user__root__client__creator__in=self.superadmins))
-            )
+            qs = qs.filter(is_internal_error=False)
         if self.status in ['success', 'failed']:
             qs = self._annotate_instant_trxs_qs(qs)
             qs = self._calculate_and_add_fees_to_qs_values(qs, self.status == 'failed')
@@ -1337,14 +1238,14 @@ class ExportClientsTransactionsMonthlyReport:
 
         # handle if status is all
         # divide qs into success and failed and pending
-        failed_qs = qs.filter(Q(status=AbstractBaseStatus.FAILED))
+        failed_qs = qs.filter(status=AbstractBaseStatus.FAILED)
         # annotate failed qs and add admin username
         failed_qs = self._annotate_instant_trxs_qs(failed_qs)
 
-        success_qs = qs.filter(Q(status__in=[
+        success_qs = qs.filter(status__in=[
             AbstractBaseStatus.SUCCESSFUL,
             AbstractBaseStatus.PENDING
-        ]))
+        ])
         # annotate success qs and add admin username
         success_qs = self._annotate_instant_trxs_qs(success_qs)
 
@@ -1364,8 +1265,7 @@ class ExportClientsTransactionsMonthlyReport:
                     Q(end_to_end=""),
                     (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
                     Q(user_created__root__client__creator__in=self.superadmins))
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id").values('id')
+            ).filter(is_latest_version=True).values('id')
         elif self.status == 'success':
             qs_ids = BankTransaction.objects.filter(
                     Q(disbursed_date__gte=self.first_day),
@@ -1374,8 +1274,7 @@ class ExportClientsTransactionsMonthlyReport:
                     Q(end_to_end=""),
                     (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
                     Q(user_created__root__client__creator__in=self.superadmins))
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id").values('id')
+            ).filter(is_latest_version=True).values('id')
         else:
             qs_ids = BankTransaction.objects.filter(
                     Q(disbursed_date__gte=self.first_day),
@@ -1384,8 +1283,7 @@ class ExportClientsTransactionsMonthlyReport:
                     Q(status__in=[AbstractBaseACHTransactionStatus.PENDING, AbstractBaseACHTransactionStatus.SUCCESSFUL, AbstractBaseACHTransactionStatus.RETURNED]),
                     (Q(document__disbursed_by__root__client__creator__in=self.superadmins) |
                     Q(user_created__root__client__creator__in=self.superadmins))
-            ).order_by("parent_transaction__transaction_id", "-id"). \
-                distinct("parent_transaction__transaction_id").values('id')
+            ).filter(is_latest_version=True).values('id')
         qs = BankTransaction.objects.filter(id__in=qs_ids).annotate(
                 admin=Case(
                         When(document__disbursed_by__isnull=False, then=F('document__disbursed_by__root__username')),
@@ -1599,7 +1497,7 @@ class ExportClientsTransactionsMonthlyReport:
         if self.vf_facilitator_perm:
             # 8. calculate distinct msisdn per admin
             distinct_msisdn = dict()
-            for el in self.temp_vf_ets_aman_qs.values():
+            for el in self.temp_vf_ets_aman_qs:
                 if el['admin'] in distinct_msisdn:
                     distinct_msisdn[el['admin']].add(el['msisdn'])
                 else:
@@ -1794,9 +1692,8 @@ class BanksListView(UserWithAcceptVFOnboardingPermissionRequired, ListView):
             filter_dict['disbursed_date__lte'] = make_aware(last_day)
 
         queryset = super().get_queryset().filter(**filter_dict). \
-            filter(~Q(creditor_bank__in=["THWL", "MIDG"])). \
-            order_by("parent_transaction__transaction_id", "-id", "-created_at"). \
-            distinct("parent_transaction__transaction_id")
+            filter(~Q(creditor_bank__in=["THWL", "MIDG"]), is_latest_version=True). \
+            order_by("parent_transaction__transaction_id")
         paginator = Paginator(queryset, 20)
         page = self.request.GET.get('page', 1)
         return paginator.get_page(page)
@@ -220,17 +220,18 @@ class InstantTransactionAdmin(admin.ModelAdmin, ExportCsvMixin):
             if not xlsx_file.name.endswith('.xlsx'):
                 messages.warning(request, 'The wrong file type was uploaded')
                 return HttpResponseRedirect(request.path_info)
-            wb = load_workbook(xlsx_file)
+            wb = load_workbook(xlsx_file, read_only=True)
             ws = wb.active
-            last_row = len(list(ws.rows))
             my_dict = {}
-            for row in range(2, last_row + 1):
-                if int(ws["AA" + str(row)].value) < 0:
-                    my_dict[ws["L" + str(row)].value] = {
-                        "wallet": ws["H" + str(row)].value,
-                        "success": not bool(ws["V" + str(row)].value),
-                        "amount": ws["J" + str(row)].value,
+            # Report columns H: wallet, J: amount, L: reference id, V: empty for successful rows, AA: balance change
+            for row in ws.iter_rows(min_row=2, values_only=True):
+                if int(row[26]) < 0:
+                    my_dict[row[11]] = {
+                        "wallet": row[7],
+                        "success": not bool(row[21]),
+                        "amount": row[9],
                     }
+            wb.close()
             
 
             print(request.POST['date_from'], request.POST['date_to'], request.user.email)
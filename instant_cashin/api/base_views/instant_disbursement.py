@@ -8,6 +8,7 @@ from users.models.base_user import User
 import requests
 
 from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
 from django.utils.translation import gettext as _
 from django.utils import timezone
 
@@ -17,11 +18,17 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from disbursement.models import BankTransaction, VMTData
-from payouts.settings import TIMEOUT_CONSTANTS
+from users.hierarchy import resolve_hierarchy
+from utilities import upstream
 from utilities.logging import logging_message
 
+from ...async_disbursement import ASYNC_ACCEPTED_MSG, ACCEPTED_STATUS_CODE, is_async_issuer, refund_reserved_amount
+from ...idempotency import (
+    claim_client_reference, release_client_reference, request_fingerprint, store_client_reference_response
+)
 from ...models import InstantTransaction
 from ...specific_issuers_integrations import AmanChannel, BankTransactionsChannel
+from ...tasks import disburse_instant_transaction
 from ...utils import default_response_structure, get_from_env
 from ..mixins import IsInstantAPICheckerUser
 from ..serializers import (
@@ -209,17 +216,75 @@ class InstantDisbursementAPIView(views.APIView):
             transaction_object.mark_failed(status.HTTP_424_FAILED_DEPENDENCY, EXTERNAL_ERROR_MSG)
             return Response(InstantTransactionResponseModelSerializer(transaction_object).data)
 
+    def accept_disbursement(self, request, serializer, user, issuer):
+        """
+        Async mode: reserve the amount plus its fees from the budget and persist the transaction as pending,
+            disburse_instant_transaction task disburses it and notifies the callback url of the root
+        :return: 202 response of the pending transaction, its final state can be inquired about at any time
+        """
+        amount = serializer.validated_data["amount"]
+        budget = user.root.budget
+
+        try:
+            fees, vat = budget.calculate_fees_and_vat_for_amount(amount, issuer)
+            with transaction.atomic():
+                balance_after = budget.deduct_if_covered(amount, issuer)
+                if balance_after is None:
+                    return Response({
+                        "disbursement_status": _("failed"), "status_description": BUDGET_EXCEEDED_MSG,
+                        "status_code": str(status.HTTP_400_BAD_REQUEST)
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                instant_trx = InstantTransaction.objects.create(
+                        from_user=user, anon_recipient=serializer.validated_data["msisdn"], status="P",
+                        amount=amount, issuer_type=self.match_issuer_type(issuer), recipient_name="",
+                        is_single_step=serializer.validated_data["is_single_step"], disbursed_date=timezone.now(),
+                        fees=fees, vat=vat, balance_after=balance_after,
+                        balance_before=balance_after + budget.accumulate_amount_with_fees_and_vat(amount, issuer),
+                        transaction_status_code=ACCEPTED_STATUS_CODE, transaction_status_description=ASYNC_ACCEPTED_MSG,
+                        client_transaction_reference=serializer.validated_data.get("client_reference_id")
+                )
+        except Exception as e:
+            logging_message(INSTANT_CASHIN_FAILURE_LOGGER, "[message] [ASYNC INTERNAL SYSTEM ERROR]", request, e.args)
+            return default_response_structure(
+                    transaction_id=None, status_description={"Internal Error": INTERNAL_ERROR_MSG},
+                    field_status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        # Only the transaction uid is queued, the worker reads the PIN of the super admin from the .env file
+        try:
+            disburse_instant_transaction.apply_async((str(instant_trx.uid),))
+        except Exception as e:
+            logging_message(INSTANT_CASHIN_FAILURE_LOGGER, "[message] [ASYNC QUEUEING ERROR]", request, e.args)
+            instant_trx.mark_failed(status.HTTP_500_INTERNAL_SERVER_ERROR, INTERNAL_ERROR_MSG)
+            refund_reserved_amount(instant_trx)
+            return Response(InstantTransactionResponseModelSerializer(instant_trx).data, status=status.HTTP_200_OK)
+
+        logging_message(INSTANT_CASHIN_REQUEST_LOGGER, "[request] [ASYNC TRX ACCEPTED]", request, f"{instant_trx.uid}")
+        return Response(InstantTransactionResponseModelSerializer(instant_trx).data, status=status.HTTP_202_ACCEPTED)
+
     def post(self, request, *args, **kwargs):
         """
         Handles POST HTTP requests
         """
         serializer = InstantDisbursementRequestSerializer(data=request.data)
+        idempotency_key = None
         try:
             serializer.is_valid(raise_exception=True)
             if 'user' in serializer.validated_data:
                 user = User.objects.get(username=serializer.validated_data['user'])
             else:
                 user = request.user
+            resolve_hierarchy(user)
+
+            # Retries of a request are answered before reaching the budget or the issuers
+            client_reference_id = serializer.validated_data.get('client_reference_id')
+            if client_reference_id:
+                idempotency_key, replayed_response = claim_client_reference(
+                        user, client_reference_id, request_fingerprint(serializer.validated_data)
+                )
+                if replayed_response is not None:
+                    return replayed_response
 
             if not user.root.\
                     budget.within_threshold(serializer.validated_data['amount'], serializer.validated_data['issuer']):
@@ -231,21 +296,39 @@ class InstantDisbursementAPIView(views.APIView):
                 failure_message = BUDGET_EXCEEDED_MSG
             else:
                 failure_message = INTERNAL_ERROR_MSG
+            release_client_reference(idempotency_key)
             logging_message(INSTANT_CASHIN_FAILURE_LOGGER, "[message] [VALIDATION ERROR]", request, e.args)
             return Response({
                 "disbursement_status": _("failed"), "status_description": failure_message,
                 "status_code": str(status.HTTP_400_BAD_REQUEST)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            response = self.disburse(request, serializer, user)
+        except Exception:
+            release_client_reference(idempotency_key)
+            raise
+
+        store_client_reference_response(idempotency_key, response)
+        return response
+
+    def disburse(self, request, serializer, user):
+        """
+        Disburse the validated request through its issuer
+        :return: the response of the disbursement
+        """
         issuer = serializer.validated_data["issuer"].lower()
 
+        if serializer.validated_data["is_async"] and is_async_issuer(issuer):
+            return self.accept_disbursement(request, serializer, user, issuer)
+
         if issuer in ["vodafone", "etisalat", "aman"] or \
             (issuer in ["orange", "bank_wallet"] and settings.BANK_WALLET_AND_ORNAGE_ISSUER == "VODAFONE"):
             transaction = None
 
             try:
                 instant_user = user
-                vmt_data = VMTData.objects.get(vmt=instant_user.root.client.creator)
+                vmt_data = instant_user.root.client.creator.vmt
                 data_dict = vmt_data.return_vmt_data(VMTData.INSTANT_DISBURSEMENT)
                 data_dict['MSISDN2'] = serializer.validated_data["msisdn"]
                 data_dict['AMOUNT'] = str(serializer.validated_data["amount"])
@@ -326,9 +409,8 @@ class InstantDisbursementAPIView(views.APIView):
                     return Response(InstantTransactionResponseModelSerializer(transaction).data, status=status.HTTP_200_OK)
 
 
-                trx_response = requests.post(
-                    get_from_env(vmt_data.vmt_environment), json=data_dict, verify=False,
-                    timeout=TIMEOUT_CONSTANTS["CENTRAL_UIG"]
+                trx_response = upstream.post(
+                    get_from_env(vmt_data.vmt_environment), "CENTRAL_UIG", json=data_dict, verify=False
                 )
 
                 if trx_response.ok:
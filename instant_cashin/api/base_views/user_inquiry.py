@@ -3,8 +3,6 @@ from __future__ import unicode_literals
 
 import logging
 
-import requests
-
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ImproperlyConfigured
 from django.shortcuts import get_object_or_404
@@ -16,6 +14,7 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from disbursement.models import VMTData
+from utilities import upstream
 from utilities.logging import logging_message
 
 from ...utils import get_from_env
@@ -81,7 +80,10 @@ class InstantUserInquiryAPIView(views.APIView):
 
         try:
             logging_message(INSTANT_CASHIN_REQUEST_LOGGER, "[request] [USER INQUIRY]", request, f"{data_dict}")
-            inquiry_response = requests.post(get_from_env(vmt_data.vmt_environment), json=data_dict, verify=False)
+            inquiry_response = upstream.post(
+                    get_from_env(vmt_data.vmt_environment), "CENTRAL_UIG_INQUIRY", idempotent=True,
+                    json=data_dict, verify=False
+            )
             json_inquiry_response = inquiry_response.json()
         except (TimeoutError, ImproperlyConfigured, Exception) as e:
             log_msg = e.args[0]
@@ -61,6 +61,7 @@ class InstantDisbursementRequestSerializer(serializers.Serializer):
     pin = serializers.CharField(min_length=6, max_length=6, required=False, allow_null=True, allow_blank=True)
     user = serializers.CharField(max_length=254, required=False, allow_blank=False)
     is_single_step = serializers.BooleanField(required=False, default=False)
+    is_async = serializers.BooleanField(required=False, default=False)
     client_reference_id = serializers.UUIDField(required=False)
     comment = serializers.CharField(max_length=140, required=False)
 
@@ -105,18 +106,14 @@ class InstantDisbursementRequestSerializer(serializers.Serializer):
                 raise serializers.ValidationError(
                         _("Symbols like !%*+&,<=> not allowed in full_name")
                 )
-        if issuer in ["vodafone", "etisalat", "aman"] and attrs.get('client_reference_id'):
-            if InstantTransaction.objects.filter(client_transaction_reference=attrs.get('client_reference_id')).exists():
+
+        # The async worker authorizes the transfer by the super admin's PIN, the passed pin is never queued
+        if attrs.get('is_async') and attrs.get('pin') and not attrs.get('is_single_step'):
+            from ..async_disbursement import is_async_issuer          # Circular import
+            if is_async_issuer(issuer):
                 raise serializers.ValidationError(
-                        _("client_reference_id is used before.")
+                        _("pin can't be passed with is_async requests, send the request without is_async to use it")
                 )
-               
-        if issuer in ["bank_wallet", "bank_card", "orange"] and attrs.get('client_reference_id'):
-               if BankTransaction.objects.filter(client_transaction_reference=attrs.get('client_reference_id')).exists():
-                raise serializers.ValidationError(
-                            _("client_reference_id is used before.")
-                    )
-
         return attrs
 
 
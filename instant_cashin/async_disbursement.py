@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import json
+import logging
+
+import requests
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+from rest_framework import status
+
+from disbursement.models import VMTData
+from disbursement.utils import EXTERNAL_ERROR_MSG, INTERNAL_ERROR_MSG
+from users.hierarchy import resolve_hierarchy
+from utilities import upstream
+
+from .api.serializers import InstantTransactionResponseModelSerializer
+from .models import InstantTransaction
+from .reconciliation import ISSUERS_FEES_TYPES
+from .specific_issuers_integrations.aman.instant_cashin import UUIDEncoder
+from .utils import get_from_env
+
+
+INSTANT_CASHIN_SUCCESS_LOGGER = logging.getLogger("instant_cashin_success")
+INSTANT_CASHIN_FAILURE_LOGGER = logging.getLogger("instant_cashin_failure")
+CALLBACK_REQUESTS_LOGGER = logging.getLogger("callback_requests")
+
+ASYNC_ACCEPTED_MSG = _("Your transaction is accepted and being processed, wait for its callback or inquire about it")
+TIMEOUT_ERROR_MSG = _('Request timeout error')
+# Status codes of the accepted transactions before and while they're picked by the worker
+ACCEPTED_STATUS_CODE = str(status.HTTP_202_ACCEPTED)
+PROCESSING_STATUS_CODE = str(status.HTTP_102_PROCESSING)
+UIG_UNKNOWN_STATUS_CODES = ["501", "6005"]
+DEFAULT_STALE_AFTER = 900
+
+
+def is_async_issuer(issuer):
+    """Only the wallets disbursed over UIG are accepted at the async mode, the other issuers are disbursed inline"""
+    return issuer in ["vodafone", "etisalat"] or \
+        (issuer in ["orange", "bank_wallet"] and settings.BANK_WALLET_AND_ORNAGE_ISSUER == "VODAFONE")
+
+
+def claim_accepted_transaction(transaction_uid):
+    """
+    Move the accepted transaction to processing with one conditional update so that a redelivered task
+        never sends the same transaction to UIG twice
+    :return: the claimed transaction or None if it's picked before
+    """
+    claimed = InstantTransaction.objects.filter(
+            uid=transaction_uid, status=InstantTransaction.PENDING, transaction_status_code=ACCEPTED_STATUS_CODE
+    ).update(transaction_status_code=PROCESSING_STATUS_CODE, updated_at=timezone.now())
+    if not claimed:
+        return None
+    return InstantTransaction.objects.select_related("from_user").get(uid=transaction_uid)
+
+
+def stale_async_transactions(status_code, stale_after=None):
+    """
+    :param status_code: ACCEPTED_STATUS_CODE or PROCESSING_STATUS_CODE
+    :param stale_after: seconds since the last update, defaults to INSTANT_DISBURSEMENT_STALE_AFTER
+    :return: uids of the pending async transactions left at the passed status code longer than stale_after
+    """
+    stale_after = stale_after or getattr(settings, "INSTANT_DISBURSEMENT_STALE_AFTER", DEFAULT_STALE_AFTER)
+    return list(InstantTransaction.objects.filter(
+            status=InstantTransaction.PENDING, transaction_status_code=status_code,
+            updated_at__lt=timezone.now() - datetime.timedelta(seconds=stale_after)
+    ).values_list("uid", flat=True))
+
+
+def mark_stale_transaction_unknown(transaction_uid):
+    """
+    Mark the transaction whose worker died while processing it as unknown and refund its reserved amount,
+        it may have reached UIG so the unknown transactions inquiry debits it again if it's found successful
+    :return: True if the transaction is marked by this call
+    """
+    with transaction.atomic():
+        stale_transaction = InstantTransaction.objects.select_for_update().select_related("from_user").filter(
+                uid=transaction_uid, status=InstantTransaction.PENDING, transaction_status_code=PROCESSING_STATUS_CODE
+        ).first()
+        if stale_transaction is None:
+            return False
+
+        stale_transaction.mark_unknown(status.HTTP_408_REQUEST_TIMEOUT, TIMEOUT_ERROR_MSG)
+        refund_reserved_amount(stale_transaction)
+
+    INSTANT_CASHIN_FAILURE_LOGGER.debug(
+            f"[message] [ASYNC STALE TRX MARKED UNKNOWN] [{stale_transaction.from_user}] [{transaction_uid}]"
+    )
+    return True
+
+
+def uig_request_payload(transaction):
+    """
+    Build the UIG instant disbursement payload of the transaction the same way the sync mode does, the PIN is read
+        from the .env file at the worker so it's never sent over the broker
+    """
+    user = transaction.from_user
+    issuer = ISSUERS_FEES_TYPES[transaction.issuer_type]
+    routed_to_vodafone = issuer in ["orange", "bank_wallet"] or \
+        (issuer == "etisalat" and settings.ETISALAT_ISSUER == "VODAFONE")
+    wallet_issuer = "VODAFONE" if routed_to_vodafone or issuer == "vodafone" else issuer.upper()
+
+    vmt_data = user.root.client.creator.vmt
+    data_dict = vmt_data.return_vmt_data(VMTData.INSTANT_DISBURSEMENT)
+    data_dict['MSISDN2'] = transaction.anon_recipient
+    data_dict['AMOUNT'] = str(transaction.amount)
+    data_dict['WALLETISSUER'] = wallet_issuer
+    data_dict['MSISDN'] = user.root.super_admin.first_non_super_agent(
+            "VODAFONE" if wallet_issuer == "VODAFONE" else issuer
+    )
+    data_dict['PIN'] = get_from_env(f"{user.root.super_admin.username}_{wallet_issuer}_PIN")
+    data_dict['EXTREFNUM'] = str(transaction.uid)
+    if routed_to_vodafone:
+        data_dict['TYPE'] = "DPSTREQ"
+
+    return get_from_env(vmt_data.vmt_environment), data_dict
+
+
+def refund_reserved_amount(transaction):
+    """Return the amount reserved at accepting the transaction, it's debited again once it's found successful"""
+    budget = transaction.from_user.root.budget
+    balance_after = budget.refund_deducted_amount(transaction.amount, ISSUERS_FEES_TYPES[transaction.issuer_type])
+    transaction.balance_before = transaction.balance_after = balance_after
+    transaction.save(update_fields=['balance_before', 'balance_after', 'updated_at'])
+
+
+def disburse_accepted_transaction(transaction):
+    """
+    Send the accepted transaction to UIG, its amount is reserved at the budget so it's kept if the transaction
+        succeeded and refunded if it failed or its status is unknown
+    """
+    resolve_hierarchy(transaction.from_user)
+    log_header = f"[{transaction.from_user}] [{transaction.uid}]"
+
+    try:
+        url, data_dict = uig_request_payload(transaction)
+        transaction.anon_sender = data_dict['MSISDN']
+        transaction.save(update_fields=['anon_sender', 'updated_at'])
+    except Exception as err:
+        INSTANT_CASHIN_FAILURE_LOGGER.debug(f"[message] [ASYNC INTERNAL SYSTEM ERROR] {log_header} -- {err.args}")
+        transaction.mark_failed(status.HTTP_500_INTERNAL_SERVER_ERROR, INTERNAL_ERROR_MSG)
+        refund_reserved_amount(transaction)
+        return transaction
+
+    try:
+        # check if msisdn is test number
+        if get_from_env("ENVIRONMENT") in ['staging', 'local'] and \
+                data_dict['MSISDN2'] == get_from_env(f"test_number_for_{ISSUERS_FEES_TYPES[transaction.issuer_type]}"):
+            transaction.mark_successful(200, "")
+            return transaction
+
+        trx_response = upstream.post(url, "CENTRAL_UIG", json=data_dict, verify=False)
+        if not trx_response.ok:
+            raise ValueError(trx_response.text)
+        json_trx_response = trx_response.json()
+    except (requests.Timeout, TimeoutError) as err:
+        INSTANT_CASHIN_FAILURE_LOGGER.debug(
+                f"[response] [ASYNC ERROR FROM CENTRAL] {log_header} -- timeout, {err.args}"
+        )
+        transaction.mark_unknown(status.HTTP_408_REQUEST_TIMEOUT, TIMEOUT_ERROR_MSG)
+        refund_reserved_amount(transaction)
+        return transaction
+    except Exception as err:
+        INSTANT_CASHIN_FAILURE_LOGGER.debug(f"[response] [ASYNC ERROR FROM CENTRAL] {log_header} -- {err.args}")
+        transaction.mark_failed(status.HTTP_424_FAILED_DEPENDENCY, EXTERNAL_ERROR_MSG)
+        refund_reserved_amount(transaction)
+        return transaction
+
+    transaction.reference_id = json_trx_response.get("TXNID", "")
+    if json_trx_response["TXNSTATUS"] == "200":
+        INSTANT_CASHIN_SUCCESS_LOGGER.debug(f"[response] [ASYNC SUCCESSFUL TRX] {log_header} -- {json_trx_response}")
+        transaction.mark_successful(json_trx_response["TXNSTATUS"], json_trx_response["MESSAGE"])
+        return transaction
+
+    INSTANT_CASHIN_FAILURE_LOGGER.debug(f"[response] [ASYNC FAILED TRX] {log_header} -- {json_trx_response}")
+    if json_trx_response["TXNSTATUS"] in UIG_UNKNOWN_STATUS_CODES:
+        transaction.mark_unknown(json_trx_response["TXNSTATUS"], json_trx_response["MESSAGE"])
+    else:
+        transaction.mark_failed(json_trx_response["TXNSTATUS"], json_trx_response["MESSAGE"])
+    refund_reserved_amount(transaction)
+    return transaction
+
+
+def notify_transaction_callback(transaction):
+    """POST the final state of the transaction to the callback url of its root if any"""
+    callback_url = transaction.from_user.root.callback_url
+    if not callback_url:
+        return None
+
+    callback_payload = json.dumps(InstantTransactionResponseModelSerializer(transaction).data, cls=UUIDEncoder)
+    log_header = f"[{callback_url}] [{transaction.from_user}]"
+    CALLBACK_REQUESTS_LOGGER.debug(
+            f"[callback request] [async instant disbursement] {log_header} -- {callback_payload}"
+    )
+    try:
+        response = upstream.post(
+                callback_url, "MERCHANT_CALLBACK", idempotent=True,
+                data=callback_payload, headers={'Content-Type': 'application/json'}
+        )
+    except Exception as err:
+        CALLBACK_REQUESTS_LOGGER.debug(f"[callback response] [async instant disbursement] {log_header} -- {err.args}")
+        return None
+
+    CALLBACK_REQUESTS_LOGGER.debug(
+            f"[callback response] [async instant disbursement] {log_header} -- {response.status_code}"
+    )
+    return response
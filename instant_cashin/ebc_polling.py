@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from disbursement.dispatcher import IssuerDispatcher
+
+from .specific_issuers_integrations import BankTransactionsChannel
+
+
+ACH_GET_TRX_STATUS_LOGGER = logging.getLogger("ach_get_transaction_status")
+
+EBC_POLLING_LOCK_KEY = "ebc_status_polling_lock"
+EBC_POLLING_CHECKPOINT_KEY = "ebc_status_polling_checkpoint_{}"
+# A checkpoint older than a day belongs to a run that won't be resumed
+EBC_POLLING_CHECKPOINT_TIMEOUT = 24 * 60 * 60
+DEFAULT_EBC_POLLING_CONCURRENCY = 4
+DEFAULT_EBC_POLLING_CHUNK_SIZE = 100
+DEFAULT_EBC_POLLING_LOCK_TIMEOUT = 15 * 60
+
+
+class PollingLock:
+    """
+    Cache lock held by one EBC status polling run at a time across all the workers,
+        it expires after EBC_STATUS_POLLING_LOCK_TIMEOUT seconds without being extended so a killed run doesn't hold it
+    """
+
+    def __init__(self, key=EBC_POLLING_LOCK_KEY, timeout=None):
+        self.key = key
+        self.timeout = timeout or getattr(settings, "EBC_STATUS_POLLING_LOCK_TIMEOUT", DEFAULT_EBC_POLLING_LOCK_TIMEOUT)
+        self.token = uuid.uuid4().hex
+
+    def acquire(self):
+        """:return: True if the lock is acquired, False if another run holds it"""
+        return cache.add(self.key, self.token, self.timeout)
+
+    def is_owned(self):
+        return cache.get(self.key) == self.token
+
+    def extend(self):
+        """Restart the lock timeout while the run is still making progress"""
+        if self.is_owned():
+            cache.touch(self.key, self.timeout)
+
+    def release(self):
+        if self.is_owned():
+            cache.delete(self.key)
+
+
+def _after_checkpoint(transactions, checkpoint):
+    created_at, trx_id = checkpoint
+    return transactions.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=trx_id))
+
+
+def poll_bank_transactions_statuses(transactions, run_name, lock=None, inquire=None, concurrency=None,
+                                    chunk_size=None):
+    """
+    Inquire EBC about the passed bank transactions statuses oldest first with bounded concurrency,
+        the last inquired transaction is checkpointed after every chunk so a killed run resumes after it
+    :param transactions: bank transactions queryset to be polled
+    :param run_name: name of the polling run, runs with the same name share one checkpoint
+    :param lock: PollingLock held by the run, extended after every chunk
+    :param inquire: callable(bank transaction) inquiring about one transaction status
+    :param concurrency: overrides EBC_STATUS_POLLING_CONCURRENCY
+    :param chunk_size: overrides EBC_STATUS_POLLING_CHUNK_SIZE
+    :return: number of inquired transactions
+    """
+    checkpoint_key = EBC_POLLING_CHECKPOINT_KEY.format(run_name)
+    concurrency = concurrency or getattr(settings, "EBC_STATUS_POLLING_CONCURRENCY", DEFAULT_EBC_POLLING_CONCURRENCY)
+    chunk_size = chunk_size or getattr(settings, "EBC_STATUS_POLLING_CHUNK_SIZE", DEFAULT_EBC_POLLING_CHUNK_SIZE)
+    inquire = inquire or BankTransactionsChannel.get_transaction_status
+    transactions = transactions.select_related("parent_transaction").order_by("created_at", "id")
+
+    checkpoint = cache.get(checkpoint_key)
+    if checkpoint is not None:
+        ACH_GET_TRX_STATUS_LOGGER.debug(
+                f"[message] [EBC STATUS POLLING] [{run_name}] -- resuming after checkpoint: {checkpoint}"
+        )
+
+    inquired = 0
+    while True:
+        chunk = list((_after_checkpoint(transactions, checkpoint) if checkpoint else transactions)[:chunk_size])
+        if not chunk:
+            break
+
+        IssuerDispatcher("bank", max_in_flight=concurrency).dispatch(chunk, lambda bank_trx, agent: inquire(bank_trx))
+        inquired += len(chunk)
+        checkpoint = (chunk[-1].created_at, chunk[-1].id)
+        cache.set(checkpoint_key, checkpoint, EBC_POLLING_CHECKPOINT_TIMEOUT)
+        if lock is not None:
+            lock.extend()
+
+    cache.delete(checkpoint_key)
+    ACH_GET_TRX_STATUS_LOGGER.debug(
+            f"[message] [EBC STATUS POLLING] [{run_name}] -- inquired transactions count: {inquired}"
+    )
+    return inquired
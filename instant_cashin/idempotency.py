@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+from rest_framework import status
+from rest_framework.response import Response
+
+from disbursement.models import BankTransaction
+
+from .api.serializers import BankTransactionResponseModelSerializer, InstantTransactionResponseModelSerializer
+from .models import IdempotencyKey, InstantTransaction
+
+
+IDEMPOTENT_RESPONSE_CACHE_KEY = "instant_disbursement_response_{}_{}"
+DEFAULT_IDEMPOTENT_RESPONSE_TTL = 10 * 60
+DEFAULT_CLAIM_TTL = 5 * 60
+# Request fields left out of the fingerprint of a request, the pin isn't to be persisted even hashed
+UNHASHED_REQUEST_FIELDS = ['pin']
+
+REFERENCE_REUSED_MSG = _("client_reference_id is used before.")
+REQUEST_IN_PROGRESS_MSG = _("A request with the same client_reference_id is being processed, try again later")
+
+
+def request_fingerprint(validated_data):
+    """:return: sha256 of the validated request's data, a retry of the same request has the same fingerprint"""
+    hashed_data = {key: value for key, value in validated_data.items() if key not in UNHASHED_REQUEST_FIELDS}
+    return hashlib.sha256(json.dumps(hashed_data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _cache_key(user, client_reference_id):
+    return IDEMPOTENT_RESPONSE_CACHE_KEY.format(user.id, client_reference_id)
+
+
+def _failure_response(status_description, status_code):
+    return Response({
+        "disbursement_status": _("failed"), "status_description": status_description, "status_code": str(status_code)
+    }, status=status_code)
+
+
+def replay_transaction_response(user, client_reference_id):
+    """
+    Rebuild the response of the transaction disbursed by the user with the passed reference,
+        used when the cached response has expired or the transaction predates the idempotency keys
+    :return: Response object or None if the user has no transaction with this reference
+    """
+    instant_trx = InstantTransaction.objects.\
+        filter(from_user_id=user.id, client_transaction_reference=client_reference_id).first()
+    if instant_trx:
+        return Response(InstantTransactionResponseModelSerializer(instant_trx).data, status=status.HTTP_200_OK)
+
+    bank_trx = BankTransaction.objects.filter(
+            user_created_id=user.id, client_transaction_reference=client_reference_id, is_latest_version=True
+    ).first()
+    if bank_trx:
+        return Response(BankTransactionResponseModelSerializer(bank_trx).data, status=status.HTTP_200_OK)
+
+    return None
+
+
+def has_reference_transactions(user, client_reference_id):
+    return InstantTransaction.objects.\
+        filter(from_user_id=user.id, client_transaction_reference=client_reference_id).exists() or \
+        BankTransaction.objects.\
+        filter(user_created_id=user.id, client_transaction_reference=client_reference_id).exists()
+
+
+def is_reference_used_by_others(user, client_reference_id):
+    return InstantTransaction.objects.\
+        filter(client_transaction_reference=client_reference_id).exclude(from_user_id=user.id).exists() or \
+        BankTransaction.objects.\
+        filter(client_transaction_reference=client_reference_id).exclude(user_created_id=user.id).exists()
+
+
+def take_over_expired_claim(idempotency_key):
+    """
+    Take over the claim left in flight longer than INSTANT_DISBURSEMENT_CLAIM_TTL seconds by a worker that was killed
+        before storing or releasing it, using one conditional update so only one of the concurrent retries takes it
+    :return: the taken over idempotency key or None if the claim is still in flight
+    """
+    claim_ttl = getattr(settings, "INSTANT_DISBURSEMENT_CLAIM_TTL", DEFAULT_CLAIM_TTL)
+    now = timezone.now()
+    if idempotency_key.response_status_code is not None or \
+            idempotency_key.claimed_at >= now - datetime.timedelta(seconds=claim_ttl):
+        return None
+
+    taken_over = IdempotencyKey.objects.filter(
+            id=idempotency_key.id, claimed_at=idempotency_key.claimed_at, response_status_code__isnull=True
+    ).update(claimed_at=now, updated_at=now)
+    if not taken_over:
+        return None
+    idempotency_key.claimed_at = idempotency_key.updated_at = now
+    return idempotency_key
+
+
+def claim_client_reference(user, client_reference_id, request_hash):
+    """
+    Claim the client reference id for the current request, the unique (user, client_reference_id) constraint
+        lets only one of the concurrent retries through to the issuers
+    :return: (idempotency key, None) if the request is to be disbursed
+        or (None, response) to be returned as is without touching the issuers or the budget
+    """
+    cached_response = cache.get(_cache_key(user, client_reference_id))
+    if cached_response:
+        cached_hash, status_code, data = cached_response
+        if cached_hash != request_hash:
+            return None, _failure_response(REFERENCE_REUSED_MSG, status.HTTP_400_BAD_REQUEST)
+        return None, Response(data, status=status_code)
+
+    try:
+        with transaction.atomic():
+            idempotency_key = IdempotencyKey.objects.create(
+                    user=user, client_reference_id=client_reference_id, request_hash=request_hash
+            )
+    except IntegrityError:
+        idempotency_key = IdempotencyKey.objects.\
+            filter(user=user, client_reference_id=client_reference_id).first()
+        if idempotency_key and idempotency_key.request_hash != request_hash:
+            return None, _failure_response(REFERENCE_REUSED_MSG, status.HTTP_400_BAD_REQUEST)
+
+        replayed_response = replay_transaction_response(user, client_reference_id)
+        if replayed_response is not None:
+            return None, replayed_response
+
+        taken_over_key = take_over_expired_claim(idempotency_key) if idempotency_key else None
+        if taken_over_key is None:
+            return None, _failure_response(REQUEST_IN_PROGRESS_MSG, status.HTTP_409_CONFLICT)
+        return taken_over_key, None
+
+    # The references used before the idempotency keys were introduced
+    if is_reference_used_by_others(user, client_reference_id):
+        idempotency_key.delete()
+        return None, _failure_response(REFERENCE_REUSED_MSG, status.HTTP_400_BAD_REQUEST)
+
+    replayed_response = replay_transaction_response(user, client_reference_id)
+    if replayed_response is not None:
+        return None, replayed_response
+
+    return idempotency_key, None
+
+
+def release_client_reference(idempotency_key):
+    """Drop the claim of a request that hasn't created any transaction so that it can be retried safely"""
+    if idempotency_key is not None:
+        idempotency_key.delete()
+
+
+def store_client_reference_response(idempotency_key, response):
+    """Cache the response of the claiming request to be returned to its retries for a short while"""
+    if idempotency_key is None:
+        return
+
+    user, client_reference_id = idempotency_key.user, idempotency_key.client_reference_id
+    if response is None or not has_reference_transactions(user, client_reference_id):
+        release_client_reference(idempotency_key)
+        return
+
+    timeout = getattr(settings, "INSTANT_DISBURSEMENT_IDEMPOTENCY_TTL", DEFAULT_IDEMPOTENT_RESPONSE_TTL)
+    cache.set(
+            _cache_key(user, client_reference_id),
+            (idempotency_key.request_hash, response.status_code, response.data),
+            timeout
+    )
+    idempotency_key.response_status_code = response.status_code
+    idempotency_key.save(update_fields=['response_status_code', 'updated_at'])
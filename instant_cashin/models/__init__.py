@@ -1,2 +1,3 @@
+from .idempotency import IdempotencyKey
 from .instant_transactions import AbstractBaseIssuer, InstantTransaction
 from .specific_issuers import AmanTransaction
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from core.models import AbstractTimeStamp
+
+
+class IdempotencyKey(AbstractTimeStamp):
+    """
+    Claim of a client reference id by the first instant disbursement request of a user,
+        the retries of the same request are answered with the response of the claiming request
+    """
+
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="idempotency_keys")
+    client_reference_id = models.UUIDField(_("Client Reference ID"))
+    request_hash = models.CharField(_("Request Hash"), max_length=64)
+    response_status_code = models.PositiveSmallIntegerField(_("Response Status Code"), null=True, blank=True)
+    # Moved forward when a claim left in flight by a killed worker is taken over by a retry
+    claimed_at = models.DateTimeField(_("Claimed At"), default=timezone.now)
+
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'client_reference_id'], name='unique_user_client_reference'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -- {self.client_reference_id}"
@@ -1,6 +1,7 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.contenttypes.fields import GenericRelation
 from django.utils.translation import gettext_lazy as _
 from rest_framework import status
@@ -151,16 +152,34 @@ class InstantTransaction(AbstractBaseTransaction, AbstractBaseIssuer):
         verbose_name_plural = "Instant Transactions"
         get_latest_by = "-updated_at"
         ordering = ["-created_at", "-updated_at"]
+        indexes = [
+            models.Index(fields=['from_user', 'disbursed_date'], name='instant_trx_user_disbursed_idx'),
+            models.Index(fields=['from_user', '-created_at'], name='instant_trx_user_created_idx'),
+            # Unknown/pending transactions are inquired about per issuer by the periodic tasks
+            models.Index(
+                    fields=['issuer_type', 'status'], condition=Q(status__in=['U', 'P']),
+                    name='instant_trx_unsettled_idx'
+            ),
+        ]
 
     def update_status_code_and_description(self, code=None, description=None):
         self.transaction_status_code = code if code else status.HTTP_500_INTERNAL_SERVER_ERROR
         self.transaction_status_description = description if description else ""
 
+    def save_status(self, new_status):
+        """Save the new status and move its document counters at the same database transaction"""
+        from disbursement.doc_counters import bank_status_bucket, count_status_change   # Circular import
+
+        previous_bucket = bank_status_bucket(self.status)
+        self.status = new_status
+        with transaction.atomic():
+            self.save()
+            count_status_change(self, previous_bucket)
+
     def mark_pending(self, status_code="", failure_reason=""):
         """Mark transaction status as pending"""
         self.update_status_code_and_description(str(status_code), failure_reason)
-        self.status = self.PENDING
-        self.save()
+        self.save_status(self.PENDING)
 
     def mark_failed(self, status_code="", failure_reason=""):
         """
@@ -170,20 +189,17 @@ class InstantTransaction(AbstractBaseTransaction, AbstractBaseIssuer):
         if str(status_code) == '90093' or str(status_code) == '6051':
             failure_reason = "Service temporarily suspended"
         self.update_status_code_and_description(str(status_code), failure_reason)
-        self.status = self.FAILED
-        self.save()
+        self.save_status(self.FAILED)
 
     def mark_successful(self, status_code="", failure_reason=""):
         """Mark transaction status as successful and add the status code and description if provided"""
         self.update_status_code_and_description(str(status_code), failure_reason)
-        self.status = self.SUCCESSFUL
-        self.save()
+        self.save_status(self.SUCCESSFUL)
 
     def mark_unknown(self, status_code="", failure_reason=""):
         """Mark transaction status as unknown and add the status code and description if provided"""
         self.update_status_code_and_description(str(status_code), failure_reason)
-        self.status = self.UNKNOWN
-        self.save()
+        self.save_status(self.UNKNOWN)
 
     @property
     def aman_transaction(self):
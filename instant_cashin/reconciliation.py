@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+from django.db import transaction
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from disbursement.persistence import get_bulk_create_batch_size
+from disbursement.rollup import mark_rollup_days_stale
+from utilities.models import Budget
+
+from .models.instant_transactions import InstantTransaction
+
+
+TIMEOUTS_UPDATE_LOGGER = logging.getLogger("timeouts_updates")
+
+SUCCESS = "success"
+FAILED_FOUND = "failed_found"
+FAILED_MISSING = "failed_missing"
+
+ISSUERS_FEES_TYPES = {
+    "V": "vodafone",
+    "E": "etisalat",
+    "O": "orange",
+    "B": "bank_wallet",
+}
+TIMEOUTS_STATUS_CODES = [6005, 501]
+# Timed out transactions values read to partition and debit them without loading the model objects
+TIMEOUT_FIELDS = ('uid', 'reference_id', 'disbursed_date', 'amount', 'issuer_type', 'from_user__root',
+                  'document__disbursed_by__root')
+
+
+def index_vodafone_report(vodafone_data):
+    """
+    :param vodafone_data: {reference id: {"wallet": .., "success": .., "amount": ..}} rows of the vodafone report
+    :return: the report keyed by the reference ids as strings as they're saved on the transactions
+    """
+    return {str(reference_id): row for reference_id, row in vodafone_data.items() if reference_id is not None}
+
+
+def partition_timeouts(timeouts, report):
+    """
+    Split the timed out transactions by their state at the vodafone report
+    :param timeouts: dicts of the TIMEOUT_FIELDS values
+    :param report: indexed vodafone report
+    :return: {SUCCESS: [..], FAILED_FOUND: [..], FAILED_MISSING: [..]}, transactions without reference id are missing
+    """
+    buckets = {SUCCESS: [], FAILED_FOUND: [], FAILED_MISSING: []}
+    for trn in timeouts:
+        report_row = report.get(trn['reference_id']) if trn['reference_id'] else None
+        if report_row is None:
+            buckets[FAILED_MISSING].append(trn)
+        elif report_row["success"]:
+            buckets[SUCCESS].append(trn)
+        else:
+            buckets[FAILED_FOUND].append(trn)
+    return buckets
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def _debit_successful_timeouts(successful, batch_size):
+    """Debit the successful transactions with one batch debit per root and save their balances"""
+    per_root = {}
+    for trn in successful:
+        per_root.setdefault(trn['from_user__root'] or trn['document__disbursed_by__root'], []).append(trn)
+
+    budgets = {budget.disburser_id: budget for budget in Budget.objects.filter(disburser_id__in=per_root.keys())}
+    for root_id, root_trns in per_root.items():
+        balances = budgets[root_id].update_disbursed_amounts_and_current_balance_in_batch(
+            [(trn['amount'], ISSUERS_FEES_TYPES[trn['issuer_type']]) for trn in root_trns]
+        )
+        InstantTransaction.objects.bulk_update(
+            [InstantTransaction(uid=trn['uid'], balance_before=balance_before, balance_after=balance_after)
+             for trn, (balance_before, balance_after) in zip(root_trns, balances)],
+            ['balance_before', 'balance_after'], batch_size=batch_size
+        )
+
+
+def reconcile_instant_timeouts(timeouts_qs, vodafone_data, batch_size=None):
+    """
+    Update the timed out instant transactions from the vodafone report using one update query per batch of every
+        bucket, the successful ones are marked successful then debited per root and the rest are marked failed
+    :param timeouts_qs: unknown status instant transactions to be reconciled
+    :return: {SUCCESS: count, FAILED_FOUND: count, FAILED_MISSING: count}
+    """
+    batch_size = get_bulk_create_batch_size(batch_size)
+    buckets = partition_timeouts(timeouts_qs.values(*TIMEOUT_FIELDS).iterator(), index_vodafone_report(vodafone_data))
+    now = timezone.now()
+
+    with transaction.atomic():
+        for batch in _batches(buckets[SUCCESS], batch_size):
+            InstantTransaction.objects.filter(uid__in=[trn['uid'] for trn in batch]).update(
+                status="S",
+                transaction_status_code="200",
+                transaction_status_description=Concat(
+                    Value("تم ايداع "), Cast('amount', output_field=CharField()), Value(" جنيه إلى رقم "),
+                    F('anon_recipient'), Value("بنجاح"), output_field=CharField()
+                ),
+                updated_at=now
+            )
+            TIMEOUTS_UPDATE_LOGGER.debug(
+                f"[Timeouts updates] update transactions {[str(trn['uid']) for trn in batch]} with Succesful status"
+            )
+
+        for bucket in (FAILED_FOUND, FAILED_MISSING):
+            for batch in _batches(buckets[bucket], batch_size):
+                InstantTransaction.objects.filter(uid__in=[trn['uid'] for trn in batch]).update(
+                    status="F", updated_at=now
+                )
+                TIMEOUTS_UPDATE_LOGGER.debug(
+                    f"[Timeouts updates] [{'found' if bucket == FAILED_FOUND else 'not found'} on report] "
+                    f"update transactions {[str(trn['uid']) for trn in batch]} with failed status"
+                )
+
+        _debit_successful_timeouts(buckets[SUCCESS], batch_size)
+
+    # Queryset updates don't send post_save so the rollup days of the updated transactions are marked here
+    mark_rollup_days_stale({
+        timezone.localtime(trn['disbursed_date']).date() if timezone.is_aware(trn['disbursed_date'])
+        else trn['disbursed_date'].date()
+        for trns in buckets.values() for trn in trns if trn['disbursed_date'] is not None
+    })
+
+    return {bucket: len(trns) for bucket, trns in buckets.items()}
@@ -15,7 +15,8 @@ from django.utils.translation import gettext as _
 from rest_framework import status
 from rest_framework.response import Response
 
-from disbursement.models import BankTransaction, RemainingAmounts
+from disbursement.models import RemainingAmounts
+from disbursement.persistence import create_bank_transaction_version
 from disbursement.utils import (BANK_TRX_BEING_PROCESSED,
                                 BANK_TRX_IS_SUCCESSFUL_1,
                                 BANK_TRX_IS_SUCCESSFUL_2, BANK_TRX_RECEIVED,
@@ -25,6 +26,7 @@ from disbursement.utils import (BANK_TRX_BEING_PROCESSED,
                                 INSTANT_TRX_IS_REJECTED, INSTANT_TRX_RECEIVED,
                                 INTERNAL_ERROR_MSG, TRX_REJECTED_BY_BANK_CODES,
                                 TRX_RETURNED_BY_BANK_CODES)
+from utilities import upstream
 from utilities.ssl_certificate import SSLCertificate
 
 from ...api.serializers import (BankTransactionResponseModelSerializer,
@@ -51,7 +53,6 @@ class BankTransactionsChannel:
             'status': bank_trx_obj.status,
             'category_code': bank_trx_obj.category_code,
             'purpose': bank_trx_obj.purpose,
-            'parent_transaction': bank_trx_obj.parent_transaction,
             'document': bank_trx_obj.document,
             'is_single_step': bank_trx_obj.is_single_step,
             'user_created': bank_trx_obj.user_created,
@@ -79,7 +80,7 @@ class BankTransactionsChannel:
             "balance_before": bank_trx_obj.balance_before,
             "balance_after": bank_trx_obj.balance_after
         }
-        return BankTransaction.objects.create(**new_transaction_dict)
+        return create_bank_transaction_version(bank_trx_obj, **new_transaction_dict)
 
     @staticmethod
     def get_corresponding_instant_trx_if_any(bank_trx_obj):
@@ -139,16 +140,16 @@ class BankTransactionsChannel:
 
     @staticmethod
     def post(url, payload, bank_trx_obj):
-        """Handles POST requests to EBC using requests package"""
+        """Handles POST requests to EBC through the pooled upstream sessions"""
         log_header = "SEND ACH TRANSACTION TO EBC"
         ACH_SEND_TRX_LOGGER.debug(_(f"[request] [{log_header}] [{bank_trx_obj.user_created}] -- {payload}"))
 
         try:
-            response = requests.post(
+            response = upstream.post(
                     url,
+                    "EBC",
                     data=json.dumps(payload, separators=(",", ":")),
-                    headers={'Content-Type': 'application/json'},
-                    timeout=30
+                    headers={'Content-Type': 'application/json'}
             )
             response_log_message = f"Response: {response.json()}"
         except HTTPError as http_err:
@@ -168,16 +169,16 @@ class BankTransactionsChannel:
 
     @staticmethod
     def get(url, payload, bank_trx_obj):
-        """Handles GET requests to EBC via requests package"""
+        """Handles GET requests to EBC through the pooled upstream sessions, retried as they're inquiries"""
         log_header = "get ach transaction status from EBC"
         ACH_GET_TRX_STATUS_LOGGER.debug(_(f"[request] [{log_header}] [{bank_trx_obj.user_created}] -- {payload}"))
 
         try:
-            response = requests.get(
+            response = upstream.get(
                     url + "?",
+                    "EBC_INQUIRY",
                     params={"request": json.dumps(payload, separators=(",", ":"))},
-                    headers={'Content-Type': 'application/json'},
-                    timeout=10
+                    headers={'Content-Type': 'application/json'}
             )
             response_log_message = f"{response.json()}"
         except HTTPError as http_err:
@@ -14,6 +14,7 @@ from rest_framework import status
 from rest_framework.response import Response
 
 from data.utils import get_client_ip
+from utilities import upstream
 
 from ...api.serializers import InstantTransactionResponseModelSerializer
 from ...models import AmanTransaction
@@ -49,7 +50,7 @@ class AmanChannel:
         self.aman_logger.debug(_(f"{head} {user_portion} -- {message}"))
 
     def post(self, url, payload, sub_logging_head, headers=dict(), **kwargs):
-        """Handles POST requests using requests package"""
+        """Handles POST requests to Accept through the pooled upstream sessions"""
         if headers.get('Content-Type', None) is None:
             headers.update({'Content-Type': 'application/json'})
 
@@ -58,7 +59,7 @@ class AmanChannel:
         )
 
         try:
-            response = requests.post(url, data=json.dumps(payload), headers=headers, **kwargs)
+            response = upstream.post(url, "ACCEPT", data=json.dumps(payload), headers=headers, **kwargs)
             response.raise_for_status()
             response_log_message = f"{response.json()}"
         except HTTPError as http_err:
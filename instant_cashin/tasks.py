@@ -6,7 +6,6 @@ import logging
 
 from django.db.models import Q
 from django.utils import timezone
-from django.core.paginator import Paginator
 
 from core.models import AbstractBaseStatus
 from data.decorators import respects_language
@@ -14,10 +13,13 @@ from disbursement.models import BankTransaction
 from instant_cashin.models.instant_transactions import InstantTransaction
 from payouts.settings.celery import app
 
-from .specific_issuers_integrations import BankTransactionsChannel
+from .async_disbursement import (ACCEPTED_STATUS_CODE, PROCESSING_STATUS_CODE, claim_accepted_transaction,
+                                 disburse_accepted_transaction, mark_stale_transaction_unknown,
+                                 notify_transaction_callback, stale_async_transactions)
+from .ebc_polling import PollingLock, poll_bank_transactions_statuses
+from .reconciliation import (FAILED_FOUND, FAILED_MISSING, SUCCESS, TIMEOUTS_STATUS_CODES,
+                             reconcile_instant_timeouts)
 import requests
-from celery.task import control
-from instant_cashin.utils import get_from_env
 from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 
@@ -40,31 +42,17 @@ def check_for_status_updates_for_latest_bank_transactions(days_delta=6, **kwargs
             f"[message] [check for EBC status] [celery_task] -- " f"Exeption: {e}"
         )
         return False
-    # check if there's same task is running
-    active_tasks = control.inspect().active()
-    ach_worker = get_from_env("ach_worker")
-    ACH_GET_TRX_STATUS_LOGGER.debug(f"Active Tasks {active_tasks.get(ach_worker)}")
-    num_of_current_tasks = 0
-    for tsk in active_tasks.get(ach_worker):
-        if (
-            tsk["type"]
-            == "instant_cashin.tasks.check_for_status_updates_for_latest_bank_transactions"
-        ):
-            num_of_current_tasks += 1
-        if (
-            tsk["type"]
-            == "instant_cashin.tasks.check_for_status_updates_for_latest_bank_transactions_more_than_6_days"
-        ):
-            return False
-    if num_of_current_tasks > 1:
+    # check if there's another status polling task running, both polling tasks share the same lock
+    lock = PollingLock()
+    if not lock.acquire():
+        ACH_GET_TRX_STATUS_LOGGER.debug("[message] [check for trx update task] -- another polling run is active")
         return False
 
     try:
         five_days_ago = timezone.now() - datetime.timedelta(int(days_delta))
         latest_bank_trx_ids = (
             BankTransaction.objects.filter(Q(created_at__gte=five_days_ago))
-            .order_by("parent_transaction__transaction_id", "-id")
-            .distinct("parent_transaction__transaction_id")
+            .filter(is_latest_version=True)
             .values_list("id", flat=True)
         )
         latest_bank_transactions = (
@@ -83,15 +71,13 @@ def check_for_status_updates_for_latest_bank_transactions(days_delta=6, **kwargs
                 f"[message] [check for trx update task] [celery_task] -- "
                 f"transactions count: {latest_bank_transactions.count()}"
             )
-            paginator = Paginator(latest_bank_transactions, 500)
-            for page_number in paginator.page_range:
-                queryset = paginator.page(page_number)
-                for bank_trx in queryset:
-                    BankTransactionsChannel.get_transaction_status(bank_trx)
+            poll_bank_transactions_statuses(latest_bank_transactions, "latest", lock=lock)
         return True
     except (BankTransaction.DoesNotExist, ValueError, Exception) as e:
         ACH_GET_TRX_STATUS_LOGGER.debug(f"check for EBC status Error {e}")
         return False
+    finally:
+        lock.release()
 
 
 @app.task()
@@ -106,22 +92,11 @@ def check_for_status_updates_for_latest_bank_transactions_more_than_6_days():
             f"Exeption: {e}"
         )
         return False
-    active_tasks = control.inspect().active()
-    ach_worker = get_from_env("ach_worker")
-    ACH_GET_TRX_STATUS_LOGGER.debug(f"Active Tasks {active_tasks.get(ach_worker)}")
-    num_of_current_tasks = 0
-    for tsk in active_tasks.get(ach_worker):
-        if (
-            tsk["type"]
-            == "instant_cashin.tasks.check_for_status_updates_for_latest_bank_transactions_more_than_6_days"
-        ):
-            num_of_current_tasks += 1
-        if (
-            tsk["type"]
-            == "instant_cashin.tasks.check_for_status_updates_for_latest_bank_transactions"
-        ):
-            return False
-    if num_of_current_tasks > 1:
+    lock = PollingLock()
+    if not lock.acquire():
+        ACH_GET_TRX_STATUS_LOGGER.debug(
+            "[message] [check for trx update task more than 6 days] -- another polling run is active"
+        )
         return False
     try:
         start_date = timezone.now()
@@ -129,8 +104,7 @@ def check_for_status_updates_for_latest_bank_transactions_more_than_6_days():
         latest_bank_trx_ids = (
             BankTransaction.objects.filter(Q(created_at__gte=end_date))
             .filter(Q(created_at__lte=start_date))
-            .order_by("parent_transaction__transaction_id", "-id")
-            .distinct("parent_transaction__transaction_id")
+            .filter(is_latest_version=True)
             .values_list("id", flat=True)
         )
         latest_bank_transactions = (
@@ -149,17 +123,15 @@ def check_for_status_updates_for_latest_bank_transactions_more_than_6_days():
                 f"[message] [check for trx update task] [celery_task] -- "
                 f"transactions count: {latest_bank_transactions.count()}"
             )
-            paginator = Paginator(latest_bank_transactions, 500)
-            for page_number in paginator.page_range:
-                queryset = paginator.page(page_number)
-                for bank_trx in queryset:
-                    BankTransactionsChannel.get_transaction_status(bank_trx)
+            poll_bank_transactions_statuses(latest_bank_transactions, "more_than_6_days", lock=lock)
         return True
     except (BankTransaction.DoesNotExist, ValueError, Exception) as e:
         ACH_GET_TRX_STATUS_LOGGER.debug(
             f"check for EBC status more than 6 days Error {e}"
         )
         return False
+    finally:
+        lock.release()
 
 
 @app.task()
@@ -169,12 +141,6 @@ def update_instant_timeouts_from_vodafone_report(
     TIMEOUTS_UPDATE_LOGGER.debug(
             f"[Timeouts updates start_date : {start_date} end_date {end_date} email for {email_notify}"
         )
-    issuer_mapper = {
-        "V": "vodafone",
-        "E": "etisalat",
-        "O": "orange",
-        "B": "bank_wallet",
-    }
     date_range = (
         datetime.datetime.combine(
             datetime.datetime.strptime(start_date, "%Y-%m-%d").date(),
@@ -186,58 +152,12 @@ def update_instant_timeouts_from_vodafone_report(
         ),
     )
     trns = InstantTransaction.objects.filter(
-        disbursed_date__range=date_range, status="U", transaction_status_code__in=[6005,501]
+        disbursed_date__range=date_range, status="U", transaction_status_code__in=TIMEOUTS_STATUS_CODES
     )
-    total_timeouts = trns.count()
-    total_failed = 0
-    total_success = 0
-    for trn in trns:
-        if trn.reference_id:
-            if trn.reference_id in vodafone_data:
-                if vodafone_data[trn.reference_id]["success"]:
-                    TIMEOUTS_UPDATE_LOGGER.debug(
-                        f"[Timeouts updates] update transaction {trn.uid} and ref {trn.reference_id} with Succesful status"
-                    )
-                    trn.status = "S"
-                    trn.transaction_status_code = "200"
-                    trn.transaction_status_description = (
-                        "تم ايداع "
-                        + str(trn.amount)
-                        + " جنيه إلى رقم "
-                        + str(trn.anon_recipient)
-                        + "بنجاح"
-                    )
-                    trn.save()
-                    # update budget
-                    balance_before = trn.from_user.root.budget.get_current_balance()
-                    balance_after = trn.from_user.root.budget.update_disbursed_amount_and_current_balance(
-                        trn.amount, issuer_mapper[trn.issuer_type]
-                    )
-                    trn.balance_before = balance_before
-                    trn.balance_after = balance_after
-                    trn.save()
-                    total_success = total_success + 1
-                else:
-                    TIMEOUTS_UPDATE_LOGGER.debug(
-                        f"[Timeouts updates] [found on report ] update transaction {trn.uid} and ref {trn.reference_id} with failed status"
-                    )
-                    trn.status = "F"
-                    trn.save()
-                    total_failed = total_failed + 1
-            else:
-                TIMEOUTS_UPDATE_LOGGER.debug(
-                        f"[Timeouts updates] [not found on report ] update transaction {trn.uid} and ref {trn.reference_id} with failed status"
-                    )
-                trn.status = "F"
-                trn.save()
-                total_failed = total_failed + 1
-        else:
-            TIMEOUTS_UPDATE_LOGGER.debug(
-                        f"[Timeouts updates] [has no ref number ] update transaction {trn.uid} and ref {trn.reference_id} with failed status"
-                    )
-            trn.status = "F"
-            trn.save()
-            total_failed = total_failed + 1
+    counts = reconcile_instant_timeouts(trns, vodafone_data)
+    total_success = counts[SUCCESS]
+    total_failed = counts[FAILED_FOUND] + counts[FAILED_MISSING]
+    total_timeouts = total_success + total_failed
 
     if email_notify:
         subject = f"Timeouts update from {start_date} To {end_date}"
@@ -251,3 +171,38 @@ def update_instant_timeouts_from_vodafone_report(
         )
         mail_to_be_sent.attach_alternative(message_body, "text/html")
         mail_to_be_sent.send()
+
+
+@app.task()
+def disburse_instant_transaction(transaction_uid):
+    """
+    Task for disbursing an instant transaction accepted at the async mode then notifying the callback url
+        of its root, it's routed to the INSTANT_DISBURSEMENT_QUEUE so the slow upstreams don't hold the other tasks
+    """
+    transaction = claim_accepted_transaction(transaction_uid)
+    if transaction is None:
+        return False
+
+    disburse_accepted_transaction(transaction)
+    notify_transaction_callback(transaction)
+    return True
+
+
+@app.task()
+def recover_stale_async_transactions(**kwargs):
+    """
+    Periodic task recovering the async mode transactions stuck before their final state, the accepted ones whose
+        task is lost are queued again and the ones whose worker died while processing them are marked unknown
+        to be settled by the unknown transactions inquiry
+    """
+    stale_accepted = stale_async_transactions(ACCEPTED_STATUS_CODE)
+    # Touch them first so the next run doesn't queue them again while they're still waiting at the queue
+    InstantTransaction.objects.filter(uid__in=stale_accepted, transaction_status_code=ACCEPTED_STATUS_CODE).\
+        update(updated_at=timezone.now())
+    for transaction_uid in stale_accepted:
+        disburse_instant_transaction.apply_async((str(transaction_uid),))
+
+    for transaction_uid in stale_async_transactions(PROCESSING_STATUS_CODE):
+        mark_stale_transaction_unknown(transaction_uid)
+
+    return True
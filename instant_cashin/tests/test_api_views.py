@@ -401,6 +401,44 @@ class InstantDisbursementAPIViewTests(APITestCase):
             response = self.client.post(url, data, format='json')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    # test instant Cashin at the async mode reserves the budget and queues the disbursement
+    @patch("instant_cashin.api.base_views.instant_disbursement.disburse_instant_transaction.apply_async")
+    def test_instant_cashin_on_vodafone_async(self, apply_async):
+        FeeSetup(budget_related=self.budget, issuer='vf', fee_type='p', percentage_value=2.25).save()
+        url = api_reverse("instant_api:instant_disburse")
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access_token)
+        data = {
+            "amount": "20.50",
+            "issuer": "vodafone",
+            "msisdn": "01003764686",
+            "is_async": True
+        }
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        transaction = InstantTransaction.objects.get(uid=response.data['transaction_id'])
+        self.assertEqual(transaction.status, InstantTransaction.PENDING)
+        self.assertEqual(self.budget.get_current_balance(), transaction.balance_after)
+        apply_async.assert_called_once_with((str(transaction.uid),))
+
+    # test instant Cashin at the async mode rejects the passed pin as it's never queued with the transaction
+    @patch("instant_cashin.api.base_views.instant_disbursement.disburse_instant_transaction.apply_async")
+    def test_instant_cashin_on_vodafone_async_with_pin(self, apply_async):
+        url = api_reverse("instant_api:instant_disburse")
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access_token)
+        data = {
+            "amount": "20.50",
+            "issuer": "vodafone",
+            "msisdn": "01003764686",
+            "pin": "123456",
+            "is_async": True
+        }
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(InstantTransaction.objects.exists())
+        apply_async.assert_not_called()
+
     # test instant Cashin on etisalat with internal server error
     def test_instant_cashin_on_etisalat_with_internal_server_error(self):
         fees_setup_etisalat = FeeSetup(
@@ -0,0 +1,27 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from instant_cashin.ebc_polling import EBC_POLLING_LOCK_KEY, PollingLock
+
+
+class PollingLockTests(SimpleTestCase):
+
+    def tearDown(self):
+        cache.delete(EBC_POLLING_LOCK_KEY)
+
+    def test_lock_is_held_by_one_run_at_a_time(self):
+        first_run, second_run = PollingLock(), PollingLock()
+
+        self.assertTrue(first_run.acquire())
+        self.assertFalse(second_run.acquire())
+
+        first_run.release()
+        self.assertTrue(second_run.acquire())
+
+    def test_release_keeps_the_lock_of_another_run(self):
+        expired_run, current_run = PollingLock(), PollingLock()
+        cache.set(EBC_POLLING_LOCK_KEY, current_run.token)
+
+        expired_run.release()
+
+        self.assertTrue(current_run.is_owned())
@@ -0,0 +1,82 @@
+import datetime
+import uuid
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from instant_cashin.idempotency import (
+    claim_client_reference, release_client_reference, store_client_reference_response
+)
+from instant_cashin.models import AbstractBaseIssuer, IdempotencyKey, InstantTransaction
+from users.tests.factories import AdminUserFactory, InstantAPICheckerFactory
+
+
+class ClientReferenceIdempotencyTests(TestCase):
+
+    def setUp(self):
+        root = AdminUserFactory(user_type=3)
+        self.checker = InstantAPICheckerFactory(user_type=6, root=root)
+        self.client_reference_id = uuid.uuid4()
+
+    def tearDown(self):
+        cache.clear()
+
+    def disburse(self):
+        InstantTransaction.objects.create(
+                from_user=self.checker, issuer_type=AbstractBaseIssuer.VODAFONE, amount=100, status="S",
+                anon_recipient="01010101010", client_transaction_reference=self.client_reference_id
+        )
+        return Response({"disbursement_status": "success", "status_code": "200"}, status=status.HTTP_200_OK)
+
+    def test_retry_is_answered_with_the_stored_response(self):
+        idempotency_key, replayed_response = claim_client_reference(self.checker, self.client_reference_id, "hash")
+        self.assertIsNone(replayed_response)
+        store_client_reference_response(idempotency_key, self.disburse())
+
+        idempotency_key, replayed_response = claim_client_reference(self.checker, self.client_reference_id, "hash")
+
+        self.assertIsNone(idempotency_key)
+        self.assertEqual(replayed_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(replayed_response.data["disbursement_status"], "success")
+
+    def test_reference_reused_by_another_request_is_rejected(self):
+        idempotency_key, _ = claim_client_reference(self.checker, self.client_reference_id, "hash")
+        store_client_reference_response(idempotency_key, self.disburse())
+
+        _, replayed_response = claim_client_reference(self.checker, self.client_reference_id, "another hash")
+
+        self.assertEqual(replayed_response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_concurrent_retry_of_a_request_in_progress_conflicts(self):
+        claim_client_reference(self.checker, self.client_reference_id, "hash")
+
+        idempotency_key, replayed_response = claim_client_reference(self.checker, self.client_reference_id, "hash")
+
+        self.assertIsNone(idempotency_key)
+        self.assertEqual(replayed_response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_request_without_transactions_can_be_retried(self):
+        idempotency_key, _ = claim_client_reference(self.checker, self.client_reference_id, "hash")
+        store_client_reference_response(idempotency_key, Response(status=status.HTTP_200_OK))
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        idempotency_key, replayed_response = claim_client_reference(self.checker, self.client_reference_id, "hash")
+        release_client_reference(idempotency_key)
+
+        self.assertIsNotNone(idempotency_key)
+        self.assertIsNone(replayed_response)
+
+    def test_claim_left_in_flight_is_taken_over_after_its_ttl(self):
+        claimed_key, _ = claim_client_reference(self.checker, self.client_reference_id, "hash")
+        IdempotencyKey.objects.filter(id=claimed_key.id).update(claimed_at=timezone.now() - datetime.timedelta(hours=1))
+
+        idempotency_key, replayed_response = claim_client_reference(self.checker, self.client_reference_id, "hash")
+        self.assertEqual(idempotency_key.id, claimed_key.id)
+        self.assertIsNone(replayed_response)
+
+        # The taken over claim is in flight again
+        _, replayed_response = claim_client_reference(self.checker, self.client_reference_id, "hash")
+        self.assertEqual(replayed_response.status_code, status.HTTP_409_CONFLICT)
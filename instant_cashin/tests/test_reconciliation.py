@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from instant_cashin.reconciliation import (FAILED_FOUND, FAILED_MISSING, SUCCESS, index_vodafone_report,
+                                           partition_timeouts)
+
+
+class TimeoutsReconciliationTests(SimpleTestCase):
+
+    def test_index_vodafone_report_keys_reference_ids_as_strings(self):
+        report = index_vodafone_report({
+            1234: {"success": True}, "5678": {"success": False}, None: {"success": True}
+        })
+
+        self.assertEqual(report, {"1234": {"success": True}, "5678": {"success": False}})
+
+    def test_partition_timeouts(self):
+        report = index_vodafone_report({1: {"success": True}, 2: {"success": False}})
+        timeouts = [
+            {"uid": "a", "reference_id": "1"},
+            {"uid": "b", "reference_id": "2"},
+            {"uid": "c", "reference_id": "3"},
+            {"uid": "d", "reference_id": ""},
+            {"uid": "e", "reference_id": None},
+        ]
+
+        buckets = partition_timeouts(timeouts, report)
+
+        self.assertEqual([trn["uid"] for trn in buckets[SUCCESS]], ["a"])
+        self.assertEqual([trn["uid"] for trn in buckets[FAILED_FOUND]], ["b"])
+        self.assertEqual([trn["uid"] for trn in buckets[FAILED_MISSING]], ["c", "d", "e"])
@@ -1,9 +1,21 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import datetime
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
 from django.test import TestCase
+from django.utils import timezone
 
-from instant_cashin.tasks import check_for_status_updates_for_latest_bank_transactions
+from instant_cashin.async_disbursement import ACCEPTED_STATUS_CODE, PROCESSING_STATUS_CODE
+from instant_cashin.models import AbstractBaseIssuer, InstantTransaction
+from instant_cashin.tasks import (
+    check_for_status_updates_for_latest_bank_transactions, disburse_instant_transaction,
+    recover_stale_async_transactions
+)
+from users.tests.factories import AdminUserFactory, InstantAPICheckerFactory
+from utilities.models import Budget, FeeSetup
 
 
 # class StatusUpdatesForLatestBankTransactionsTests(TestCase):
@@ -11,3 +23,81 @@ from instant_cashin.tasks import check_for_status_updates_for_latest_bank_transa
 
     # def test_check_for_status_updates_for_latest_bank_transactions(self):
     #     self.assertTrue(check_for_status_updates_for_latest_bank_transactions())
+
+
+@patch("instant_cashin.async_disbursement.uig_request_payload", Mock(return_value=("url", {
+    "MSISDN": "01021469732", "MSISDN2": "01003764686"
+})))
+class DisburseInstantTransactionTests(TestCase):
+
+    def setUp(self):
+        root = AdminUserFactory(user_type=3)
+        self.budget = Budget.objects.create(disburser=root, current_balance=100)
+        FeeSetup.objects.create(budget_related=self.budget, issuer='vf', fee_type='f', fixed_value=10)
+        balance_after = self.budget.deduct_if_covered(50, 'vodafone')
+        self.transaction = InstantTransaction.objects.create(
+                from_user=InstantAPICheckerFactory(user_type=6, root=root), issuer_type=AbstractBaseIssuer.VODAFONE,
+                amount=50, anon_recipient="01003764686", status="P", transaction_status_code=ACCEPTED_STATUS_CODE,
+                balance_before=100, balance_after=balance_after
+        )
+
+    def uig_response(self, txn_status):
+        return Mock(ok=True, json=Mock(return_value={"TXNSTATUS": txn_status, "MESSAGE": "", "TXNID": "1"}))
+
+    def test_successful_transaction_keeps_the_reserved_amount(self):
+        with patch("instant_cashin.async_disbursement.upstream.post", return_value=self.uig_response("200")):
+            self.assertTrue(disburse_instant_transaction(str(self.transaction.uid)))
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, InstantTransaction.SUCCESSFUL)
+        self.assertEqual(self.budget.get_current_balance(), Decimal("38.60"))
+
+    def test_failed_transaction_is_refunded_and_not_disbursed_twice(self):
+        with patch("instant_cashin.async_disbursement.upstream.post", return_value=self.uig_response("-1")) as post:
+            self.assertTrue(disburse_instant_transaction(str(self.transaction.uid)))
+            self.assertFalse(disburse_instant_transaction(str(self.transaction.uid)))
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, InstantTransaction.FAILED)
+        self.assertEqual(self.budget.get_current_balance(), Decimal("100"))
+        self.assertEqual(post.call_count, 1)
+
+
+class RecoverStaleAsyncTransactionsTests(TestCase):
+
+    def setUp(self):
+        root = AdminUserFactory(user_type=3)
+        self.budget = Budget.objects.create(disburser=root, current_balance=100)
+        FeeSetup.objects.create(budget_related=self.budget, issuer='vf', fee_type='f', fixed_value=10)
+        self.checker = InstantAPICheckerFactory(user_type=6, root=root)
+
+    def accepted_transaction(self, status_code, minutes_ago):
+        balance_after = self.budget.deduct_if_covered(20, 'vodafone')
+        transaction = InstantTransaction.objects.create(
+                from_user=self.checker, issuer_type=AbstractBaseIssuer.VODAFONE, amount=20,
+                anon_recipient="01003764686", status="P", transaction_status_code=status_code,
+                balance_before=100, balance_after=balance_after
+        )
+        InstantTransaction.objects.filter(uid=transaction.uid).update(
+                updated_at=timezone.now() - datetime.timedelta(minutes=minutes_ago)
+        )
+        return transaction
+
+    @patch("instant_cashin.tasks.disburse_instant_transaction.apply_async")
+    def test_stale_transactions_are_queued_again_or_marked_unknown(self, apply_async):
+        stale_accepted = self.accepted_transaction(ACCEPTED_STATUS_CODE, 60)
+        stale_processing = self.accepted_transaction(PROCESSING_STATUS_CODE, 60)
+        processing = self.accepted_transaction(PROCESSING_STATUS_CODE, 1)
+
+        self.assertTrue(recover_stale_async_transactions())
+
+        apply_async.assert_called_once_with((str(stale_accepted.uid),))
+        stale_processing.refresh_from_db()
+        self.assertEqual(stale_processing.status, InstantTransaction.UNKNOWN)
+        self.assertEqual(InstantTransaction.objects.get(uid=processing.uid).status, InstantTransaction.PENDING)
+        # Only the reserved amounts of the accepted and the still processing transactions are kept
+        self.assertEqual(self.budget.get_current_balance(), Decimal("100") - 2 * (Decimal("20") + Decimal("11.40")))
+
+        # A queued transaction isn't queued again before it's stale once more
+        recover_stale_async_transactions()
+        apply_async.assert_called_once()
@@ -3,7 +3,7 @@ import re
 
 from rest_framework.response import Response
 
-from payouts.utils import get_dot_env
+from payouts.utils import dot_env
 
 
 re_non_digits = re.compile(r'[^\d]+')
@@ -13,12 +13,12 @@ def get_from_env(key):
     """
     This function will get the corresponding key from the .env file
     """
-    environment_vars_dict = get_dot_env()
+    value = dot_env.str(key)
 
-    if not environment_vars_dict.str(key):
+    if not value:
         raise ImproperlyConfigured(f"{key} does not exist at your .env file")
 
-    return environment_vars_dict.str(key)
+    return value
 
 
 def default_response_structure(transaction_id="0",
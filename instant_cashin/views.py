@@ -140,9 +140,8 @@ class BankTransactionsListView(IntegrationUserAndSupportUserPassesTestMixin, Lis
             filter_dict['disbursed_date__lte'] = make_aware(last_day)
 
         queryset = super().get_queryset().filter(**filter_dict). \
-            filter(~Q(creditor_bank__in=["THWL", "MIDG"])). \
-            order_by("parent_transaction__transaction_id", "-id", "-created_at"). \
-            distinct("parent_transaction__transaction_id")
+            filter(~Q(creditor_bank__in=["THWL", "MIDG"]), is_latest_version=True). \
+            order_by("parent_transaction__transaction_id")
         paginator = Paginator(queryset, 20)
         page = self.request.GET.get('page')
         return paginator.get_page(page)
@@ -362,6 +362,13 @@ CUSTOM_LOGGING = {
             'class': 'logging.FileHandler',
             'filename': 'logs/timeouts_updates.log',
         },
+        'upstream_latency': {
+            'level': 'DEBUG',
+            'filters': ['request_id'],
+            'formatter': 'detail',
+            'class': 'logging.FileHandler',
+            'filename': 'logs/upstream_latency.log',
+        },
     },
 
     'loggers': {
@@ -604,5 +611,10 @@ CUSTOM_LOGGING = {
             'level': 'DEBUG',
             'propagate': True,
         },
+        'upstream_latency': {
+            'handlers': ['upstream_latency'],
+            'level': 'DEBUG',
+            'propagate': True,
+        },
     },
 }
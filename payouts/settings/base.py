@@ -161,6 +161,11 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_PERSISTENT = False
 MAX_TASK_RETRIES = 10
 CELERY_TIMEZONE = 'Africa/Cairo'
+# Instant disbursements accepted at the async mode are disbursed by a dedicated worker consuming this queue
+INSTANT_DISBURSEMENT_QUEUE = env.str('INSTANT_DISBURSEMENT_QUEUE', 'instant_disbursement')
+CELERY_TASK_ROUTES = {
+    'instant_cashin.tasks.disburse_instant_transaction': {'queue': INSTANT_DISBURSEMENT_QUEUE},
+}
 
 # Password validation
 CUSTOM_PASSWORD_VALIDATOR = [
@@ -329,8 +334,68 @@ ADMIN_INDEX_TITLE = 'Payouts Administration'
 
 # Timeout dictionary
 TIMEOUT_CONSTANTS = {
-    'CENTRAL_UIG': 33
+    'CENTRAL_UIG': 33,
+    'CENTRAL_UIG_INQUIRY': 33,
+    'CENTRAL_UIG_CHANGE_PROFILE': 120,
+    'EBC': 30,
+    'EBC_INQUIRY': 10,
+    'ACCEPT': 30,
+    'MERCHANT_CALLBACK': 10,
+}
+
+# Bulk disbursement in flight requests per issuer and per agent MSISDN
+BULK_DISBURSEMENT_CONCURRENCY = {
+    'vodafone': env.int('VODAFONE_BULK_DISBURSEMENT_CONCURRENCY', 8),
+    'etisalat': env.int('ETISALAT_BULK_DISBURSEMENT_CONCURRENCY', 4),
+    'aman': env.int('AMAN_BULK_DISBURSEMENT_CONCURRENCY', 2),
+    'bank': env.int('BANK_BULK_DISBURSEMENT_CONCURRENCY', 4),
 }
+BULK_DISBURSEMENT_CONCURRENCY_PER_AGENT = env.int('BULK_DISBURSEMENT_CONCURRENCY_PER_AGENT', 2)
+# Documents with more records than the chunk size are disbursed as chunks across the celery workers
+BULK_DISBURSEMENT_CHUNK_SIZE = env.int('BULK_DISBURSEMENT_CHUNK_SIZE', 500)
+# Seconds a chunk may stay pending before a re-run of its document dispatches it again
+BULK_DISBURSEMENT_CHUNK_STALE_AFTER = env.int('BULK_DISBURSEMENT_CHUNK_STALE_AFTER', 3600)
+# Seconds a chunk task may run before its worker is killed, only then a re-run dispatches its running chunk again
+BULK_DISBURSEMENT_CHUNK_TIME_LIMIT = env.int('BULK_DISBURSEMENT_CHUNK_TIME_LIMIT', 3600)
+# Uploaded disbursement sheets are read, validated and saved in chunks of this number of rows
+SHEET_INGESTION_CHUNK_SIZE = env.int('SHEET_INGESTION_CHUNK_SIZE', 10000)
+# Transactions records are written with bulk_create in batches of this size
+TRANSACTIONS_BULK_CREATE_BATCH_SIZE = env.int('TRANSACTIONS_BULK_CREATE_BATCH_SIZE', 1000)
+# Seconds a process trusts its cached budget fee schedule before checking the shared cache for fees setup changes
+FEE_SCHEDULE_CACHE_CHECK_INTERVAL = env.int('FEE_SCHEDULE_CACHE_CHECK_INTERVAL', 5)
+# Seconds a process trusts its cached agents pool before checking the shared cache for agents changes
+AGENT_POOL_CACHE_CHECK_INTERVAL = env.int('AGENT_POOL_CACHE_CHECK_INTERVAL', 5)
+# How the instant disbursement agent is picked from the agents pool, round_robin or least_recently_used
+AGENT_SELECTION_STRATEGY = env.str('AGENT_SELECTION_STRATEGY', 'round_robin')
+# Upstreams (UIG, EBC, Accept) keep-alive connections pool size per host and per process
+UPSTREAM_POOL_SIZE = env.int('UPSTREAM_POOL_SIZE', 10)
+# Retries of the idempotent upstreams inquiries, waiting UPSTREAM_RETRY_BACKOFF * 2 ** retry seconds before each
+UPSTREAM_IDEMPOTENT_RETRIES = env.int('UPSTREAM_IDEMPOTENT_RETRIES', 2)
+UPSTREAM_RETRY_BACKOFF = env.float('UPSTREAM_RETRY_BACKOFF', 0.5)
+# Seconds between publishing every process upstreams latency histograms to the shared database counters
+UPSTREAM_LATENCY_PUBLISH_INTERVAL = env.int('UPSTREAM_LATENCY_PUBLISH_INTERVAL', 60)
+# Seconds a process trusts its loaded .env values before checking if the reload_dot_env command was run
+DOT_ENV_RELOAD_CHECK_INTERVAL = env.int('DOT_ENV_RELOAD_CHECK_INTERVAL', 30)
+# Transactions exports read the database through a server side cursor fetching this number of rows at a time
+EXPORT_ITERATOR_CHUNK_SIZE = env.int('EXPORT_ITERATOR_CHUNK_SIZE', 2000)
+# Transactions exports file format, one of xlsx, csv or csv.gz
+TRANSACTIONS_EXPORT_FORMAT = env.str('TRANSACTIONS_EXPORT_FORMAT', 'xlsx')
+# EBC status polling inquiries in flight at once, inquired per checkpointed chunk oldest transactions first
+EBC_STATUS_POLLING_CONCURRENCY = env.int('EBC_STATUS_POLLING_CONCURRENCY', 4)
+EBC_STATUS_POLLING_CHUNK_SIZE = env.int('EBC_STATUS_POLLING_CHUNK_SIZE', 100)
+# Seconds the EBC status polling lock is held without progress before another run can take it over
+EBC_STATUS_POLLING_LOCK_TIMEOUT = env.int('EBC_STATUS_POLLING_LOCK_TIMEOUT', 900)
+# Vodafone msisdns sent per bulk change fees profile request and the requests in flight at once
+CHANGE_PROFILE_BATCH_SIZE = env.int('CHANGE_PROFILE_BATCH_SIZE', 1000)
+CHANGE_PROFILE_CONCURRENCY = env.int('CHANGE_PROFILE_CONCURRENCY', 4)
+# sync applies the bulk disbursement callbacks at the request, async saves them to the callbacks inbox for a task
+DISBURSEMENT_CALLBACK_MODE = env.str('DISBURSEMENT_CALLBACK_MODE', 'sync')
+# Seconds the instant disbursement responses are replayed from the cache to the retries of their requests
+INSTANT_DISBURSEMENT_IDEMPOTENCY_TTL = env.int('INSTANT_DISBURSEMENT_IDEMPOTENCY_TTL', 600)
+# Seconds a client reference id claim may stay in flight before a retry of its request can take it over
+INSTANT_DISBURSEMENT_CLAIM_TTL = env.int('INSTANT_DISBURSEMENT_CLAIM_TTL', 300)
+# Seconds an async instant transaction may stay accepted or processing before it's recovered as stale
+INSTANT_DISBURSEMENT_STALE_AFTER = env.int('INSTANT_DISBURSEMENT_STALE_AFTER', 900)
 
 
 # log viewer settings
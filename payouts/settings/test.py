@@ -98,6 +98,8 @@ AUTH_PASSWORD_VALIDATORS = [
 
 import logging
 logging.disable(logging.CRITICAL)
+# The upstreams latency histograms aren't published by a background thread during the tests
+UPSTREAM_LATENCY_PUBLISH_INTERVAL = 24 * 60 * 60
 # Internationalization
 # https://docs.djangoproject.com/en/1.9/topics/i18n/
 
@@ -1,10 +1,106 @@
+import os
+import threading
+import time
+import uuid
 
-def get_dot_env():
-    from django.conf import settings
-    import os
-    import environ
+import environ
+
+
+DOT_ENV_VERSION_KEY = "dot_env_version"
+
+
+class _DotEnvFile(environ.Env):
+    """Parses a .env file into its own dictionary instead of os.environ"""
+    ENVIRON = {}
+
+
+class DotEnvRegistry:
+    """
+    Process wide registry of the .env file values, the file is parsed once instead of once per lookup
+        and reloaded only by reload() or by the reload_dot_env management command at every process
+    """
+
+    def __init__(self, env_file=None):
+        self.env_file = env_file
+        self.env = environ.Env()
+        self.env.ENVIRON = {}
+        self.file_values = {}
+        self.version = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def _read_file(self):
+        from django.conf import settings
+
+        _DotEnvFile.ENVIRON = {}
+        _DotEnvFile.read_env(env_file=self.env_file or os.path.join(settings.BASE_DIR, '.env'))
+        return _DotEnvFile.ENVIRON
+
+    def load(self, version=None):
+        """Parse the .env file, variables set at the process environment take precedence over it as read_env does"""
+        with self.lock:
+            file_values = self._read_file()
+            values = dict(os.environ)
+
+            for key, value in file_values.items():
+                if key not in os.environ or os.environ[key] == self.file_values.get(key):
+                    values[key] = value
+
+            # The Env object is updated in place so the modules holding it see the reloaded values
+            self.env.ENVIRON = values
+            self.file_values = file_values
+            self.version = version
+            self.checked_at = time.monotonic()
+
+    def reload(self):
+        """Reload the .env file at this process and ask the other processes to reload it"""
+        from django.core.cache import cache
 
-    env = environ.Env()
-    environ.Env.read_env(env_file=os.path.join(settings.BASE_DIR, '.env'))
+        version = uuid.uuid4().hex
+        cache.set(DOT_ENV_VERSION_KEY, version, None)
+        self.load(version)
 
-    return env
+    def _check_version(self):
+        from django.conf import settings
+        from django.core.cache import cache
+
+        if time.monotonic() - self.checked_at < getattr(settings, "DOT_ENV_RELOAD_CHECK_INTERVAL", 30):
+            return
+
+        self.checked_at = time.monotonic()
+        try:
+            version = cache.get(DOT_ENV_VERSION_KEY)
+        except Exception:
+            return
+        if version is not None and version != self.version:
+            self.load(version)
+
+    def get_env(self):
+        """:return: environ.Env object reading the registry values"""
+        if self.checked_at is None:
+            self.load()
+        else:
+            self._check_version()
+        return self.env
+
+    def str(self, key, default=environ.Env.NOTSET):
+        return self.get_env().str(key, default=default)
+
+    def int(self, key, default=environ.Env.NOTSET):
+        return self.get_env().int(key, default=default)
+
+    def float(self, key, default=environ.Env.NOTSET):
+        return self.get_env().float(key, default=default)
+
+    def bool(self, key, default=environ.Env.NOTSET):
+        return self.get_env().bool(key, default=default)
+
+    def list(self, key, default=environ.Env.NOTSET):
+        return self.get_env().list(key, default=default)
+
+
+dot_env = DotEnvRegistry()
+
+
+def get_dot_env():
+    return dot_env.get_env()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+# Relations of the root loaded along with it, root → client → super admin → VMT data and root → budget
+ROOT_CHAIN = ("client__creator__vmt", "budget")
+
+
+class HierarchyResolver:
+    """
+    Loads the entity chain of the users' roots with one query per root and memoizes it,
+        create one resolver per request or task run so the chain is never older than the request/task itself
+    """
+
+    def __init__(self):
+        self._roots = {}
+
+    def get_root(self, root_id):
+        """:return: the root user with its client, super admin, VMT data and budget already loaded"""
+        from .models import RootUser
+
+        root = self._roots.get(root_id)
+        if root is None:
+            root = self._roots[root_id] = RootUser._base_manager.select_related(*ROOT_CHAIN).get(id=root_id)
+            if root.root_id == root.id:
+                root.root = root
+        return root
+
+    def resolve(self, user):
+        """
+        Attach the memoized root chain to the passed user so user.root.client.creator.vmt, user.super_admin,
+            user.root.budget and user.root.has_custom_budget are served without extra queries,
+            the budget fee schedule is served from its own process cache
+        :return: the passed user
+        """
+        if user is not None and user.root_id is not None:
+            user.root = self.get_root(user.root_id)
+        return user
+
+
+def resolve_hierarchy(user):
+    """Load the entity chain of the passed user once, it lives as long as the user object itself"""
+    return HierarchyResolver().resolve(user)
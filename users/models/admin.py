@@ -1,3 +1,5 @@
+from disbursement.agent_pool import get_agent_pool
+
 from .base_user import User, UserManager
 
 
@@ -32,9 +34,9 @@ class SuperAdminUser(User):
         """
         msisdn_issuer_type = "E" if wallet_issuer.lower() == "etisalat" else "V"
 
-        if self.agents:
-            qs = self.agents.filter(super=False, type=msisdn_issuer_type)
-            if qs.count() > 0:
-                return qs.order_by("?").first().msisdn
+        # Agents are picked from the cached pool of the super admin in turn instead of a random sort per transaction
+        msisdn = get_agent_pool(self.id).pick([msisdn_issuer_type], is_super=False)
+        if msisdn is not None:
+            return msisdn
 
         raise ValueError(f"{self.username} root/wallet_issuer has no agents setup.")
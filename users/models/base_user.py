@@ -176,12 +176,9 @@ class User(AbstractUser, SoftDeletionModel):
     def super_admin(self):
         if self.is_superadmin:
             return self
-        else:
-            from users.models import SuperAdminUser
-            from users.models import Client
-            client = Client.objects.get(client=self.root)
-            super_admin = client.creator
-            return SuperAdminUser.objects.get(id=super_admin.id)
+        # Served from the root chain without queries once it's loaded by users.hierarchy.HierarchyResolver
+        root = self.root if self.root_id is not None else self
+        return root.client.creator
 
     @property
     def can_pass_disbursement(self):
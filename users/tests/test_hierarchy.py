@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.test import TestCase
+
+from users.hierarchy import HierarchyResolver, resolve_hierarchy
+from users.models import Client, User
+from users.tests.factories import AdminUserFactory, MakerUserFactory, VariousOnboardingSuperAdminUserFactory
+from utilities.models import Budget
+
+
+class HierarchyResolverTests(TestCase):
+    """
+    Tests for loading the entity chain of the users once
+    """
+
+    def setUp(self):
+        self.super_admin = VariousOnboardingSuperAdminUserFactory.create_new_superadmin()
+        self.root = AdminUserFactory(user_type=3)
+        self.root.root = self.root
+        self.root.save()
+        Client.objects.create(client=self.root, creator=self.super_admin)
+        Budget.objects.create(disburser=self.root, created_by=self.super_admin, current_balance=100)
+        self.maker = MakerUserFactory(user_type=1, root=self.root)
+
+    def test_entity_chain_is_loaded_with_one_query(self):
+        """Test the root, client, super admin, VMT data and budget of a user are loaded with a single query"""
+        maker = User.objects.get(id=self.maker.id)
+
+        with self.assertNumQueries(1):
+            resolve_hierarchy(maker)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(maker.super_admin, self.super_admin)
+            self.assertEqual(maker.root.super_admin, self.super_admin)
+            self.assertEqual(maker.root.client.creator.vmt.vmt, self.super_admin)
+            self.assertTrue(maker.root.has_custom_budget)
+            self.assertEqual(maker.root.budget.current_balance, 100)
+
+    def test_users_of_the_same_root_share_the_memoized_chain(self):
+        """Test resolving many users of the same root hits the database once"""
+        hierarchy = HierarchyResolver()
+        users = [User.objects.get(id=self.maker.id), User.objects.get(id=self.root.id)]
+
+        with self.assertNumQueries(1):
+            for user in users:
+                self.assertEqual(hierarchy.resolve(user).super_admin, self.super_admin)
@@ -16,13 +16,11 @@ from django.views.generic import CreateView, ListView, TemplateView
 from django.core.paginator import Paginator
 from django.utils import translation
 
-from core.models import AbstractBaseStatus
 from instant_cashin.utils import get_from_env
 from data.models import Doc
 from utilities.models import Budget, CallWalletsModerator, FeeSetup
 from utilities.logging import logging_message
 from disbursement.views import DisbursementDocTransactionsView
-from disbursement.models import BankTransaction
 from oauth2_provider.models import Application
 from ..forms import SupportUserCreationForm, OnboardingApiClientForm
 from ..mixins import (
@@ -237,7 +235,6 @@ class DocumentForSupportDetailView(SupportUserRequiredMixin,
                 return HttpResponse(status=200)
         doc_obj = doc.first()
         doc_transactions = doc_obj.disbursement_data.all()
-        doc_transactions_qs = doc_obj.disbursement_data.all()
         search_filter = None
         if self.request.GET.get('search'):
             search_keys = self.request.GET.get('search')
@@ -247,7 +244,6 @@ class DocumentForSupportDetailView(SupportUserRequiredMixin,
             )
         if doc_obj.is_bank_wallet:
             doc_transactions = doc_obj.bank_wallets_transactions.all()
-            doc_transactions_qs = doc_obj.bank_wallets_transactions.all()
             if search_filter:
                 search_filter = (
                     Q(uid__iexact=search_keys)|
@@ -255,12 +251,8 @@ class DocumentForSupportDetailView(SupportUserRequiredMixin,
                     Q(transaction_status_description__icontains=search_keys)
                 )
         elif doc_obj.is_bank_card:
-            doc_transactions = doc_obj.bank_cards_transactions.all()\
-                .order_by('parent_transaction__transaction_id', '-created_at')\
-                .distinct('parent_transaction__transaction_id')
-            doc_transactions_qs = BankTransaction.objects.filter(
-                id__in=doc_transactions.values('id')
-            )
+            doc_transactions = doc_obj.bank_cards_transactions.filter(is_latest_version=True)\
+                .order_by('parent_transaction__transaction_id')
             if search_filter:
                 search_filter = (
                     Q(parent_transaction__transaction_id__iexact=search_keys)|
@@ -290,15 +282,9 @@ class DocumentForSupportDetailView(SupportUserRequiredMixin,
             'is_reviews_completed': doc_obj.is_reviews_completed(),
             'disbursement_records': queryset,
             'disbursement_doc_data': doc_obj.disbursement_txn,
-            'doc_transactions_totals':
-                DisbursementDocTransactionsView.get_document_transactions_totals(doc_obj, doc_transactions_qs),
+            'doc_transactions_totals': DisbursementDocTransactionsView.get_document_transactions_totals(doc_obj),
+            **DisbursementDocTransactionsView.get_document_transactions_flags(doc_obj),
         }
-        if doc_obj.is_e_wallet:
-            context['has_failed'] = doc_transactions_qs.filter(is_disbursed=False).count() != 0
-            context['has_success'] = doc_transactions_qs.filter(is_disbursed=True).count() != 0
-        else:
-            context['has_failed'] = doc_transactions_qs.filter(status=AbstractBaseStatus.FAILED).count() != 0
-            context['has_success'] = doc_transactions_qs.filter(status=AbstractBaseStatus.SUCCESSFUL).count() != 0
 
 
         return render(request, 'support/document_details.html', context=context)
@@ -9,7 +9,9 @@ from django.utils.timezone import datetime, make_aware
 from .forms import BudgetAdminModelForm
 from .functions import custom_budget_logger
 from .mixins import CustomInlineAdmin
-from .models import Budget, CallWalletsModerator, FeeSetup, TopupRequest, TopupAction, VodafoneBalance
+from .models import (
+    Budget, BudgetLedgerEntry, CallWalletsModerator, FeeSetup, TopupRequest, TopupAction, VodafoneBalance
+)
 from simple_history.admin import SimpleHistoryAdmin
 from django.core.exceptions import PermissionDenied
 from django import http
@@ -369,6 +371,37 @@ class TopupActionAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(BudgetLedgerEntry)
+class BudgetLedgerEntryAdmin(admin.ModelAdmin):
+    """
+    Read only list view of the budgets ledger entries
+    """
+
+    list_display = [
+        "budget",
+        "entry_type",
+        "amount",
+        "fees_and_vat",
+        "issuer",
+        "balance_before",
+        "balance_after",
+        "is_compacted",
+        "created_at",
+    ]
+    list_filter = [
+        "entry_type",
+        "is_compacted",
+        ("created_at", DateRangeFilter),
+    ]
+    search_fields = ["budget__disburser__username"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(VodafoneBalance)
 class VodafoneBalanceAdmin(admin.ModelAdmin, ExportCsvMixin):
     """
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UtilsConfig(AppConfig):
     name = 'utilities'
+
+    def ready(self):
+        import utilities.signals  # noqa
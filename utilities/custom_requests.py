@@ -4,10 +4,11 @@ from __future__ import unicode_literals
 from requests.exceptions import ConnectionError, HTTPError
 import json
 import logging
-import requests
 
 from django.utils.translation import ugettext as _
 
+from . import upstream as upstream_client
+
 
 class CustomRequests:
     """
@@ -25,8 +26,8 @@ class CustomRequests:
         self.request_logger = logging.getLogger(self.log_file)
         self.request_logger.debug(_(f"{head} [{request.user}] -- {message}"))
 
-    def post(self, url, payload, headers=dict(), sub_logging_head='', **kwargs):
-        """Handles POST requests using requests package"""
+    def post(self, url, payload, headers=dict(), sub_logging_head='', upstream='CENTRAL_UIG', **kwargs):
+        """Handles POST requests through the pooled upstream sessions"""
         if headers.get('Content-Type', None) is None:
             headers.update({'Content-Type': 'application/json'})
 
@@ -34,7 +35,9 @@ class CustomRequests:
             self.log_message(f"[request] [{sub_logging_head}]", self.request_obj, f"{payload}, URL: {url}")
 
         try:
-            response = requests.post(url, data=json.dumps(payload), headers=headers, verify=False, **kwargs)
+            response = upstream_client.post(
+                    url, upstream, data=json.dumps(payload), headers=headers, verify=False, **kwargs
+            )
             response.raise_for_status()
             self.resp_log_msg = f"{response.json()}"
         except HTTPError as http_err:
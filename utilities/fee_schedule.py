@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+FEE_SCHEDULE_VERSION_KEY = "fee_schedule_version_{}"
+
+_schedules = {}
+_schedules_lock = threading.Lock()
+
+
+class FeeSchedule:
+    """
+    Fees setups of one budget compiled into an in-memory lookup by the FeeSetup issuer,
+        pricing any number of amounts using the schedule needs no database queries
+    """
+
+    def __init__(self, fees_objs, version=None):
+        self.fees_objs = {fees_obj.issuer: fees_obj for fees_obj in fees_objs}
+        self.version = version
+        self.checked_at = time.monotonic()
+
+    def get(self, fees_issuer):
+        """:return: FeeSetup object of the passed FeeSetup issuer or None"""
+        return self.fees_objs.get(fees_issuer)
+
+
+def _current_version(budget_id):
+    return cache.get(FEE_SCHEDULE_VERSION_KEY.format(budget_id))
+
+
+def get_fee_schedule(budget_id):
+    """
+    Return the compiled fee schedule of the passed budget from the process cache,
+        the shared cache version is checked at most once per FEE_SCHEDULE_CACHE_CHECK_INTERVAL seconds
+        so other processes pick up the fees setup changes
+    """
+    from .models import FeeSetup
+
+    check_interval = getattr(settings, "FEE_SCHEDULE_CACHE_CHECK_INTERVAL", 5)
+    schedule = _schedules.get(budget_id)
+
+    if schedule is not None:
+        if time.monotonic() - schedule.checked_at < check_interval:
+            return schedule
+        if _current_version(budget_id) == schedule.version:
+            schedule.checked_at = time.monotonic()
+            return schedule
+
+    version = _current_version(budget_id)
+    schedule = FeeSchedule(FeeSetup.objects.filter(budget_related_id=budget_id), version)
+    with _schedules_lock:
+        _schedules[budget_id] = schedule
+    return schedule
+
+
+def invalidate_fee_schedule(budget_id):
+    """Drop the compiled fee schedule of the passed budget at this process and at the other processes"""
+    with _schedules_lock:
+        _schedules.pop(budget_id, None)
+    cache.set(FEE_SCHEDULE_VERSION_KEY.format(budget_id), uuid.uuid4().hex, None)
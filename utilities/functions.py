@@ -10,7 +10,7 @@ from django.template.loader import get_template
 from environ import ImproperlyConfigured
 from xhtml2pdf import pisa
 
-from payouts.utils import get_dot_env
+from payouts.utils import dot_env
 
 
 BUDGET_LOGGER = logging.getLogger("custom_budgets")
@@ -21,12 +21,12 @@ def get_value_from_env(key):
     :param key: Key that will be used to retrieve its corresponding value
     This function will get the corresponding value of a key from the .env file
     """
-    environment_vars_dict = get_dot_env()
+    value = dot_env.str(key)
 
-    if not environment_vars_dict.str(key):
+    if not value:
         raise ImproperlyConfigured(f"{key} does not exist at your .env file")
 
-    return environment_vars_dict.str(key)
+    return value
 
 
 def render_to_pdf(src_template, context_dict={}):
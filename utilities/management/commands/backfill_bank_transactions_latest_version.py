@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from disbursement.models import BankTransaction
+
+
+class Command(BaseCommand):
+    help = "Flag the last version of every bank transaction chain as its latest version, run it once after migrating"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="number of chains updated per transaction")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        chains_range = BankTransaction.objects.aggregate(
+                first=Min('parent_transaction_id'), last=Max('parent_transaction_id')
+        )
+        if chains_range['first'] is None:
+            self.stdout.write(self.style.SUCCESS("there're no bank transactions to backfill"))
+            return
+
+        for start in range(chains_range['first'], chains_range['last'] + 1, batch_size):
+            chains = BankTransaction.objects.filter(
+                    parent_transaction_id__gte=start, parent_transaction_id__lt=start + batch_size
+            )
+            with transaction.atomic():
+                latest_ids = list(
+                        chains.order_by().values('parent_transaction_id').annotate(latest_id=Max('id')).
+                        values_list('latest_id', flat=True)
+                )
+                outdated = chains.filter(is_latest_version=True).exclude(id__in=latest_ids).\
+                    update(is_latest_version=False)
+                BankTransaction.objects.filter(id__in=latest_ids, is_latest_version=False).\
+                    update(is_latest_version=True)
+
+            self.stdout.write(
+                    f"chains {start} - {start + batch_size - 1}: {len(latest_ids)} latest versions, "
+                    f"{outdated} outdated versions"
+            )
+
+        self.stdout.write(self.style.SUCCESS("finished flagging the latest bank transactions versions"))
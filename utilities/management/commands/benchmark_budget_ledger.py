@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from utilities.models import Budget, BudgetLedgerEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the budget balance reads and debits throughput with many parallel disbursements for one entity, "
+        "the budget balance and ledger are restored after the run so use it against staging data only"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', type=str, help="username of the admin owning the budget")
+        parser.add_argument('--workers', type=int, default=50)
+        parser.add_argument('--transactions', type=int, default=500)
+        parser.add_argument('--amount', type=float, default=1.0)
+        parser.add_argument('--issuer', type=str, default="vodafone")
+
+    @staticmethod
+    def locked_read(budget):
+        """The balance read used before the budget ledger"""
+        with transaction.atomic():
+            return Budget.objects.select_for_update().get(id=budget.id).current_balance
+
+    def run_in_parallel(self, workers, transactions, operation):
+        def worker(count):
+            try:
+                for _ in range(count):
+                    operation()
+            finally:
+                connections.close_all()
+
+        counts = [transactions // workers + (1 if index < transactions % workers else 0) for index in range(workers)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(worker, counts))
+        return time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        try:
+            budget = Budget.objects.get(disburser__username=options['username'])
+        except Budget.DoesNotExist:
+            raise CommandError(f"Budget of {options['username']} does not exist")
+
+        workers, transactions = options['workers'], options['transactions']
+        initial_balance = budget.get_current_balance()
+        last_entry = BudgetLedgerEntry.objects.filter(budget=budget).order_by('-id').first()
+        last_entry_id = last_entry.id if last_entry else 0
+
+        scenarios = [
+            ("locked balance reads", lambda: self.locked_read(budget)),
+            ("lock-free balance reads", budget.get_current_balance),
+            (
+                "debit + balance read",
+                lambda: (
+                    budget.get_current_balance(),
+                    budget.update_disbursed_amount_and_current_balance(options['amount'], options['issuer'])
+                )
+            ),
+        ]
+        try:
+            for label, operation in scenarios:
+                elapsed = self.run_in_parallel(workers, transactions, operation)
+                self.stdout.write(self.style.SUCCESS(
+                        f"{label:<25} workers: {workers:<4} -- {transactions} operations in {elapsed:.2f}s "
+                        f"({transactions / elapsed:.1f} op/s)"
+                ))
+
+            entries = BudgetLedgerEntry.objects.filter(budget=budget, id__gt=last_entry_id)
+            self.stdout.write(self.style.SUCCESS(
+                    f"ledger entries written: {entries.count()}, "
+                    f"balance after the debits: {budget.get_current_balance()}"
+            ))
+        finally:
+            BudgetLedgerEntry.objects.filter(budget=budget, id__gt=last_entry_id).delete()
+            Budget.objects.filter(id=budget.id).update(current_balance=initial_balance)
+            self.stdout.write(self.style.SUCCESS(f"budget balance restored to {initial_balance}"))
@@ -0,0 +1,37 @@
+import os
+import time
+
+import environ
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from instant_cashin.utils import get_from_env
+
+
+class Command(BaseCommand):
+    help = "Measure the .env values lookups cost of parsing the file per lookup against the cached registry"
+
+    KEYS = ['ENVIRONMENT', 'EBC_API_URL', 'ACH_CORPORATE_CODE', 'ACH_DEBTOR_ACCOUNT']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=10000)
+
+    @staticmethod
+    def parsed_lookup(key):
+        """The lookup used before the registry"""
+        env = environ.Env()
+        environ.Env.read_env(env_file=os.path.join(settings.BASE_DIR, '.env'))
+        return env.str(key)
+
+    def handle(self, *args, **options):
+        keys = [key for key in self.KEYS if os.environ.get(key)] or ['ENVIRONMENT']
+        lookups = options['lookups']
+
+        for label, lookup in [("parsed per lookup", self.parsed_lookup), ("cached registry", get_from_env)]:
+            start = time.perf_counter()
+            for index in range(lookups):
+                lookup(keys[index % len(keys)])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                    f"{label:<20} -- {lookups} lookups in {elapsed:.3f}s ({elapsed / lookups * 1e6:.1f} us/lookup)"
+            ))
@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from disbursement.dispatcher import IssuerDispatcher
+from utilities import upstream
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the EBC status polling throughput at several concurrency levels against a local EBC stub "
+        "answering every inquiry after the passed latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=200)
+        parser.add_argument('--latency', type=float, default=0.1, help="stub response latency in seconds")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+
+    @staticmethod
+    def start_ebc_stub(latency):
+        class EBCStubHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(latency)
+                body = json.dumps(json.dumps({"TransactionStatusCode": "8000"})).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), EBCStubHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def handle(self, *args, **options):
+        server = self.start_ebc_stub(options['latency'])
+        url = f"http://127.0.0.1:{server.server_address[1]}/get-transaction-status?"
+
+        def inquire(transaction, agent):
+            response = upstream.get(url, "EBC_INQUIRY", params={"request": json.dumps(transaction)})
+            return json.loads(response.json())
+
+        try:
+            for concurrency in options['concurrency']:
+                transactions = [{"TransactionId": index} for index in range(options['transactions'])]
+                start = time.perf_counter()
+                IssuerDispatcher("bank", max_in_flight=concurrency).dispatch(transactions, inquire)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(self.style.SUCCESS(
+                        f"concurrency: {concurrency:<4} -- {len(transactions)} inquiries in {elapsed:.2f}s "
+                        f"({len(transactions) / elapsed:.1f} inquiries/s)"
+                ))
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import time
+
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.management.base import BaseCommand, CommandError
+
+from utilities.ssl_certificate import SignerRegistry
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the EBC payloads signatures per second of parsing the private key at every signature "
+        "against the cached signer registry, a temporary key is generated if no key path is passed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--key-path', type=str, help="path of a PEM private key to sign with")
+        parser.add_argument('--key-size', type=int, default=2048)
+        parser.add_argument('--signatures', type=int, default=1000)
+
+    @staticmethod
+    def sign_parsing_key(key_path, data):
+        """The signature as it was generated before the signer registry"""
+        with open(key_path, 'r') as f:
+            private_key_rsa = RSA.importKey(f.read())
+        return PKCS1_v1_5.new(private_key_rsa).sign(SHA256.new(data))
+
+    @staticmethod
+    def generate_key(key_size):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=key_size, backend=default_backend())
+        key_file = tempfile.NamedTemporaryFile(suffix='.pem', delete=False)
+        with key_file:
+            key_file.write(key.private_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PrivateFormat.TraditionalOpenSSL,
+                    encryption_algorithm=serialization.NoEncryption(),
+            ))
+        return key_file.name
+
+    def measure(self, label, sign, payloads):
+        start = time.perf_counter()
+        signatures = [sign(payload) for payload in payloads]
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+                f"{label:<22} -- {len(payloads)} signatures in {elapsed:.2f}s ({len(payloads) / elapsed:.1f} sig/s)"
+        ))
+        return signatures
+
+    def handle(self, *args, **options):
+        key_path = options['key_path'] or self.generate_key(options['key_size'])
+        if not os.path.exists(key_path):
+            raise CommandError(f"No private key found at {key_path}")
+
+        payloads = [
+            json.dumps({"TransactionId": index, "MessageId": index, "CorporateCode": "CODE"}, separators=(",", ":"))
+            .encode('utf-16le') for index in range(options['signatures'])
+        ]
+        registry = SignerRegistry()
+        try:
+            before = self.measure("key parsed per call", lambda data: self.sign_parsing_key(key_path, data), payloads)
+            after = self.measure("cached signer", lambda data: registry.sign(key_path, data), payloads)
+        finally:
+            if not options['key_path']:
+                os.remove(key_path)
+
+        if before != after:
+            raise CommandError("Signatures generated by the cached signer are not identical")
+        self.stdout.write(self.style.SUCCESS("signatures are identical"))
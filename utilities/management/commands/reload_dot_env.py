@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from payouts.utils import dot_env
+
+
+class Command(BaseCommand):
+    help = (
+        "Reload the .env file values, the running web and celery processes pick the new values "
+        "within DOT_ENV_RELOAD_CHECK_INTERVAL seconds"
+    )
+
+    def handle(self, *args, **options):
+        dot_env.reload()
+        self.stdout.write(self.style.SUCCESS(f".env reloaded, {len(dot_env.file_values)} values read from the file"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from data.models import Doc
+from disbursement.doc_counters import recompute_doc_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the pending/successful/failed counters of the documents from their transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('doc_ids', nargs='*', type=str, help="defaults to all the processed documents")
+
+    def handle(self, *args, **options):
+        docs = Doc.objects.filter(is_processed=True)
+        if options['doc_ids']:
+            docs = docs.filter(id__in=options['doc_ids'])
+
+        repaired = 0
+        for doc_obj in docs.order_by('created_at').iterator():
+            doc_data = recompute_doc_counters(doc_obj)
+            if doc_data is None:
+                continue
+
+            repaired += 1
+            self.stdout.write(
+                    f"doc {doc_obj.id}: pending {doc_data.pending_count}, successful {doc_data.success_count}, "
+                    f"failed {doc_data.failed_count}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"finished recomputing the counters of {repaired} documents"))
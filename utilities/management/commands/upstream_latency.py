@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from utilities.upstream import get_latency_histograms
+
+
+class Command(BaseCommand):
+    help = "Print the upstreams (UIG, EBC, Accept) latency histograms published by all the processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('upstreams', nargs='*', type=str, help="defaults to the TIMEOUT_CONSTANTS keys")
+
+    def handle(self, *args, **options):
+        for upstream, histogram in get_latency_histograms(options['upstreams']).items():
+            if not histogram['count']:
+                self.stdout.write(f"{upstream:<28} no requests")
+                continue
+
+            self.stdout.write(self.style.SUCCESS(
+                    f"{upstream:<28} requests: {histogram['count']}, "
+                    f"average: {histogram['sum'] / histogram['count']:.3f}s"
+            ))
+            cumulative = 0
+            for bucket, count in histogram['buckets'].items():
+                cumulative += count
+                self.stdout.write(f"    <= {bucket:<6} {cumulative:>8} ({cumulative / histogram['count']:.1%})")
@@ -2,5 +2,6 @@ from .abstract_models import (
     AbstractBaseDocStatus, AbstractBaseDocType, AbstractBaseVMTData, AbstractTransactionCurrency,
     AbstractTransactionCategory, AbstractTransactionPurpose
 )
-from .generic_models import Budget, CallWalletsModerator, FeeSetup, TopupRequest, TopupAction, ExcelFile, VodafoneBalance
+from .generic_models import Budget, BudgetLedgerEntry, CallWalletsModerator, FeeSetup, TopupRequest, TopupAction, ExcelFile, VodafoneBalance
+from .generic_models import UpstreamLatencyBucket
 from .soft_delete_models import SoftDeletionModel
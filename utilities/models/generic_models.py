@@ -7,13 +7,17 @@ import logging
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, Sum
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from core.models import AbstractTimeStamp
 from simple_history.models import HistoricalRecords
 from django.db import transaction
 
+from ..fee_schedule import get_fee_schedule
+
 
 BUDGET_LOGGER = logging.getLogger("custom_budgets")
 
@@ -83,7 +87,7 @@ class Budget(AbstractTimeStamp):
             default=0,
             null=False,
             blank=False,
-            help_text=_("Updated automatically after any disbursement callback")
+            help_text=_("Updated automatically by the periodic compaction of the budget ledger")
     )
     
     history = HistoricalRecords()
@@ -102,106 +106,95 @@ class Budget(AbstractTimeStamp):
         """Success form submit - object saving url"""
         return reverse("utilities:budget_update", kwargs={"username": self.disburser.username})
 
-    def accumulate_amount_with_fees_and_vat(self, amount_to_be_disbursed, issuer_type, num_of_trns = 1):
-        """Accumulate amount being disbursed with fees percentage and 14 % VAT"""
-        actual_amount = round(Decimal(amount_to_be_disbursed), 2)
+    @staticmethod
+    def get_fees_issuer(issuer_type):
+        """Map the issuer type used by the transactions to its FeeSetup issuer, None for unknown issuers"""
+        return {
+            "vodafone": FeeSetup.VODAFONE, "v": FeeSetup.VODAFONE,
+            "etisalat": FeeSetup.ETISALAT, "e": FeeSetup.ETISALAT,
+            "orange": FeeSetup.ORANGE, "o": FeeSetup.ORANGE,
+            "aman": FeeSetup.AMAN, "a": FeeSetup.AMAN,
+            "bank_card": FeeSetup.BANK_CARD, "c": FeeSetup.BANK_CARD,
+            "bank_wallet": FeeSetup.BANK_WALLET, "b": FeeSetup.BANK_WALLET,
+        }.get(str(issuer_type).lower())
+
+    @staticmethod
+    def calculate_fees_and_vat_using_fees_obj(fees_obj, actual_amount, num_of_trns=1):
+        """Calculate the fees and 14 % VAT of an amount using the passed FeeSetup object"""
+        # 1. Calculate the fees for the passed amount to be disbursed using the picked fees type and value
+        if fees_obj.fee_type == FeeSetup.FIXED_FEE:
+            fees_value = fees_obj.fixed_value * num_of_trns
+        elif fees_obj.fee_type == FeeSetup.PERCENTAGE_FEE:
+            fees_value = round(((actual_amount * fees_obj.percentage_value) / 100), 4)
+        elif fees_obj.fee_type == FeeSetup.MIXED_FEE:
+            fees_value = round(((actual_amount * fees_obj.percentage_value) / 100), 4) + fees_obj.fixed_value
+
+        # 2. Check the total fees_value if it complies against the min and max values
+        if 0 < fees_obj.min_value > fees_value:
+            fees_value = fees_obj.min_value
+
+        if 0 < fees_obj.max_value < fees_value:
+            fees_value = fees_obj.max_value
+
+        vat_value = round(((fees_value * Decimal(14.00)) / 100), 4)
+        return fees_value, vat_value
 
-        # 1. Determine the type of the issuer to calculate the fees for
-        if issuer_type == "vodafone" or issuer_type == "V" or issuer_type == "v":
-            issuer_type_refined = FeeSetup.VODAFONE
-        elif issuer_type == "etisalat" or issuer_type == "E" or issuer_type == "e":
-            issuer_type_refined = FeeSetup.ETISALAT
-        elif issuer_type == "orange" or issuer_type == "O" or issuer_type == "o":
-            issuer_type_refined = FeeSetup.ORANGE
-        elif issuer_type == "aman" or issuer_type == "A" or issuer_type == "a":
-            issuer_type_refined = FeeSetup.AMAN
-        elif issuer_type == "bank_card" or issuer_type == "C" or issuer_type == "c":
-            issuer_type_refined = FeeSetup.BANK_CARD
-        elif issuer_type == "bank_wallet" or issuer_type == "B" or issuer_type == "b":
-            issuer_type_refined = FeeSetup.BANK_WALLET
-
-        # 2. Pick the fees objects corresponding to the determined issuer type
-        fees_obj = self.fees.filter(issuer=issuer_type_refined)
-        fees_obj = fees_obj.first() if fees_obj.count() > 0 else None
-
-        # 3. Calculate the fees for the passed amount to be disbursed using the picked fees type and value
-        if fees_obj:
-            if fees_obj.fee_type == FeeSetup.FIXED_FEE:
-                fixed_value = fees_obj.fixed_value
-                fees_aggregated_value = fixed_value * num_of_trns
-            elif fees_obj.fee_type == FeeSetup.PERCENTAGE_FEE:
-                percentage_value = fees_obj.percentage_value
-                fees_aggregated_value = round(((actual_amount * percentage_value) / 100), 4)
-            elif fees_obj.fee_type == FeeSetup.MIXED_FEE:
-                fixed_value = fees_obj.fixed_value
-                percentage_value = fees_obj.percentage_value
-                fees_aggregated_value = round(((actual_amount * percentage_value) / 100), 4) + fixed_value
-
-            # 3.1 Check the total fees_aggregated_value if it complies against the min and max values
-            if 0 < fees_obj.min_value > fees_aggregated_value:
-                fees_aggregated_value = fees_obj.min_value
-
-            if 0 < fees_obj.max_value < fees_aggregated_value:
-                fees_aggregated_value = fees_obj.max_value
-
-            vat_value = round(((fees_aggregated_value * Decimal(14.00)) / 100), 4)
-            total_amount_with_fees_and_vat = round((actual_amount + fees_aggregated_value + vat_value), 2)
-
-            return total_amount_with_fees_and_vat
-        else:
+    @property
+    def fee_schedule(self):
+        """Compiled fees setups of this budget cached in process and invalidated on every FeeSetup change"""
+        return get_fee_schedule(self.id)
+
+    def get_fees_obj(self, issuer_type, fee_schedule=None):
+        """Pick the fees object corresponding to the passed issuer type"""
+        fees_obj = (fee_schedule or self.fee_schedule).get(self.get_fees_issuer(issuer_type))
+        if fees_obj is None:
             raise ValueError(_(f"Fees type and value for the passed issuer -{issuer_type}- does not exist!"))
+        return fees_obj
 
-    def calculate_fees_and_vat_for_amount(self, amount_to_be_disbursed, issuer_type, num_of_trns = 1):
-        """
-        Calculate fees percentage and 14 % VAT regarding specific amount and issuer.
-        TODO: Remove the repeated code via exporting the main part into a generic method
-        """
+    def accumulate_amount_with_fees_and_vat(self, amount_to_be_disbursed, issuer_type, num_of_trns = 1):
+        """Accumulate amount being disbursed with fees percentage and 14 % VAT"""
         actual_amount = round(Decimal(amount_to_be_disbursed), 2)
+        fees_value, vat_value = self.calculate_fees_and_vat_using_fees_obj(
+                self.get_fees_obj(issuer_type), actual_amount, num_of_trns
+        )
+        return round((actual_amount + fees_value + vat_value), 2)
 
-        # 1. Determine the type of the issuer to calculate the fees for
-        if issuer_type == "vodafone" or issuer_type == "V":
-            issuer_type_refined = FeeSetup.VODAFONE
-        elif issuer_type == "etisalat" or issuer_type == "E":
-            issuer_type_refined = FeeSetup.ETISALAT
-        elif issuer_type == "orange" or issuer_type == "O":
-            issuer_type_refined = FeeSetup.ORANGE
-        elif issuer_type == "aman" or issuer_type == "A":
-            issuer_type_refined = FeeSetup.AMAN
-        elif issuer_type == "bank_card" or issuer_type == "C":
-            issuer_type_refined = FeeSetup.BANK_CARD
-        elif issuer_type == "bank_wallet" or issuer_type == "B":
-            issuer_type_refined = FeeSetup.BANK_WALLET
-        elif issuer_type == 'default' or issuer_type in ["D", 'd']:
+    def calculate_fees_and_vat_for_amount(self, amount_to_be_disbursed, issuer_type, num_of_trns = 1):
+        """Calculate fees percentage and 14 % VAT regarding specific amount and issuer"""
+        if issuer_type == 'default' or issuer_type in ["D", 'd']:
             return 0, 0
 
-        # 2. Pick the fees objects corresponding to the determined issuer type
-        fees_obj = self.fees.filter(issuer=issuer_type_refined)
-        fees_obj = fees_obj.first() if fees_obj.count() > 0 else None
-
-        # 3. Calculate the fees for the passed amount to be disbursed using the picked fees type and value
-        if fees_obj:
-            if fees_obj.fee_type == FeeSetup.FIXED_FEE:
-                fixed_value = fees_obj.fixed_value
-                fees_value = fixed_value * num_of_trns
-            elif fees_obj.fee_type == FeeSetup.PERCENTAGE_FEE:
-                percentage_value = fees_obj.percentage_value
-                fees_value = round(((actual_amount * percentage_value) / 100), 4)
-            elif fees_obj.fee_type == FeeSetup.MIXED_FEE:
-                fixed_value = fees_obj.fixed_value
-                percentage_value = fees_obj.percentage_value
-                fees_value = round(((actual_amount * percentage_value) / 100), 4) + fixed_value
-
-            # 3.1 Check the total fees_value if it complies against the min and max values
-            if 0 < fees_obj.min_value > fees_value:
-                fees_value = fees_obj.min_value
-
-            if 0 < fees_obj.max_value < fees_value:
-                fees_value = fees_obj.max_value
-
-            vat_value = round(((fees_value * Decimal(14.00)) / 100), 4)
-            return fees_value, vat_value
-        else:
-            raise ValueError(_(f"Fees type and value for the passed issuer -{issuer_type}- does not exist!"))
+        actual_amount = round(Decimal(amount_to_be_disbursed), 2)
+        return self.calculate_fees_and_vat_using_fees_obj(self.get_fees_obj(issuer_type), actual_amount, num_of_trns)
+
+    def calculate_fees_and_vat_bulk(self, amounts, issuers):
+        """
+        Calculate fees and 14 % VAT for many amounts at once using the cached fee schedule
+        :param amounts: amounts to be disbursed
+        :param issuers: issuer type of every amount
+        :return: tuple of fees list and VAT list at the same order of the passed amounts
+        """
+        fee_schedule = self.fee_schedule
+        fees_objs, calculated = {}, {}
+        fees_list, vat_list = [], []
+
+        for amount, issuer_type in zip(amounts, issuers):
+            issuer_type = str(issuer_type).lower()
+            key = (amount, issuer_type)
+            if key not in calculated:
+                if issuer_type in ['default', 'd']:
+                    calculated[key] = (0, 0)
+                else:
+                    if issuer_type not in fees_objs:
+                        fees_objs[issuer_type] = self.get_fees_obj(issuer_type, fee_schedule)
+                    calculated[key] = self.calculate_fees_and_vat_using_fees_obj(
+                            fees_objs[issuer_type], round(Decimal(amount), 2)
+                    )
+            fees_value, vat_value = calculated[key]
+            fees_list.append(fees_value)
+            vat_list.append(vat_value)
+
+        return fees_list, vat_list
 
     def within_threshold(self, amount_to_be_disbursed, issuer_type):
         """
@@ -219,6 +212,41 @@ class Budget(AbstractTimeStamp):
         except (ValueError, Exception) as e:
             raise ValueError(_(f"Error while checking the amount to be disbursed if within threshold - {e.args}"))
 
+    def _apply_ledger_entry(self, entry_type, amount, fees_and_vat=0, issuer_type="", only_if_covered=False,
+                            transactions_count=1):
+        """
+        Apply a debit/credit to the current balance through a single conditional F() update and append it
+            to the budget ledger, the budget row is locked only by the update statement until the commit
+        :param only_if_covered: apply debit only if the current balance covers it
+        :return: (balance before, balance after) or None if the debit isn't covered by the current balance
+        """
+        change = round(Decimal(amount) + Decimal(fees_and_vat), 2)
+        if entry_type == BudgetLedgerEntry.DEBIT:
+            change = -change
+
+        with transaction.atomic():
+            budget_qs = Budget.objects.filter(id=self.id)
+            if only_if_covered:
+                budget_qs = budget_qs.filter(current_balance__gte=-change)
+            if not budget_qs.update(current_balance=F("current_balance") + change, updated_at=timezone.now()):
+                return None
+
+            balance_after = Budget.objects.values_list("current_balance", flat=True).get(id=self.id)
+            balance_before = balance_after - change
+            BudgetLedgerEntry.objects.create(
+                    budget_id=self.id,
+                    entry_type=entry_type,
+                    amount=round(Decimal(amount), 2),
+                    fees_and_vat=round(Decimal(fees_and_vat), 4),
+                    issuer=issuer_type,
+                    balance_before=balance_before,
+                    balance_after=balance_after,
+                    transactions_count=transactions_count
+            )
+
+        self.current_balance = balance_after
+        return balance_before, balance_after
+
     def update_disbursed_amount_and_current_balance(self, amount, issuer_type, num_of_trns = 1):
         """
         Update the total disbursement amount and the current balance after each successful transaction
@@ -227,21 +255,16 @@ class Budget(AbstractTimeStamp):
         :return: True/False
         """
         try:
-            with transaction.atomic():
-                budget_obj = Budget.objects.select_for_update().get(id=self.id)
-                print("===============ATOMIC=================")
-                amount_plus_fees_vat = budget_obj.accumulate_amount_with_fees_and_vat(amount, issuer_type.lower(), num_of_trns)
-                current_balance_before = budget_obj.current_balance
-                applied_fees_and_vat = amount_plus_fees_vat - Decimal(amount)
-                budget_obj.total_disbursed_amount += amount_plus_fees_vat
-                budget_obj.current_balance -= amount_plus_fees_vat
-                balance_after = budget_obj.current_balance
-                budget_obj.save()
-                BUDGET_LOGGER.debug(
-                        f"[message] [CUSTOM BUDGET UPDATE] [{budget_obj.disburser.username}] -- disbursed amount: {amount}, "
-                        f"applied fees plus VAT: {applied_fees_and_vat}, used issuer: {issuer_type.lower()}, "
-                        f"current balance before: {current_balance_before}, current balance after: {budget_obj.current_balance}"
-                )
+            amount_plus_fees_vat = self.accumulate_amount_with_fees_and_vat(amount, issuer_type.lower(), num_of_trns)
+            applied_fees_and_vat = amount_plus_fees_vat - round(Decimal(amount), 2)
+            current_balance_before, balance_after = self._apply_ledger_entry(
+                    BudgetLedgerEntry.DEBIT, amount, applied_fees_and_vat, issuer_type.lower()
+            )
+            BUDGET_LOGGER.debug(
+                    f"[message] [CUSTOM BUDGET UPDATE] [{self.disburser.username}] -- disbursed amount: {amount}, "
+                    f"applied fees plus VAT: {applied_fees_and_vat}, used issuer: {issuer_type.lower()}, "
+                    f"current balance before: {current_balance_before}, current balance after: {balance_after}"
+            )
         except Exception as e:
             raise ValueError(_(
                     f"Error updating the total disbursed amount and the current balance, please retry again later, "
@@ -250,6 +273,81 @@ class Budget(AbstractTimeStamp):
 
         return balance_after
 
+    def update_disbursed_amounts_and_current_balance_in_batch(self, transactions):
+        """
+        Debit a batch of successful transactions using one balance update and one consolidated ledger entry
+        :param transactions: list of (amount, issuer type) pairs
+        :return: list of (balance before, balance after) pairs of every transaction at the passed order
+        """
+        if not transactions:
+            return []
+
+        try:
+            fees_list, vat_list = self.calculate_fees_and_vat_bulk(*zip(*transactions))
+            amounts_with_fees_and_vat = []
+            for (amount, issuer_type), fees_value, vat_value in zip(transactions, fees_list, vat_list):
+                actual_amount = round(Decimal(amount), 2)
+                amounts_with_fees_and_vat.append((actual_amount, round((actual_amount + fees_value + vat_value), 2)))
+
+            total_amount = sum(amount for amount, total in amounts_with_fees_and_vat)
+            total_fees_and_vat = sum(total for amount, total in amounts_with_fees_and_vat) - total_amount
+            issuers = {str(issuer_type).lower() for amount, issuer_type in transactions}
+            batch_balance_before, batch_balance_after = self._apply_ledger_entry(
+                    BudgetLedgerEntry.DEBIT, total_amount, total_fees_and_vat,
+                    issuers.pop() if len(issuers) == 1 else "mixed", transactions_count=len(transactions)
+            )
+            BUDGET_LOGGER.debug(
+                    f"[message] [CUSTOM BUDGET BATCH UPDATE] [{self.disburser.username}] -- "
+                    f"transactions count: {len(transactions)}, disbursed amount: {total_amount}, "
+                    f"applied fees plus VAT: {total_fees_and_vat}, current balance before: {batch_balance_before}, "
+                    f"current balance after: {batch_balance_after}"
+            )
+        except Exception as e:
+            raise ValueError(_(
+                    f"Error updating the total disbursed amount and the current balance, please retry again later, "
+                    f"exception: {e.args}"
+            ))
+
+        balances, balance = [], batch_balance_before
+        for amount, amount_with_fees_and_vat in amounts_with_fees_and_vat:
+            balances.append((balance, balance - amount_with_fees_and_vat))
+            balance -= amount_with_fees_and_vat
+
+        return balances
+
+    def deduct_if_covered(self, amount, issuer_type):
+        """
+        Deduct the amount plus its fees and VAT only if the current balance covers it, without locking on reads
+        :param amount: the amount being disbursed
+        :param issuer_type: Channel/Issuer used to disburse the amount over
+        :return: balance after the deduction or None if the current balance doesn't cover it
+        """
+        amount_plus_fees_vat = self.accumulate_amount_with_fees_and_vat(amount, issuer_type.lower())
+        applied_fees_and_vat = amount_plus_fees_vat - round(Decimal(amount), 2)
+        balances = self._apply_ledger_entry(
+                BudgetLedgerEntry.DEBIT, amount, applied_fees_and_vat, issuer_type.lower(), only_if_covered=True
+        )
+        return balances[1] if balances else None
+
+    def refund_deducted_amount(self, amount, issuer_type):
+        """
+        Return an amount deducted by deduct_if_covered plus its fees and VAT to the current balance
+        :param amount: the deducted amount
+        :param issuer_type: Channel/Issuer used at the deduction
+        :return: balance after the refund
+        """
+        amount_plus_fees_vat = self.accumulate_amount_with_fees_and_vat(amount, issuer_type.lower())
+        applied_fees_and_vat = amount_plus_fees_vat - round(Decimal(amount), 2)
+        balance_before, balance_after = self._apply_ledger_entry(
+                BudgetLedgerEntry.CREDIT, amount, applied_fees_and_vat, issuer_type.lower()
+        )
+        BUDGET_LOGGER.debug(
+                f"[message] [CUSTOM BUDGET REFUND] [{self.disburser.username}] -- refunded amount: {amount}, "
+                f"refunded fees plus VAT: {applied_fees_and_vat}, current balance before: {balance_before}, "
+                f"current balance after: {balance_after}"
+        )
+        return balance_after
+
     def return_disbursed_amount_for_cancelled_trx(self, amount):
         """
         Update the total disbursement amount and the current balance after each pending -> failed transaction
@@ -257,24 +355,89 @@ class Budget(AbstractTimeStamp):
         :return: True/False
         """
         try:
-            current_balance_before = self.current_balance
-            self.total_disbursed_amount -= round(Decimal(amount), 2)
-            self.current_balance += round(Decimal(amount), 2)
-            self.save()
+            current_balance_before, balance_after = self._apply_ledger_entry(BudgetLedgerEntry.CREDIT, amount)
             BUDGET_LOGGER.debug(
                     f"[message] [CUSTOM BUDGET UPDATE] [{self.disburser.username}] -- returned amount: {amount}, "
-                    f"current balance before: {current_balance_before}, current balance after: {self.current_balance}"
+                    f"current balance before: {current_balance_before}, current balance after: {balance_after}"
             )
         except Exception:
             raise ValueError(_(f"Error adding to the current balance and cutting from the total disbursed amount"))
 
-        return self.current_balance
+        return balance_after
 
     def get_current_balance(self):
+        """Read the committed current balance without locking the budget row"""
+        return Budget.objects.values_list("current_balance", flat=True).get(id=self.id)
+
+    def compact_ledger(self):
+        """
+        Roll the not compacted ledger entries into the total disbursed amount and the budget history
+        :return: number of compacted ledger entries
+        """
         with transaction.atomic():
-            print("===============GETTING BALACE=================")
             budget_obj = Budget.objects.select_for_update().get(id=self.id)
-            return budget_obj.current_balance
+            entries = BudgetLedgerEntry.objects.select_for_update().filter(budget_id=self.id, is_compacted=False)
+            entries_ids = list(entries.values_list("id", flat=True))
+            if not entries_ids:
+                return 0
+
+            entries = BudgetLedgerEntry.objects.filter(id__in=entries_ids)
+            totals = entries.values("entry_type").annotate(total=Sum(F("amount") + F("fees_and_vat")))
+            totals = {total["entry_type"]: total["total"] for total in totals}
+            budget_obj.total_disbursed_amount += round(
+                    totals.get(BudgetLedgerEntry.DEBIT, 0) - totals.get(BudgetLedgerEntry.CREDIT, 0), 2
+            )
+            # Saving the locked object records one history snapshot for all of the compacted entries
+            budget_obj.save()
+            entries.update(is_compacted=True)
+
+        self.total_disbursed_amount = budget_obj.total_disbursed_amount
+        return len(entries_ids)
+
+
+class BudgetLedgerEntry(AbstractTimeStamp):
+    """
+    Append only record of every debit/credit applied to a budget's current balance
+    """
+
+    DEBIT = "d"
+    CREDIT = "c"
+
+    ENTRY_TYPE_CHOICES = [
+        (DEBIT, _("Debit")),
+        (CREDIT, _("Credit")),
+    ]
+
+    budget = models.ForeignKey(
+            Budget,
+            on_delete=models.CASCADE,
+            related_name="ledger_entries",
+            verbose_name=_("Budget")
+    )
+    entry_type = models.CharField(_("Entry type"), max_length=1, choices=ENTRY_TYPE_CHOICES)
+    amount = models.DecimalField(_("Amount"), max_digits=15, decimal_places=2)
+    fees_and_vat = models.DecimalField(_("Fees plus VAT"), max_digits=12, decimal_places=4, default=0)
+    issuer = models.CharField(_("Issuer"), max_length=16, blank=True, default="")
+    transactions_count = models.PositiveIntegerField(_("Transactions count"), default=1)
+    balance_before = models.DecimalField(_("Balance before"), max_digits=10, decimal_places=2)
+    balance_after = models.DecimalField(_("Balance after"), max_digits=10, decimal_places=2)
+    is_compacted = models.BooleanField(
+            _("Is compacted?"),
+            default=False,
+            help_text=_("Rolled into the total disbursed amount and the budget history")
+    )
+
+    class Meta:
+        verbose_name = "Budget Ledger Entry"
+        verbose_name_plural = "Budget Ledger Entries"
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["budget", "is_compacted"]),
+        ]
+
+    def __str__(self):
+        """String representation for a budget ledger entry"""
+        return f"{self.get_entry_type_display()} {self.amount} - {self.budget_id}"
 
 
 class FeeSetup(models.Model):
@@ -554,4 +717,26 @@ class VodafoneBalance(AbstractTimeStamp):
     class Meta:
         verbose_name = "Vodafone Balance"
         verbose_name_plural = "Vodafone Monthly Balances"
-        ordering = ["-id"]
\ No newline at end of file
+        ordering = ["-id"]
+
+
+class UpstreamLatencyBucket(models.Model):
+    """
+    Requests latencies of one upstream within one histogram bucket published by all the processes,
+        its counters are added to by F() updates so the concurrent publishers never overwrite each other
+    """
+
+    upstream = models.CharField(_("Upstream"), max_length=64)
+    bucket = models.CharField(_("Bucket upper bound"), max_length=16)
+    count = models.PositiveBigIntegerField(_("Requests count"), default=0)
+    sum_ms = models.PositiveBigIntegerField(_("Latencies sum in milliseconds"), default=0)
+
+    class Meta:
+        verbose_name = "Upstream Latency Bucket"
+        verbose_name_plural = "Upstream Latency Buckets"
+        constraints = [
+            models.UniqueConstraint(fields=["upstream", "bucket"], name="unique_upstream_latency_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.upstream} <= {self.bucket}"
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .fee_schedule import invalidate_fee_schedule
+from .models import Budget, FeeSetup
+
+
+@receiver(post_save, sender=FeeSetup)
+@receiver(post_delete, sender=FeeSetup)
+def invalidate_budget_fee_schedule(sender, instance, **kwargs):
+    """Drop the cached fee schedule of the budget whenever one of its fees setups changes"""
+    invalidate_fee_schedule(instance.budget_related_id)
+
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def invalidate_fee_schedule_of_budget(sender, instance, **kwargs):
+    """Saved/deleted budgets shouldn't keep using a fee schedule cached for the same id"""
+    invalidate_fee_schedule(instance.id)
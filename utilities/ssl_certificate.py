@@ -4,14 +4,13 @@ from __future__ import unicode_literals
 import base64
 import datetime
 import logging
+import os
+import threading
 
-from Crypto.Hash import SHA256
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_v1_5
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
 from cryptography.x509.oid import NameOID
 
@@ -22,6 +21,36 @@ from django.utils.translation import gettext as _
 SSL_CERTIFICATE_LOGGER = logging.getLogger('ssl_certificates')
 
 
+class SignerRegistry:
+    """
+    Process wide registry of the parsed private keys used to sign the requests payloads,
+        every key file is parsed once and parsed again only if its modification time changes
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def get_private_key(self, key_path):
+        modified_at = os.stat(key_path).st_mtime_ns
+        cached = self.keys.get(key_path)
+        if cached is not None and cached[0] == modified_at:
+            return cached[1]
+
+        with self.lock:
+            with open(key_path, 'rb') as pem_key:
+                private_key = load_pem_private_key(pem_key.read(), None, default_backend())
+            self.keys[key_path] = (modified_at, private_key)
+        return private_key
+
+    def sign(self, key_path, data):
+        """:return: RSA PKCS#1 v1.5 SHA256 signature of the passed bytes"""
+        return self.get_private_key(key_path).sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+
+signers = SignerRegistry()
+
+
 class SSLCertificate:
     """
     Generate private key and use it to generate SSL certificate
@@ -167,13 +196,8 @@ class SSLCertificate:
             refined_key_name = private_key_name.split('.')[0]
             key_path = f"{settings.MEDIA_ROOT}/certificates/{refined_key_name}.pem"
 
-            with open(key_path, 'r') as f:
-                private_key_file = f.read()
-                private_key_rsa = RSA.importKey(private_key_file)
-
-            hashed_data = SHA256.new(payload_without_signature.encode('utf-16le'))
-            signer = PKCS1_v1_5.new(private_key_rsa).sign(hashed_data)
-            return base64.b64encode(signer).decode('utf-8')
+            signature = signers.sign(key_path, payload_without_signature.encode('utf-16le'))
+            return base64.b64encode(signature).decode('utf-8')
 
         except ValueError:
             raise ValueError(_(f'Provided private key name is not valid'))
@@ -19,7 +19,7 @@ from payouts.settings.celery import app
 from users.models import EntitySetup, User
 
 from .functions import render_to_pdf
-from .models import AbstractBaseDocStatus
+from .models import AbstractBaseDocStatus, Budget, BudgetLedgerEntry
 
 BUDGET_LOGGER = logging.getLogger("custom_budgets")
 
@@ -111,6 +111,25 @@ def send_transfer_request_email(admin_username, message, attachment_file_name=No
     return True
 
 
+@app.task()
+@respects_language
+def compact_budgets_ledger(**kwargs):
+    """Background task for rolling the budgets ledger entries into their total disbursed amounts and history"""
+    budgets_ids = BudgetLedgerEntry.objects.filter(is_compacted=False).values_list("budget_id", flat=True).distinct()
+
+    for budget in Budget.objects.filter(id__in=list(budgets_ids)).select_related("disburser"):
+        try:
+            compacted_entries = budget.compact_ledger()
+            BUDGET_LOGGER.debug(
+                    f"[message] [BUDGET LEDGER COMPACTION] [{budget.disburser.username}] -- "
+                    f"compacted entries: {compacted_entries}, total disbursed amount: {budget.total_disbursed_amount}"
+            )
+        except Exception as err:
+            BUDGET_LOGGER.debug(
+                    f"[message] [BUDGET LEDGER COMPACTION ERROR] [{budget.disburser.username}] -- {err.args}"
+            )
+
+
 @app.task()
 @respects_language
 def check_disk_space_and_send_warning_email():
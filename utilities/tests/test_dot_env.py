@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from payouts.utils import DotEnvRegistry
+
+
+class DotEnvRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        env_file = tempfile.NamedTemporaryFile("w", suffix=".env", delete=False)
+        env_file.write("DOT_ENV_TEST_URL=https://uig.example\nDOT_ENV_TEST_TIMEOUT=33\nDOT_ENV_TEST_PATH=file\n")
+        env_file.close()
+        self.env_file = env_file.name
+        self.addCleanup(os.remove, self.env_file)
+        self.registry = DotEnvRegistry(self.env_file)
+
+    def write_env_file(self, content):
+        with open(self.env_file, "w") as env_file:
+            env_file.write(content)
+
+    @mock.patch.dict(os.environ, {"DOT_ENV_TEST_PATH": "process"})
+    def test_values_are_typed_and_process_environment_takes_precedence(self):
+        self.assertEqual(self.registry.str("DOT_ENV_TEST_URL"), "https://uig.example")
+        self.assertEqual(self.registry.int("DOT_ENV_TEST_TIMEOUT"), 33)
+        self.assertEqual(self.registry.str("DOT_ENV_TEST_PATH"), "process")
+        self.assertEqual(self.registry.str("DOT_ENV_TEST_MISSING", default="default"), "default")
+
+    def test_file_is_parsed_once_until_reloaded(self):
+        env = self.registry.get_env()
+        self.write_env_file("DOT_ENV_TEST_URL=https://new-uig.example\n")
+
+        with mock.patch.object(DotEnvRegistry, "_read_file", side_effect=AssertionError) as read_file:
+            self.assertEqual(self.registry.str("DOT_ENV_TEST_URL"), "https://uig.example")
+            read_file.assert_not_called()
+
+        self.registry.reload()
+        self.assertEqual(env.str("DOT_ENV_TEST_URL"), "https://new-uig.example")
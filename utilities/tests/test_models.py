@@ -7,7 +7,7 @@ from django.test import TestCase
 from users.tests.factories import SuperAdminUserFactory, VMTDataFactory
 from users.models import RootUser
 
-from utilities.models import Budget, FeeSetup, CallWalletsModerator
+from utilities.models import Budget, BudgetLedgerEntry, FeeSetup, CallWalletsModerator
 
 DISBURSEMENT = 1
 DISBURSEMENT_KEYS = ['LOGIN', 'PASSWORD', 'REQUEST_GATEWAY_CODE', 'REQUEST_GATEWAY_TYPE', 'WALLETISSUER', 'SENDERS',
@@ -408,6 +408,31 @@ class BudgetTests(TestCase):
             Decimal('0')
         )
 
+    # test calculate_fees_and_vat_bulk matches the single amount calculation without extra queries
+    def test_calculate_fees_and_vat_bulk(self):
+        FeeSetup(budget_related=self.budget, issuer='vf', fee_type='p', percentage_value=2.25).save()
+        FeeSetup(budget_related=self.budget, issuer='es', fee_type='p', percentage_value=2.25, min_value=10).save()
+        amounts, issuers = [200, 200, 50], ['vodafone', 'etisalat', 'default']
+        self.budget.fee_schedule
+
+        with self.assertNumQueries(0):
+            fees_list, vat_list = self.budget.calculate_fees_and_vat_bulk(amounts, issuers)
+        self.assertEqual(fees_list, [Decimal('4.5'), Decimal('10'), 0])
+        self.assertEqual(vat_list, [Decimal('0.63'), Decimal('1.4000'), 0])
+
+    # test the cached fee schedule is invalidated when the fees setup changes
+    def test_fee_schedule_invalidated_on_fees_setup_change(self):
+        fees_setup = FeeSetup(budget_related=self.budget, issuer='vf', fee_type='f', fixed_value=10)
+        fees_setup.save()
+        self.assertEqual(self.budget.calculate_fees_and_vat_for_amount(200, 'V')[0], Decimal('10'))
+
+        fees_setup.fixed_value = 20
+        fees_setup.save()
+        self.assertEqual(self.budget.calculate_fees_and_vat_for_amount(200, 'V')[0], Decimal('20'))
+
+        fees_setup.delete()
+        self.assertRaises(ValueError, self.budget.calculate_fees_and_vat_for_amount, 200, 'V')
+
     # test calculate_fees_and_vat_for_amount with fake fees
     def test_calculate_fees_and_vat_for_amount_fake_fees(self):
         self.assertRaises(
@@ -478,6 +503,59 @@ class BudgetTests(TestCase):
             True
         )
 
+    # test debits are appended to the budget ledger and compacted into the total disbursed amount
+    def test_budget_ledger_debit_and_compaction(self):
+        FeeSetup(budget_related=self.budget, issuer='vf', fee_type='p', percentage_value=2.25).save()
+        Budget.objects.filter(id=self.budget.id).update(current_balance=Decimal('1000'))
+
+        self.assertEqual(
+            self.budget.update_disbursed_amount_and_current_balance(200, 'vodafone'),
+            Decimal('794.87')
+        )
+        entry = BudgetLedgerEntry.objects.get(budget=self.budget)
+        self.assertEqual(entry.balance_before, Decimal('1000'))
+        self.assertEqual(entry.fees_and_vat, Decimal('5.13'))
+
+        self.assertEqual(self.budget.compact_ledger(), 1)
+        self.assertEqual(Budget.objects.get(id=self.budget.id).total_disbursed_amount, Decimal('205.13'))
+        self.assertEqual(self.budget.compact_ledger(), 0)
+
+    # test batch debit applies one ledger entry and returns every transaction balances
+    def test_update_disbursed_amounts_and_current_balance_in_batch(self):
+        FeeSetup(budget_related=self.budget, issuer='vf', fee_type='p', percentage_value=2.25).save()
+        FeeSetup(budget_related=self.budget, issuer='es', fee_type='f', fixed_value=10).save()
+        Budget.objects.filter(id=self.budget.id).update(current_balance=Decimal('1000'))
+
+        balances = self.budget.update_disbursed_amounts_and_current_balance_in_batch(
+            [(200, 'vodafone'), (50, 'etisalat')]
+        )
+        self.assertEqual(balances, [
+            (Decimal('1000'), Decimal('794.87')),
+            (Decimal('794.87'), Decimal('733.47')),
+        ])
+        entry = BudgetLedgerEntry.objects.get(budget=self.budget)
+        self.assertEqual(entry.transactions_count, 2)
+        self.assertEqual(entry.issuer, 'mixed')
+        self.assertEqual(self.budget.get_current_balance(), Decimal('733.47'))
+
+    # test conditional deduction doesn't exceed the current balance
+    def test_deduct_if_covered(self):
+        FeeSetup(budget_related=self.budget, issuer='vf', fee_type='f', fixed_value=10).save()
+        Budget.objects.filter(id=self.budget.id).update(current_balance=Decimal('100'))
+
+        self.assertIsNone(self.budget.deduct_if_covered(95, 'vodafone'))
+        self.assertEqual(self.budget.deduct_if_covered(50, 'vodafone'), Decimal('38.60'))
+        self.assertEqual(self.budget.get_current_balance(), Decimal('38.60'))
+
+    # test refunding a deduction returns its fees and VAT too
+    def test_refund_deducted_amount(self):
+        FeeSetup(budget_related=self.budget, issuer='vf', fee_type='f', fixed_value=10).save()
+        Budget.objects.filter(id=self.budget.id).update(current_balance=Decimal('100'))
+
+        self.budget.deduct_if_covered(50, 'vodafone')
+        self.assertEqual(self.budget.refund_deducted_amount(50, 'vodafone'), Decimal('100'))
+        self.assertEqual(self.budget.get_current_balance(), Decimal('100'))
+
 class FeeSetupTests(TestCase):
 
     def setUp(self):
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import uuid
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from data.models import Doc, FileCategory
+from disbursement.models import BankTransaction, DisbursementData
+from instant_cashin.models import AbstractBaseIssuer, InstantTransaction
+from users.models import MakerUser
+from users.tests.factories import AdminUserFactory, InstantAPICheckerFactory
+
+
+@skipUnless(connection.vendor == 'postgresql', "query plans are checked against PostgreSQL only")
+class TransactionsQueryPlansTests(TestCase):
+    """
+    EXPLAIN the canonical transactions queries of the views and tasks with sequential scans disabled,
+        a query still planned as a sequential scan has no index backing its filters and a plan missing the index
+        added for its query has that index unused
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = AdminUserFactory(user_type=3)
+        cls.api_checker = InstantAPICheckerFactory(user_type=6, root=cls.root)
+        maker = MakerUser.objects.create(username='test_maker_user', root=cls.root, user_type=1)
+        cls.doc = Doc.objects.create(owner=maker, file_category=FileCategory.objects.create(user_created=cls.root))
+
+        for index in range(10):
+            InstantTransaction.objects.create(
+                    from_user=cls.api_checker, issuer_type=AbstractBaseIssuer.ETISALAT, amount=50,
+                    anon_recipient=f"0111111111{index}", status="U" if index % 2 else "S",
+                    disbursed_date=timezone.now(), client_transaction_reference=uuid.uuid4()
+            )
+            DisbursementData.objects.create(
+                    doc=cls.doc, amount=50, msisdn=f"0101010101{index}", is_disbursed=index % 2 == 0,
+                    reason="" if index % 3 else "Failed"
+            )
+            BankTransaction.objects.create(
+                    amount=50, user_created=cls.root, document=cls.doc, status="P",
+                    client_transaction_reference=uuid.uuid4()
+            )
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndexes(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan", plan, msg=f"\n{queryset.query}\n{plan}")
+        for index_name in index_names:
+            self.assertIn(index_name, plan, msg=f"\n{queryset.query}\n{plan}")
+
+    def test_instant_transactions_of_hierarchy_within_dates(self):
+        today = timezone.now()
+        self.assertUsesIndexes(InstantTransaction.objects.filter(
+                from_user__hierarchy=self.root.hierarchy,
+                disbursed_date__gte=today - datetime.timedelta(days=30),
+                disbursed_date__lte=today
+        ).order_by("-created_at"), "instant_trx_user_disbursed_idx")
+
+    def test_latest_instant_transactions_of_user(self):
+        self.assertUsesIndexes(
+                InstantTransaction.objects.filter(from_user=self.api_checker).order_by("-created_at")[:20],
+                "instant_trx_user_created_idx"
+        )
+
+    def test_unknown_transactions_of_issuer(self):
+        self.assertUsesIndexes(
+                InstantTransaction.objects.filter(status__in=["U", "P"], issuer_type__exact="E"),
+                "instant_trx_unsettled_idx"
+        )
+
+    def test_transactions_by_client_reference(self):
+        self.assertUsesIndexes(InstantTransaction.objects.filter(client_transaction_reference=uuid.uuid4()))
+        self.assertUsesIndexes(
+                BankTransaction.objects.filter(client_transaction_reference=uuid.uuid4()),
+                "bank_trx_client_reference_idx"
+        )
+
+    def test_document_records_by_status(self):
+        self.assertUsesIndexes(
+                DisbursementData.objects.filter(doc=self.doc, is_disbursed=True), "disb_data_doc_disbursed_idx"
+        )
+        self.assertUsesIndexes(
+                DisbursementData.objects.filter(doc=self.doc, is_disbursed=False).exclude(reason=''),
+                "disb_data_doc_disbursed_idx"
+        )
+        self.assertUsesIndexes(DisbursementData.objects.filter(doc=self.doc, reason=''), "disb_data_doc_pending_idx")
+
+    def test_latest_bank_transactions_to_be_polled(self):
+        latest_bank_trx_ids = BankTransaction.objects.\
+            filter(created_at__gte=timezone.now() - datetime.timedelta(days=5), is_latest_version=True).\
+            values_list("id", flat=True)
+        self.assertUsesIndexes(
+                BankTransaction.objects.filter(id__in=latest_bank_trx_ids, status__in=["P", "S"]).
+                order_by("created_at"),
+                "bank_trx_latest_created_idx"
+        )
+
+    def test_latest_bank_transactions_of_document(self):
+        self.assertUsesIndexes(
+                BankTransaction.objects.filter(document=self.doc, is_latest_version=True).order_by("-created_at"),
+                "bank_trx_latest_document_idx"
+        )
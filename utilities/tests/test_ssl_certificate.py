@@ -0,0 +1,53 @@
+import base64
+import os
+import shutil
+import tempfile
+
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+from django.test import SimpleTestCase, override_settings
+
+from utilities.ssl_certificate import SSLCertificate, signers
+
+
+class GenerateSignatureTests(SimpleTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(f"{self.media_root}/certificates")
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.key_path = SSLCertificate.generate_private_key("ebc_key", 1024)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        signers.keys.pop(self.key_path, None)
+        shutil.rmtree(self.media_root)
+
+    def pycrypto_signature(self, payload):
+        with open(self.key_path, 'r') as f:
+            private_key_rsa = RSA.importKey(f.read())
+        signature = PKCS1_v1_5.new(private_key_rsa).sign(SHA256.new(payload.encode('utf-16le')))
+        return base64.b64encode(signature).decode('utf-8')
+
+    def test_signature_is_identical_to_pycrypto_signature(self):
+        payload = '{"TransactionId":"1234","MessageId":"5678","CorporateCode":"CODE"}'
+
+        self.assertEqual(SSLCertificate.generate_signature("ebc_key.pem", payload), self.pycrypto_signature(payload))
+
+    def test_key_is_reloaded_when_its_file_changes(self):
+        payload = '{"TransactionId":"1234"}'
+        SSLCertificate.generate_signature("ebc_key", payload)
+        first_key = signers.get_private_key(self.key_path)
+
+        SSLCertificate.generate_private_key("ebc_key", 1024)
+        stat = os.stat(self.key_path)
+        os.utime(self.key_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        self.assertEqual(SSLCertificate.generate_signature("ebc_key", payload), self.pycrypto_signature(payload))
+        self.assertIsNot(signers.get_private_key(self.key_path), first_key)
+
+    def test_missing_key(self):
+        with self.assertRaises(FileNotFoundError):
+            SSLCertificate.generate_signature("missing_key", "{}")
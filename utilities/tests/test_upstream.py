@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from utilities import upstream
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    statuses = []
+    connections = set()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        StubUpstreamHandler.connections.add(self.client_address)
+        status = StubUpstreamHandler.statuses.pop(0) if StubUpstreamHandler.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(UPSTREAM_RETRY_BACKOFF=0, UPSTREAM_IDEMPOTENT_RETRIES=2)
+class UpstreamClientTests(SimpleTestCase):
+
+    def setUp(self):
+        StubUpstreamHandler.statuses = []
+        StubUpstreamHandler.connections = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubUpstreamHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_requests_to_the_same_host_reuse_the_pooled_connection(self):
+        for _ in range(3):
+            self.assertEqual(upstream.post(self.url, "CENTRAL_UIG", json={}).status_code, 200)
+
+        self.assertIs(upstream.get_session(self.url), upstream.get_session(self.url + "inquiry"))
+        self.assertEqual(len(StubUpstreamHandler.connections), 1)
+
+    def test_idempotent_requests_are_retried_on_gateway_errors(self):
+        StubUpstreamHandler.statuses = [503, 502]
+        response = upstream.post(self.url, "CENTRAL_UIG_INQUIRY", idempotent=True, json={})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StubUpstreamHandler.statuses, [])
+
+    def test_non_idempotent_requests_are_not_retried(self):
+        StubUpstreamHandler.statuses = [503]
+        response = upstream.post(self.url, "CENTRAL_UIG", json={})
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_latency_histogram_buckets(self):
+        histogram = upstream.LatencyHistogram()
+        for seconds in [0.01, 0.05, 0.3, 45]:
+            histogram.observe(seconds)
+
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.counts[0], 2)
+        self.assertEqual(histogram.counts[upstream.LATENCY_BUCKETS.index(0.5)], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+
+
+class LatencyHistogramsPublishingTests(TestCase):
+
+    def setUp(self):
+        # Drop the latencies observed by the other tests of this process
+        upstream._histograms.clear()
+
+    def test_published_histograms_are_added_to_the_shared_counters(self):
+        for seconds in [0.01, 0.3, 0.3]:
+            upstream.observe_latency("CENTRAL_UIG", seconds)
+        upstream.publish_latency_histograms()
+        upstream.observe_latency("CENTRAL_UIG", 0.02)
+        upstream.publish_latency_histograms()
+
+        histogram = upstream.get_latency_histograms(["CENTRAL_UIG"])["CENTRAL_UIG"]
+        self.assertEqual(histogram["count"], 4)
+        self.assertEqual(histogram["buckets"][0.05], 2)
+        self.assertEqual(histogram["buckets"][0.5], 2)
+        self.assertAlmostEqual(histogram["sum"], 0.63, places=2)
+
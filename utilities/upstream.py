@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import bisect
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+
+from .models import UpstreamLatencyBucket
+
+
+UPSTREAM_LATENCY_LOGGER = logging.getLogger("upstream_latency")
+
+# Upper bounds in seconds of the latency histograms buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf"))
+RETRY_STATUS_CODES = (502, 503, 504)
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+_published_at = time.monotonic()
+_publisher = None
+
+
+class LatencyHistogram:
+    """Requests latencies of one upstream counted per LATENCY_BUCKETS bucket"""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sums = [0.0] * len(LATENCY_BUCKETS)
+
+    def observe(self, seconds):
+        bucket_index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        self.counts[bucket_index] += 1
+        self.sums[bucket_index] += seconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    @property
+    def sum(self):
+        return sum(self.sums)
+
+
+def _new_session(prefix):
+    session = requests.Session()
+    pool_size = getattr(settings, "UPSTREAM_POOL_SIZE", 10)
+    session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    return session
+
+
+def get_session(url):
+    """
+    Return the keep-alive session of the url host, sessions are created once per process
+        and every one of them holds a connections pool of UPSTREAM_POOL_SIZE connections
+    """
+    global _sessions_pid
+    url_parts = urlsplit(url)
+    prefix = f"{url_parts.scheme}://{url_parts.netloc}"
+
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            # Connections inherited from the parent of a forked worker can't be shared with it
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(prefix)
+        if session is None:
+            session = _sessions[prefix] = _new_session(prefix)
+
+    return session
+
+
+def _add_to_bucket(upstream, bucket, count, sum_ms):
+    """Add to the shared counters of the bucket with one F() update, its row is created by its first publisher"""
+    bucket_qs = UpstreamLatencyBucket.objects.filter(upstream=upstream, bucket=str(bucket))
+    counters = {"count": F("count") + count, "sum_ms": F("sum_ms") + sum_ms}
+    if bucket_qs.update(**counters):
+        return
+
+    try:
+        with transaction.atomic():
+            UpstreamLatencyBucket.objects.create(upstream=upstream, bucket=str(bucket), count=count, sum_ms=sum_ms)
+    except IntegrityError:
+        bucket_qs.update(**counters)
+
+
+def publish_latency_histograms():
+    """Add the latencies observed by this process to the shared histograms and log them"""
+    with _histograms_lock:
+        histograms = dict(_histograms)
+        _histograms.clear()
+
+    for upstream, histogram in histograms.items():
+        try:
+            for bucket, count, seconds in zip(LATENCY_BUCKETS, histogram.counts, histogram.sums):
+                if count:
+                    _add_to_bucket(upstream, bucket, count, int(seconds * 1000))
+        except Exception as e:
+            UPSTREAM_LATENCY_LOGGER.debug(f"[message] [UPSTREAM LATENCY PUBLISH ERROR] [{upstream}] -- {e.args}")
+
+        UPSTREAM_LATENCY_LOGGER.debug(
+                f"[message] [UPSTREAM LATENCY] [{upstream}] -- requests: {histogram.count}, "
+                f"average: {histogram.sum / histogram.count:.3f}s, "
+                f"buckets: {dict(zip(LATENCY_BUCKETS, histogram.counts))}"
+        )
+
+
+def _run_publisher():
+    try:
+        publish_latency_histograms()
+    finally:
+        # The publisher thread opens its own database connection, close it before the thread exits
+        connections.close_all()
+
+
+def observe_latency(upstream, seconds):
+    """
+    Record one request latency, published at most once per UPSTREAM_LATENCY_PUBLISH_INTERVAL seconds
+        by a background thread so the request that finds them due never waits for the database
+    """
+    global _published_at, _publisher
+    with _histograms_lock:
+        _histograms.setdefault(upstream, LatencyHistogram()).observe(seconds)
+        if time.monotonic() - _published_at < getattr(settings, "UPSTREAM_LATENCY_PUBLISH_INTERVAL", 60) or \
+                (_publisher is not None and _publisher.is_alive()):
+            return
+        _published_at = time.monotonic()
+        _publisher = threading.Thread(target=_run_publisher, name="upstream-latency-publisher", daemon=True)
+
+    _publisher.start()
+
+
+def get_latency_histograms(upstreams=None):
+    """
+    :param upstreams: upstreams names, defaults to the TIMEOUT_CONSTANTS keys
+    :return: {upstream: {"buckets": {upper bound: count}, "count": total count, "sum": total seconds}}
+    """
+    upstreams = list(upstreams or settings.TIMEOUT_CONSTANTS.keys())
+    published_buckets = UpstreamLatencyBucket.objects.filter(upstream__in=upstreams).\
+        values_list("upstream", "bucket", "count", "sum_ms")
+    published = {(upstream, bucket): (count, sum_ms) for upstream, bucket, count, sum_ms in published_buckets}
+    histograms = {}
+
+    for upstream in upstreams:
+        totals = [published.get((upstream, str(bucket)), (0, 0)) for bucket in LATENCY_BUCKETS]
+        buckets = {bucket: count for bucket, (count, _) in zip(LATENCY_BUCKETS, totals)}
+        histograms[upstream] = {
+            "buckets": buckets,
+            "count": sum(buckets.values()),
+            "sum": sum(sum_ms for _, sum_ms in totals) / 1000,
+        }
+
+    return histograms
+
+
+def request(method, url, upstream, idempotent=False, **kwargs):
+    """
+    Send a request through the pooled session of the url host.
+    :param upstream: TIMEOUT_CONSTANTS key of the called endpoint, ex: CENTRAL_UIG, EBC, ACCEPT
+    :param idempotent: retry connection errors, timeouts and gateway errors with exponential backoff,
+        pass it only for inquiries as a retried disbursement may be applied twice
+    :return: requests response object
+    """
+    kwargs.setdefault("timeout", settings.TIMEOUT_CONSTANTS.get(upstream))
+    retries = getattr(settings, "UPSTREAM_IDEMPOTENT_RETRIES", 2) if idempotent else 0
+    backoff = getattr(settings, "UPSTREAM_RETRY_BACKOFF", 0.5)
+    session = get_session(url)
+
+    for attempt in range(retries + 1):
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            observe_latency(upstream, time.monotonic() - start)
+            if attempt == retries:
+                raise
+        else:
+            observe_latency(upstream, time.monotonic() - start)
+            if attempt == retries or response.status_code not in RETRY_STATUS_CODES:
+                return response
+
+        time.sleep(backoff * 2 ** attempt)
+
+
+def post(url, upstream, idempotent=False, **kwargs):
+    return request("POST", url, upstream, idempotent=idempotent, **kwargs)
+
+
+def get(url, upstream, idempotent=True, **kwargs):
+    return request("GET", url, upstream, idempotent=idempotent, **kwargs)